@@ -1,7 +1,20 @@
 """Additional widgets for PyQt5 that we need."""
 
-from PyQt5.QtWidgets import QLineEdit
-from PyQt5.QtCore import Qt
+import os
+
+from PyQt5.QtWidgets import QLineEdit, QListWidget, QListWidgetItem
+from PyQt5.QtCore import (
+    Qt,
+    QBuffer,
+    QIODevice,
+    QObject,
+    QRunnable,
+    QSize,
+    QThreadPool,
+    QUrl,
+    pyqtSignal,
+)
+from PyQt5.QtGui import QDesktopServices, QIcon, QImageReader, QPixmap
 
 
 class LineEditHistory(QLineEdit):
@@ -56,3 +69,123 @@ class LineEditHistory(QLineEdit):
         elif a0.key() == Qt.Key_Escape:  # reset the _history
             self.clear()
             self._history_counter = 0
+
+
+class _ThumbnailSignals(QObject):
+    """Signals of the thumbnail worker, QRunnable cannot emit signals itself."""
+
+    done = pyqtSignal(str, bytes)
+
+
+class _ThumbnailWorker(QRunnable):
+    """Load a thumbnail from the cache or create it by decoding the file."""
+
+    def __init__(self, path, cache, size):
+        super().__init__()
+        self.path = path
+        self.cache = cache
+        self.size = size
+        self.signals = _ThumbnailSignals()
+
+    def run(self):
+        """Get the thumbnail, create and cache it if required."""
+        data = self.cache.get(self.path)
+        if data is None:
+            reader = QImageReader(self.path)
+            original = reader.size()
+            if original.isValid():  # let the decoder scale, e.g., JPEG DCT scaling
+                reader.setScaledSize(original.scaled(self.size, Qt.KeepAspectRatio))
+            image = reader.read()
+            if image.isNull():
+                return
+            buffer = QBuffer()
+            buffer.open(QIODevice.WriteOnly)
+            image.save(buffer, "JPEG")
+            data = bytes(buffer.data())
+            self.cache.put(self.path, data)
+        self.signals.done.emit(self.path, data)
+
+
+class GalleryWidget(QListWidget):
+    """Gallery of captured images as thumbnails, newest first.
+
+    Thumbnails are loaded on a worker thread from a `ThumbnailCache` or created
+    from the file if they are not cached yet. Double click to open an image.
+    """
+
+    def __init__(self, cache, size=(160, 120), max_entries=100):
+        """Initialize the gallery.
+
+        :param cache: Cache to get and store thumbnails.
+        :type cache: rpyscope.thumbnails.ThumbnailCache
+        :param size: Size of the thumbnails (width, height).
+        :type size: tuple(int, int)
+        :param max_entries: Maximum number of entries to show.
+        :type max_entries: int
+        """
+        QListWidget.__init__(self)
+        self.cache = cache
+        self.size = QSize(*size)
+        self.max_entries = max_entries
+
+        self.setViewMode(QListWidget.IconMode)
+        self.setIconSize(self.size)
+        self.setResizeMode(QListWidget.Adjust)
+        self.setMovement(QListWidget.Static)
+        self.itemDoubleClicked.connect(self.open_item)
+
+        self._items = {}  # path -> QListWidgetItem
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(2)
+
+    def add_path(self, path, front=True):
+        """Add an image to the gallery and load its thumbnail in the background.
+
+        :param path: Path of the image.
+        :type path: str
+        :param front: Add to the front of the gallery (newest).
+        :type front: bool
+        """
+        path = str(path)
+        if path in self._items:
+            return
+        item = QListWidgetItem(os.path.basename(path))
+        item.setToolTip(path)
+        item.setData(Qt.UserRole, path)
+        if front:
+            self.insertItem(0, item)
+        else:
+            self.addItem(item)
+        self._items[path] = item
+
+        while self.count() > self.max_entries:
+            old = self.takeItem(self.count() - 1)
+            self._items.pop(old.data(Qt.UserRole), None)
+
+        worker = _ThumbnailWorker(path, self.cache, self.size)
+        worker.signals.done.connect(self._set_thumbnail)
+        self._pool.start(worker)
+
+    def set_paths(self, paths):
+        """Replace the gallery content.
+
+        :param paths: Paths of the images, newest first.
+        :type paths: list(str)
+        """
+        self.clear()
+        self._items = {}
+        for path in paths[: self.max_entries]:
+            self.add_path(path, front=False)
+
+    def open_item(self, item):
+        """Open an image with the default application of the system."""
+        QDesktopServices.openUrl(QUrl.fromLocalFile(item.data(Qt.UserRole)))
+
+    def _set_thumbnail(self, path, data):
+        """Set the icon of an item once its thumbnail is available."""
+        item = self._items.get(path)
+        if item is None:
+            return
+        pixmap = QPixmap()
+        pixmap.loadFromData(data)
+        item.setIcon(QIcon(pixmap))
@@ -0,0 +1,490 @@
+"""Batch post-processing of capture folders on a process pool.
+
+Every image of the input folder is read, run through a chain of stages, and
+written to the same relative path in the output folder. Stages are functions
+`stage(image, **options)` that return the processed image, either built-in
+(see `STAGES`) or given as "module:function". The last stage can also return a
+table as dict of columns, e.g., `particles`, which is written as CSV or
+Parquet. Files are distributed over a process pool with a bounded number of
+files in flight, such that results are streamed instead of held in memory.
+
+A manifest in the output folder stores size, modification time, and SHA-256
+checksum of every processed file together with the stage configuration. Reruns
+skip files whose size and time are unchanged without reading them, and files
+with unchanged content without processing them.
+
+Run it from the command line, e.g.::
+
+    rpyscope-batch captures/ processed/ --stage calibrate --dark dark.npy \\
+        --stage scalebar --pixel-size 0.35 --format png
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+import hashlib
+import importlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from rpyscope import particles
+from rpyscope.image_io import IMAGE_SUFFIXES, read_image, write_image
+
+MANIFEST_NAME = ".rpyscope-manifest.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    config TEXT NOT NULL,
+    output TEXT NOT NULL
+);
+"""
+
+
+def calibrate(image, dark=None, flat=None):
+    """Subtract a dark frame and divide by a flat field.
+
+    :param image: Image to calibrate.
+    :type image: numpy.ndarray
+    :param dark: File name of the dark frame, same shape as the image.
+    :type dark: str
+    :param flat: File name of the flat field, same shape as the image.
+    :type flat: str
+
+    :return: Calibrated image with the data type of the input.
+    :rtype: numpy.ndarray
+    """
+    result = image.astype(np.float32)
+    dark_frame = 0 if dark is None else _load_reference(dark)
+    result -= dark_frame
+    if flat is not None:
+        flat_frame = _load_reference(flat) - dark_frame
+        flat_frame = np.maximum(flat_frame, 1e-6)
+        result *= flat_frame.mean() / flat_frame
+    if np.issubdtype(image.dtype, np.integer):
+        info = np.iinfo(image.dtype)
+        result = np.clip(np.rint(result), info.min, info.max)
+    return result.astype(image.dtype)
+
+
+def grayscale(image):
+    """Convert an RGB image to gray.
+
+    :param image: Image to convert.
+    :type image: numpy.ndarray
+
+    :return: Gray image with shape (height, width).
+    :rtype: numpy.ndarray
+    """
+    if image.ndim == 2:
+        return image
+    gray = image[..., :3].astype(np.float32) @ np.array(
+        [0.299, 0.587, 0.114], dtype=np.float32
+    )
+    return np.rint(gray).astype(image.dtype)
+
+
+def scalebar(image, pixel_size, length=None, margin=0.03, value=None):
+    """Burn a scale bar into the bottom right corner of an image.
+
+    :param image: Image to annotate.
+    :type image: numpy.ndarray
+    :param pixel_size: Size of a pixel in the sample, e.g., in um.
+    :type pixel_size: float
+    :param length: Length of the bar in the same unit as the pixel size,
+        defaults to a round number close to a fifth of the image width.
+    :type length: float
+    :param margin: Distance to the border as fraction of the image width.
+    :type margin: float
+    :param value: Value of the bar, defaults to the maximum of the data type.
+    :type value: int, float
+
+    :return: Annotated image.
+    :rtype: numpy.ndarray
+    """
+    height, width = image.shape[:2]
+    if length is None:
+        target = width * pixel_size / 5
+        magnitude = 10 ** np.floor(np.log10(target))
+        length = max(m for m in (1, 2, 5) if m * magnitude <= target) * magnitude
+    if value is None:
+        value = np.iinfo(image.dtype).max if image.dtype.kind in "iu" else 1
+    bar_width = max(int(round(length / pixel_size)), 1)
+    bar_height = max(height // 100, 2)
+    offset = int(width * margin)
+    result = image.copy()
+    result[
+        height - offset - bar_height : height - offset,
+        width - offset - bar_width : width - offset,
+    ] = value
+    return result
+
+
+STAGES = {
+    "calibrate": calibrate,
+    "grayscale": grayscale,
+    "particles": particles.analyze,
+    "scalebar": scalebar,
+}
+
+
+class BatchProcessor:
+    """Process the images of a folder in parallel, see module description."""
+
+    def __init__(
+        self,
+        input_folder,
+        output_folder,
+        stages,
+        output_format=None,
+        workers=None,
+        recursive=True,
+    ):
+        """Open the manifest of the output folder.
+
+        :param input_folder: Folder with the captured images.
+        :type input_folder: Path, str
+        :param output_folder: Folder for the processed images and the manifest.
+        :type output_folder: Path, str
+        :param stages: Stages to run in order, names or (name, options) tuples.
+        :type stages: list
+        :param output_format: Suffix of the output files, e.g., ".png", defaults
+            to the suffix of the input file.
+        :type output_format: str
+        :param workers: Number of processes, defaults to the number of CPUs.
+        :type workers: int
+        :param recursive: Include sub-folders.
+        :type recursive: bool
+
+        :raises ValueError: Unknown stage.
+        """
+        self.input_folder = Path(input_folder)
+        self.output_folder = Path(output_folder)
+        self.stages = [
+            (stage, {}) if isinstance(stage, str) else (stage[0], dict(stage[1]))
+            for stage in stages
+        ]
+        for name, _ in self.stages:
+            _get_stage(name)  # fail early for unknown stages
+        if output_format and not output_format.startswith("."):
+            output_format = f".{output_format}"
+        self.output_format = output_format
+        self.workers = workers or os.cpu_count()
+        self.recursive = recursive
+        self.config = hashlib.sha1(
+            json.dumps([self.stages, output_format], sort_keys=True).encode()
+        ).hexdigest()
+
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.output_folder.joinpath(MANIFEST_NAME)))
+        with self._db:
+            self._db.executescript(_SCHEMA)
+        self._reset_stats()
+
+    # METHODS #
+
+    def close(self):
+        """Close the manifest."""
+        self._db.close()
+
+    def files(self):
+        """Get the images in the input folder, sorted.
+
+        :return: Paths of the images.
+        :rtype: list(Path)
+        """
+        pattern = "**/*" if self.recursive else "*"
+        return sorted(
+            fname
+            for fname in self.input_folder.glob(pattern)
+            if fname.suffix.lower() in IMAGE_SUFFIXES and fname.is_file()
+        )
+
+    def run(self):
+        """Process all new and changed files, yielding results as they finish.
+
+        :return: Result per file with "path", "output", "status" (processed,
+            unchanged, skipped, failed), and "error".
+        :rtype: generator(dict)
+        """
+        self._reset_stats()
+        start = time.monotonic()
+        max_in_flight = 2 * self.workers
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = {}
+            for fname in self.files():
+                job = self._job(fname)
+                if job is None:
+                    result = {
+                        "path": str(fname),
+                        "output": str(self._output(fname)),
+                        "status": "skipped",
+                        "error": None,
+                    }
+                    self._count(result)
+                    yield result
+                    continue
+                in_flight[executor.submit(_process, *job)] = fname
+                while len(in_flight) >= max_in_flight:
+                    yield from self._collect(in_flight)
+            while in_flight:
+                yield from self._collect(in_flight)
+        self._wall_time = time.monotonic() - start
+
+    def stats(self):
+        """Get the statistics of the last run.
+
+        Throughput per stage is given per worker process, i.e., how many files
+        or MB a single process handles per second in that stage.
+
+        :return: Files per status, wall time in s, and per stage the time in s,
+            files per s, and MB per s of input data.
+        :rtype: dict
+        """
+        stages = {}
+        for name, (seconds, files, size) in self._stage_times.items():
+            stages[name] = {
+                "seconds": seconds,
+                "files_per_s": files / seconds if seconds else float("inf"),
+                "mb_per_s": size / 1e6 / seconds if seconds else float("inf"),
+            }
+        return {
+            "status": dict(self._status),
+            "wall_time": self._wall_time,
+            "stages": stages,
+        }
+
+    # PRIVATE FUNCTIONS #
+
+    def _collect(self, in_flight):
+        """Wait for finished jobs, update the manifest, and yield their results."""
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            fname = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:  # e.g., a crashed worker process
+                result = {"status": "failed", "error": str(e), "times": {}}
+            result["path"] = str(fname)
+            result["output"] = str(self._output(fname))
+            if result["status"] in ("processed", "unchanged"):
+                stat = fname.stat()
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            self._key(fname),
+                            stat.st_size,
+                            stat.st_mtime_ns,
+                            result["sha256"],
+                            self.config,
+                            result["output"],
+                        ),
+                    )
+            self._count(result)
+            yield result
+
+    def _count(self, result):
+        """Add a result to the statistics."""
+        self._status[result["status"]] = self._status.get(result["status"], 0) + 1
+        for name, seconds in result.get("times", {}).items():
+            total, files, size = self._stage_times.get(name, (0.0, 0, 0))
+            self._stage_times[name] = (
+                total + seconds,
+                files + 1,
+                size + result.get("size", 0),
+            )
+
+    def _job(self, fname):
+        """Arguments for `_process`, None if size and time are unchanged."""
+        output = self._output(fname)
+        row = self._db.execute(
+            "SELECT size, mtime_ns, sha256, config FROM files WHERE path = ?",
+            (self._key(fname),),
+        ).fetchone()
+        known_hash = None
+        if row is not None and row[3] == self.config and output.exists():
+            stat = fname.stat()
+            if (row[0], row[1]) == (stat.st_size, stat.st_mtime_ns):
+                return None
+            known_hash = row[2]
+        return str(fname), str(output), known_hash, self.stages
+
+    def _key(self, fname):
+        """Key of a file in the manifest, relative to the input folder."""
+        return fname.relative_to(self.input_folder).as_posix()
+
+    def _output(self, fname):
+        """Output file name of an input file."""
+        output = self.output_folder.joinpath(fname.relative_to(self.input_folder))
+        return output.with_suffix(self.output_format) if self.output_format else output
+
+    def _reset_stats(self):
+        """Reset the statistics for a new run."""
+        self._status = {}
+        self._stage_times = {}  # name -> (seconds, files, bytes)
+        self._wall_time = 0.0
+
+
+def main(args=None):
+    """Run the batch processing from the command line.
+
+    :param args: Command line arguments, defaults to `sys.argv`.
+    :type args: list(str)
+
+    :return: Exit code, 1 if any file failed.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="rpyscope-batch",
+        description="Process the images of a capture folder in parallel. Files "
+        "that did not change since the last run are skipped.",
+    )
+    parser.add_argument("input", help="folder with the captured images")
+    parser.add_argument("output", help="folder for the processed images")
+    parser.add_argument(
+        "--stage",
+        action="append",
+        default=[],
+        help=f"stage to run, in order: {', '.join(STAGES)} or module:function",
+    )
+    parser.add_argument("--format", help="output format, e.g., png")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    parser.add_argument("--no-recursive", action="store_true")
+    parser.add_argument("--dark", help="dark frame for calibrate")
+    parser.add_argument("--flat", help="flat field for calibrate")
+    parser.add_argument("--pixel-size", type=float, help="pixel size for scalebar")
+    parser.add_argument("--bar-length", type=float, help="bar length for scalebar")
+    parser.add_argument("--threshold", type=float, help="threshold for particles")
+    parser.add_argument(
+        "--min-area", type=int, default=1, help="minimum area in pixels for particles"
+    )
+    parser.add_argument(
+        "--dark-particles", action="store_true", help="particles are dark"
+    )
+    parser.add_argument("--quiet", action="store_true", help="only print summary")
+    args = parser.parse_args(args)
+
+    options = {
+        "calibrate": {"dark": args.dark, "flat": args.flat},
+        "particles": {
+            "threshold": args.threshold,
+            "dark": args.dark_particles,
+            "min_area": args.min_area,
+            "pixel_size": args.pixel_size or 1.0,
+        },
+        "scalebar": {"pixel_size": args.pixel_size, "length": args.bar_length},
+    }
+    if "scalebar" in args.stage and args.pixel_size is None:
+        parser.error("the scalebar stage requires --pixel-size")
+    stages = [(name, options.get(name, {})) for name in args.stage]
+    if args.stage and args.stage[-1] == "particles" and not args.format:
+        args.format = "csv"
+
+    processor = BatchProcessor(
+        args.input,
+        args.output,
+        stages,
+        output_format=args.format,
+        workers=args.workers,
+        recursive=not args.no_recursive,
+    )
+    try:
+        for result in processor.run():
+            if not args.quiet and result["status"] != "skipped":
+                line = f"{result['status']:>9}  {result['path']}"
+                if result["error"]:
+                    line += f": {result['error']}"
+                print(line)
+    finally:
+        processor.close()
+
+    stats = processor.stats()
+    print(
+        ", ".join(
+            f"{stats['status'][status]} {status}"
+            for status in ("processed", "unchanged", "skipped", "failed")
+            if status in stats["status"]
+        )
+        + f" in {stats['wall_time']:.1f} s"
+    )
+    for name, stage in stats["stages"].items():
+        print(
+            f"{name:>12}: {stage['files_per_s']:.1f} files/s, "
+            f"{stage['mb_per_s']:.1f} MB/s per process"
+        )
+    return 1 if stats["status"].get("failed") else 0
+
+
+def _get_stage(name):
+    """Get a built-in stage by name or import one given as "module:function".
+
+    :raises ValueError: Unknown stage.
+    """
+    if name in STAGES:
+        return STAGES[name]
+    module, _, function = name.partition(":")
+    if not function:
+        raise ValueError(f"Unknown stage {name}, use one of {list(STAGES)}.")
+    return getattr(importlib.import_module(module), function)
+
+
+@lru_cache(maxsize=8)
+def _load_reference(fname):
+    """Load a dark frame or flat field once per process."""
+    return read_image(fname).astype(np.float32)
+
+
+def _process(source, output, known_hash, stages):
+    """Process one file in a worker process.
+
+    :return: Status, error, checksum, size, and time per stage.
+    :rtype: dict
+    """
+    times = {}
+    result = {"status": "processed", "error": None, "times": times}
+    try:
+        start = time.monotonic()
+        with open(source, "rb") as fin:
+            data = fin.read()
+        result["sha256"] = hashlib.sha256(data).hexdigest()
+        result["size"] = len(data)
+        if result["sha256"] == known_hash and os.path.exists(output):
+            result["status"] = "unchanged"
+            return result
+        image = read_image(data, suffix=os.path.splitext(source)[1])
+        times["read"] = time.monotonic() - start
+
+        for name, options in stages:
+            start = time.monotonic()
+            image = _get_stage(name)(image, **options)
+            times[name] = time.monotonic() - start
+
+        start = time.monotonic()
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        tmp = f"{output}.part"
+        suffix = os.path.splitext(output)[1]
+        with open(tmp, "wb") as fout:
+            if isinstance(image, dict):
+                particles.write_table(fout, image, suffix=suffix)
+            else:
+                write_image(fout, image, suffix=suffix)
+        os.replace(tmp, output)
+        times["write"] = time.monotonic() - start
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
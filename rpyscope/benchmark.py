@@ -0,0 +1,431 @@
+"""Benchmarks of the capture, recording, and analysis paths.
+
+The benchmarks drive a `Microscope` with the simulated camera, which renders
+and encodes real frames, such that they run on any Linux machine. Results are
+compared to a baseline of the same machine and the run fails if a benchmark
+got slower by more than a tolerance::
+
+    rpyscope-benchmark --save      # record the baseline, e.g., on main
+    rpyscope-benchmark             # compare, exit code 1 on regressions
+
+Baselines are stored per machine in `~/.config/RPyConf/benchmarks.json`, such
+that a Raspberry Pi and a laptop do not compare against each other.
+"""
+
+import argparse
+from contextlib import contextmanager, redirect_stdout
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from rpyscope.image_io import check_format
+from rpyscope.microscope import Cam, Microscope
+
+BENCHMARKS = {}  # name -> (function, unit, higher is better)
+CAPTURE_FORMATS = ("jpeg", "png", "gif", "bmp", "yuv", "rgb", "rgba", "bgr", "bgra")
+
+
+def benchmark(name, unit, higher_is_better=False):
+    """Register a benchmark.
+
+    The function is called with the microscope, a temporary folder, and the
+    number of repetitions, and returns the measured values. Their median is
+    the result.
+
+    :param name: Name of the benchmark.
+    :type name: str
+    :param unit: Unit of the result, e.g., "ms".
+    :type unit: str
+    :param higher_is_better: Higher values are better, e.g., for throughput.
+    :type higher_is_better: bool
+
+    :return: Decorator
+    :rtype: callable
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better)
+        return func
+
+    return decorator
+
+
+@benchmark("startup", "ms")
+def bench_startup(scope, folder, repeat):
+    """Time to create and close a microscope."""
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Microscope(default_cam=Cam.Demo).close()
+        values.append((time.perf_counter() - start) * 1e3)
+    return values
+
+
+@benchmark("capture_latency", "ms")
+def bench_capture_latency(scope, folder, repeat):
+    """Time until `capture_image` returns, the file is written behind."""
+    values = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        scope.capture_image(os.path.join(folder, f"capture_{index}.rgb"), "rgb")
+        values.append((time.perf_counter() - start) * 1e3)
+    scope.storage.flush()
+    return values
+
+
+@benchmark("capture_to_disk", "ms")
+def bench_capture_to_disk(scope, folder, repeat):
+    """Time until a captured image is on disk."""
+    values = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        scope.capture_image(os.path.join(folder, f"disk_{index}.rgb"), "rgb")
+        scope.storage.flush()
+        values.append((time.perf_counter() - start) * 1e3)
+    return values
+
+
+@benchmark("burst_throughput", "fps", higher_is_better=True)
+def bench_burst(scope, folder, repeat):
+    """Frames per second of a burst from the video port."""
+    count = 30
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in scope.cam.capture_burst(count):
+            pass
+        values.append(count / (time.perf_counter() - start))
+    return values
+
+
+@benchmark("series_throughput", "fps", higher_is_better=True)
+def bench_series(scope, folder, repeat):
+    """Frames per second captured into a chunked series."""
+    count = 5
+    values = []
+    for index in range(repeat):
+        with scope.open_series(os.path.join(folder, f"series_{index}.zarr")) as series:
+            start = time.perf_counter()
+            for _ in range(count):
+                scope.capture_to(series)
+            values.append(count / (time.perf_counter() - start))
+    return values
+
+
+@benchmark("settings_change", "us")
+def bench_settings(scope, folder, repeat):
+    """Time to change the resolution, framerate, exposure, and formats."""
+    values = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        negotiated = scope.cam.negotiate_mode((1920, 1080), 30)
+        scope.cam.apply_mode(negotiated)
+        scope.auto_exposure = bool(index % 2)
+        scope.image_format = "png" if index % 2 else "jpeg"
+        scope.video_format = "mjpeg" if index % 2 else "h264"
+        values.append((time.perf_counter() - start) * 1e6)
+    return values
+
+
+@benchmark("analysis_particles", "ms")
+def bench_particles(scope, folder, repeat):
+    """Time to detect and measure the particles of a frame."""
+    from rpyscope import particles
+
+    frame = scope.capture_frame()
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        particles.analyze(frame)
+        values.append((time.perf_counter() - start) * 1e3)
+    return values
+
+
+@benchmark("survey_throughput", "tiles/min", higher_is_better=True)
+def bench_survey(scope, folder, repeat):
+    """Tiles per minute of a 3x2 mosaic with the simulated stage."""
+    from rpyscope import scanning
+    from rpyscope.stages.simulation import SimStage
+
+    scope.stage = SimStage(speed=(50e3, 50e3, 5e3), settle_time=0.02)
+    width, height = scope.cam.resolution
+    positions = scanning.grid((0, 0), (3, 2), (width, height))  # 1 µm per pixel
+    values = []
+    for _ in range(repeat):
+        fname = tempfile.mkdtemp(suffix=".zarr", dir=folder)  # mosaics cannot grow
+        values.append(scope.scan_mosaic(fname, positions, 1.0)["tiles_per_minute"])
+    return values
+
+
+@benchmark("zstack_throughput", "slices/s", higher_is_better=True)
+def bench_zstack(scope, folder, repeat):
+    """Slices per second of a 10 slice z-stack with the simulated focus."""
+    from rpyscope import zstack
+    from rpyscope.stages.simulation import SimStage
+
+    scope.focus = SimStage(settle_time=0.01)
+    fname = os.path.join(folder, "stack.zarr")
+    values = []
+    for _ in range(repeat):
+        result = scope.capture_zstack(fname, zstack.z_range(0, 9, 1))
+        values.append(1 / result["seconds_per_slice"])
+    return values
+
+
+@benchmark("recording_raw_throughput", "fps", higher_is_better=True)
+def bench_recording_raw(scope, folder, repeat):
+    """Frames per second recorded into the raw container, until on disk.
+
+    The simulated camera records as fast as it can render and the frames are
+    written, the framerate of the camera does not limit it.
+    """
+    from rpyscope.rawvideo import RawVideoReader
+
+    duration = 0.25
+    framerate = scope.cam.framerate
+    scope.cam.framerate = 1000
+    values = []
+    try:
+        for index in range(repeat):
+            fname = os.path.join(folder, f"video_{index}.rgb")
+            start = time.perf_counter()
+            scope.start_recording(fname, "rgb")
+            time.sleep(duration)
+            scope.stop_recording()
+            scope.storage.flush()
+            frames = len(RawVideoReader(fname))
+            values.append(frames / (time.perf_counter() - start))
+    finally:
+        scope.cam.framerate = framerate
+    return values
+
+
+@benchmark("recording_h264_setup", "ms")
+def bench_recording_h264(scope, folder, repeat):
+    """Time to start and stop an H.264 recording, until it is on disk.
+
+    Setup only, the simulated camera does not encode H.264 frames.
+    """
+    values = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        scope.start_recording(os.path.join(folder, f"video_{index}.h264"), "h264")
+        scope.stop_recording()
+        scope.storage.flush()
+        values.append((time.perf_counter() - start) * 1e3)
+    return values
+
+
+def _capture_benchmark(format):
+    """Register the capture latency benchmark of an image format."""
+
+    @benchmark(f"capture_{format}", "ms")
+    def bench_capture(scope, folder, repeat):
+        check_format(format)  # the simulated camera needs Pillow to encode
+        values = []
+        for index in range(repeat):
+            fname = os.path.join(folder, f"capture_{index}.{format}")
+            start = time.perf_counter()
+            scope.capture_image(fname, format)
+            values.append((time.perf_counter() - start) * 1e3)
+        scope.storage.flush()
+        return values
+
+    bench_capture.__doc__ = f"Time until `capture_image` returns for {format}."
+    return bench_capture
+
+
+for _format in CAPTURE_FORMATS:
+    _capture_benchmark(_format)
+
+
+def run(names=None, repeat=10, resolution=(1920, 1080)):
+    """Run benchmarks.
+
+    The microscope uses a temporary home folder, such that the catalog and the
+    settings of the user are not touched.
+
+    :param names: Names of the benchmarks, defaults to all.
+    :type names: list(str)
+    :param repeat: Number of repetitions, the median is reported.
+    :type repeat: int
+    :param resolution: Resolution of the simulated camera (width, height).
+    :type resolution: tuple(int, int)
+
+    :return: Results by name with "value", "unit", and "higher_is_better",
+        benchmarks that cannot run (e.g., Pillow missing) have a "skipped"
+        reason instead of a value.
+    :rtype: dict(str, dict)
+
+    :raises ValueError: Unknown benchmark.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {sorted(unknown)}.")
+
+    results = {}
+    quiet = redirect_stdout(io.StringIO())
+    with quiet, _isolated_home() as home, _isolated_camera(resolution):
+        scope = Microscope(default_cam=Cam.Demo)
+        try:
+            for name in names:
+                func, unit, higher = BENCHMARKS[name]
+                result = {"unit": unit, "higher_is_better": higher}
+                folder = tempfile.mkdtemp(dir=home)
+                try:
+                    func(scope, folder, 1)  # warm up, e.g., caches and imports
+                    result["value"] = statistics.median(func(scope, folder, repeat))
+                except ModuleNotFoundError as e:
+                    result["skipped"] = str(e)
+                results[name] = result
+        finally:
+            scope.close()
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Find benchmarks that got worse than the baseline.
+
+    :param results: Results, see `run`.
+    :type results: dict
+    :param baseline: Results to compare to.
+    :type baseline: dict
+    :param tolerance: Allowed relative change for the worse, e.g., 0.2 for 20 %.
+    :type tolerance: float
+
+    :return: Name, value, baseline value, and relative change of regressions.
+    :rtype: list(tuple(str, float, float, float))
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name, {}).get("value")
+        if base is None or "value" not in result:
+            continue
+        change = _change(result, base)
+        if change > tolerance:
+            regressions.append((name, result["value"], base, change))
+    return regressions
+
+
+def machine_key():
+    """Key of this machine in the baseline file.
+
+    :return: Host name and architecture.
+    :rtype: str
+    """
+    return f"{platform.node()}-{platform.machine()}"
+
+
+def main(args=None):
+    """Run the benchmarks from the command line.
+
+    :param args: Command line arguments, defaults to `sys.argv`.
+    :type args: list(str)
+
+    :return: Exit code, 1 if a benchmark regressed beyond the tolerance.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="rpyscope-benchmark",
+        description="Benchmark capture, recording, and analysis with the "
+        "simulated camera and compare to the baseline of this machine.",
+    )
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--resolution", default="1920x1080", help="e.g., 640x480")
+    parser.add_argument(
+        "--baseline",
+        default=str(Path.home().joinpath(".config", "RPyConf", "benchmarks.json")),
+        help="baseline file",
+    )
+    parser.add_argument("--save", action="store_true", help="save as new baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20 %%)"
+    )
+    args = parser.parse_args(args)
+
+    resolution = tuple(int(value) for value in args.resolution.lower().split("x"))
+    results = run(args.names or None, repeat=args.repeat, resolution=resolution)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fin:
+            baselines = json.load(fin)
+    baseline = baselines.get(machine_key(), {})
+
+    print(f"{'benchmark':<20}{'result':>12}{'baseline':>12}{'change':>9}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<20}  skipped: {result['skipped']}")
+            continue
+        base = baseline.get(name, {}).get("value")
+        line = f"{name:<20}{result['value']:>8.1f} {result['unit']:<4}"
+        if base is not None:
+            line += f"{base:>8.1f} {result['unit']:<4}{_change(result, base):>+8.0%}"
+        print(line)
+
+    if args.save:
+        baseline.update(
+            {name: result for name, result in results.items() if "value" in result}
+        )
+        baselines[machine_key()] = baseline
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as fout:
+            json.dump(baselines, fout, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, value, base, change in regressions:
+        print(f"REGRESSION {name}: {value:.1f} vs. {base:.1f} ({change:+.0%})")
+    return 1 if regressions else 0
+
+
+def _change(result, base):
+    """Relative change for the worse, positive if slower than the baseline."""
+    if result["higher_is_better"]:
+        return base / result["value"] - 1 if result["value"] else np.inf
+    return result["value"] / base - 1 if base else np.inf
+
+
+@contextmanager
+def _isolated_camera(resolution):
+    """Reset the shared simulated camera, its state is restored afterwards."""
+    camera = Cam.Demo.camera
+    state = dict(vars(camera))
+    camera.reset()
+    camera.resolution = resolution
+    try:
+        yield camera
+    finally:
+        vars(camera).clear()
+        vars(camera).update(state)
+
+
+@contextmanager
+def _isolated_home():
+    """Temporary home folder with a `.config` folder, restored afterwards."""
+    home = os.environ.get("HOME")
+    with tempfile.TemporaryDirectory() as folder:
+        os.mkdir(os.path.join(folder, ".config"))
+        os.environ["HOME"] = folder
+        try:
+            yield folder
+        finally:
+            if home is None:
+                del os.environ["HOME"]
+            else:
+                os.environ["HOME"] = home
+
+
+if __name__ == "__main__":
+    sys.exit(main())
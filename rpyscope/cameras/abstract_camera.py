@@ -2,6 +2,8 @@
 
 import abc
 
+from rpyscope.cameras import sensor_modes
+
 
 class AbsCamera(metaclass=abc.ABCMeta):
     """Abstract camera class that has functions implemented.
@@ -39,8 +41,80 @@ class AbsCamera(metaclass=abc.ABCMeta):
     def contrast(self, value):
         pass
 
+    @property
+    @abc.abstractmethod
+    def framerate(self):
+        """Get / set framerate of camera.
+
+        :return: Framerate in frames per second
+        :rtype: float
+        """
+
+    @framerate.setter
+    @abc.abstractmethod
+    def framerate(self, value):
+        pass
+
+    @property
+    @abc.abstractmethod
+    def resolution(self):
+        """Get / set resolution of camera.
+
+        :return: Resolution (width, height)
+        :rtype: tuple(int, int)
+        """
+
+    @resolution.setter
+    @abc.abstractmethod
+    def resolution(self, value):
+        pass
+
+    @property
+    def motion_vectors(self):
+        """Can the camera write motion vectors with `motion_output` when recording?
+
+        :return: Motion vectors available
+        :rtype: bool
+        """
+        return False
+
+    @property
+    def sensor_modes(self):
+        """Get the native sensor modes of the camera.
+
+        :return: Sensor modes, see `rpyscope.cameras.sensor_modes`
+        :rtype: tuple(SensorMode)
+        """
+        return ()
+
+    @property
+    def sensor_timestamp(self):
+        """Get the time the last frame was exposed, if the camera knows it.
+
+        :return: Time on the `time.monotonic` clock in s, None if unknown
+        :rtype: float
+        """
+        return None
+
     # METHODS #
 
+    def apply_mode(self, negotiated):
+        """Configure the camera for a negotiated mode, see `negotiate_mode`.
+
+        The sensor mode is set first, such that the firmware does not pick its
+        own, then resolution and framerate. Unchanged values are not set, each
+        change reconfigures the camera.
+
+        :param negotiated: Negotiated sensor mode, resolution, and framerate
+        :type negotiated: sensor_modes.Negotiated
+        """
+        if getattr(self, "sensor_mode", None) != negotiated.mode.mode:
+            self.sensor_mode = negotiated.mode.mode
+        if tuple(self.resolution) != negotiated.resolution:
+            self.resolution = negotiated.resolution
+        if float(self.framerate) != negotiated.framerate:
+            self.framerate = negotiated.framerate
+
     @abc.abstractmethod
     def auto_exposure(self, value):
         """Turn auto exposure on or off.
@@ -51,34 +125,100 @@ class AbsCamera(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def capture(self, fname, format):
+    def capture(self, fname, format, **kwargs):
         """Capture an image.
 
-        :param fname: Filename
+        :param fname: Filename or file-like object
         :type fname: str
         :param format: Format
         :type format: str
+        :param kwargs: Further options, e.g., `resize` or `use_video_port`
         """
         pass
 
+    @abc.abstractmethod
+    def capture_array(self, resize=None, use_video_port=True):
+        """Capture a frame as an RGB array.
+
+        :param resize: Resize the frame to (width, height), defaults to no resizing
+        :type resize: tuple(int, int)
+        :param use_video_port: Capture from the (faster) video port
+        :type use_video_port: bool
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        pass
+
+    def capture_burst(self, count, resize=None):
+        """Capture frames from the video port as fast as possible.
+
+        :param count: Number of frames.
+        :type count: int
+        :param resize: Resize the frames to (width, height).
+        :type resize: tuple(int, int)
+
+        :return: Frames with shape (height, width, 3), one at a time
+        :rtype: generator(numpy.ndarray)
+        """
+        for _ in range(count):
+            yield self.capture_array(resize=resize)
+
     @abc.abstractmethod
     def close(self):
         """Close the camera connection."""
         pass
 
+    def negotiate_mode(self, resolution, framerate):
+        """Validate and snap resolution and framerate to a native sensor mode.
+
+        The hardware is not touched, apply the result with `apply_mode`.
+
+        :param resolution: Requested resolution, "wxh" or (width, height)
+        :type resolution: str, tuple
+        :param framerate: Requested framerate
+        :type framerate: float
+
+        :return: Selected mode, resolution, and framerate
+        :rtype: sensor_modes.Negotiated
+
+        :raises ValueError: Invalid resolution or framerate.
+        """
+        return sensor_modes.negotiate(self.sensor_modes, resolution, framerate)
+
+    def valid_framerates(self, resolution=None):
+        """Get the framerates the camera can deliver, e.g., for a selection.
+
+        :param resolution: Only framerates available at this resolution.
+        :type resolution: str, tuple
+
+        :return: Valid framerates
+        :rtype: list(str)
+        """
+        return sensor_modes.valid_framerates(self.sensor_modes, resolution)
+
+    def valid_resolutions(self):
+        """Get the resolutions the camera can deliver, e.g., for a selection.
+
+        :return: Valid resolutions formatted as "wxh"
+        :rtype: list(str)
+        """
+        return sensor_modes.valid_resolutions(self.sensor_modes)
+
     @abc.abstractmethod
     def start_preview(self):
         """Start camera preview."""
         pass
 
     @abc.abstractmethod
-    def start_recording(self, fname, format):
+    def start_recording(self, fname, format, **kwargs):
         """Record a video.
 
-        :param fname: Filename
+        :param fname: Filename or file-like object
         :type fname: str
         :param format: Format
         :type format: str
+        :param kwargs: Further options, e.g., `resize` or `motion_output`
         """
 
     @abc.abstractmethod
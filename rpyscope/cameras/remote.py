@@ -0,0 +1,492 @@
+"""Camera on another machine, e.g., a second Raspberry Pi, over the network.
+
+Run the server on the machine with the camera, or with the simulated camera as
+a local stand-in::
+
+    rpyscope-camera-server --port 8765 --demo
+
+The server only listens on localhost by default. There is no authentication,
+such that anybody who can reach the port can use the camera: only serve it to
+the network, e.g., with `--host 0.0.0.0 --allow-remote`, on a trusted one.
+Clients can only set camera settings, see `SETTINGS`, and only record into the
+recording folder of the server (`--recordings`, the current folder by
+default).
+
+and add the camera to the microscope::
+
+    scope.add_camera("transmitted", RemoteCam("pi2.local", 8765))
+
+Every request is a line of JSON, e.g., `{"op": "get", "name": "iso"}`. The
+response is a line of JSON, followed by `size` bytes of payload for captured
+images and frames, such that frames are not encoded as text.
+"""
+
+import argparse
+import io
+import ipaddress
+import json
+import os
+from pathlib import Path
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
+from rpyscope.cameras.abstract_camera import AbsCamera
+from rpyscope.cameras.sensor_modes import SensorMode
+
+CALLS = (
+    "auto_exposure",
+    "capture",
+    "capture_array",
+    "start_preview",
+    "start_recording",
+    "stop_preview",
+    "stop_recording",
+)  # methods that can be called remotely
+SETTINGS = (
+    "awb_gains",
+    "awb_mode",
+    "brightness",
+    "contrast",
+    "drc_strength",
+    "drift",
+    "exposure_compensation",
+    "exposure_mode",
+    "framerate",
+    "hflip",
+    "image_denoise",
+    "iso",
+    "meter_mode",
+    "resolution",
+    "rotation",
+    "saturation",
+    "sensor_mode",
+    "sharpness",
+    "shutter_speed",
+    "vflip",
+    "video_denoise",
+    "video_stabilization",
+    "zoom",
+)  # attributes that can be set remotely, "drift" of the simulated camera
+
+
+class RemoteCam(AbsCamera):
+    """Client of a camera server, behaves like a local camera.
+
+    Attributes that are not part of `AbsCamera`, e.g., `iso`, are read and set
+    on the remote camera as well.
+    """
+
+    def __init__(self, host="localhost", port=8765, timeout=10.0):
+        """Connect to a camera server.
+
+        :param host: Host name or address of the server.
+        :type host: str
+        :param port: Port of the server.
+        :type port: int
+        :param timeout: Timeout of requests in s.
+        :type timeout: float
+        """
+        self._address = (host, port)
+        self._lock = threading.Lock()  # one request at a time
+        self._exposed = None
+        self._sock = socket.create_connection(self._address, timeout=timeout)
+        self._file = self._sock.makefile("rwb")
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._request("get", name)["value"]
+
+    def __setattr__(self, name, value):
+        if name.startswith("_") or hasattr(type(self), name):
+            super().__setattr__(name, value)
+        else:
+            self._request("set", name, value=value)
+
+    # PROPERTIES #
+
+    @property
+    def brightness(self):
+        """Get / set brightness of camera.
+
+        :return: Brightness setting
+        :rtype: float
+        """
+        return self._request("get", "brightness")["value"]
+
+    @brightness.setter
+    def brightness(self, value):
+        self._request("set", "brightness", value=value)
+
+    @property
+    def contrast(self):
+        """Get / set contrast of camera.
+
+        :return: Contrast setting
+        :rtype: float
+        """
+        return self._request("get", "contrast")["value"]
+
+    @contrast.setter
+    def contrast(self, value):
+        self._request("set", "contrast", value=value)
+
+    @property
+    def framerate(self):
+        """Get / set framerate of camera.
+
+        :return: Framerate in frames per second
+        :rtype: float
+        """
+        return self._request("get", "framerate")["value"]
+
+    @framerate.setter
+    def framerate(self, value):
+        self._request("set", "framerate", value=value)
+
+    @property
+    def resolution(self):
+        """Get / set resolution of camera.
+
+        :return: Resolution (width, height)
+        :rtype: tuple(int, int)
+        """
+        return tuple(self._request("get", "resolution")["value"])
+
+    @resolution.setter
+    def resolution(self, value):
+        self._request("set", "resolution", value=value)
+
+    @property
+    def sensor_modes(self):
+        """Get the native sensor modes of the remote camera.
+
+        :return: Sensor modes, see `rpyscope.cameras.sensor_modes`
+        :rtype: tuple(SensorMode)
+        """
+        modes = self._request("get", "sensor_modes")["value"]
+        return tuple(SensorMode(mode[0], tuple(mode[1]), *mode[2:]) for mode in modes)
+
+    @property
+    def sensor_timestamp(self):
+        """Get the time the last frame was exposed, on the local clock.
+
+        The server sends the age of the frame, such that the clocks of the
+        machines do not need to be synchronized. The time of the response on the
+        network is included in the age.
+
+        :return: Time on the `time.monotonic` clock in s, None if unknown
+        :rtype: float
+        """
+        return self._exposed
+
+    # METHODS #
+
+    def auto_exposure(self, value):
+        """Turn auto exposure on or off.
+
+        :param value: True for on, False for off.
+        :type value: bool
+        """
+        self._request("call", "auto_exposure", args=[value])
+
+    def capture(self, fname, format, **kwargs):
+        """Capture an image on the remote camera and write it locally.
+
+        :param fname: Filename or file-like object
+        :type fname: str
+        :param format: Format
+        :type format: str
+        :param kwargs: Further options, e.g., `resize` or `use_video_port`
+        """
+        response = self._request("call", "capture", args=[format], kwargs=kwargs)
+        if hasattr(fname, "write"):
+            fname.write(response["payload"])
+        else:
+            with open(fname, "wb") as fout:
+                fout.write(response["payload"])
+
+    def capture_array(self, resize=None, use_video_port=True):
+        """Capture a frame on the remote camera as an RGB array.
+
+        :param resize: Resize the frame to (width, height), defaults to no resizing
+        :type resize: tuple(int, int)
+        :param use_video_port: Capture from the (faster) video port
+        :type use_video_port: bool
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        response = self._request(
+            "call",
+            "capture_array",
+            kwargs={"resize": resize, "use_video_port": use_video_port},
+        )
+        return np.frombuffer(response["payload"], dtype=response["dtype"]).reshape(
+            response["shape"]
+        )
+
+    def close(self):
+        """Close the connection, the remote camera stays open for other clients."""
+        self._file.close()
+        self._sock.close()
+
+    def start_preview(self, **kwargs):
+        """Start the preview on the display of the remote machine."""
+        self._request("call", "start_preview", kwargs=kwargs)
+
+    def start_recording(self, fname, format, **kwargs):
+        """Record a video on the remote machine.
+
+        :param fname: Filename on the remote machine, relative to the recording
+            folder of the server
+        :type fname: str
+        :param format: Format
+        :type format: str
+        :param kwargs: Further options, e.g., `resize`
+        """
+        self._request(
+            "call", "start_recording", args=[str(fname), format], kwargs=kwargs
+        )
+
+    def stop_preview(self):
+        """Stop camera preview."""
+        self._request("call", "stop_preview")
+
+    def stop_recording(self):
+        """Stop video recording."""
+        self._request("call", "stop_recording")
+
+    # PRIVATE FUNCTIONS #
+
+    def _request(self, op, name, **kwargs):
+        """Send a request and wait for the response.
+
+        :return: Response, with the "payload" bytes if there are any.
+        :rtype: dict
+
+        :raises AttributeError: The remote camera has no such attribute.
+        :raises RuntimeError: The remote camera raised an error.
+        """
+        request = json.dumps({"op": op, "name": name, **kwargs}).encode() + b"\n"
+        with self._lock:
+            self._file.write(request)
+            self._file.flush()
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError(f"Camera server {self._address} disconnected.")
+            response = json.loads(line)
+            if response.get("size"):
+                response["payload"] = self._file.read(response["size"])
+            received = time.monotonic()
+        if not response["ok"]:
+            if response["type"] == "AttributeError":
+                raise AttributeError(response["error"])
+            raise RuntimeError(
+                f"Remote camera: {response['type']}: {response['error']}"
+            )
+        if response.get("age") is not None:
+            self._exposed = received - response["age"]
+        return response
+
+
+class CameraServer(socketserver.ThreadingTCPServer):
+    """Serve a camera to `RemoteCam` clients."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, cam, address=("127.0.0.1", 8765), folder=None):
+        """Open the server, requests are handled with `serve_forever`.
+
+        :param cam: Camera to serve.
+        :type cam: rpyscope.cameras.abstract_camera.AbsCamera
+        :param address: Host and port to listen on, port 0 picks a free one.
+        :type address: tuple(str, int)
+        :param folder: Folder that recordings are written to, recordings are
+            refused if not given.
+        :type folder: Path, str
+        """
+        self.cam = cam
+        self.folder = None if folder is None else Path(folder).resolve()
+        self.cam_lock = threading.Lock()  # clients take turns
+        super().__init__(address, _CameraHandler)
+
+
+class _CameraHandler(socketserver.StreamRequestHandler):
+    """Handle the requests of one client."""
+
+    def handle(self):
+        for line in self.rfile:
+            payload = b""
+            try:
+                request = json.loads(line)
+                with self.server.cam_lock:
+                    response, payload = _execute(
+                        self.server.cam, request, self.server.folder
+                    )
+                response["ok"] = True
+            except Exception as e:  # sent to the client
+                response = {"ok": False, "type": type(e).__name__, "error": str(e)}
+            response["size"] = len(payload)
+            self.wfile.write(json.dumps(response, default=_to_json).encode() + b"\n")
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+
+def serve(cam, host="127.0.0.1", port=0, folder=None):
+    """Serve a camera in a background thread, e.g., as a local stand-in.
+
+    :param cam: Camera to serve.
+    :type cam: rpyscope.cameras.abstract_camera.AbsCamera
+    :param host: Host to listen on.
+    :type host: str
+    :param port: Port to listen on, 0 picks a free one.
+    :type port: int
+    :param folder: Folder that recordings are written to, see `CameraServer`.
+    :type folder: Path, str
+
+    :return: Running server, its port is `server.server_address[1]`. Stop it
+        with `shutdown` and `server_close`.
+    :rtype: CameraServer
+    """
+    server = CameraServer(cam, (host, port), folder)
+    threading.Thread(
+        target=server.serve_forever, name="rpyscope-camera-server", daemon=True
+    ).start()
+    return server
+
+
+def main(args=None):
+    """Serve a camera from the command line.
+
+    :param args: Command line arguments, defaults to `sys.argv`.
+    :type args: list(str)
+
+    :return: Exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="rpyscope-camera-server",
+        description="Serve the camera of this machine to RPyScope on another one.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="allow listening on other interfaces than localhost, there is no "
+        "authentication",
+    )
+    parser.add_argument(
+        "--recordings", default=".", help="folder that recordings are written to"
+    )
+    parser.add_argument("--demo", action="store_true", help="serve a simulated camera")
+    args = parser.parse_args(args)
+    if not args.allow_remote and not _is_loopback(args.host):
+        parser.error(f"listening on {args.host} requires --allow-remote")
+
+    if args.demo:
+        from rpyscope.cameras.simulation import SimCam as Camera
+    else:
+        from rpyscope.cameras.rpi_cam import RPiCam as Camera
+
+    with CameraServer(Camera(), (args.host, args.port), args.recordings) as server:
+        print(f"Serving the camera on port {server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.cam.close()
+    return 0
+
+
+def _confine(folder, fname):
+    """Path of a file in the recording folder.
+
+    :raises PermissionError: No recording folder or the file is outside of it.
+    """
+    if folder is None:
+        raise PermissionError("This server does not accept recordings.")
+    path = str(folder.joinpath(fname).resolve())
+    if os.path.commonpath([str(folder), path]) != str(folder):
+        raise PermissionError(f"{fname} is outside of the recording folder.")
+    return path
+
+
+def _execute(cam, request, folder=None):
+    """Execute a request on the camera.
+
+    :return: Response and payload.
+    :rtype: tuple(dict, bytes)
+
+    :raises AttributeError: Unknown or private attribute, or not a setting.
+    :raises PermissionError: The recording is outside of `folder`.
+    :raises ValueError: Unknown operation.
+    """
+    op, name = request["op"], request["name"]
+    if name.startswith("_"):
+        raise AttributeError(f"{name} is private.")
+    if op == "get":
+        return {"value": getattr(cam, name)}, b""
+    if op == "set":
+        if name not in SETTINGS:
+            raise AttributeError(f"{name} cannot be set remotely.")
+        value = request["value"]
+        setattr(cam, name, tuple(value) if isinstance(value, list) else value)
+        return {}, b""
+    if op != "call" or name not in CALLS:
+        raise ValueError(f"Unknown request {op} {name}.")
+
+    args = request.get("args", [])
+    kwargs = request.get("kwargs", {})
+    if kwargs.get("resize") is not None:
+        kwargs["resize"] = tuple(kwargs["resize"])
+    if name == "start_recording":
+        args = [_confine(folder, args[0])] + list(args[1:])
+        if isinstance(kwargs.get("motion_output"), str):
+            kwargs["motion_output"] = _confine(folder, kwargs["motion_output"])
+    if name == "capture":
+        buffer = io.BytesIO()
+        cam.capture(buffer, *args, **kwargs)
+        return {"age": _age(cam)}, buffer.getvalue()
+    if name == "capture_array":
+        frame = np.ascontiguousarray(cam.capture_array(**kwargs))
+        response = {"shape": frame.shape, "dtype": frame.dtype.str, "age": _age(cam)}
+        return response, frame.tobytes()
+    getattr(cam, name)(*args, **kwargs)
+    return {}, b""
+
+
+def _age(cam):
+    """Time since the camera exposed its last frame in s, None if unknown."""
+    exposed = cam.sensor_timestamp
+    return None if exposed is None else time.monotonic() - exposed
+
+
+def _is_loopback(host):
+    """Is the host only reachable from this machine?"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _to_json(value):
+    """Convert values that JSON does not know, e.g., a Fraction."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
 """Class for the RPi camera."""
 
+import time
+
 from rpyscope.cameras.abstract_camera import AbsCamera
+from rpyscope.cameras.sensor_modes import SENSOR_MODES
 
 try:
-    from picamera import PiCamera
+    from picamera import PiCamera, PiCameraRuntimeError
+    from picamera.array import PiRGBArray
 except ModuleNotFoundError:
     print("No picamera Module. Please choose Demo camera.")
 
@@ -12,6 +16,11 @@ except ModuleNotFoundError:
 
         pass
 
+    class PiCameraRuntimeError(RuntimeError):
+        """Dummy class so we can catch errors of the RPiCam."""
+
+        pass
+
 
 class RPiCam(PiCamera):
     __metaclass__ = AbsCamera
@@ -26,6 +35,53 @@ class RPiCam(PiCamera):
         """Initialize RPiCam."""
         super().__init__()
 
+    # AbsCamera helpers, RPiCam cannot inherit them since it derives from PiCamera
+    apply_mode = AbsCamera.apply_mode
+    negotiate_mode = AbsCamera.negotiate_mode
+    valid_framerates = AbsCamera.valid_framerates
+    valid_resolutions = AbsCamera.valid_resolutions
+
+    @property
+    def motion_vectors(self):
+        """Can the camera write motion vectors with `motion_output` when recording?
+
+        :return: Motion vectors available, always True for the H.264 encoder
+        :rtype: bool
+        """
+        return True
+
+    @property
+    def sensor_modes(self):
+        """Get the native sensor modes of the camera, determined by its sensor.
+
+        :return: Sensor modes, see `rpyscope.cameras.sensor_modes`
+        :rtype: tuple(SensorMode)
+        """
+        return SENSOR_MODES.get(getattr(self, "revision", None), ())
+
+    @property
+    def sensor_timestamp(self):
+        """Get the time the last frame was exposed, from the camera clock.
+
+        The frame timestamp of the GPU is mapped to the `time.monotonic` clock
+        by comparing it to the current time of the GPU clock. Frame information
+        is only available while recording, stills captured from the video port
+        are close to the last recorded frame. Otherwise, e.g., for stills from
+        the still port, the time is unknown.
+
+        :return: Time on the `time.monotonic` clock in s, None if unknown
+        :rtype: float
+        """
+        if not self.recording:
+            return None
+        try:
+            frame = self.frame
+        except PiCameraRuntimeError:  # recording stopped meanwhile
+            return None
+        if frame is None or frame.timestamp is None:
+            return None
+        return time.monotonic() - (self.timestamp - frame.timestamp) / 1e6
+
     def auto_exposure(self, value):
         """Turn auto exposure on or off.
 
@@ -41,3 +97,43 @@ class RPiCam(PiCamera):
             g = self.awb_gains
             self.awb_mode = "off"
             self.awb_gains = g
+
+    def capture_array(self, resize=None, use_video_port=True):
+        """Capture a frame as an RGB array.
+
+        :param resize: Resize the frame to (width, height), defaults to no resizing
+        :type resize: tuple(int, int)
+        :param use_video_port: Capture from the (faster) video port
+        :type use_video_port: bool
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        output = PiRGBArray(self, size=resize)
+        self.capture(output, format="rgb", use_video_port=use_video_port, resize=resize)
+        return output.array
+
+    def capture_burst(self, count, resize=None):
+        """Capture frames from the video port as fast as possible.
+
+        Frames are captured continuously, such that the port is only set up once.
+
+        :param count: Number of frames.
+        :type count: int
+        :param resize: Resize the frames to (width, height).
+        :type resize: tuple(int, int)
+
+        :return: Frames with shape (height, width, 3), one at a time
+        :rtype: generator(numpy.ndarray)
+        """
+        if count < 1:
+            return
+        output = PiRGBArray(self, size=resize)
+        frames = self.capture_continuous(
+            output, format="rgb", use_video_port=True, resize=resize
+        )
+        for index, _ in enumerate(frames):
+            yield output.array
+            output.truncate(0)
+            if index + 1 >= count:
+                break
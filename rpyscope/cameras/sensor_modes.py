@@ -0,0 +1,223 @@
+"""Sensor mode tables and resolution / framerate negotiation.
+
+The tables follow the sensor modes listed in the picamera documentation, see
+https://picamera.readthedocs.io/en/release-1.13/fov.html#sensor-modes
+Requested settings are validated and snapped against these tables before the
+camera hardware is touched, so invalid values never cost a reconfiguration.
+"""
+
+from collections import namedtuple
+
+SensorMode = namedtuple(
+    "SensorMode", ["mode", "resolution", "fps_min", "fps_max", "full_fov", "binning"]
+)
+SensorMode.__doc__ = """Native sensor mode of a camera.
+
+:param mode: Sensor mode number as used by the camera firmware.
+:param resolution: Native resolution (width, height) in pixels.
+:param fps_min: Minimum framerate in frames per second.
+:param fps_max: Maximum framerate in frames per second.
+:param full_fov: Is the full field of view of the sensor used?
+:param binning: Binning applied, e.g., "2x2", or None.
+"""
+
+Negotiated = namedtuple("Negotiated", ["mode", "resolution", "framerate"])
+Negotiated.__doc__ = """Result of a negotiation: sensor mode and snapped settings."""
+
+
+SENSOR_MODES = {
+    # Camera module v1
+    "ov5647": (
+        SensorMode(1, (1920, 1080), 1, 30, False, None),
+        SensorMode(2, (2592, 1944), 1, 15, True, None),
+        SensorMode(3, (2592, 1944), 1 / 6, 1, True, None),
+        SensorMode(4, (1296, 972), 1, 42, True, "2x2"),
+        SensorMode(5, (1296, 730), 1, 49, True, "2x2"),
+        SensorMode(6, (640, 480), 42.1, 60, True, "4x4"),
+        SensorMode(7, (640, 480), 60.1, 90, True, "4x4"),
+    ),
+    # Camera module v2
+    "imx219": (
+        SensorMode(1, (1920, 1080), 0.1, 30, False, None),
+        SensorMode(2, (3280, 2464), 0.1, 15, True, None),
+        SensorMode(3, (3280, 2464), 0.1, 15, True, None),
+        SensorMode(4, (1640, 1232), 0.1, 40, True, "2x2"),
+        SensorMode(5, (1640, 922), 0.1, 40, True, "2x2"),
+        SensorMode(6, (1280, 720), 40, 90, False, "2x2"),
+        SensorMode(7, (640, 480), 40, 200, False, "2x2"),
+    ),
+    # HQ camera
+    "imx477": (
+        SensorMode(1, (2028, 1080), 0.1, 50, False, "2x2"),
+        SensorMode(2, (2028, 1520), 0.1, 50, True, "2x2"),
+        SensorMode(3, (4056, 3040), 0.005, 10, True, None),
+        SensorMode(4, (1332, 990), 50.1, 120, False, "2x2"),
+    ),
+}
+
+# Common resolutions that are offered in addition to the native ones.
+COMMON_RESOLUTIONS = (
+    (640, 480),
+    (800, 600),
+    (1024, 768),
+    (1280, 720),
+    (1280, 960),
+    (1920, 1080),
+)
+
+# Common framerates that are offered as choices.
+COMMON_FRAMERATES = (1, 5, 10, 15, 24, 25, 30, 40, 50, 60, 90, 120, 200)
+
+# Resolutions this close to the native one of a mode are snapped to it.
+SNAP_TOLERANCE = 0.05
+
+
+def parse_resolution(value):
+    """Parse a resolution into a (width, height) tuple.
+
+    :param value: Resolution as "wxh" string or as (width, height) sequence.
+    :type value: str, tuple
+
+    :return: Width and height in pixels.
+    :rtype: tuple(int, int)
+
+    :raises ValueError: The resolution cannot be parsed or is not positive.
+    """
+    try:
+        if isinstance(value, str):
+            width, height = value.lower().replace(" ", "").split("x")
+        else:
+            width, height = value
+        width, height = int(width), int(height)
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"Resolution {value!r} is invalid, use the format 'width x height'."
+        )
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Resolution {value!r} must be positive.")
+    return width, height
+
+
+def format_resolution(resolution):
+    """Format a resolution the same way as picamera does, e.g., "1920x1080".
+
+    :param resolution: Resolution (width, height).
+    :type resolution: tuple(int, int)
+
+    :return: Formatted resolution.
+    :rtype: str
+    """
+    return f"{resolution[0]}x{resolution[1]}"
+
+
+def negotiate(modes, resolution, framerate):
+    """Validate and snap a requested resolution / framerate to a native mode.
+
+    The framerate is clamped into the range of the available modes first. Of
+    all modes that can deliver this framerate, the smallest one that does not
+    need any upscaling is chosen, preferring the full field of view and the
+    closest aspect ratio. The camera scales the mode to the resolution, which
+    is snapped to the native resolution of the mode if it is within
+    `SNAP_TOLERANCE` of it, such that nearly native resolutions are not
+    rescaled. If no mode is large enough, the resolution is snapped down to
+    the largest mode.
+
+    :param modes: Sensor modes of the camera.
+    :type modes: tuple(SensorMode)
+    :param resolution: Requested resolution, see `parse_resolution`.
+    :type resolution: str, tuple
+    :param framerate: Requested framerate in frames per second.
+    :type framerate: float, str
+
+    :return: Selected mode, snapped resolution, and snapped framerate.
+    :rtype: Negotiated
+
+    :raises ValueError: Invalid resolution or framerate, or no modes available.
+    """
+    if not modes:
+        raise ValueError("No sensor modes available for this camera.")
+    width, height = parse_resolution(resolution)
+    try:
+        framerate = float(framerate)
+    except (TypeError, ValueError):
+        raise ValueError(f"Framerate {framerate!r} is not a number.")
+    if framerate <= 0:
+        raise ValueError(f"Framerate {framerate} must be positive.")
+
+    # modes that can deliver the framerate, else the closest ones
+    candidates = [m for m in modes if m.fps_min <= framerate <= m.fps_max]
+    if not candidates:
+        distance = min(_fps_distance(m, framerate) for m in modes)
+        candidates = [m for m in modes if _fps_distance(m, framerate) == distance]
+        framerate = min(max(framerate, candidates[0].fps_min), candidates[0].fps_max)
+
+    fitting = [
+        m for m in candidates if m.resolution[0] >= width and m.resolution[1] >= height
+    ]
+    if fitting:
+        aspect = width / height
+        mode = min(
+            fitting,
+            key=lambda m: (
+                not m.full_fov,
+                round(abs(m.resolution[0] / m.resolution[1] - aspect), 2),
+                m.resolution[0] * m.resolution[1],
+            ),
+        )
+        if width >= mode.resolution[0] * (
+            1 - SNAP_TOLERANCE
+        ) and height >= mode.resolution[1] * (1 - SNAP_TOLERANCE):
+            width, height = mode.resolution
+    else:
+        mode = max(candidates, key=lambda m: m.resolution[0] * m.resolution[1])
+        width, height = mode.resolution
+
+    return Negotiated(mode, (width, height), framerate)
+
+
+def valid_resolutions(modes):
+    """Get all resolutions that can be offered as choices for the given modes.
+
+    :param modes: Sensor modes of the camera.
+    :type modes: tuple(SensorMode)
+
+    :return: Sorted resolutions as strings, e.g., "1920x1080".
+    :rtype: list(str)
+    """
+    if not modes:
+        return []
+    max_w = max(m.resolution[0] for m in modes)
+    max_h = max(m.resolution[1] for m in modes)
+    resolutions = {m.resolution for m in modes}
+    resolutions.update(r for r in COMMON_RESOLUTIONS if r[0] <= max_w and r[1] <= max_h)
+    return [format_resolution(r) for r in sorted(resolutions)]
+
+
+def valid_framerates(modes, resolution=None):
+    """Get all framerates that can be offered as choices for the given modes.
+
+    :param modes: Sensor modes of the camera.
+    :type modes: tuple(SensorMode)
+    :param resolution: Only consider modes that can deliver this resolution.
+    :type resolution: str, tuple
+
+    :return: Sorted framerates as strings.
+    :rtype: list(str)
+    """
+    if resolution is not None:
+        width, height = parse_resolution(resolution)
+        modes = [
+            m for m in modes if m.resolution[0] >= width and m.resolution[1] >= height
+        ]
+    return [
+        str(fps)
+        for fps in COMMON_FRAMERATES
+        if any(m.fps_min <= fps <= m.fps_max for m in modes)
+    ]
+
+
+def _fps_distance(mode, framerate):
+    """Distance of a framerate to the framerate range of a mode."""
+    if framerate < mode.fps_min:
+        return mode.fps_min - framerate
+    return max(0, framerate - mode.fps_max)
@@ -1,14 +1,29 @@
 """Class for Simulated Camera."""
 
+import threading
+import time
+
+import numpy as np
+
 from rpyscope.cameras.abstract_camera import AbsCamera
+from rpyscope.cameras.sensor_modes import SENSOR_MODES, parse_resolution
+from rpyscope.image_io import RAW_FORMATS, check_format, encode_frame
 
 
 class SimCam(AbsCamera):
-    """Simulated Camera. Simply pipes commands through and returns them as strings."""
+    """Simulated Camera, e.g., for the demo, the tests, and the benchmarks.
+
+    Captures, frames captured as arrays, and recordings show a synthetic sample
+    of bright particles on a dark background, which moves by `drift` pixels
+    (dx, dy) per frame. Resolution, framerate, and sensor mode are kept like
+    on a HQ camera, other settings are only printed.
+    """
 
     def __init__(self):
         """Initialize."""
-        pass
+        self._recorder = None  # thread that writes the frames of a recording
+        self._recording_stop = threading.Event()
+        self.reset()
 
     # PROPERTIES #
 
@@ -24,7 +39,7 @@ class SimCam(AbsCamera):
 
     @brightness.setter
     def brightness(self, value):
-        print_return_call("brigntess", value)
+        print_return_call("brightness", value)
 
     @property
     def contrast(self):
@@ -40,6 +55,69 @@ class SimCam(AbsCamera):
     def contrast(self, value):
         print_return_call("contrast", value)
 
+    @property
+    def framerate(self):
+        """Get / set framerate of camera.
+
+        :return: Framerate in frames per second
+        :rtype: float
+        """
+        return self._framerate
+
+    @framerate.setter
+    def framerate(self, value):
+        print_return_call("framerate", value)
+        self._framerate = float(value)
+
+    @property
+    def resolution(self):
+        """Get / set resolution of camera.
+
+        :return: Resolution (width, height)
+        :rtype: tuple(int, int)
+        """
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value):
+        print_return_call("resolution", value)
+        self._resolution = parse_resolution(value)
+
+    @property
+    def sensor_mode(self):
+        """Get / set the sensor mode, 0 lets the firmware choose.
+
+        :return: Sensor mode number, see `sensor_modes`
+        :rtype: int
+        """
+        return self._sensor_mode
+
+    @sensor_mode.setter
+    def sensor_mode(self, value):
+        print_return_call("sensor_mode", value)
+        if value != 0 and value not in (mode.mode for mode in self.sensor_modes):
+            raise ValueError(f"Invalid sensor mode {value}.")
+        self._sensor_mode = value
+
+    @property
+    def sensor_modes(self):
+        """Get the native sensor modes, the simulation behaves like a HQ camera.
+
+        :return: Sensor modes, see `rpyscope.cameras.sensor_modes`
+        :rtype: tuple(SensorMode)
+        """
+        return SENSOR_MODES["imx477"]
+
+    @property
+    def sensor_timestamp(self):
+        """Get the time the last frame was captured.
+
+        :return: Time on the `time.monotonic` clock in s, None before the first
+            capture
+        :rtype: float
+        """
+        return self._exposed
+
     # METHODS #
 
     def auto_exposure(self, value):
@@ -50,41 +128,220 @@ class SimCam(AbsCamera):
         """
         print_return_call("auto_exposure", value)
 
-    def capture(self, fname, format):
-        """Capture an image.
+    def capture(self, fname, format, **kwargs):
+        """Capture an image of the synthetic sample.
+
+        Raw formats (rgb, rgba, bgr, bgra, yuv) are always written, compressed
+        formats only if Pillow is installed, otherwise nothing is written.
 
-        :param fname: Filename
+        :param fname: Filename or file-like object
         :type fname: str
         :param format: Format
         :type format: str
+        :param kwargs: Further options, e.g., `resize` or `use_video_port`
+        """
+        print_return_call("capture", fname, format, **kwargs)
+        self._exposed = time.monotonic()
+        data = _encode(self._render(kwargs.get("resize")), format)
+        if data is None:
+            return
+        if hasattr(fname, "write"):
+            fname.write(data)
+        else:
+            with open(fname, "wb") as fout:
+                fout.write(data)
+
+    def capture_array(self, resize=None, use_video_port=True):
+        """Capture a frame of the synthetic sample as an RGB array.
+
+        :param resize: Resize the frame to (width, height), defaults to no resizing
+        :type resize: tuple(int, int)
+        :param use_video_port: Ignored, for compatibility with the RPi camera
+        :type use_video_port: bool
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
         """
-        print_return_call("capture", fname, format)
+        frame = self._render(resize)
+        self.frame_count += 1
+        self._exposed = time.monotonic()
+        return frame
 
     def close(self):
-        """Close the camera connection."""
+        """Close the camera connection, stops a recording."""
         print_return_call("close")
+        self.stop_recording()
+
+    def reset(self):
+        """Stop a recording and restore the initial settings and state."""
+        if self._recorder is not None:
+            self.stop_recording()
+        self._framerate = 30.0
+        self._resolution = (1920, 1080)
+        self._sensor_mode = 0
+
+        self.drift = (0, 0)
+        self.frame_count = 0
+        self._exposed = None  # time of the last capture
+        self._scene = None
 
-    def start_preview(self):
+    def start_preview(self, **kwargs):
         """Start camera preview."""
-        print_return_call("start_preview")
+        print_return_call("start_preview", **kwargs)
 
-    def start_recording(self, fname, format):
-        """Record a video.
+    def start_recording(self, fname, format, **kwargs):
+        """Record a video of the synthetic sample at the framerate.
 
-        :param fname: Filename
+        Frames are written in a background thread until `stop_recording`. Raw
+        formats are padded like the camera does, see `rpyscope.rawvideo`, and
+        "mjpeg" is written if Pillow is installed. Nothing is written for
+        "h264", which would require an encoder.
+
+        :param fname: Filename or file-like object
         :type fname: str
         :param format: Format
         :type format: str
+        :param kwargs: Further options, e.g., `resize` or `motion_output`
+
+        :raises RuntimeError: The camera is already recording.
         """
-        print_return_call("start_recording", fname, format)
+        print_return_call("start_recording", fname, format, **kwargs)
+        if self._recorder is not None:
+            raise RuntimeError("The camera is already recording.")
+        self._recording_stop.clear()
+        self._recorder = threading.Thread(
+            target=self._record,
+            args=(fname, "jpeg" if format == "mjpeg" else format, kwargs.get("resize")),
+            daemon=True,
+        )
+        self._recorder.start()
 
     def stop_preview(self):
         """Stop camera preview."""
         print_return_call("stop_preview")
 
     def stop_recording(self):
-        """Stop video recording."""
+        """Stop video recording, once the frame being written is complete."""
         print_return_call("stop_recording")
+        if self._recorder is not None:
+            self._recording_stop.set()
+            self._recorder.join()
+            self._recorder = None
+
+    # PRIVATE FUNCTIONS #
+
+    def _record(self, fname, format, resize):
+        """Write frames at the framerate until the recording is stopped.
+
+        Frames are dropped if writing takes longer than the frame interval.
+        Frames that cannot be encoded, e.g., "h264", are counted but not
+        rendered.
+
+        :param fname: Filename or file-like object
+        :type fname: str
+        :param format: Format of a frame
+        :type format: str
+        :param resize: Resize the frames to (width, height)
+        :type resize: tuple(int, int)
+        """
+        try:
+            check_format(format)
+        except (ModuleNotFoundError, ValueError):
+            format = None
+        output = fname if hasattr(fname, "write") else open(fname, "wb")
+        try:
+            due = time.monotonic()
+            while not self._recording_stop.wait(max(due - time.monotonic(), 0)):
+                frame = None if format is None else self._render(resize)
+                self.frame_count += 1
+                self._exposed = time.monotonic()
+                if format in RAW_FORMATS:
+                    output.write(encode_frame(_pad(frame), format))
+                elif format is not None:
+                    output.write(encode_frame(frame, format))
+                due = max(due + 1 / self._framerate, time.monotonic())
+        finally:
+            if output is not fname:
+                output.close()
+
+    def _render(self, resize=None):
+        """Render the current frame, moved by the drift so far.
+
+        :param resize: Resize the frame to (width, height)
+        :type resize: tuple(int, int)
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        shift = (
+            int(round(self.drift[1] * self.frame_count)),
+            int(round(self.drift[0] * self.frame_count)),
+        )
+        frame = np.roll(self._get_scene(), shift, axis=(0, 1))
+        if resize is not None:
+            height, width = frame.shape[:2]
+            rows = np.arange(resize[1]) * height // resize[1]
+            cols = np.arange(resize[0]) * width // resize[0]
+            frame = frame[rows[:, np.newaxis], cols]
+        return frame
+
+    def _get_scene(self):
+        """Get the synthetic sample at the current resolution, cached.
+
+        :return: Scene with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        width, height = self._resolution
+        if self._scene is not None and self._scene.shape[:2] == (height, width):
+            return self._scene
+
+        rng = np.random.default_rng(42)
+        yy, xx = np.mgrid[0:height, 0:width]
+        scene = (20 + 20 * xx / width).astype(np.uint8)
+        scale = min(width, height)
+        for _ in range(40):
+            cx, cy = rng.integers(0, width), rng.integers(0, height)
+            radius = rng.uniform(0.005, 0.03) * scale
+            y0, y1 = int(max(cy - radius, 0)), int(min(cy + radius + 1, height))
+            x0, x1 = int(max(cx - radius, 0)), int(min(cx + radius + 1, width))
+            disk = (yy[y0:y1, x0:x1] - cy) ** 2 + (xx[y0:y1, x0:x1] - cx) ** 2
+            scene[y0:y1, x0:x1][disk <= radius**2] = 200
+        self._scene = np.repeat(scene[:, :, np.newaxis], 3, axis=2)
+        return self._scene
+
+
+def _encode(frame, format):
+    """Encode an RGB frame like the camera, None if Pillow is needed but missing.
+
+    :param frame: Frame with shape (height, width, 3)
+    :type frame: numpy.ndarray
+    :param format: Format, e.g., "jpeg" or "rgb"
+    :type format: str
+
+    :return: Encoded image
+    :rtype: bytes
+    """
+    try:
+        return encode_frame(frame, format)
+    except (ModuleNotFoundError, ValueError):
+        return None
+
+
+def _pad(frame):
+    """Pad a frame to a multiple of 32 columns and 16 rows like the camera.
+
+    :param frame: Frame with shape (height, width, 3)
+    :type frame: numpy.ndarray
+
+    :return: Padded frame
+    :rtype: numpy.ndarray
+    """
+    height, width = frame.shape[:2]
+    padded = np.zeros(
+        ((height + 15) // 16 * 16, (width + 31) // 32 * 32, 3), dtype=frame.dtype
+    )
+    padded[:height, :width] = frame
+    return padded
 
 
 def print_return_call(fnc_name, *args, **kwargs):
@@ -0,0 +1,327 @@
+"""SQLite catalog of all captured images and videos with their settings."""
+
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+# camera settings that are stored with every entry
+SETTINGS_COLUMNS = (
+    "resolution",
+    "framerate",
+    "shutter_speed",
+    "analog_gain",
+    "digital_gain",
+    "brightness",
+    "contrast",
+    "format",
+)
+
+IMAGE_FORMATS = (
+    "jpeg",
+    "jpg",
+    "png",
+    "gif",
+    "bmp",
+    "yuv",
+    "rgb",
+    "rgba",
+    "bgr",
+    "bgra",
+)
+VIDEO_FORMATS = ("h264", "mjpeg")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    sample_id TEXT,
+    resolution TEXT,
+    framerate REAL,
+    shutter_speed INTEGER,
+    analog_gain REAL,
+    digital_gain REAL,
+    brightness INTEGER,
+    contrast INTEGER,
+    format TEXT,
+    size INTEGER,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_captures_timestamp ON captures (timestamp);
+CREATE INDEX IF NOT EXISTS idx_captures_sample ON captures (sample_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_captures_settings
+    ON captures (format, resolution, shutter_speed);
+"""
+
+
+class Catalog:
+    """Catalog of captures, stored in a local SQLite database.
+
+    Every capture and recording done through the `Microscope` is logged with its
+    path, timestamp, camera settings, and sample ID. Files that were added
+    outside of RPyScope can be picked up with `rescan`.
+    """
+
+    def __init__(self, fname):
+        """Open (and create if required) the catalog.
+
+        :param fname: File name of the SQLite database.
+        :type fname: Path, str
+        """
+        self.fname = Path(fname)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.fname), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def add(self, path, kind, settings=None, sample_id=None, timestamp=None):
+        """Add a capture to the catalog, replaces an existing entry.
+
+        :param path: Path of the captured file.
+        :type path: Path, str
+        :param kind: Kind of capture, "image" or "video".
+        :type kind: str
+        :param settings: Camera settings, see `SETTINGS_COLUMNS` for valid keys.
+        :type settings: dict
+        :param sample_id: ID of the sample that was captured.
+        :type sample_id: str
+        :param timestamp: Time of the capture as UNIX time, defaults to now.
+        :type timestamp: float
+
+        :raises ValueError: Invalid kind or setting.
+        """
+        if kind not in ("image", "video"):
+            raise ValueError(f"Kind must be 'image' or 'video' but is {kind!r}.")
+        settings = {} if settings is None else dict(settings)
+        invalid = set(settings) - set(SETTINGS_COLUMNS)
+        if invalid:
+            raise ValueError(f"Invalid settings for the catalog: {sorted(invalid)}.")
+        if timestamp is None:
+            timestamp = time.time()
+
+        row = {
+            "path": str(path),
+            "kind": kind,
+            "timestamp": timestamp,
+            "sample_id": sample_id or None,
+        }
+        row.update(settings)
+        size, mtime = _stat(path)
+        row["size"] = size
+        row["mtime"] = mtime
+
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{key}" for key in row)
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO captures ({columns}) VALUES ({placeholders})",
+                row,
+            )
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+    def query(
+        self,
+        since=None,
+        until=None,
+        sample_id=None,
+        kind=None,
+        limit=None,
+        **settings,
+    ):
+        """Query the catalog, newest entries first.
+
+        :param since: Only entries at or after this UNIX time.
+        :type since: float
+        :param until: Only entries before this UNIX time.
+        :type until: float
+        :param sample_id: Only entries of this sample.
+        :type sample_id: str
+        :param kind: Only entries of this kind, "image" or "video".
+        :type kind: str
+        :param limit: Maximum number of entries to return.
+        :type limit: int
+        :param settings: Only entries with these camera settings.
+
+        :return: Matching entries
+        :rtype: list(dict)
+
+        :raises ValueError: Invalid setting to query for.
+        """
+        invalid = set(settings) - set(SETTINGS_COLUMNS)
+        if invalid:
+            raise ValueError(f"Invalid settings to query: {sorted(invalid)}.")
+
+        conditions = []
+        params = []
+        for condition, value in (
+            ("timestamp >= ?", since),
+            ("timestamp < ?", until),
+            ("sample_id = ?", sample_id),
+            ("kind = ?", kind),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        for key, value in settings.items():
+            conditions.append(f"{key} = ?")
+            params.append(value)
+
+        sql = "SELECT * FROM captures"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def refresh(self, path):
+        """Update size and modification time of an entry from its file.
+
+        :param path: Path of the entry.
+        :type path: Path, str
+        """
+        size, mtime = _stat(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE captures SET size = ?, mtime = ? WHERE path = ?",
+                (size, mtime, str(path)),
+            )
+
+    def remove(self, path):
+        """Remove an entry from the catalog.
+
+        :param path: Path of the entry to remove.
+        :type path: Path, str
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM captures WHERE path = ?", (str(path),))
+
+    def rescan(self, folder):
+        """Scan a folder for captures that are new, changed, or deleted.
+
+        Files are compared to the catalog by size and modification time, such
+        that only new and changed files are written to the catalog. New files
+        are added without settings, entries of files that no longer exist are
+        removed.
+
+        :param folder: Folder to scan recursively.
+        :type folder: Path, str
+
+        :return: Number of new, updated, or removed entries.
+        :rtype: int
+        """
+        folder = os.path.abspath(folder)
+        with self._lock:
+            known = {
+                row["path"]: (row["size"], row["mtime"])
+                for row in self._db.execute(
+                    "SELECT path, size, mtime FROM captures "
+                    "WHERE path LIKE ? ESCAPE '\\'",
+                    (_like_prefix(folder),),
+                )
+            }
+
+        new_rows = []
+        seen = set()
+        unreadable = []
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except FileNotFoundError:
+                continue
+            except OSError:
+                unreadable.append(current + os.sep)
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    seen.add(entry.path)
+                    row = _scan_row(entry, known.get(entry.path))
+                    if row is not None:
+                        new_rows.append(row)
+
+        removed = [
+            (path,)
+            for path in known
+            if path not in seen and not path.startswith(tuple(unreadable))
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO captures (path, kind, timestamp, format, size, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET "
+                "size = excluded.size, mtime = excluded.mtime",
+                new_rows,
+            )
+            self._db.executemany("DELETE FROM captures WHERE path = ?", removed)
+        return len(new_rows) + len(removed)
+
+
+def _like_prefix(folder):
+    """Get a LIKE pattern for all paths in a folder, escaped with a backslash.
+
+    :param folder: Absolute path of the folder.
+    :type folder: str
+
+    :return: Pattern that matches the folder's content but not its siblings.
+    :rtype: str
+    """
+    prefix = folder.rstrip(os.sep) + os.sep
+    for char in ("\\", "%", "_"):
+        prefix = prefix.replace(char, "\\" + char)
+    return prefix + "%"
+
+
+def _scan_row(entry, known):
+    """Get the catalog row of a scanned file if it is a new or changed capture.
+
+    :param entry: Directory entry of the file.
+    :type entry: os.DirEntry
+    :param known: Size and modification time in the catalog, None if unknown.
+    :type known: tuple
+
+    :return: Path, kind, timestamp, format, size, and modification time.
+    :rtype: tuple, None
+    """
+    fmt = os.path.splitext(entry.name)[1][1:].lower()
+    if fmt in IMAGE_FORMATS:
+        kind = "image"
+    elif fmt in VIDEO_FORMATS:
+        kind = "video"
+    else:
+        return None
+    stat = entry.stat()
+    if known == (stat.st_size, stat.st_mtime):
+        return None
+    return entry.path, kind, stat.st_mtime, fmt, stat.st_size, stat.st_mtime
+
+
+def _stat(path):
+    """Get size and modification time of a file, None if it does not exist.
+
+    :param path: Path of the file.
+    :type path: Path, str
+
+    :return: Size and modification time.
+    :rtype: tuple
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime
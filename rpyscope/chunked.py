@@ -0,0 +1,320 @@
+"""Chunked, compressed N-dimensional array output for series, stacks, and mosaics.
+
+Arrays are stored with the dimensions (t, z, y, x, c) in the Zarr v2 directory
+format with zlib compressed chunks, such that they can also be opened with
+`zarr.open(path)` and other tools that read Zarr. Frames are appended as they
+are captured, and regions can be read lazily without loading the whole array.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import os
+from pathlib import Path
+import zlib
+
+import numpy as np
+
+DIMENSIONS = ("t", "z", "y", "x", "c")
+
+
+class ChunkedArrayWriter:
+    """Write frames into a chunked, compressed (t, z, y, x, c) array.
+
+    Each frame is split into chunks of `chunks` (height, width) pixels that are
+    compressed in parallel and written to individual files. Time and z extents
+    grow as frames are written. Frames can also be written at an (y, x) offset,
+    e.g., for tiles of a mosaic, in which case the canvas grows as required.
+    Metadata in `attrs` is written to disk with `flush` and `close`.
+    """
+
+    def __init__(
+        self,
+        path,
+        frame_shape,
+        dtype="uint8",
+        chunks=(256, 256),
+        compression_level=1,
+        attrs=None,
+        workers=None,
+    ):
+        """Create a new array, an existing one is appended to.
+
+        :param path: Folder of the array.
+        :type path: Path, str
+        :param frame_shape: Shape of a frame, (height, width) or
+            (height, width, channels).
+        :type frame_shape: tuple
+        :param dtype: Data type of the frames.
+        :type dtype: str, numpy.dtype
+        :param chunks: Chunk size (height, width) in pixels.
+        :type chunks: tuple(int, int)
+        :param compression_level: zlib compression level, 1 (fast) to 9 (small).
+        :type compression_level: int
+        :param attrs: Metadata to store with the array, must be JSON serializable.
+        :type attrs: dict
+        :param workers: Number of threads to compress chunks, defaults to CPUs.
+        :type workers: int
+
+        :raises ValueError: The existing array does not match the given shape.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        channels = frame_shape[2] if len(frame_shape) == 3 else 1
+        frame_shape = (frame_shape[0], frame_shape[1], channels)
+
+        if self.path.joinpath(".zarray").exists():
+            reader = ChunkedArrayReader(self.path)
+            if reader.shape[2:] != frame_shape or reader.dtype != np.dtype(dtype):
+                raise ValueError(
+                    f"Existing array at {self.path} has frames of shape "
+                    f"{reader.shape[2:]} and type {reader.dtype}."
+                )
+            self.shape = list(reader.shape)
+            self.chunks = reader.chunks
+            self.attrs = reader.attrs
+            self.attrs.update(attrs or {})
+        else:
+            self.shape = [0, 0, *frame_shape]
+            self.chunks = (1, 1, chunks[0], chunks[1], channels)
+            self.attrs = dict(attrs or {})
+            self.attrs.setdefault("dimensions", list(DIMENSIONS))
+
+        self.dtype = np.dtype(dtype)
+        self.compression_level = compression_level
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count(), thread_name_prefix="ChunkWriter"
+        )
+        self._write_metadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, frame, **metadata):
+        """Append a frame as the next time point.
+
+        :param frame: Frame to write.
+        :type frame: numpy.ndarray
+        :param metadata: Stored in `attrs["frames"]`, e.g., a timestamp.
+
+        :return: Time index of the frame.
+        :rtype: int
+        """
+        t = self.shape[0]
+        self.write(frame, t=t, **metadata)
+        return t
+
+    def close(self):
+        """Write the metadata and stop the compression threads."""
+        self.flush()
+        self._executor.shutdown()
+
+    def flush(self):
+        """Write the metadata, e.g., after a frame such that readers see it."""
+        _write_json(self.path.joinpath(".zattrs"), self.attrs)
+
+    def write(self, frame, t=0, z=0, y=0, x=0, **metadata):
+        """Write a frame at the given position.
+
+        Chunks that are only partially covered by the frame are read and
+        updated, aligned frames (the default) are written without reading.
+
+        :param frame: Frame to write, (height, width) or (height, width, c).
+        :type frame: numpy.ndarray
+        :param t: Time index.
+        :type t: int
+        :param z: Z index.
+        :type z: int
+        :param y: Offset of the frame in y (pixels).
+        :type y: int
+        :param x: Offset of the frame in x (pixels).
+        :type x: int
+        :param metadata: Stored in `attrs["frames"]` together with t, z, y, x.
+
+        :raises ValueError: The frame has the wrong number of channels.
+        """
+        frame = np.asarray(frame, dtype=self.dtype)
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis]
+        if frame.shape[2] != self.shape[4]:
+            raise ValueError(
+                f"Frame has {frame.shape[2]} channels, expected {self.shape[4]}."
+            )
+        height, width = frame.shape[:2]
+        self.shape[0] = max(self.shape[0], t + 1)
+        self.shape[1] = max(self.shape[1], z + 1)
+        self.shape[2] = max(self.shape[2], y + height)
+        self.shape[3] = max(self.shape[3], x + width)
+
+        cy, cx = self.chunks[2:4]
+        jobs = []
+        for iy in range(y // cy, (y + height - 1) // cy + 1):
+            for ix in range(x // cx, (x + width - 1) // cx + 1):
+                jobs.append((frame, t, z, y, x, iy, ix))
+        list(self._executor.map(lambda job: self._write_chunk(*job), jobs))
+
+        if metadata:
+            metadata.update(t=t, z=z, y=y, x=x)
+            self.attrs.setdefault("frames", []).append(metadata)
+        self._write_metadata()
+
+    # PRIVATE FUNCTIONS #
+
+    def _write_chunk(self, frame, t, z, y, x, iy, ix):
+        """Write the part of a frame that falls into one chunk."""
+        cy, cx, cc = self.chunks[2:]
+        y0, x0 = iy * cy, ix * cx
+        fy0, fy1 = max(y0, y), min(y0 + cy, y + frame.shape[0])
+        fx0, fx1 = max(x0, x), min(x0 + cx, x + frame.shape[1])
+        part = frame[fy0 - y : fy1 - y, fx0 - x : fx1 - x]
+
+        fname = self.path.joinpath(_chunk_key((t, z, iy, ix, 0)))
+        if part.shape[:2] == (cy, cx):
+            chunk = part
+        else:
+            chunk = _read_chunk(fname, self.chunks, self.dtype)
+            if chunk is None:
+                chunk = np.zeros((cy, cx, cc), dtype=self.dtype)
+            chunk[fy0 - y0 : fy1 - y0, fx0 - x0 : fx1 - x0] = part
+        data = zlib.compress(
+            np.ascontiguousarray(chunk).tobytes(), self.compression_level
+        )
+        tmp = fname.with_name(fname.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, fname)
+
+    def _write_metadata(self):
+        """Write the array description, readers see the new shape afterwards."""
+        _write_json(
+            self.path.joinpath(".zarray"),
+            {
+                "zarr_format": 2,
+                "shape": self.shape,
+                "chunks": list(self.chunks),
+                "dtype": self.dtype.str,
+                "compressor": {"id": "zlib", "level": self.compression_level},
+                "fill_value": 0,
+                "order": "C",
+                "filters": None,
+                "dimension_separator": ".",
+            },
+        )
+
+
+class ChunkedArrayReader:
+    """Lazily read a chunked (t, z, y, x, c) array.
+
+    Index it like a NumPy array, only chunks that overlap the requested region
+    are read and decompressed, e.g., `reader[5, 0, 100:200, 300:400]`.
+    """
+
+    def __init__(self, path):
+        """Open an array.
+
+        :param path: Folder of the array.
+        :type path: Path, str
+
+        :raises ValueError: The array is not a (zlib compressed) Zarr v2 array.
+        """
+        self.path = Path(path)
+        with open(self.path.joinpath(".zarray")) as fin:
+            meta = json.load(fin)
+        compressor = meta.get("compressor") or {}
+        if meta.get("zarr_format") != 2 or compressor.get("id") not in ("zlib", None):
+            raise ValueError(f"{self.path} is not a zlib compressed Zarr v2 array.")
+        self.shape = tuple(meta["shape"])
+        self.chunks = tuple(meta["chunks"])
+        self.dtype = np.dtype(meta["dtype"])
+        self._compressed = compressor.get("id") == "zlib"
+        self._separator = meta.get("dimension_separator", ".")
+        try:
+            with open(self.path.joinpath(".zattrs")) as fin:
+                self.attrs = json.load(fin)
+        except FileNotFoundError:
+            self.attrs = {}
+
+    def __getitem__(self, key):
+        """Read a region of the array, see class description."""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > len(self.shape):
+            raise IndexError(f"Too many indices for array with {len(self.shape)} dims.")
+        key = key + (slice(None),) * (len(self.shape) - len(key))
+
+        ranges = []
+        steps = []
+        squeeze = []
+        for dim, (index, size) in enumerate(zip(key, self.shape)):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(size)
+                stop = max(start, stop)
+                ranges.append((start, stop))
+                steps.append(slice(None, None, step))
+            else:
+                index = int(index)
+                if index < 0:
+                    index += size
+                if not 0 <= index < size:
+                    raise IndexError(f"Index {index} out of range for dimension {dim}.")
+                ranges.append((index, index + 1))
+                steps.append(slice(None))
+                squeeze.append(dim)
+
+        out = np.zeros([stop - start for start, stop in ranges], dtype=self.dtype)
+        chunk_ranges = [
+            range(start // chunk, (stop - 1) // chunk + 1) if stop > start else range(0)
+            for (start, stop), chunk in zip(ranges, self.chunks)
+        ]
+        for index in itertools.product(*chunk_ranges):
+            chunk = self._read_chunk(index)
+            if chunk is None:
+                continue
+            src = []
+            dst = []
+            for (start, stop), chunk_index, size in zip(ranges, index, self.chunks):
+                c0 = chunk_index * size
+                lo, hi = max(start, c0), min(stop, c0 + size)
+                src.append(slice(lo - c0, hi - c0))
+                dst.append(slice(lo - start, hi - start))
+            out[tuple(dst)] = chunk[tuple(src)]
+        out = out[tuple(steps)]
+        return out.squeeze(axis=tuple(squeeze)) if squeeze else out
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read_chunk(self, index):
+        """Read a chunk by its index, None if it was never written."""
+        fname = self.path.joinpath(self._separator.join(str(i) for i in index))
+        try:
+            data = fname.read_bytes()
+        except FileNotFoundError:
+            return None
+        if self._compressed:
+            data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.chunks)
+
+
+def _chunk_key(index):
+    """File name of a chunk."""
+    return ".".join(str(i) for i in index)
+
+
+def _read_chunk(fname, chunks, dtype):
+    """Read a (1, 1, cy, cx, c) chunk as writable (cy, cx, c) array or None."""
+    try:
+        data = zlib.decompress(Path(fname).read_bytes())
+    except FileNotFoundError:
+        return None
+    return np.frombuffer(data, dtype=dtype).reshape(chunks[2:]).copy()
+
+
+def _write_json(fname, data):
+    """Write JSON atomically."""
+    tmp = Path(f"{fname}.tmp")
+    with open(tmp, "w") as fout:
+        json.dump(data, fout)
+    os.replace(tmp, fname)
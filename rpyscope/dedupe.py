@@ -0,0 +1,476 @@
+"""Find near-duplicate images with perceptual hashes.
+
+Every image is reduced to a 64 bit hash of its downscaled luma, either a
+difference hash (dHash, compares neighboring pixels) or a DCT-based hash
+(pHash). Similar images have hashes that differ in few bits. The index stores
+the hashes in SQLite, split into `max_distance + 1` bands: two hashes that
+differ in at most `max_distance` bits have at least one identical band, so a
+search only compares the few hashes that share a band with the query.
+
+Find duplicates in an existing archive from the command line, e.g.::
+
+    rpyscope-dedupe ~/Desktop/captures --output duplicates.csv
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+from pathlib import Path
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from rpyscope.image_io import IMAGE_SUFFIXES, read_image
+
+HASH_BITS = 64
+HASH_KINDS = ("dhash", "phash")
+
+_DCT = np.sqrt(2 / 32) * np.cos(
+    np.pi * np.arange(32)[:, np.newaxis] * (2 * np.arange(32) + 1) / 64
+)  # orthonormal DCT-II basis for pHash
+_DCT[0] /= np.sqrt(2)
+
+
+def dhash(image):
+    """Difference hash: is a pixel brighter than its right neighbor?
+
+    :param image: Image, gray or color.
+    :type image: numpy.ndarray
+
+    :return: 64 bit hash.
+    :rtype: int
+    """
+    small = _resize(_luma(image), (8, 9))
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def phash(image):
+    """Perceptual hash: is a low frequency DCT coefficient above the median?
+
+    :param image: Image, gray or color.
+    :type image: numpy.ndarray
+
+    :return: 64 bit hash.
+    :rtype: int
+    """
+    small = _resize(_luma(image), (32, 32))
+    dct = _DCT @ small @ _DCT.T
+    low = dct[:8, :8].ravel()
+    return _pack(low > np.median(low[1:]))  # the DC term is ignored
+
+
+def image_hash(image, kind="dhash"):
+    """Hash an image.
+
+    :param image: Image, gray or color.
+    :type image: numpy.ndarray
+    :param kind: Hash to use, see `HASH_KINDS`.
+    :type kind: str
+
+    :return: 64 bit hash.
+    :rtype: int
+
+    :raises ValueError: Unknown kind of hash.
+    """
+    if kind == "dhash":
+        return dhash(image)
+    elif kind == "phash":
+        return phash(image)
+    raise ValueError(f"Unknown hash {kind}, use one of {HASH_KINDS}.")
+
+
+def hamming(a, b):
+    """Number of bits in which two hashes differ.
+
+    :param a: Hash.
+    :type a: int
+    :param b: Hash.
+    :type b: int
+
+    :return: Hamming distance.
+    :rtype: int
+    """
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """Index of image hashes for bounded Hamming distance searches."""
+
+    def __init__(self, fname, max_distance=6, kind="dhash"):
+        """Open or create an index.
+
+        :param fname: File name of the SQLite index.
+        :type fname: Path, str
+        :param max_distance: Largest Hamming distance that can be searched.
+        :type max_distance: int
+        :param kind: Hash to use, see `HASH_KINDS`.
+        :type kind: str
+
+        :raises ValueError: The index was created for another distance or kind
+            of hash.
+        """
+        if kind not in HASH_KINDS:
+            raise ValueError(f"Unknown hash {kind}, use one of {HASH_KINDS}.")
+        self.fname = Path(fname)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.fname), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO meta VALUES (?, ?)",
+                [("max_distance", str(max_distance)), ("kind", kind)],
+            )
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if int(meta["max_distance"]) != max_distance or meta["kind"] != kind:
+            raise ValueError(
+                f"Index {fname} was created for {meta['kind']} with a maximum "
+                f"distance of {meta['max_distance']}."
+            )
+        self.max_distance = max_distance
+        self.kind = kind
+        self._bands = _bands(max_distance)
+
+        columns = ", ".join(f"b{i} INTEGER" for i in range(len(self._bands)))
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, "
+                f"hash INTEGER NOT NULL, size INTEGER, mtime_ns INTEGER, {columns})"
+            )
+            for i in range(len(self._bands)):
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS hashes_b{i} ON hashes (b{i})"
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    # METHODS #
+
+    def add(self, path, image=None, hash=None):
+        """Add an image and get the near-duplicates that were already indexed.
+
+        :param path: Path of the image.
+        :type path: Path, str
+        :param image: Image to hash, read from the path if neither it nor the
+            hash is given.
+        :type image: numpy.ndarray
+        :param hash: Hash of the image.
+        :type hash: int
+
+        :return: Path and distance of near-duplicates, closest first.
+        :rtype: list(tuple(str, int))
+        """
+        path = os.path.abspath(path)
+        if hash is None:
+            hash = image_hash(read_image(path) if image is None else image, self.kind)
+        duplicates = [item for item in self.find(hash) if item[0] != path]
+        stat = _stat(path)
+        self._insert([(path, hash, *stat)])
+        return duplicates
+
+    def close(self):
+        """Close the index."""
+        with self._lock:
+            self._db.close()
+
+    def find(self, hash, max_distance=None):
+        """Find indexed images close to a hash.
+
+        :param hash: Hash to search for.
+        :type hash: int
+        :param max_distance: Largest Hamming distance, at most the one of the
+            index.
+        :type max_distance: int
+
+        :return: Path and distance of the matches, closest first.
+        :rtype: list(tuple(str, int))
+
+        :raises ValueError: The distance is larger than the one of the index.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"The index supports distances up to {self.max_distance}.")
+        bands = _split(hash, self._bands)
+        where = " OR ".join(f"b{i} = ?" for i in range(len(bands)))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT path, hash FROM hashes WHERE {where}", bands
+            ).fetchall()
+        matches = []
+        for path, other in rows:
+            distance = hamming(hash, _unsigned(other))
+            if distance <= max_distance:
+                matches.append((path, distance))
+        return sorted(matches, key=lambda item: (item[1], item[0]))
+
+    def remove(self, path):
+        """Remove an image from the index.
+
+        :param path: Path of the image.
+        :type path: Path, str
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM hashes WHERE path = ?", (os.path.abspath(path),)
+            )
+
+    def report(self, max_distance=None):
+        """Group all indexed images into sets of near-duplicates.
+
+        Images with identical hashes are grouped first, such that only distinct
+        hashes are compared. Candidates among them are found per band by
+        sorting and their distances are computed in bulk, such that archives
+        with many images, e.g., of an empty field of view, are handled quickly.
+
+        :param max_distance: Largest Hamming distance within a group.
+        :type max_distance: int
+
+        :return: Groups of paths, every group has at least two images.
+        :rtype: list(list(str))
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        with self._lock:
+            rows = self._db.execute("SELECT path, hash FROM hashes").fetchall()
+        if not rows:
+            return []
+        paths = [row[0] for row in rows]
+        hashes, inverse = np.unique(
+            np.array([_unsigned(row[1]) for row in rows], dtype=np.uint64),
+            return_inverse=True,
+        )
+
+        left = []
+        right = []
+        for shift, bits in self._bands:
+            band = (hashes >> np.uint64(shift)) & np.uint64((1 << bits) - 1)
+            order = np.argsort(band, kind="stable")
+            sorted_band = band[order]
+            starts = np.flatnonzero(np.r_[True, sorted_band[1:] != sorted_band[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                members = order[start:end]
+                a, b = np.triu_indices(len(members), k=1)
+                left.append(members[a])
+                right.append(members[b])
+        pairs = []
+        if left:
+            left = np.concatenate(left)
+            right = np.concatenate(right)
+            close = _popcount(hashes[left] ^ hashes[right]) <= max_distance
+            pairs = zip(left[close].tolist(), right[close].tolist())
+
+        parent = list(range(len(hashes)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in pairs:
+            ra, rb = root(a), root(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        groups = {}
+        for path, unique in zip(paths, inverse.ravel().tolist()):
+            groups.setdefault(root(unique), []).append(path)
+        return sorted(
+            (sorted(group) for group in groups.values() if len(group) > 1),
+            key=lambda group: group[0],
+        )
+
+    def scan(self, folder, workers=None):
+        """Index all images of a folder, unchanged files are skipped.
+
+        :param folder: Folder to scan, including sub-folders.
+        :type folder: Path, str
+        :param workers: Number of processes to hash, defaults to the CPUs.
+        :type workers: int
+
+        :return: Number of newly hashed images.
+        :rtype: int
+        """
+        with self._lock:
+            known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in self._db.execute(
+                    "SELECT path, size, mtime_ns FROM hashes"
+                )
+            }
+        todo = []
+        for fname in sorted(Path(folder).glob("**/*")):
+            if fname.suffix.lower() not in IMAGE_SUFFIXES or not fname.is_file():
+                continue
+            path = os.path.abspath(fname)
+            stat = _stat(path)
+            if known.get(path) != stat:
+                todo.append((path, stat))
+
+        count = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batch = []
+            hashes = executor.map(
+                _hash_file,
+                [path for path, _ in todo],
+                [self.kind] * len(todo),
+                chunksize=16,
+            )
+            for (path, stat), hash in zip(todo, hashes):
+                if hash is None:  # not readable as image
+                    continue
+                batch.append((path, hash, *stat))
+                if len(batch) >= 256:
+                    count += self._insert(batch)
+                    batch = []
+            count += self._insert(batch)
+        return count
+
+    # PRIVATE FUNCTIONS #
+
+    def _insert(self, entries):
+        """Insert (path, hash, size, mtime_ns) entries, returns their number."""
+        rows = [
+            (path, _signed(hash), size, mtime_ns, *_split(hash, self._bands))
+            for path, hash, size, mtime_ns in entries
+        ]
+        placeholders = ", ".join("?" * (4 + len(self._bands)))
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO hashes VALUES ({placeholders})", rows
+            )
+        return len(rows)
+
+
+def main(args=None):
+    """Report near-duplicates in a folder from the command line.
+
+    :param args: Command line arguments, defaults to `sys.argv`.
+    :type args: list(str)
+
+    :return: Exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="rpyscope-dedupe",
+        description="Find near-duplicate images in a folder. Hashes are kept in "
+        "an index, such that reruns only hash new or changed files.",
+    )
+    parser.add_argument("folder", help="folder with images")
+    parser.add_argument("--index", help="index file, defaults to one in the folder")
+    parser.add_argument("--distance", type=int, default=6, help="max. bit distance")
+    parser.add_argument("--kind", choices=HASH_KINDS, default="dhash")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    parser.add_argument("--output", help="write the groups as CSV (group, path)")
+    args = parser.parse_args(args)
+
+    index_file = args.index or os.path.join(args.folder, ".rpyscope-hashes.sqlite")
+    index = HashIndex(index_file, max_distance=args.distance, kind=args.kind)
+    try:
+        hashed = index.scan(args.folder, workers=args.workers)
+        groups = index.report()
+        total = len(index)
+    finally:
+        index.close()
+
+    if args.output:
+        with open(args.output, "w", newline="") as fout:
+            writer = csv.writer(fout)
+            writer.writerow(["group", "path"])
+            for number, group in enumerate(groups, start=1):
+                writer.writerows((number, path) for path in group)
+    else:
+        for group in groups:
+            print("\n".join(group) + "\n")
+    duplicates = sum(len(group) - 1 for group in groups)
+    print(
+        f"{total} images ({hashed} newly hashed), {len(groups)} groups, "
+        f"{duplicates} near-duplicates"
+    )
+    return 0
+
+
+def _bands(max_distance):
+    """Split the hash bits into `max_distance + 1` bands of (shift, bits)."""
+    count = min(max_distance + 1, HASH_BITS)
+    bands = []
+    shift = 0
+    for i in range(count):
+        bits = HASH_BITS // count + (i < HASH_BITS % count)
+        bands.append((shift, bits))
+        shift += bits
+    return bands
+
+
+def _hash_file(path, kind):
+    """Hash an image file in a worker process, None if it cannot be read."""
+    try:
+        return image_hash(read_image(path), kind)
+    except (OSError, ValueError):
+        return None
+
+
+def _luma(image):
+    """Luma of an image as float32."""
+    image = np.asarray(image, dtype=np.float32)
+    if image.ndim == 3 and image.shape[2] >= 3:
+        return image[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return image if image.ndim == 2 else image[..., 0]
+
+
+def _pack(bits):
+    """Pack 64 booleans into an int."""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _popcount(values):
+    """Number of set bits of every value of an uint64 array."""
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _resize(image, shape):
+    """Downscale by averaging over blocks of (almost) equal size."""
+    rows = np.linspace(0, image.shape[0], shape[0] + 1).astype(int)[:-1]
+    cols = np.linspace(0, image.shape[1], shape[1] + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(image, rows, axis=0), cols, axis=1)
+    heights = np.diff(np.r_[rows, image.shape[0]])
+    widths = np.diff(np.r_[cols, image.shape[1]])
+    return sums / np.outer(heights, widths)
+
+
+def _signed(value):
+    """Store an unsigned 64 bit hash in SQLite's signed integers."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _split(hash, bands):
+    """Values of the bands of a hash."""
+    return [(hash >> shift) & ((1 << bits) - 1) for shift, bits in bands]
+
+
+def _stat(path):
+    """Size and modification time of a file, None for both if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _unsigned(value):
+    """Read an unsigned 64 bit hash from SQLite's signed integers."""
+    return value + (1 << 64) if value < 0 else value
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Find out why the GUI hangs: event-loop stall detection and sampling profiling.
+
+The GUI thread sends a heartbeat from a Qt timer. A watchdog thread notices
+when heartbeats stop for longer than a threshold, captures the Python stack of
+the GUI thread at that moment, and appends it to a report. Start the GUI with
+`--diagnostics` to turn this on::
+
+    python gui_qt.py --diagnostics
+
+The sampling profiler periodically records the stack of a thread without
+slowing it down much, e.g., from the command window::
+
+    rpyscope_app.profile(10)  # report is printed and written after 10 s
+"""
+
+from collections import Counter
+import sys
+import threading
+import time
+import traceback
+
+
+def format_stack(thread_id):
+    """Python stack of a running thread.
+
+    :param thread_id: Identifier of the thread, see `threading.get_ident`.
+    :type thread_id: int
+
+    :return: Stack, most recent call last, empty if the thread is gone.
+    :rtype: str
+    """
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return ""
+    return "".join(traceback.format_stack(frame))
+
+
+class StallWatchdog:
+    """Detect when a thread stops sending heartbeats, e.g., a blocked event loop."""
+
+    def __init__(self, threshold=0.5, report=None, thread_id=None, poll=None):
+        """Initialize, watching starts with `start`.
+
+        :param threshold: Time without heartbeat in s that counts as a stall.
+        :type threshold: float
+        :param report: File to append stall reports to.
+        :type report: Path, str
+        :param thread_id: Thread to watch, defaults to the main thread.
+        :type thread_id: int
+        :param poll: Interval in s to check for stalls, defaults to a fifth of
+            the threshold.
+        :type poll: float
+        """
+        self.threshold = threshold
+        self.report = report
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.poll = poll or threshold / 5
+        self.stalls = []  # dicts with start time, duration (None if ongoing), stack
+
+        self._last_beat = time.monotonic()
+        self._current = None  # ongoing stall
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # METHODS #
+
+    def heartbeat(self):
+        """Signal that the watched thread is responsive, call it periodically."""
+        now = time.monotonic()
+        with self._lock:
+            stall = self._current
+            self._current = None
+            if stall is not None:
+                stall["duration"] = now - self._last_beat
+            self._last_beat = now
+        if stall is not None:
+            self._write(f"--- Stall ended after {stall['duration']:.3f} s ---\n\n")
+
+    def start(self):
+        """Start watching in a background thread."""
+        if self._thread is not None:
+            return
+        self.heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="rpyscope-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    # PRIVATE FUNCTIONS #
+
+    def _watch(self):
+        """Watchdog thread, captures the stack once per stall."""
+        while not self._stop.wait(self.poll):
+            with self._lock:
+                late = time.monotonic() - self._last_beat
+                if late <= self.threshold or self._current is not None:
+                    continue
+                stall = {
+                    "start": time.time() - late,
+                    "duration": None,
+                    "stack": format_stack(self.thread_id),
+                }
+                self._current = stall
+                self.stalls.append(stall)
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stall["start"]))
+            self._write(
+                f"=== Stall at {started}: no heartbeat for {late:.3f} s ===\n"
+                f"{stall['stack']}"
+            )
+
+    def _write(self, text):
+        """Append text to the report, if any."""
+        if self.report is None:
+            return
+        with open(self.report, "a") as fout:
+            fout.write(text)
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples the stack of a thread periodically."""
+
+    def __init__(self, interval=0.005, thread_id=None):
+        """Initialize, sampling starts with `start`.
+
+        :param interval: Time between samples in s.
+        :type interval: float
+        :param thread_id: Thread to sample, defaults to the main thread.
+        :type thread_id: int
+        """
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = Counter()  # stacks as tuples of (file, line, function)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # METHODS #
+
+    def report(self, limit=20):
+        """Functions with the most samples.
+
+        :param limit: Number of functions to list.
+        :type limit: int
+
+        :return: Table of functions by their own samples (they were running)
+            and total samples (they were on the stack).
+        :rtype: str
+        """
+        total = sum(self.samples.values())
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.samples.items():
+            functions = [_function(entry) for entry in stack]
+            own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        lines = [
+            f"{total} samples every {self.interval * 1e3:g} ms",
+            f"{'own %':>7} {'total %':>7}  function",
+        ]
+        for function, count in own.most_common(limit):
+            lines.append(
+                f"{count / total * 100:7.1f} {inclusive[function] / total * 100:7.1f}"
+                f"  {function}"
+            )
+        return "\n".join(lines)
+
+    def start(self):
+        """Start sampling in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name="rpyscope-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def write(self, fname):
+        """Write the samples as collapsed stacks, e.g., for flame graphs.
+
+        Every line is a stack of functions separated by ";", oldest first,
+        followed by the number of samples.
+
+        :param fname: File name.
+        :type fname: Path, str
+        """
+        with open(fname, "w") as fout:
+            for stack, count in self.samples.most_common():
+                fout.write(";".join(_function(entry) for entry in stack))
+                fout.write(f" {count}\n")
+
+    # PRIVATE FUNCTIONS #
+
+    def _sample(self):
+        """Profiler thread, records the stack of the thread at every interval."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return  # thread is gone
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+
+def _function(entry):
+    """Readable name of a stack entry (file, first line, function)."""
+    fname, line, name = entry
+    return f"{name} ({fname.rsplit('/', 1)[-1]}:{line})"
@@ -0,0 +1,388 @@
+"""Shared-memory ring of live frames for local analysis processes.
+
+The publisher writes frames into a ring of slots in one shared memory block.
+Every slot carries a sequence counter that is odd while the slot is written and
+even once it is complete (seqlock). Readers never lock: they read the counter,
+the frame, and the counter again, and retry if it changed. Readers register in
+a consumer table of the block, such that the publisher can report their lag.
+The header holds the process ID of the publisher, such that a block that was
+left over by a crashed publisher can be told apart from a live one, see
+`reclaim`.
+
+Consumers attach by name, e.g., in a separate analysis script::
+
+    from rpyscope.framebus import FrameBusReader
+    bus = FrameBusReader("rpyscope")
+    seq, timestamp, frame = bus.wait_next()
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+import os
+import time
+
+import numpy as np
+
+MAGIC = 0x5250595342555331  # "RPYSBUS1"
+
+_HEADER = np.dtype(
+    {
+        "names": [
+            "magic",
+            "n_slots",
+            "max_consumers",
+            "ndim",
+            "shape",
+            "dtype",
+            "head",
+            "owner",
+        ],
+        "formats": ["<u8", "<u4", "<u4", "<u4", ("<u4", (4,)), "S8", "<u8", "<u8"],
+        "offsets": [0, 8, 12, 16, 20, 36, 48, 56],
+        "itemsize": 64,
+    }
+)
+_CONSUMER = np.dtype(
+    {
+        "names": ["pid", "seq", "last_seen"],
+        "formats": ["<u8", "<u8", "<f8"],
+        "itemsize": 32,
+    }
+)
+
+
+class _FrameBusBase:
+    """Views into the shared memory block, used by publisher and reader."""
+
+    def _map(self, shm, shape=None, dtype=None, n_slots=None, max_consumers=None):
+        """Create the structured views, initialize the header if shape given."""
+        self._shm = shm
+        self._header = np.ndarray((), dtype=_HEADER, buffer=shm.buf)
+        if shape is not None:
+            self._header["magic"] = MAGIC
+            self._header["n_slots"] = n_slots
+            self._header["max_consumers"] = max_consumers
+            self._header["ndim"] = len(shape)
+            self._header["shape"][: len(shape)] = shape
+            self._header["dtype"] = np.dtype(dtype).str.encode()
+            self._header["head"] = 0
+            self._header["owner"] = os.getpid()
+        elif int(self._header["magic"]) != MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a frame bus.")
+
+        self.n_slots = int(self._header["n_slots"])
+        self.max_consumers = int(self._header["max_consumers"])
+        self.shape = tuple(
+            int(x) for x in self._header["shape"][: self._header["ndim"]]
+        )
+        self.dtype = np.dtype(self._header["dtype"].item().decode())
+
+        offset = _HEADER.itemsize
+        self._consumers = np.ndarray(
+            (self.max_consumers,), dtype=_CONSUMER, buffer=shm.buf, offset=offset
+        )
+        offset += _CONSUMER.itemsize * self.max_consumers
+        self._slots = np.ndarray(
+            (self.n_slots,),
+            dtype=_slot_dtype(self.shape, self.dtype),
+            buffer=shm.buf,
+            offset=offset,
+        )
+
+    @property
+    def name(self):
+        """Get the name of the shared memory block to attach to.
+
+        :return: Name
+        :rtype: str
+        """
+        return self._shm.name
+
+    @property
+    def head(self):
+        """Get the sequence number of the latest published frame, 0 if none.
+
+        :return: Sequence number
+        :rtype: int
+        """
+        return int(self._header["head"])
+
+    def _release(self):
+        """Drop the views such that the shared memory can be closed."""
+        self._header = self._consumers = self._slots = None
+        self._shm.close()
+
+
+class FrameBus(_FrameBusBase):
+    """Publish frames into a shared-memory ring, see module description."""
+
+    def __init__(self, shape, dtype="uint8", n_slots=8, max_consumers=8, name=None):
+        """Create the shared memory block.
+
+        :param shape: Shape of a frame.
+        :type shape: tuple
+        :param dtype: Data type of a frame.
+        :type dtype: str, numpy.dtype
+        :param n_slots: Number of frames in the ring.
+        :type n_slots: int
+        :param max_consumers: Maximum number of registered consumers.
+        :type max_consumers: int
+        :param name: Name of the block, defaults to a random name.
+        :type name: str
+
+        :raises ValueError: The frame has more than 4 dimensions.
+        """
+        if len(shape) > 4:
+            raise ValueError("Frames can have at most 4 dimensions.")
+        size = (
+            _HEADER.itemsize
+            + _CONSUMER.itemsize * max_consumers
+            + _slot_dtype(shape, dtype).itemsize * n_slots
+        )
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._map(shm, shape, dtype, n_slots, max_consumers)
+        self._consumers[:] = 0
+        self._slots["seq"] = 0
+
+    def close(self):
+        """Close and remove the shared memory block."""
+        if self._slots is not None:
+            self._release()
+            self._shm.unlink()
+
+    def consumers(self):
+        """Get the registered consumers and how many frames they lag behind.
+
+        :return: Process ID, last sequence number read, lag in frames, and
+            seconds since the consumer last read a frame for every consumer.
+        :rtype: list(dict)
+        """
+        head = self.head
+        now = time.monotonic()
+        return [
+            {
+                "pid": int(entry["pid"]),
+                "seq": int(entry["seq"]),
+                "lag": head - int(entry["seq"]),
+                "idle": now - float(entry["last_seen"]),
+            }
+            for entry in self._consumers
+            if entry["pid"] != 0
+        ]
+
+    def publish(self, frame, timestamp=None):
+        """Publish a frame, overwrites the oldest slot.
+
+        :param frame: Frame, must have the shape and data type of the bus.
+        :type frame: numpy.ndarray
+        :param timestamp: Timestamp of the frame, defaults to now.
+        :type timestamp: float
+
+        :return: Sequence number of the frame.
+        :rtype: int
+        """
+        seq = self.head + 1
+        slot = self._slots[(seq - 1) % self.n_slots]
+        slot["seq"] = 2 * seq - 1  # odd: being written
+        slot["timestamp"] = time.time() if timestamp is None else timestamp
+        slot["frame"] = frame
+        slot["seq"] = 2 * seq  # even: complete
+        self._header["head"] = seq
+        return seq
+
+
+class FrameBusReader(_FrameBusBase):
+    """Read frames from a `FrameBus` in any local process, without locks."""
+
+    def __init__(self, name):
+        """Attach to a frame bus and register as consumer.
+
+        :param name: Name of the frame bus.
+        :type name: str
+
+        :raises ValueError: The block is not a frame bus.
+        :raises RuntimeError: Too many consumers are registered.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13 tracks attached blocks and removes them
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        self._map(shm)
+
+        self.last_seq = 0
+        self._index = None
+        for index, entry in enumerate(self._consumers):
+            if entry["pid"] == 0 or not _pid_alive(int(entry["pid"])):
+                self._consumers[index] = (os.getpid(), self.head, time.monotonic())
+                self._index = index
+                break
+        if self._index is None:
+            self._release()
+            raise RuntimeError(f"Frame bus {name} has no free consumer slot.")
+
+    @property
+    def lag(self):
+        """Get the number of frames published since the last one read.
+
+        :return: Lag in frames
+        :rtype: int
+        """
+        return self.head - self.last_seq
+
+    def close(self):
+        """Unregister and detach from the frame bus."""
+        if self._slots is not None:
+            self._consumers[self._index]["pid"] = 0
+            self._release()
+
+    def latest(self, copy=True):
+        """Get the latest frame.
+
+        Without copying, the frame is a view into shared memory that the
+        publisher overwrites after `n_slots` frames. Check with `is_valid` after
+        using it.
+
+        :param copy: Return a copy of the frame.
+        :type copy: bool
+
+        :return: Sequence number, timestamp, and frame, or None if there is none.
+        :rtype: tuple(int, float, numpy.ndarray)
+        """
+        while True:
+            seq = self.head
+            if seq == 0:
+                return None
+            result = self.read(seq, copy=copy)
+            if result is not None:
+                return result
+
+    def is_valid(self, seq):
+        """Check if a frame read without copying is still unchanged.
+
+        :param seq: Sequence number of the frame.
+        :type seq: int
+
+        :return: Is the frame still valid?
+        :rtype: bool
+        """
+        return int(self._slots[(seq - 1) % self.n_slots]["seq"]) == 2 * seq
+
+    def read(self, seq, copy=True):
+        """Read a frame by its sequence number, if it is still in the ring.
+
+        :param seq: Sequence number of the frame.
+        :type seq: int
+        :param copy: Return a copy of the frame, see `latest`.
+        :type copy: bool
+
+        :return: Sequence number, timestamp, and frame, or None if the frame is
+            not available (anymore).
+        :rtype: tuple(int, float, numpy.ndarray)
+        """
+        slot = self._slots[(seq - 1) % self.n_slots]
+        if int(slot["seq"]) != 2 * seq:
+            return None
+        timestamp = float(slot["timestamp"])
+        frame = slot["frame"].copy() if copy else slot["frame"]
+        if int(slot["seq"]) != 2 * seq:  # overwritten while reading
+            return None
+        self.last_seq = max(self.last_seq, seq)
+        consumer = self._consumers[self._index]
+        consumer["seq"] = self.last_seq
+        consumer["last_seen"] = time.monotonic()
+        return seq, timestamp, frame
+
+    def wait_next(self, timeout=None, poll=0.001, copy=True):
+        """Wait for the next frame after the last one read.
+
+        If the reader fell behind by more than the ring, the oldest available
+        frame is returned; use `latest` to skip to the newest one instead.
+
+        :param timeout: Maximum time to wait in s, defaults to forever.
+        :type timeout: float
+        :param poll: Polling interval in s.
+        :type poll: float
+        :param copy: Return a copy of the frame, see `latest`.
+        :type copy: bool
+
+        :return: Sequence number, timestamp, and frame, or None on timeout.
+        :rtype: tuple(int, float, numpy.ndarray)
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            head = self.head
+            if head > self.last_seq:
+                seq = max(self.last_seq + 1, head - self.n_slots + 1)
+                result = self.read(seq, copy=copy)
+                if result is not None:
+                    return result
+                self.last_seq = seq  # overwritten in the meantime, skip it
+                continue
+            if end is not None and time.monotonic() >= end:
+                return None
+            time.sleep(poll)
+
+
+def reclaim(name):
+    """Remove a frame bus if its publisher is not running anymore.
+
+    Blocks of a live publisher, e.g., another RPyScope session, are kept. If
+    the process ID of a crashed publisher was reused, use `unlink`.
+
+    :param name: Name of the frame bus.
+    :type name: str
+
+    :return: Was the block removed or did it not exist?
+    :rtype: bool
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return True
+    header = np.ndarray((), dtype=_HEADER, buffer=shm.buf)
+    owner = int(header["owner"]) if int(header["magic"]) == MAGIC else None
+    del header  # release the buffer, such that the block can be closed
+    shm.close()
+    if owner is None or (owner != 0 and _pid_alive(owner)):
+        resource_tracker.unregister(shm._name, "shared_memory")  # not ours
+        return False
+    shm.unlink()
+    return True
+
+
+def unlink(name):
+    """Remove a frame bus that was left over, e.g., by a crashed publisher.
+
+    :param name: Name of the frame bus.
+    :type name: str
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _pid_alive(pid):
+    """Check if a process is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _slot_dtype(shape, dtype):
+    """Data type of a slot: sequence counter, timestamp, and the frame."""
+    frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return np.dtype(
+        {
+            "names": ["seq", "timestamp", "frame"],
+            "formats": ["<u8", "<f8", (np.dtype(dtype), tuple(shape))],
+            "offsets": [0, 8, 64],
+            "itemsize": 64 + (frame_bytes + 63) // 64 * 64,
+        }
+    )
@@ -1,9 +1,19 @@
-"""GUI for RPyMicroscope."""
+"""GUI for RPyMicroscope.
+
+The window is shown first, the camera is opened in the background and the
+camera controls are enabled once it is ready. Time to interactive and to the
+first preview are printed and shown in the status bar.
+"""
+
+import time
+
+STARTED = time.monotonic()  # start of the GUI, for startup timings
 
 from datetime import datetime
 import os
 from pathlib import Path
 import sys
+import threading
 
 from PyQt5.QtWidgets import (
     QWidget,
@@ -23,18 +33,30 @@ from PyQt5.QtWidgets import (
     QErrorMessage,
     QComboBox,
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QDoubleValidator, QKeySequence
 
-from add_widgets import LineEditHistory
+from add_widgets import GalleryWidget, LineEditHistory
 from pyqtconfig import ConfigManager, ConfigDialog, QSettingsManager
 from microscope import Microscope
+from rpyscope.settings import SettingsStore
+from rpyscope.storage import StorageFullError  # the class microscope raises
 
 
 class MainWindowControls(QMainWindow):
     """Main Window with adjustments, etc. for Microscope GUI"""
 
-    def __init__(self):
+    camera_opened = pyqtSignal(object)  # error while opening, None if none
+    sequence_progress = pyqtSignal(str)  # status of a running sequence
+    image_written = pyqtSignal(str)  # path of a captured image that is on disk
+
+    def __init__(self, diagnostics=False):
+        """Initialize the main window.
+
+        :param diagnostics: Report stalls of the event loop, see
+            `diagnostics.StallWatchdog`.
+        :type diagnostics: bool
+        """
         # info variables
         self.version = "0.0.1"
         self.author = "Reto Trappitsch and Louis Linder"
@@ -65,13 +87,35 @@ class MainWindowControls(QMainWindow):
         self.error_dialog = QErrorMessage()
         self.error_dialog.setGeometry(5, 80, 300, 200)
 
-        # Load Microscope interactions
-        self.scope = Microscope()
-        self.cam = self.scope.cam
+        # Load Microscope interactions, the camera is opened in the background
+        self.scope = Microscope(open_camera=False)
+        self.cam = None
+        self.startup_times = {}  # s since start of the GUI, by milestone
+        # time GUI actions, arguments of signals (e.g., `checked`) are dropped
+        for action in ("capture_image", "record_video", "preview_cam"):
+            timed = self.scope.metrics.timed(f"gui_{action}")(getattr(self, action))
+            setattr(self, action, lambda *args, timed=timed: timed())
 
         # Load settings
         self.load_settings()
 
+        # Diagnostics: report stalls of the event loop
+        self.watchdog = None
+        if diagnostics:
+            from diagnostics import StallWatchdog
+
+            stall_log = self.scope.path_config.joinpath("stalls.log")
+            self.watchdog = StallWatchdog(report=stall_log)
+            self.heartbeat_timer = QTimer()
+            self.heartbeat_timer.setInterval(int(self.watchdog.threshold * 250))
+            self.heartbeat_timer.timeout.connect(self.watchdog.heartbeat)
+            self.heartbeat_timer.start()
+            self.watchdog.start()
+            print(
+                f"Diagnostics: stalls over {self.watchdog.threshold} s are "
+                f"reported to {stall_log}"
+            )
+
         # colors
         self.col_green = "#DBFFD4"
         self.col_red = "#FFB6B6"
@@ -157,9 +201,11 @@ class MainWindowControls(QMainWindow):
         # Resolution
         layout.addWidget(QLabel("Resolution (w x h) [Alt+R]"))
 
-        self.res_input = QLineEdit()
-        self.res_input.setToolTip("Set the resolution (width x height)")
-        self.res_input.returnPressed.connect(self.res_input.clearFocus)
+        self.res_input = QComboBox()  # items are added once the camera is open
+        self.res_input.setToolTip(
+            "Set the resolution (width x height).\n"
+            "The camera picks the best native sensor mode."
+        )
 
         self.res_reset_button = QPushButton("default")
         self.res_reset_button.clicked.connect(self.reset_resolution)
@@ -183,11 +229,10 @@ class MainWindowControls(QMainWindow):
         # Framerate
         layout.addWidget(QLabel("Framerate (fps) [Alt+F]"))
 
-        self.fps_input = QLineEdit()
+        self.fps_input = QComboBox()  # items are added once the camera is open
         self.fps_input.setToolTip(
             "Set the framerate for video\n" "recordings in frames per second."
         )
-        self.fps_input.returnPressed.connect(self.fps_input.clearFocus)
 
         self.fps_reset_button = QPushButton("default")
         self.fps_reset_button.clicked.connect(self.reset_framerate)
@@ -277,6 +322,22 @@ class MainWindowControls(QMainWindow):
 
         self.config.add_handler("fname", self.fname_input)
 
+        # Sample ID
+        layout.addWidget(QLabel("Sample ID [I]:"))
+
+        self.sample_input = QLineEdit()
+        self.sample_input.setToolTip(
+            "ID of the sample, stored with every\n"
+            "capture in the catalog for later search."
+        )
+        self.sample_input.returnPressed.connect(self.sample_input.clearFocus)
+        layout.addWidget(self.sample_input)
+
+        self.sample_sc = QShortcut(QKeySequence("I"), self)
+        self.sample_sc.activated.connect(self.sample_input.setFocus)
+
+        self.config.add_handler("sample_id", self.sample_input)
+
         layout_hline(layout)
 
         # preview
@@ -338,15 +399,126 @@ class MainWindowControls(QMainWindow):
         self.capture_button.setShortcut("Space")
         layout.addWidget(self.capture_button)
 
-        # open command line interface
-        if self.config.get("open_cmd_startup"):
-            self.open_cmd_window()
+        # storage status
+        self.storage_label = QLabel()
+        self.storage_label.setToolTip(
+            "Files are written to disk in the background.\n"
+            "Shows files waiting to be written and the write speed."
+        )
+        layout.addWidget(self.storage_label)
+
+        self.storage_timer = QTimer()
+        self.storage_timer.setInterval(500)
+        self.storage_timer.timeout.connect(self.update_storage_status)
+        self.storage_timer.start()
+        self.update_storage_status()
+
+        # gallery of recent captures
+        self.gallery_button = QPushButton("Show Gallery [G]")
+        self.gallery_button.clicked.connect(self.toggle_gallery)
+        self.gallery_button.setToolTip(
+            "Show / hide thumbnails of the recent captures.\n"
+            "Double click a thumbnail to open the image."
+        )
+        self.gallery_button.setShortcut("G")
+        layout.addWidget(self.gallery_button)
+
+        # live timings of the hot paths, shown if metrics are enabled
+        self.metrics_label = QLabel()
+        self.metrics_label.setFont(QFont("Monospace", 8))
+        self.metrics_label.setToolTip(
+            "Median (p50) and 99th percentile (p99) of the slowest\n"
+            "operations in ms. Also written to ~/.config/RPyConf/metrics.prom"
+        )
+        self.metrics_label.setVisible(self.scope.metrics.enabled)
+        layout.addWidget(self.metrics_label)
+
+        self.metrics_timer = QTimer()
+        self.metrics_timer.setInterval(2000)
+        self.metrics_timer.timeout.connect(self.update_metrics)
+        self.metrics_timer.start()
+
+        self.gallery = None  # created when first shown
+        self.gallery_layout = layout
+
+        # open the camera in the background, its controls wait for it
+        self.camera_widgets = [
+            self.bright_slider,
+            self.bright_reset_button,
+            self.contr_slider,
+            self.contr_reset_button,
+            self.auto_exp_checkbox,
+            self.res_input,
+            self.res_reset_button,
+            self.fps_input,
+            self.fps_reset_button,
+            self.preview_button,
+            self.rec_button,
+            self.capture_button,
+            self.cmd_window_button,
+        ]
+        for widget in self.camera_widgets:
+            widget.setEnabled(False)
+        self.statusBar().showMessage("Opening camera...")
+        self.camera_opened.connect(self.camera_ready)
+        self.sequence_progress.connect(self.statusBar().showMessage)
+        self.image_written.connect(self.add_to_gallery)
+        threading.Thread(target=self.open_camera, daemon=True).start()
+        QTimer.singleShot(0, lambda: self.startup_mark("interactive"))
+
+    # FUNCTIONS #
+    def open_camera(self):
+        """Open the camera, runs in a background thread."""
+        try:
+            self.scope.open_camera()
+        except Exception as e:  # reported in the window
+            self.camera_opened.emit(e)
+            return
+        self.camera_opened.emit(None)
+
+    def camera_ready(self, error):
+        """Enable the camera controls once the camera is open."""
+        if error is not None:
+            self.statusBar().showMessage("Camera not available")
+            self.error_dialog.showMessage(f"Error opening the camera: {error}")
+            return
+        self.startup_mark("camera")
+        self.cam = self.scope.cam
+        # adding items changes the configuration, restore it afterwards
+        resolution = self.config.get("resolution")
+        framerate = self.config.get("framerate")
+        self.res_input.addItems(self.cam.valid_resolutions())
+        self.res_input.setCurrentText(resolution)
+        self.fps_input.addItems(self.cam.valid_framerates())
+        self.fps_input.setCurrentText(framerate)
+        for widget in self.camera_widgets:
+            widget.setEnabled(True)
+
+        # apply the settings that were loaded before the camera was open
+        self.update_config(self.config)
+        self.brightness_changed(self.bright_slider.value())
+        self.contrast_changed(self.contr_slider.value())
+        self.auto_exposure()
 
-        # open preview
         if self.config.get("open_preview_startup"):
             self.preview_cam()
+        # the command line interface needs the camera
+        if self.config.get("open_cmd_startup"):
+            self.open_cmd_window()
+        self.statusBar().showMessage(
+            ", ".join(
+                f"{name.replace('_', ' ')} after {value:.1f} s"
+                for name, value in self.startup_times.items()
+            )
+        )
+
+    def startup_mark(self, name):
+        """Record and print the time since the start of the GUI."""
+        value = time.monotonic() - STARTED
+        self.startup_times[name] = value
+        self.scope.metrics.histogram(f"gui_startup_{name}").observe(value)
+        print(f"Startup: {name.replace('_', ' ')} after {value:.2f} s")
 
-    # FUNCTIONS #
     def load_settings(self):
         default_settings = {
             "open_preview_startup": True,
@@ -356,9 +528,16 @@ class MainWindowControls(QMainWindow):
             "preview_h": "900",
             "image_format": "jpeg",
             "video_format": "h264",
-            "rotation": "0",
+            "rotation": 0,
             "vflip": False,
             "hflip": False,
+            "staging_folder": "",
+            "capture_mode": "single",
+            "lucky_burst": 10,
+            "lucky_keep": 1,
+            "lucky_stack": False,
+            "duplicate_check": True,
+            "metrics": False,
             # hidden settings
             "brightness": 50,
             "contrast": 0,
@@ -368,6 +547,7 @@ class MainWindowControls(QMainWindow):
             "path": os.path.expanduser("~/Desktop"),
             "date_prefix": False,
             "fname": "",
+            "sample_id": "",
             "rec_time": "0",
         }
 
@@ -398,6 +578,10 @@ class MainWindowControls(QMainWindow):
                     "bgra": "bgra",
                 },
             },
+            "capture_mode": {
+                "preferred_handler": QComboBox,
+                "preferred_map_dict": {"single": "single", "lucky": "lucky"},
+            },
             "rotation": {
                 "preferred_handler": QComboBox,
                 "preferred_map_dict": {
@@ -415,14 +599,19 @@ class MainWindowControls(QMainWindow):
             "path": {"prefer_hidden": True},
             "date_prefix": {"prefer_hidden": True},
             "fname": {"prefer_hidden": True},
+            "sample_id": {"prefer_hidden": True},
             "rec_time": {"prefer_hidden": True},
         }
 
-        self.config = ConfigManager(
-            default_settings,
-            filename=os.path.expanduser("~/.config/rpyscope-config.json"),
+        # changes are written in the background once they settle, the settings
+        # of the microscope are in its own file and mirrored in `update_config`
+        self.settings_store = SettingsStore(
+            os.path.expanduser("~/.config/rpyscope-config.json"), default_settings
         )
+        self.config = ConfigManager(default_settings)
+        self.config.set_many(dict(self.settings_store), trigger_update=False)
         self.config.set_many_metadata(default_settings_metadata)
+        self.config.updated.connect(lambda *args: self.store_settings())
         # apply rotations and flips
         self.update_config(self.config)
 
@@ -434,10 +623,92 @@ class MainWindowControls(QMainWindow):
 
     def update_config(self, update):
         self.config.set_many(update.as_dict())
-        self.cam.rotation = update.get("rotation")
-        self.cam.vflip = update.get("vflip")
-        self.cam.hflip = update.get("hflip")
-        self.config.save()
+        if self.cam is not None:
+            self.cam.rotation = update.get("rotation")
+            self.cam.vflip = update.get("vflip")
+            self.cam.hflip = update.get("hflip")
+        self.scope.microscope_settings["staging_folder"] = (
+            update.get("staging_folder") or None
+        )
+        for key in (
+            "capture_mode",
+            "lucky_burst",
+            "lucky_keep",
+            "lucky_stack",
+            "duplicate_check",
+        ):
+            self.scope.microscope_settings[key] = update.get(key)
+        if update.get("capture_mode") == "lucky":
+            from rpyscope.image_io import check_format  # imports NumPy
+
+            try:
+                check_format(update.get("image_format"))
+            except (ModuleNotFoundError, ValueError) as e:
+                self.error_dialog.showMessage(f"Error: lucky capture mode: {e}")
+        if update.get("metrics") != self.scope.metrics.enabled:
+            self.scope.metrics.enabled = update.get("metrics")
+            if self.cam is not None:
+                self.scope.enable_metrics(update.get("metrics"))
+                self.cam = self.scope.cam
+        if hasattr(self, "metrics_label"):
+            self.metrics_label.setVisible(self.scope.metrics.enabled)
+        self.store_settings()
+
+    def run_sequence(self, name):
+        """Run an acquisition sequence, its progress is shown in the status bar.
+
+        :param name: Name of the sequence, see `Microscope.sequences`.
+        :type name: str
+
+        :return: Running sequence, None if it could not be started.
+        :rtype: rpyscope.sequences.SequenceRun
+        """
+        if self.cam is None:
+            self.error_dialog.showMessage("Error: the camera is not open yet")
+            return None
+
+        def progress(step):
+            """Called from the worker thread, the signal is queued to the GUI."""
+            self.sequence_progress.emit(
+                f"Sequence {name}: step {step['index'] + 1} {step['command']} "
+                f"took {step['duration'] * 1e3:.0f} ms"
+            )
+
+        try:
+            return self.scope.run_sequence(name, on_progress=progress)
+        except ValueError as e:
+            self.error_dialog.showMessage(f"Error: {e}")
+            return None
+
+    def store_settings(self):
+        """Hand the current settings to the store, it writes them when they settle."""
+        self.settings_store.update(self.config.as_dict())
+
+    def profile(self, seconds=10, fname=None):
+        """Profile the GUI thread for a while without blocking it.
+
+        The report is printed afterwards and the collapsed stacks are written
+        to a file, see `diagnostics.SamplingProfiler.write`.
+
+        :param seconds: Duration of the profile in s.
+        :type seconds: float
+        :param fname: File for the collapsed stacks, defaults to `profile.txt`
+            in the configuration folder.
+        :type fname: str
+        """
+        from diagnostics import SamplingProfiler
+
+        profiler = SamplingProfiler()
+        fname = fname or self.scope.path_config.joinpath("profile.txt")
+
+        def done():
+            profiler.stop()
+            profiler.write(fname)
+            print(f"{profiler.report()}\nCollapsed stacks written to {fname}")
+
+        profiler.start()
+        QTimer.singleShot(int(seconds * 1000), done)
+        print(f"Profiling for {seconds} s...")
 
     def open_cmd_window(self):  # , top, height):
         cli = CommandLineScope(
@@ -459,6 +730,8 @@ class MainWindowControls(QMainWindow):
 
     def auto_exposure(self):
         """Turns automatic exposure of the camera on and off."""
+        if self.cam is None:
+            return
         if self.auto_exp_checkbox.isChecked():
             self.scope.auto_exposure = True
         else:
@@ -466,33 +739,114 @@ class MainWindowControls(QMainWindow):
 
     def brightness_changed(self, val):
         """Change brightness to value"""
-        self.cam.brightness = val
+        if self.cam is not None:
+            self.cam.brightness = val
 
     def capture_image(self):
         fmt = self.config.get("image_format")
         if self.fname_ok() and self.path_ok():
             fname = self.make_filename_with_path() + "." + str(fmt)
-            if not os.path.isfile(fname):
-                self.set_resolution()
-                self.cam.capture(
-                    str(fname), format=fmt
-                )  # specifying the format double checks that it is possible
+            if not self.scope.file_exists(fname):
+                self.negotiate_mode()
+                try:
+                    self.scope.capture_image(
+                        fname,
+                        format=fmt,
+                        sample_id=self.sample_input.text(),
+                        on_written=self.image_written.emit,  # queued to the GUI
+                    )  # specifying the format double checks that it is possible
+                except (ModuleNotFoundError, StorageFullError, ValueError) as e:
+                    self.error_dialog.showMessage(f"Error: {e}")
+                    return
                 print("Image captured: " + str(fname))
+                if self.scope.duplicates:
+                    path, distance = self.scope.duplicates[0]
+                    self.error_dialog.showMessage(
+                        f"Warning: {fname} looks almost the same as {path} "
+                        f"({distance} bits differ)"
+                    )
             else:
                 self.error_dialog.showMessage("Error: " + fname + "  already exists")
 
+    def add_to_gallery(self, path):
+        """Show a captured image in the gallery once it is written."""
+        if self.gallery is not None and self.gallery.isVisible():
+            self.gallery.add_path(path)
+
+    def update_storage_status(self):
+        """Show backlog and throughput of the storage layer."""
+        stats = self.scope.storage.stats()
+        text = (
+            f"Writing: {stats['backlog_files']} files, "
+            f"{stats['backlog_bytes'] / 1e6:.1f} MB waiting, "
+            f"{stats['throughput'] / 1e6:.1f} MB/s"
+        )
+        offload = self.scope.offloader.stats()
+        if offload["pending"] or offload["failed"]:
+            text += f"\nOffload: {offload['pending']} pending"
+            if offload["failed"]:
+                text += f", {offload['failed']} failed"
+        if stats["error"] is not None:
+            text = f"Write failed: {stats['error']}\n" + text
+        if stats["refusing"]:
+            text = "Disk full! " + text
+        if stats["refusing"] or stats["error"] is not None:
+            self.storage_label.setStyleSheet(f"background-color:{self.col_red}")
+        else:
+            self.storage_label.setStyleSheet("")
+        self.storage_label.setText(text)
+
+    def update_metrics(self, rows=6):
+        """Show p50 / p99 of the slowest operations and export the metrics."""
+        if not self.scope.metrics.enabled:
+            return
+        snapshot = self.scope.metrics.snapshot()
+        timings = [
+            (name, value)
+            for name, value in snapshot.items()
+            if isinstance(value, dict) and value["count"]
+        ]
+        timings.sort(key=lambda item: item[1]["p99"], reverse=True)
+        lines = [f"{'operation':<24} {'p50':>7} {'p99':>7}"]
+        for name, value in timings[:rows]:
+            lines.append(
+                f"{name[:24]:<24} {value['p50'] * 1e3:7.1f} {value['p99'] * 1e3:7.1f}"
+            )
+        self.metrics_label.setText("\n".join(lines))
+        self.scope.metrics.write(self.scope.path_config.joinpath("metrics.prom"))
+
+    def toggle_gallery(self):
+        """Show or hide the gallery of recent captures."""
+        if self.gallery is None:
+            self.gallery = GalleryWidget(self.scope.thumbnails)
+            self.gallery.setMinimumHeight(300)
+            self.gallery.hide()
+            self.gallery_layout.addWidget(self.gallery)
+        if self.gallery.isVisible():
+            self.gallery.hide()
+            self.gallery_button.setText("Show Gallery [G]")
+        else:
+            entries = self.scope.catalog.query(
+                kind="image", limit=self.gallery.max_entries
+            )
+            self.gallery.set_paths([e["path"] for e in entries])
+            self.gallery.show()
+            self.gallery_button.setText("Hide Gallery [G]")
+        # Anytime text is changed, the shortcut is cleared. So specify it again.
+        self.gallery_button.setShortcut("G")
+
     def contrast_changed(self, val):
         """Change brightness to value"""
-        self.cam.contrast = val
+        if self.cam is not None:
+            self.cam.contrast = val
 
     def preview_cam(self):
         """Preview camera."""
         if not self.is_preview:  # not preview
-            self.set_resolution()
-            self.set_framerate()
+            self.negotiate_mode()
             self.preview_button.setText("Stop Preview [P]")
             self.preview_button.setStyleSheet(f"background-color:{self.col_red}")
-            (w_camera, h_camera) = self.cam.resolution
+            w_camera, h_camera = self.cam.resolution
             aspect_ratio = w_camera / h_camera
             x = int(self.config.get("preview_x"))
             y = int(self.config.get("preview_y"))
@@ -500,6 +854,8 @@ class MainWindowControls(QMainWindow):
             w = int(h * aspect_ratio)
             self.cam.start_preview(fullscreen=False, window=(x, y, w, h))
             self.is_preview = True
+            if "first_preview" not in self.startup_times:
+                self.startup_mark("first_preview")
         else:
             self.preview_button.setText("Start Preview [P]")
             self.preview_button.setStyleSheet(f"background-color:{self.col_green}")
@@ -514,15 +870,19 @@ class MainWindowControls(QMainWindow):
             if self.fname_ok() and self.path_ok:
                 fmt = self.config.get("video_format")
                 fname = self.make_filename_with_path() + "." + str(fmt)
-                if not os.path.isfile(fname):
-                    self.set_resolution()
-                    self.set_framerate()
+                if not self.scope.file_exists(fname):
+                    self.negotiate_mode()
+                    try:
+                        self.scope.start_recording(
+                            fname, format=fmt, sample_id=self.sample_input.text()
+                        )
+                    except StorageFullError as e:
+                        self.error_dialog.showMessage(f"Error: {e}")
+                        return
                     self.rec_button.setText("Stop Recording [R]")
                     self.rec_button.setStyleSheet(f"background-color:{self.col_red}")
                     self.capture_button.setDisabled(True)
 
-                    self.cam.start_recording(fname, format=fmt)
-
                     if (
                         self.rec_time.text().replace(" ", "") != ""
                     ):  # make sure not empty
@@ -539,7 +899,7 @@ class MainWindowControls(QMainWindow):
             self.rec_button.setStyleSheet(f"background-color:{self.col_green}")
             self.capture_button.setEnabled(True)
 
-            self.cam.stop_recording()
+            self.scope.stop_recording()
 
             self.rec_timer.stop()
             self.rec_time_elapsed = 0.0  # reset elapsed time
@@ -603,38 +963,40 @@ class MainWindowControls(QMainWindow):
             self.path_input.setText(str(path))
 
     def reset_resolution(self):
-        self.res_input.setText(self.config._get_default("resolution"))
-
-    def set_resolution(self):
-        new_res = self.res_input.text()
-        if str(self.cam.resolution) != new_res:
-            previous_resolution = self.cam.resolution
-            try:
-                self.cam.resolution = new_res
-                print(f"resolution set to {new_res}.")
-            except:
-                print(f"resolution {new_res} not supported.")
-                self.res_input.setText(str(previous_resolution))
-                self.cam.resolution = previous_resolution
+        self.res_input.setCurrentText(self.config._get_default("resolution"))
 
     def reset_framerate(self):
-        self.fps_input.setText(self.config._get_default("framerate"))
+        self.fps_input.setCurrentText(self.config._get_default("framerate"))
 
-    def set_framerate(self):
-        new_fps = float(self.fps_input.text())
-        if float(self.cam.framerate) != new_fps:
-            previous_framerate = self.cam.framerate
-            try:
-                self.cam.framerate = new_fps
-                print(f"framerate set to {new_fps} fps.")
-            except:
-                print(f"framerate {new_fps} fps not supported.")
-                self.fps_input.setText(str(previous_framerate))
-                self.cam.framerate = previous_framerate
+    def negotiate_mode(self):
+        """Validate resolution and framerate and only reconfigure if required.
+
+        Both values are checked against the sensor mode table of the camera
+        first, such that invalid inputs never reach the hardware.
+        """
+        new_res = self.res_input.currentText() or self.config._get_default("resolution")
+        new_fps = self.fps_input.currentText() or self.config._get_default("framerate")
+        try:
+            negotiated = self.cam.negotiate_mode(new_res, new_fps)
+        except ValueError as e:
+            self.error_dialog.showMessage(f"Error: {e}")
+            return
+        self.cam.apply_mode(negotiated)
+        print(
+            f"Sensor mode {negotiated.mode.mode}: resolution "
+            f"{negotiated.resolution}, framerate {negotiated.framerate} fps."
+        )
 
     def closeEvent(self, event):
         print("\nHave a nice day :)")
-        self.config.save()
+        self.store_settings()
+        self.settings_store.close()
+        self.storage_timer.stop()
+        self.metrics_timer.stop()
+        if self.watchdog is not None:
+            self.heartbeat_timer.stop()
+            self.watchdog.stop()
+        self.scope.close()  # write all pending files
 
 
 class CommandLineScope(QMainWindow):
@@ -676,7 +1038,9 @@ class CommandLineScope(QMainWindow):
             "the command you would attach to `cam.`.\n\n"
             "For example, if you would like to change `iso`,\n"
             "type `iso = 100` and the microscope software\n"
-            "will send the command `cam.iso = 100`."
+            "will send the command `cam.iso = 100`.\n\n"
+            "Type `run name` to run the acquisition sequence\n"
+            "~/.config/RPyConf/sequences/name.py."
         )
 
         self.setCentralWidget(self.cli_edit)
@@ -693,6 +1057,13 @@ class CommandLineScope(QMainWindow):
         if cmd == "":
             return
 
+        # acquisition sequences run in the background, see rpyscope.sequences
+        if cmd.startswith("run "):
+            if self.parent.run_sequence(cmd[4:].strip()) is not None:
+                self.cli_edit.add_to_history(cmd)
+                self.cli_edit.clear()
+            return
+
         # camera directly is called `cam` -> add a `self`
         oldcmd = str(cmd)
         cmd = cmd.replace("cam.", "rpyscope_app.cam.")
@@ -742,7 +1113,7 @@ def layout_horizontal(items, align):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    rpyscope_app = MainWindowControls()
+    rpyscope_app = MainWindowControls(diagnostics="--diagnostics" in sys.argv)
     rpyscope_app.show()
 
     sys.exit(app.exec_())
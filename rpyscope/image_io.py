@@ -0,0 +1,215 @@
+"""Read and write images as NumPy arrays.
+
+NumPy files (.npy) are always supported. Other formats, e.g., JPEG, PNG, and
+TIFF, require Pillow (`pip install pillow`), which is imported when needed.
+Frames are encoded to and decoded from the raw formats of the camera, e.g.,
+"rgb" or "yuv", without Pillow, see `encode_frame` and `decode_frame`.
+"""
+
+import io
+import os
+
+import numpy as np
+
+NUMPY_SUFFIXES = (".npy",)
+PILLOW_SUFFIXES = (".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff")
+IMAGE_SUFFIXES = NUMPY_SUFFIXES + PILLOW_SUFFIXES
+RAW_FORMATS = ("bgr", "bgra", "rgb", "rgba", "yuv")  # as written by the camera
+ENCODE_FORMATS = RAW_FORMATS + ("bmp", "gif", "jpeg", "npy", "png", "tiff")
+
+
+def check_format(format):
+    """Check that frames can be encoded to a format, see `encode_frame`.
+
+    :param format: Format, e.g., "jpeg" or "rgb".
+    :type format: str
+
+    :raises ValueError: Unknown format.
+    :raises ModuleNotFoundError: The format requires Pillow, which is missing.
+    """
+    if format not in ENCODE_FORMATS:
+        raise ValueError(
+            f"Cannot encode frames as {format}, use one of {ENCODE_FORMATS}."
+        )
+    if format not in RAW_FORMATS + ("npy",):
+        _pillow()
+
+
+def decode_frame(data, format, resolution, size=None):
+    """Decode an image as captured by the camera, see `encode_frame`.
+
+    Raw formats are decoded without Pillow, rows and columns that the camera
+    padded them with are cropped. If a size is given, the frame is shrunk to
+    about that size, but not smaller. JPEGs are then decoded at a reduced
+    scale, which is much faster than decoding them in full.
+
+    :param data: Encoded image.
+    :type data: bytes
+    :param format: Format, see `ENCODE_FORMATS`.
+    :type format: str
+    :param resolution: Resolution of the image as (width, height).
+    :type resolution: tuple(int, int)
+    :param size: Size to shrink the frame to as (width, height).
+    :type size: tuple(int, int)
+
+    :return: Frame with shape (height, width, 3)
+    :rtype: numpy.ndarray
+
+    :raises ValueError: Unknown format or the size of the data does not match
+        the resolution.
+    :raises ModuleNotFoundError: The format requires Pillow, which is missing.
+    """
+    check_format(format)
+    if format in RAW_FORMATS:
+        frame = _decode_raw(data, format, *resolution)
+    elif format == "npy":
+        frame = np.load(io.BytesIO(data), allow_pickle=False)
+    else:
+        with _pillow().open(io.BytesIO(data)) as img:
+            if size is not None:
+                img.draft("RGB", tuple(size))
+            frame = np.asarray(img.convert("RGB"))
+    if size is not None:
+        step = max(1, min(frame.shape[1] // size[0], frame.shape[0] // size[1]))
+        frame = frame[::step, ::step]
+    return frame
+
+
+def encode_frame(frame, format):
+    """Encode an RGB frame like the camera does.
+
+    Raw formats contain the pixels only, e.g., "yuv" is planar YUV 4:2:0.
+
+    :param frame: Frame with shape (height, width, 3)
+    :type frame: numpy.ndarray
+    :param format: Format, see `ENCODE_FORMATS`.
+    :type format: str
+
+    :return: Encoded image
+    :rtype: bytes
+
+    :raises ValueError: Unknown format.
+    :raises ModuleNotFoundError: The format requires Pillow, which is missing.
+    """
+    check_format(format)
+    if format in ("rgb", "bgr"):
+        return np.ascontiguousarray(
+            frame[..., :: 1 if format == "rgb" else -1]
+        ).tobytes()
+    if format in ("rgba", "bgra"):
+        alpha = np.full(frame.shape[:2] + (1,), 255, dtype=np.uint8)
+        channels = frame if format == "rgba" else frame[..., ::-1]
+        return np.concatenate([channels, alpha], axis=2).tobytes()
+    if format == "yuv":
+        rgb = frame.astype(np.float32)
+        y = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        sub = rgb[::2, ::2]
+        u = sub @ np.array([-0.169, -0.331, 0.5], dtype=np.float32) + 128
+        v = sub @ np.array([0.5, -0.419, -0.081], dtype=np.float32) + 128
+        planes = [np.clip(plane, 0, 255).astype(np.uint8) for plane in (y, u, v)]
+        return b"".join(plane.tobytes() for plane in planes)
+    buffer = io.BytesIO()
+    if format == "gif":
+        _pillow().fromarray(np.asarray(frame)).save(buffer, format="gif")
+    else:
+        write_image(buffer, frame, suffix=f".{format}")
+    return buffer.getvalue()
+
+
+def read_image(source, suffix=None):
+    """Read an image.
+
+    :param source: File name, bytes, or file-like object.
+    :type source: Path, str, bytes, file-like
+    :param suffix: Suffix that determines the format, defaults to the suffix
+        of the file name.
+    :type suffix: str
+
+    :return: Image with shape (height, width) or (height, width, channels)
+    :rtype: numpy.ndarray
+
+    :raises ValueError: Unknown image format.
+    """
+    if suffix is None:
+        suffix = os.path.splitext(str(source))[1]
+    suffix = suffix.lower()
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if suffix in NUMPY_SUFFIXES:
+        return np.load(source, allow_pickle=False)
+    if suffix in PILLOW_SUFFIXES:
+        with _pillow().open(source) as img:
+            return np.asarray(img)
+    raise ValueError(f"Unknown image format {suffix}, use one of {IMAGE_SUFFIXES}.")
+
+
+def write_image(fname, image, suffix=None):
+    """Write an image.
+
+    :param fname: File name or file-like object.
+    :type fname: Path, str, file-like
+    :param image: Image with shape (height, width) or (height, width, channels).
+    :type image: numpy.ndarray
+    :param suffix: Suffix that determines the format, defaults to the suffix
+        of the file name.
+    :type suffix: str
+
+    :raises ValueError: Unknown image format.
+    """
+    if suffix is None:
+        suffix = os.path.splitext(str(fname))[1]
+    suffix = suffix.lower()
+    if suffix in NUMPY_SUFFIXES:
+        np.save(fname, image, allow_pickle=False)
+    elif suffix in PILLOW_SUFFIXES:
+        format = {".jpg": "jpeg", ".tif": "tiff"}.get(suffix, suffix[1:])
+        _pillow().fromarray(np.asarray(image)).save(fname, format=format)
+    else:
+        raise ValueError(f"Unknown image format {suffix}, use one of {IMAGE_SUFFIXES}.")
+
+
+def _decode_raw(data, format, width, height):
+    """Decode a raw frame, which the camera may pad to 32 columns and 16 rows."""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    for padded_width, padded_height in (
+        (width, height),
+        (-(-width // 32) * 32, -(-height // 16) * 16),
+    ):
+        if format == "yuv":
+            chroma = ((padded_height + 1) // 2, (padded_width + 1) // 2)
+            expected = padded_width * padded_height + 2 * chroma[0] * chroma[1]
+        else:
+            expected = padded_width * padded_height * len(format)
+        if buffer.size == expected:
+            break
+    else:
+        raise ValueError(
+            f"{buffer.size} bytes do not match a {format} frame of {width}x{height}."
+        )
+
+    if format != "yuv":
+        frame = buffer.reshape(padded_height, padded_width, len(format))
+        frame = frame[..., 2::-1] if format.startswith("bgr") else frame[..., :3]
+        return frame[:height, :width]
+    luma = padded_width * padded_height
+    y = buffer[:luma].reshape(padded_height, padded_width).astype(np.float32)
+    u, v = buffer[luma:].reshape(2, *chroma).astype(np.float32) - 128
+    u = u.repeat(2, axis=0).repeat(2, axis=1)[:padded_height, :padded_width]
+    v = v.repeat(2, axis=0).repeat(2, axis=1)[:padded_height, :padded_width]
+    rgb = np.stack([y + 1.402 * v, y - 0.344 * u - 0.714 * v, y + 1.772 * u], axis=2)
+    return np.clip(rgb, 0, 255).astype(np.uint8)[:height, :width]
+
+
+def _pillow():
+    """Import Pillow's Image module.
+
+    :raises ModuleNotFoundError: Pillow is not installed.
+    """
+    try:
+        from PIL import Image
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError(
+            "Reading and writing this image format requires Pillow, "
+            "install it with `pip install pillow`."
+        )
+    return Image
@@ -0,0 +1,110 @@
+"""Select the sharpest frames of a burst ("lucky imaging").
+
+Vibrations blur some frames of a burst more than others. Every frame is scored
+as it arrives by the variance of its Laplacian, which is high for sharp edges
+and low for blurred ones. Only the best frames are kept in memory, all others
+are discarded right away without being encoded or written.
+"""
+
+import heapq
+import itertools
+
+import numpy as np
+
+from rpyscope.registration import DriftCorrector
+
+
+def sharpness(frame, step=1):
+    """Score the sharpness of a frame by the variance of its Laplacian.
+
+    :param frame: Frame, gray or color (the green channel is used).
+    :type frame: numpy.ndarray
+    :param step: Only use every `step`-th row, which makes scoring faster.
+    :type step: int
+
+    :return: Sharpness, higher is sharper.
+    :rtype: float
+    """
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        frame = frame[..., 1 if frame.shape[2] > 1 else 0]
+    gray = frame[::step].astype(np.float32)
+    laplacian = (
+        gray[1:-1, :-2]
+        + gray[1:-1, 2:]
+        + gray[:-2, 1:-1]
+        + gray[2:, 1:-1]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+class BestFrames:
+    """Keep the `keep` sharpest frames of a stream of frames."""
+
+    def __init__(self, keep=1, score=sharpness):
+        """Initialize an empty selection.
+
+        :param keep: Number of frames to keep.
+        :type keep: int
+        :param score: Function that scores a frame, higher is better.
+        :type score: callable
+
+        :raises ValueError: Less than one frame to keep.
+        """
+        if keep < 1:
+            raise ValueError("At least one frame must be kept.")
+        self.keep = keep
+        self.score = score
+        self.scores = []  # scores of all frames, in order
+        self._heap = []  # (score, index, frame), worst kept frame first
+        self._count = itertools.count()
+
+    def add(self, frame):
+        """Score a frame and keep it if it is among the best.
+
+        :param frame: Frame to add.
+        :type frame: numpy.ndarray
+
+        :return: Score of the frame.
+        :rtype: float
+        """
+        value = self.score(frame)
+        self.scores.append(value)
+        item = (value, next(self._count), frame)
+        if len(self._heap) < self.keep:
+            heapq.heappush(self._heap, item)
+        elif value > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+        return value
+
+    def best(self):
+        """Get the kept frames, best first.
+
+        :return: Kept frames with their scores and indices in the burst.
+        :rtype: list(tuple(float, int, numpy.ndarray))
+        """
+        return sorted(self._heap, key=lambda item: item[0], reverse=True)
+
+
+def stack(frames, align=True):
+    """Average frames, optionally registered to the first one.
+
+    :param frames: Frames of the same shape.
+    :type frames: list(numpy.ndarray)
+    :param align: Correct shifts between the frames first.
+    :type align: bool
+
+    :return: Average with the data type of the frames.
+    :rtype: numpy.ndarray
+    """
+    corrector = DriftCorrector() if align else None
+    total = np.zeros(frames[0].shape, dtype=np.float32)
+    for frame in frames:
+        if corrector is not None:
+            frame, _ = corrector.align(frame)
+        total += frame
+    total /= len(frames)
+    if np.issubdtype(frames[0].dtype, np.integer):
+        total = np.rint(total)
+    return total.astype(frames[0].dtype)
@@ -0,0 +1,332 @@
+"""Latency histograms and counters for the hot paths of the microscope.
+
+Timed functions, e.g., property setters of the microscope or the writer of the
+storage layer, record their duration in a histogram of the global `REGISTRY`.
+Camera calls are timed by wrapping the camera in an `InstrumentedCamera`. All
+of this is disabled by default and then costs a single attribute lookup per
+call; turn it on with `Microscope.enable_metrics`.
+
+Histograms use fixed, logarithmically spaced buckets from 10 us to 100 s, such
+that recording is a binary search and quantiles are accurate to about 20 %.
+The registry can be exported in the Prometheus text format, e.g., for the
+textfile collector of the node exporter, or as JSON::
+
+    scope.enable_metrics()
+    ...
+    scope.metrics.write("metrics.prom")
+    print(scope.metrics.snapshot()["camera_capture"]["p99"])
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+BUCKETS = tuple(1e-5 * 2 ** (i / 4) for i in range(94))  # 10 us to ~115 s
+PREFIX = "rpyscope"
+
+
+class Counter:
+    """Monotonically increasing count of events."""
+
+    def __init__(self, name):
+        """Initialize at zero.
+
+        :param name: Name of the counter.
+        :type name: str
+        """
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increase the count.
+
+        :param amount: Amount to add.
+        :type amount: int, float
+        """
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Distribution of durations in fixed buckets."""
+
+    def __init__(self, name, buckets=BUCKETS):
+        """Initialize empty.
+
+        :param name: Name of the histogram.
+        :type name: str
+        :param buckets: Increasing upper bounds of the buckets in s, values
+            above the last one are counted in an overflow bucket.
+        :type buckets: tuple(float)
+        """
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record a value.
+
+        :param value: Duration in s.
+        :type value: float
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket.
+
+        :param q: Quantile between 0 and 1, e.g., 0.99.
+        :type q: float
+
+        :return: Estimated value, NaN if nothing was recorded.
+        :rtype: float
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count = self.count
+            largest = self.max
+        if count == 0:
+            return math.nan
+        rank = q * count
+        seen = 0
+        for index, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else largest
+                return min(lower + (upper - lower) * (rank - seen) / n, largest)
+            seen += n
+        return largest
+
+    def cumulative(self):
+        """Cumulative counts per upper bound, the last bound is infinity.
+
+        :return: Pairs of upper bound and number of values up to it.
+        :rtype: list(tuple(float, int))
+        """
+        with self._lock:
+            counts = list(self._counts)
+        result = []
+        total = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry:
+    """Collection of named counters and histograms."""
+
+    def __init__(self, enabled=False):
+        """Initialize empty.
+
+        :param enabled: Record metrics, otherwise timed calls are passed on.
+        :type enabled: bool
+        """
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    # METHODS #
+
+    def counter(self, name):
+        """Get or create a counter.
+
+        :param name: Name, letters, digits, and underscores.
+        :type name: str
+
+        :return: Counter
+        :rtype: Counter
+        """
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter(name)
+            return self._counters[name]
+
+    def histogram(self, name):
+        """Get or create a histogram of durations.
+
+        :param name: Name, letters, digits, and underscores.
+        :type name: str
+
+        :return: Histogram
+        :rtype: Histogram
+        """
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name)
+            return self._histograms[name]
+
+    def reset(self):
+        """Remove all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Current state of all metrics.
+
+        :return: Counters by name with their values, histograms by name with
+            count, sum, max, p50, and p99 in s.
+        :rtype: dict
+        """
+        with self._lock:
+            counters = list(self._counters.values())
+            histograms = list(self._histograms.values())
+        result = {counter.name: counter.value for counter in counters}
+        for hist in histograms:
+            result[hist.name] = {
+                "count": hist.count,
+                "sum": hist.sum,
+                "max": hist.max,
+                "p50": hist.quantile(0.5),
+                "p99": hist.quantile(0.99),
+            }
+        return result
+
+    @contextmanager
+    def time(self, name):
+        """Time a block of code, errors are counted in `<name>_errors`.
+
+        :param name: Name of the histogram.
+        :type name: str
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.counter(f"{name}_errors").inc()
+            raise
+        finally:
+            self.histogram(name).observe(time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator that times every call of a function while enabled.
+
+        :param name: Name of the histogram.
+        :type name: str
+
+        :return: Decorator
+        :rtype: callable
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.time(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def to_json(self):
+        """Export all metrics as JSON.
+
+        :return: JSON text, NaN quantiles of empty histograms are null.
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        for value in snapshot.values():
+            if isinstance(value, dict):
+                for key in ("p50", "p99"):
+                    if math.isnan(value[key]):
+                        value[key] = None
+        return json.dumps(snapshot, indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Export all metrics in the Prometheus text format.
+
+        Counters are named `rpyscope_<name>_total`, histograms
+        `rpyscope_<name>_seconds`.
+
+        :return: Exposition text.
+        :rtype: str
+        """
+        with self._lock:
+            counters = sorted(self._counters.values(), key=lambda c: c.name)
+            histograms = sorted(self._histograms.values(), key=lambda h: h.name)
+        lines = []
+        for counter in counters:
+            name = f"{PREFIX}_{counter.name}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {counter.value}"]
+        for hist in histograms:
+            name = f"{PREFIX}_{hist.name}_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for bound, total in hist.cumulative():
+                le = "+Inf" if math.isinf(bound) else f"{bound:.6g}"
+                lines.append(f'{name}_bucket{{le="{le}"}} {total}')
+            lines += [f"{name}_sum {hist.sum}", f"{name}_count {hist.count}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, fname):
+        """Write all metrics to a file, replacing it atomically.
+
+        :param fname: File name, ".json" for JSON, otherwise Prometheus text.
+        :type fname: Path, str
+        """
+        fname = str(fname)
+        text = self.to_json() if fname.endswith(".json") else self.to_prometheus()
+        tmp = f"{fname}.tmp"
+        with open(tmp, "w") as fout:
+            fout.write(text)
+        os.replace(tmp, fname)
+
+
+class InstrumentedCamera:
+    """Camera proxy that times all method calls and property changes.
+
+    Calls of a method `capture` are recorded as `camera_capture`, setting a
+    property `resolution` as `camera_set_resolution`. Everything else is
+    passed on to the wrapped camera.
+    """
+
+    def __init__(self, cam, registry, prefix="camera"):
+        """Wrap a camera.
+
+        :param cam: Camera to wrap.
+        :type cam: rpyscope.cameras.abstract_camera.AbsCamera
+        :param registry: Registry to record to.
+        :type registry: MetricsRegistry
+        :param prefix: Prefix of the metric names.
+        :type prefix: str
+        """
+        object.__setattr__(self, "cam", cam)
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_prefix", prefix)
+        object.__setattr__(self, "_methods", {})
+
+    def __getattr__(self, name):
+        value = getattr(self.cam, name)
+        if not callable(value) or name.startswith("_"):
+            return value
+        if name not in self._methods:
+            self._methods[name] = self._registry.timed(f"{self._prefix}_{name}")
+        return self._methods[name](value)
+
+    def __setattr__(self, name, value):
+        with self._registry.time(f"{self._prefix}_set_{name}"):
+            setattr(self.cam, name, value)
+
+
+REGISTRY = MetricsRegistry()
+timed = REGISTRY.timed
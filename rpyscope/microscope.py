@@ -1,18 +1,52 @@
 """Python class that defines microscope operations."""
 
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+import hashlib
+from importlib import import_module
+import io
 import os
 from pathlib import Path
+import threading
+import time
 
-from rpyscope.cameras import rpi_cam
-from rpyscope.cameras import simulation
+# subsystems with databases or threads (catalog, storage, offloader, analysis,
+# series, motion, ...) are imported and opened when first used
+from rpyscope.metrics import REGISTRY, InstrumentedCamera, timed
+from rpyscope.pipeline import FramePipeline
+from rpyscope.settings import SettingsStore
+from rpyscope.thumbnails import THUMBNAIL_SIZE, ThumbnailCache
+from rpyscope.tracing import Trace, TraceLog
+
+MAIN_CAMERA = "main"  # name of the default camera in `Microscope.cameras`
 
 
 class Cam(Enum):
-    """Enum Class for Available / Implemented Cameras."""
+    """Enum Class for Available / Implemented Cameras.
+
+    Cameras are imported and opened when first used, see `camera`, and then
+    shared by all microscopes.
+    """
+
+    RPi_HQ = "rpyscope.cameras.rpi_cam:RPiCam"
+    Demo = "rpyscope.cameras.simulation:SimCam"
+
+    @property
+    def camera(self):
+        """Get the camera, it is opened on first access.
+
+        :return: Camera
+        :rtype: rpyscope.cameras.abstract_camera.AbsCamera
+        """
+        with _cameras_lock:
+            if self not in _cameras:
+                module, name = self.value.split(":")
+                _cameras[self] = getattr(import_module(module), name)()
+            return _cameras[self]
 
-    RPi_HQ = rpi_cam.RPiCam()
-    Demo = simulation.SimCam()
+
+_cameras = {}  # opened cameras by Cam
+_cameras_lock = threading.Lock()
 
 
 class Microscope:
@@ -23,27 +57,79 @@ class Microscope:
     and capture video classes inherit from Microscope class.
     """
 
-    def __init__(self, default_cam=Cam.RPi_HQ):
-        """Initialize the Microscope class."""
+    def __init__(self, default_cam=Cam.RPi_HQ, open_camera=True):
+        """Initialize the Microscope class.
+
+        :param default_cam: Camera to use.
+        :type default_cam: Cam
+        :param open_camera: Open the camera right away, otherwise call
+            `open_camera` later, e.g., in the background while a GUI starts.
+        :type open_camera: bool
+        """
         self.cam = None
         self.default_cam = default_cam
+        self._cameras = {}  # further cameras by name, see `add_camera`
+        self._camera_workers = {}  # one thread per camera for synchronized captures
 
         self.is_preview_on = False
+        self.is_recording = False
+
+        self.path_config = None
+        self._setup_config_folder()
 
-        self.microscope_settings = {
+        default_settings = {
             "auto_exposure": True,
+            "capture_mode": "single",
+            "disk_high_watermark": 0.95,
+            "disk_low_watermark": 0.9,
+            "duplicate_check": True,
+            "fsync_batch": 8,
             "home_folder": Path.home(),
             "image_format": "jpeg",
+            "lucky_burst": 10,
+            "lucky_keep": 1,
+            "lucky_stack": False,
+            "raw_container": True,
+            "staging_folder": None,
+            "thumbnails": True,
+            "tracing": True,
             "video_format": "h264",
         }
+        self.microscope_settings = SettingsStore(
+            self.path_config.joinpath("settings.json"), default_settings
+        )
 
-        # todo load settings
+        self._subsystems = {}  # catalog, storage, and offloader, see `_subsystem`
+        self._subsystems_lock = threading.RLock()
+        self.thumbnails = ThumbnailCache(self.path_config.joinpath("thumbnails"))
+        self._hash_indexes = {}  # by capture folder, see `hash_index`
+        self.duplicates = []  # near-duplicates of the last captured image
+        self.metrics = REGISTRY
+        self.traces = TraceLog(self.path_config.joinpath("traces.jsonl"))
+        self._pending_written = {}  # destination -> thumbnail, callback of staged
+        self._recording = []  # outputs of the current recording, closed in order
 
-        # todo load startup script
-        self.path_config = None
-        self._setup_config_folder()
+        self.stage = None  # motorized stage, see `rpyscope.stages`
+        self.focus = None  # focus drive for z-stacks, defaults to the stage
+        self.frame_bus = None
+        self._frame_listeners = []
+        self._frame_listeners_lock = threading.RLock()  # held while calling
+        self._frame_stream = None  # thread that captures frames for the listeners
+        self._frame_stream_resize = None
+        self._frame_stream_stop = threading.Event()
+        self.pipeline = FramePipeline()
 
-        self._load_camera()
+        self.motion_trigger = None
+        self._motion_actions = None  # runs captures triggered by motion
+        self._motion_vectors = False  # motion is scored from encoder vectors
+        self._motion_recording = False  # recording was started by the trigger
+
+        self._sequences = None
+        self._sequence_runs = []
+        self.startup_run = None  # run of the startup script, see `open_camera`
+
+        if open_camera:
+            self.open_camera()
 
     # PROPERTIES #
 
@@ -64,6 +150,7 @@ class Microscope:
         return self.microscope_settings["auto_exposure"]
 
     @auto_exposure.setter
+    @timed("microscope_set_auto_exposure")
     def auto_exposure(self, newval):
         if not isinstance(newval, bool):
             raise TypeError(
@@ -88,6 +175,7 @@ class Microscope:
         return self.default_cam
 
     @select_camera.setter
+    @timed("microscope_set_select_camera")
     def select_camera(self, value):
         if not isinstance(value, type(self.Cam)):
             raise TypeError(
@@ -96,6 +184,32 @@ class Microscope:
         self.default_cam = value
         self._load_camera()
 
+    @property
+    def cameras(self):
+        """Get all cameras by name, the default camera is named `MAIN_CAMERA`.
+
+        :return: Cameras, see `add_camera`.
+        :rtype: dict(str, rpyscope.cameras.abstract_camera.AbsCamera)
+        """
+        cameras = {} if self.cam is None else {MAIN_CAMERA: self.cam}
+        cameras.update(self._cameras)
+        return cameras
+
+    @property
+    def catalog(self):
+        """Get the catalog of captures and recordings.
+
+        :return: Catalog, opened on first access
+        :rtype: rpyscope.catalog.Catalog
+        """
+
+        def open_catalog():
+            from rpyscope.catalog import Catalog
+
+            return Catalog(self.path_config.joinpath("catalog.sqlite"))
+
+        return self._subsystem("catalog", open_catalog)
+
     @property
     def home_folder(self):
         """Get / set the home folder.
@@ -112,6 +226,7 @@ class Microscope:
         return self.microscope_settings["home_folder"]
 
     @home_folder.setter
+    @timed("microscope_set_home_folder")
     def home_folder(self, newval):
         if not isinstance(newval, Path):
             raise TypeError(
@@ -140,6 +255,7 @@ class Microscope:
         return self.microscope_settings["image_format"]
 
     @image_format.setter
+    @timed("microscope_set_image_format")
     def image_format(self, newval):
         if not isinstance(newval, str):
             raise TypeError(
@@ -148,6 +264,55 @@ class Microscope:
             )
         self.microscope_settings["image_format"] = newval
 
+    @property
+    def offloader(self):
+        """Get the offloader that moves staged files to their destination.
+
+        :return: Offloader, opened on first access, see `open_camera`
+        :rtype: rpyscope.offload.Offloader
+        """
+
+        def open_offloader():
+            from rpyscope.offload import Offloader
+
+            return Offloader(
+                self.path_config.joinpath("offload.sqlite"), on_done=self._offloaded
+            )
+
+        return self._subsystem("offloader", open_offloader)
+
+    @property
+    def sequences(self):
+        """Get the acquisition sequences in the `sequences` configuration folder.
+
+        :return: Library of sequences, see `rpyscope.sequences`.
+        :rtype: rpyscope.sequences.SequenceLibrary
+        """
+        if self._sequences is None:
+            from rpyscope.sequences import SequenceLibrary
+
+            self._sequences = SequenceLibrary(self.path_config.joinpath("sequences"))
+        return self._sequences
+
+    @property
+    def storage(self):
+        """Get the storage layer that writes files in the background.
+
+        :return: Storage, its writer thread is started on first access
+        :rtype: rpyscope.storage.WriteBehindStorage
+        """
+
+        def open_storage():
+            from rpyscope.storage import WriteBehindStorage
+
+            return WriteBehindStorage(
+                fsync_batch=self.microscope_settings["fsync_batch"],
+                high_watermark=self.microscope_settings["disk_high_watermark"],
+                low_watermark=self.microscope_settings["disk_low_watermark"],
+            )
+
+        return self._subsystem("storage", open_storage)
+
     @property
     def video_format(self):
         """Get / set video format.
@@ -165,6 +330,7 @@ class Microscope:
         return self.microscope_settings["video_format"]
 
     @video_format.setter
+    @timed("microscope_set_video_format")
     def video_format(self, newval):
         if not isinstance(newval, str):
             raise TypeError(
@@ -173,8 +339,958 @@ class Microscope:
             )
         self.microscope_settings["video_format"] = newval
 
+    # METHODS #
+
+    def add_camera(self, name, camera):
+        """Add a further camera, e.g., for reflected and transmitted light.
+
+        Capture from all cameras at once with `capture_synchronized`.
+
+        :param name: Name of the camera, used in file names.
+        :type name: str
+        :param camera: Camera, e.g., `Cam.Demo` or a
+            `rpyscope.cameras.remote.RemoteCam` for a camera on another machine.
+        :type camera: Cam, rpyscope.cameras.abstract_camera.AbsCamera
+
+        :raises ValueError: The name or the camera is used already.
+        """
+        if isinstance(camera, Cam):
+            camera = camera.camera
+        cameras = self.cameras
+        if name in cameras or name == MAIN_CAMERA:
+            raise ValueError(f"A camera named {name} exists already.")
+        if any(camera is cam for cam in cameras.values()):
+            raise ValueError("This camera was added already.")
+        self._cameras[name] = camera
+
+    def add_frame_listener(self, listener):
+        """Add a function that is called with every frame of the frame stream.
+
+        Listeners are called in the frame stream thread as
+        `listener(frame, timestamp)` and must not modify the frame, which is
+        shared by all listeners. Slow listeners slow down the frame stream.
+
+        :param listener: Function to call.
+        :type listener: callable
+        """
+        with self._frame_listeners_lock:
+            self._frame_listeners.append(listener)
+
+    def camera_settings(self, cam=None):
+        """Get the current camera settings as they are stored in the catalog.
+
+        Settings that the camera does not provide are returned as None.
+
+        :param cam: Camera, defaults to the default camera.
+        :type cam: rpyscope.cameras.abstract_camera.AbsCamera
+
+        :return: Camera settings
+        :rtype: dict
+        """
+        cam = self.cam if cam is None else cam
+        resolution = getattr(cam, "resolution", None)
+        shutter_speed = getattr(cam, "shutter_speed", None)
+        if not shutter_speed:  # 0 means automatic, store the actual exposure
+            shutter_speed = getattr(cam, "exposure_speed", shutter_speed)
+        return {
+            "resolution": (
+                None if resolution is None else "x".join(str(it) for it in resolution)
+            ),
+            "framerate": _to_float(getattr(cam, "framerate", None)),
+            "shutter_speed": shutter_speed,
+            "analog_gain": _to_float(getattr(cam, "analog_gain", None)),
+            "digital_gain": _to_float(getattr(cam, "digital_gain", None)),
+            "brightness": cam.brightness,
+            "contrast": cam.contrast,
+        }
+
+    def capture_frame(self, resize=None):
+        """Capture a frame from the video port as RGB array, e.g., for analysis.
+
+        :param resize: Resize the frame to (width, height).
+        :type resize: tuple(int, int)
+
+        :return: Frame with shape (height, width, 3)
+        :rtype: numpy.ndarray
+        """
+        return self.cam.capture_array(resize=resize)
+
+    def capture_best(
+        self,
+        fname,
+        burst=None,
+        keep=None,
+        stack_frames=None,
+        format=None,
+        sample_id=None,
+        on_written=None,
+    ):
+        """Capture a burst and only write the sharpest frames ("lucky imaging").
+
+        Frames are scored as they arrive, see `rpyscope.lucky`, and only the
+        best ones are encoded and written. Kept frames are numbered, e.g.,
+        "image_1.jpeg", unless a single frame is kept or they are stacked.
+        Raw formats, e.g., "rgb", and "npy" are encoded without Pillow, other
+        formats require it, see `rpyscope.image_io.encode_frame`.
+        Near-duplicates of the kept frames are stored in `duplicates`.
+
+        :param fname: File name, including the path.
+        :type fname: Path, str
+        :param burst: Number of frames to capture, defaults to `lucky_burst`.
+        :type burst: int
+        :param keep: Number of frames to keep, defaults to `lucky_keep`.
+        :type keep: int
+        :param stack_frames: Average the kept frames after aligning them,
+            defaults to `lucky_stack`.
+        :type stack_frames: bool
+        :param format: Image format, defaults to `image_format`.
+        :type format: str
+        :param sample_id: ID of the sample that is captured.
+        :type sample_id: str
+        :param on_written: Called with the file name of every kept frame once
+            it is written, see `capture_image`.
+        :type on_written: callable
+
+        :return: Sharpness of all frames of the burst, in order.
+        :rtype: list(float)
+
+        :raises StorageFullError: The disk is full, the images are not written.
+        :raises ValueError: Frames cannot be encoded to the format.
+        :raises ModuleNotFoundError: The format requires Pillow, which is missing.
+        """
+        from rpyscope.image_io import check_format, encode_frame
+        from rpyscope.lucky import BestFrames, stack
+
+        defaults = self.microscope_settings
+        burst = defaults["lucky_burst"] if burst is None else burst
+        keep = defaults["lucky_keep"] if keep is None else keep
+        if stack_frames is None:
+            stack_frames = defaults["lucky_stack"]
+        if format is None:
+            format = self.image_format
+        check_format(format)  # before capturing the burst
+        trace = Trace("image", fname)
+        settings = self.camera_settings()
+        settings["format"] = format
+        timestamp = time.time()
+
+        best = BestFrames(keep=min(keep, burst))
+        for frame in self.cam.capture_burst(burst):
+            best.add(frame)
+        trace.mark("exposure", self.cam.sensor_timestamp)
+        trace.mark("frames")
+        frames = [frame for _, _, frame in best.best()]
+        if stack_frames:
+            frames = [stack(frames)]
+        thumbnail = None
+        if defaults["thumbnails"]:
+            thumbnail = self.capture_thumbnail()
+
+        root, ext = os.path.splitext(str(fname))
+        self.duplicates = []
+        for index, frame in enumerate(frames):
+            name = fname if len(frames) == 1 else f"{root}_{index + 1}{ext}"
+            file_trace = trace.copy(name)
+            data = encode_frame(frame, format)
+            file_trace.mark("encoded")
+            self.duplicates += self._check_duplicates(name, frame)
+            self._submit_image(
+                name,
+                data,
+                settings,
+                sample_id,
+                timestamp,
+                thumbnail,
+                file_trace,
+                on_written,
+            )
+        return best.scores
+
+    def capture_image(self, fname, format=None, sample_id=None, on_written=None):
+        """Capture an image, write it in the background, and log it to the catalog.
+
+        With the "lucky" `capture_mode`, the sharpest frame of a burst is
+        captured instead, see `capture_best`. If `duplicate_check` is set,
+        previous captures that look almost the same are stored in `duplicates`,
+        e.g., to warn the user.
+
+        :param fname: File name, including the path.
+        :type fname: Path, str
+        :param format: Image format, defaults to `image_format`.
+        :type format: str
+        :param sample_id: ID of the sample that is captured.
+        :type sample_id: str
+        :param on_written: Called with the file name once the image is written
+            to its final path and its thumbnail is cached, from the thread of
+            the storage layer or the offloader.
+        :type on_written: callable
+
+        :raises StorageFullError: The disk is full, the image is not written.
+        :raises ValueError: The "lucky" mode cannot encode the format.
+        :raises ModuleNotFoundError: The "lucky" mode requires Pillow for the
+            format, which is missing.
+        """
+        if self.microscope_settings["capture_mode"] == "lucky":
+            self.capture_best(
+                fname, format=format, sample_id=sample_id, on_written=on_written
+            )
+            return
+        if format is None:
+            format = self.image_format
+        trace = Trace("image", fname)
+        settings = self.camera_settings()
+        settings["format"] = format
+        timestamp = time.time()
+
+        buffer = io.BytesIO()
+        self.cam.capture(buffer, format=format)
+        trace.mark("exposure", self.cam.sensor_timestamp)
+        trace.mark("encoded")
+        small = None  # the captured image, shrunk for duplicate check and thumbnail
+        if self.microscope_settings["duplicate_check"] or (
+            self.microscope_settings["thumbnails"]
+        ):
+            from rpyscope.image_io import decode_frame
+
+            try:
+                small = decode_frame(
+                    buffer.getvalue(), format, self.cam.resolution, THUMBNAIL_SIZE
+                )
+            except ModuleNotFoundError:  # Pillow is required for the format
+                pass
+        thumbnail = None
+        if self.microscope_settings["thumbnails"]:
+            thumbnail = self.capture_thumbnail(small)
+        self.duplicates = self._check_duplicates(fname, small)
+        self._submit_image(
+            fname,
+            buffer.getvalue(),
+            settings,
+            sample_id,
+            timestamp,
+            thumbnail,
+            trace,
+            on_written,
+        )
+
+    def capture_to(self, writer, t=None, z=0, y=0, x=0, **metadata):
+        """Capture a frame into a chunked array, see `open_series`.
+
+        :param writer: Array to write to.
+        :type writer: ChunkedArrayWriter
+        :param t: Time index, defaults to appending a new time point.
+        :type t: int
+        :param z: Z index.
+        :type z: int
+        :param y: Offset in y, e.g., for tiles of a mosaic.
+        :type y: int
+        :param x: Offset in x, e.g., for tiles of a mosaic.
+        :type x: int
+        :param metadata: Stored with the frame, the timestamp and the ID of
+            its trace are added.
+
+        :return: Time index of the frame.
+        :rtype: int
+        """
+        trace = Trace("frame", getattr(writer, "path", None))
+        metadata.setdefault("timestamp", time.time())
+        metadata["trace_id"] = trace.id
+        frame = self.capture_frame()
+        trace.mark("exposure", self.cam.sensor_timestamp)
+        trace.mark("captured")
+        if t is None:
+            t = writer.append(frame, **metadata)
+        else:
+            writer.write(frame, t=t, z=z, y=y, x=x, **metadata)
+        trace.mark("written")
+        self._write_trace(trace)
+        return t
+
+    def capture_synchronized(
+        self, fname, format=None, sample_id=None, names=None, timeout=10.0
+    ):
+        """Capture an image with every camera at the same time.
+
+        Every camera captures in its own worker thread. The workers wait for
+        each other and are released together, such that the total latency is
+        about the one of the slowest camera, not the sum. Images are written in
+        the background and logged to the catalog like with `capture_image`.
+
+        :param fname: File name, the name of the camera is appended to the
+            stem, e.g., "a.jpeg" becomes "a_main.jpeg" and "a_transmitted.jpeg".
+        :type fname: Path, str
+        :param format: Image format, defaults to `image_format`.
+        :type format: str
+        :param sample_id: ID of the sample that is captured.
+        :type sample_id: str
+        :param names: Names of the cameras to capture with, defaults to all.
+        :type names: list(str)
+        :param timeout: Time in s to wait for all cameras to be ready.
+        :type timeout: float
+
+        :return: "files" and "timestamps" (`time.monotonic`) of the exposures
+            by camera name, the "skew" between the first and the last exposure,
+            and the "latency" until all cameras captured, both in s.
+        :rtype: dict
+
+        :raises ValueError: Unknown camera name.
+        :raises TimeoutError: A camera was not ready in time, e.g., still busy.
+        :raises StorageFullError: The disk is full, the images are not written.
+        """
+        if format is None:
+            format = self.image_format
+        cameras = self.cameras
+        names = list(cameras) if names is None else names
+        unknown = set(names) - set(cameras)
+        if unknown:
+            raise ValueError(f"Unknown cameras {sorted(unknown)}.")
+        fname = Path(fname)
+        timestamp = time.time()
+
+        barrier = threading.Barrier(len(names))
+        start = time.monotonic()
+        futures = {
+            name: self._camera_worker(name).submit(
+                self._capture_released,
+                cameras[name],
+                barrier,
+                fname.with_name(f"{fname.stem}_{name}{fname.suffix}"),
+                format,
+                timeout,
+            )
+            for name in names
+        }
+        try:
+            results = {name: future.result() for name, future in futures.items()}
+        except threading.BrokenBarrierError as e:
+            raise TimeoutError("A camera was not ready to capture in time.") from e
+        latency = time.monotonic() - start
+
+        for path, data, settings, trace, _ in results.values():
+            self._submit_image(path, data, settings, sample_id, timestamp, None, trace)
+        timestamps = {name: result[4] for name, result in results.items()}
+        skew = max(timestamps.values()) - min(timestamps.values())
+        if self.metrics.enabled:
+            self.metrics.histogram("capture_synchronized_skew").observe(skew)
+            self.metrics.histogram("capture_synchronized_latency").observe(latency)
+        return {
+            "files": {name: result[0] for name, result in results.items()},
+            "timestamps": timestamps,
+            "skew": skew,
+            "latency": latency,
+        }
+
+    def capture_zstack(self, path, z_positions, return_to_start=True, **kwargs):
+        """Capture a z-stack into a chunked array, pipelined, see `rpyscope.zstack`.
+
+        The focus is driven by `focus`, or by the z axis of `stage` if no focus
+        drive is set. Further stacks into the same array are appended as new
+        time points.
+
+        :param path: Folder of the array, e.g., "stack.zarr".
+        :type path: Path, str
+        :param z_positions: Focus positions in µm, e.g., from
+            `rpyscope.zstack.z_range`.
+        :type z_positions: list(float)
+        :param return_to_start: Move the focus back to where it was afterwards.
+        :type return_to_start: bool
+        :param kwargs: Further arguments for `rpyscope.zstack.acquire`, e.g.,
+            `depth`.
+
+        :return: Time index and timing of the stack, see
+            `rpyscope.zstack.acquire`.
+        :rtype: dict
+
+        :raises ValueError: No focus drive or stage is set.
+        """
+        from rpyscope import zstack
+
+        focus = self.focus if self.focus is not None else self.stage
+        if focus is None:
+            raise ValueError("No focus drive is set, see `Microscope.focus`.")
+        focus.wait()  # e.g., still returning from the previous stack
+        _, _, z_start = focus.position
+
+        writer = self.open_series(path)
+        try:
+            return zstack.acquire(self, focus, z_positions, writer, **kwargs)
+        finally:
+            writer.close()
+            if return_to_start:
+                focus.move_to(z=z_start, wait=False)
+
+    def capture_thumbnail(self, frame=None):
+        """Capture a thumbnail for the thumbnail cache.
+
+        The thumbnail is taken from the resized output of the video port, such
+        that the captured file does not have to be decoded again. A frame of
+        about the thumbnail size that was decoded anyway is encoded instead,
+        unless Pillow is missing.
+
+        :param frame: Frame of about the thumbnail size, see `capture_image`.
+        :type frame: numpy.ndarray
+
+        :return: JPEG encoded thumbnail
+        :rtype: bytes
+        """
+        if frame is not None:
+            from rpyscope.image_io import encode_frame
+
+            try:
+                return encode_frame(frame, "jpeg")
+            except ModuleNotFoundError:  # the camera encodes it
+                pass
+        buffer = io.BytesIO()
+        self.cam.capture(
+            buffer, format="jpeg", resize=THUMBNAIL_SIZE, use_video_port=True
+        )
+        return buffer.getvalue()
+
+    def close(self):
+        """Stop sequences, write all pending files and settings, close the catalog.
+
+        Staged files that are not offloaded yet are moved on the next start.
+        """
+        for run in self._sequence_runs:
+            run.cancel()
+        for run in self._sequence_runs:
+            run.wait()
+        for worker in self._camera_workers.values():
+            worker.shutdown()
+        self.stop_motion_trigger()
+        self.stop_frame_bus()
+        self.stop_frame_stream()
+        self.pipeline.close()
+        # in this order, written files are offloaded and offloaded files logged
+        for name in ("storage", "offloader", "catalog"):
+            subsystem = self._subsystems.get(name)
+            if subsystem is not None:
+                subsystem.close()
+        for index in self._hash_indexes.values():
+            index.close()
+        self.microscope_settings.close()
+
+    def enable_metrics(self, enabled=True):
+        """Turn the timing of camera calls and other hot paths on or off.
+
+        Timings are recorded in `metrics`, see `rpyscope.metrics`. While
+        enabled, the camera is wrapped in an `InstrumentedCamera`. A camera
+        that is not open yet is wrapped once it is opened.
+
+        :param enabled: Record timings?
+        :type enabled: bool
+        """
+        self.metrics.enabled = enabled
+        if self.cam is not None:
+            self.cam = self._instrument(self.default_cam.camera)
+
+    def file_exists(self, fname):
+        """Check if a file exists, is waiting to be written, or to be offloaded.
+
+        :param fname: File name, including the path.
+        :type fname: Path, str
+
+        :return: Does the file exist?
+        :rtype: bool
+        """
+        target, _ = self._write_target(fname, None)
+        return (
+            self.storage.exists(fname)
+            or self.storage.exists(target)
+            or self.offloader.is_pending(os.path.abspath(fname))
+        )
+
+    def hash_index(self, folder):
+        """Get the index of image hashes of a capture folder.
+
+        Captures are only compared to earlier ones in the same folder. The
+        indexes are stored in the configuration folder, such that folders on
+        network shares do not hold databases.
+
+        :param folder: Folder of the captures.
+        :type folder: Path, str
+
+        :return: Index, opened on first access
+        :rtype: rpyscope.dedupe.HashIndex
+        """
+        from rpyscope.dedupe import HashIndex
+
+        folder = os.path.abspath(folder)
+        with self._subsystems_lock:
+            if folder not in self._hash_indexes:
+                indexes = self.path_config.joinpath("hashes")
+                indexes.mkdir(exist_ok=True)
+                key = hashlib.sha1(folder.encode()).hexdigest()[:16]
+                self._hash_indexes[folder] = HashIndex(
+                    indexes.joinpath(f"{key}.sqlite")
+                )
+            return self._hash_indexes[folder]
+
+    def open_camera(self):
+        """Open the default camera, if it was not opened when initializing.
+
+        Opening can take a while, e.g., on a Raspberry Pi, and may be done in a
+        background thread. The startup script `init.py` in the configuration
+        folder is started once the camera is open, see `startup_run`. Staged
+        files that were not offloaded in the last session are moved from then on.
+
+        :return: Camera
+        :rtype: rpyscope.cameras.abstract_camera.AbsCamera
+        """
+        if self.cam is None:
+            self._load_camera()
+            if self.path_config.joinpath("offload.sqlite").exists():
+                self.offloader  # resumes pending moves
+            self._run_startup_script()
+        return self.cam
+
+    def open_series(self, path, align=False, **kwargs):
+        """Open a chunked, compressed array as output for series, stacks, mosaics.
+
+        Frames have the current resolution of the camera, the camera settings
+        are stored in the attributes of the array.
+
+        :param path: Folder of the array, e.g., "timelapse.zarr".
+        :type path: Path, str
+        :param align: Correct the drift of frames as they are captured, see
+            `rpyscope.registration`.
+        :type align: bool
+        :param kwargs: Further arguments for `ChunkedArrayWriter`.
+
+        :return: Writer to pass to `capture_to`.
+        :rtype: ChunkedArrayWriter, AlignedWriter
+        """
+        from rpyscope.chunked import ChunkedArrayWriter
+        from rpyscope.registration import AlignedWriter
+
+        width, height = self.cam.resolution
+        attrs = dict(kwargs.pop("attrs", {}))
+        attrs.setdefault("camera_settings", self.camera_settings())
+        writer = ChunkedArrayWriter(path, (height, width, 3), attrs=attrs, **kwargs)
+        return AlignedWriter(writer) if align else writer
+
+    def register_processor(self, name, processor, **kwargs):
+        """Register a frame processor in the pipeline and feed it live frames.
+
+        The frame stream is started with its defaults if it is not running, start
+        it first to set the frame size and framerate. Results are available as
+        `stage.result` or through the `on_result` callback.
+
+        :param name: Name of the processor.
+        :type name: str
+        :param processor: Function called as `processor(frame, timestamp)`.
+        :type processor: callable
+        :param kwargs: Rate, executor, drop policy, etc., see
+            `rpyscope.pipeline.Stage`.
+
+        :return: Stage of the processor, e.g., for its statistics.
+        :rtype: rpyscope.pipeline.Stage
+        """
+        stage = self.pipeline.register(name, processor, **kwargs)
+        if self.pipeline.submit not in self._frame_listeners:
+            self.add_frame_listener(self.pipeline.submit)
+        if self._frame_stream is None:
+            self.start_frame_stream()
+        return stage
+
+    def remove_camera(self, name):
+        """Remove a camera that was added with `add_camera`.
+
+        The camera is not closed, e.g., such that it can be added again.
+
+        :param name: Name of the camera.
+        :type name: str
+
+        :return: Removed camera.
+        :rtype: rpyscope.cameras.abstract_camera.AbsCamera
+
+        :raises ValueError: Unknown camera or the default camera.
+        """
+        if name not in self._cameras:
+            raise ValueError(f"No camera named {name} was added.")
+        worker = self._camera_workers.pop(name, None)
+        if worker is not None:
+            worker.shutdown()
+        return self._cameras.pop(name)
+
+    def remove_frame_listener(self, listener):
+        """Remove a frame listener, see `add_frame_listener`.
+
+        Once removed, the listener is not being called anymore.
+
+        :param listener: Function to remove.
+        :type listener: callable
+        """
+        with self._frame_listeners_lock:
+            if listener in self._frame_listeners:
+                self._frame_listeners.remove(listener)
+
+    def run_sequence(self, sequence, on_progress=None):
+        """Run an acquisition sequence in a worker thread.
+
+        :param sequence: Sequence or name of a sequence in `sequences`.
+        :type sequence: rpyscope.sequences.Sequence, str
+        :param on_progress: Function called from the worker thread with every
+            finished step, see `rpyscope.sequences.SequenceRun`.
+        :type on_progress: callable
+
+        :return: Running sequence, e.g., to wait for it or to cancel it.
+        :rtype: rpyscope.sequences.SequenceRun
+
+        :raises ValueError: Unknown sequence or invalid script.
+        """
+        if isinstance(sequence, str):
+            sequence = self.sequences.get(sequence)
+        self._sequence_runs = [run for run in self._sequence_runs if not run.done]
+        run = sequence.start(self, on_progress=on_progress)
+        self._sequence_runs.append(run)
+        return run
+
+    def scan_mosaic(self, path, positions, pixel_size, order="serpentine", **kwargs):
+        """Capture a tile at every stage position into one chunked array.
+
+        Tiles are placed by their stage position, the tile at the smallest x
+        and y is at the top left. While the stage moves to the next position,
+        the previous tile is compressed and written, see `rpyscope.scanning`.
+
+        :param path: Folder of the array, e.g., "mosaic.zarr".
+        :type path: Path, str
+        :param positions: Stage positions (x, y) or (x, y, z) in µm, e.g.,
+            from `rpyscope.scanning.grid`.
+        :type positions: list(tuple)
+        :param pixel_size: Size of a pixel on the sample in µm.
+        :type pixel_size: float
+        :param order: Order of the positions, see `rpyscope.scanning.plan`.
+        :type order: str
+        :param kwargs: Further arguments for `open_series`.
+
+        :return: Throughput and timing of the scan, see `rpyscope.scanning.scan`.
+        :rtype: dict
+
+        :raises ValueError: No stage is set.
+        """
+        from rpyscope import scanning
+
+        if self.stage is None:
+            raise ValueError("No stage is set, see `Microscope.stage`.")
+        x0 = min(position[0] for position in positions)
+        y0 = min(position[1] for position in positions)
+
+        def write(frame, position, timestamp):
+            """Write a tile at the offset of its stage position."""
+            writer.write(
+                frame,
+                y=int(round((position[1] - y0) / pixel_size)),
+                x=int(round((position[0] - x0) / pixel_size)),
+                stage_position=list(position),
+                timestamp=timestamp,
+            )
+
+        writer = self.open_series(path, **kwargs)
+        try:
+            return scanning.scan(self, self.stage, positions, write, order=order)
+        finally:
+            writer.close()
+
+    def start_frame_bus(self, name="rpyscope", n_slots=8, resize=None, fps=None):
+        """Publish live frames into shared memory for local analysis processes.
+
+        Consumers attach with `rpyscope.framebus.FrameBusReader(name)`. The frame
+        stream is started if it is not running yet, otherwise its frame size
+        is used. A block of the same name that a crashed session left over is
+        replaced, one of a running session is not.
+
+        :param name: Name of the shared memory block.
+        :type name: str
+        :param n_slots: Number of frames in the ring.
+        :type n_slots: int
+        :param resize: Resize the frames to (width, height).
+        :type resize: tuple(int, int)
+        :param fps: Maximum framerate of the frame stream.
+        :type fps: float
+
+        :return: The frame bus, e.g., to report the lag of its consumers.
+        :rtype: rpyscope.framebus.FrameBus
+
+        :raises FileExistsError: Another running process publishes a frame bus
+            of this name.
+        """
+        from rpyscope import framebus
+
+        self.stop_frame_bus()
+        if self._frame_stream is not None:
+            resize = self._frame_stream_resize
+        width, height = self.cam.resolution if resize is None else resize
+        try:
+            bus = framebus.FrameBus((height, width, 3), n_slots=n_slots, name=name)
+        except FileExistsError:
+            if not framebus.reclaim(name):  # not left over from a crashed session
+                raise FileExistsError(
+                    f"The frame bus {name} is published by another process."
+                )
+            bus = framebus.FrameBus((height, width, 3), n_slots=n_slots, name=name)
+        self.frame_bus = bus
+        self.add_frame_listener(bus.publish)
+        if self._frame_stream is None:
+            self.start_frame_stream(resize=resize, fps=fps)
+        return bus
+
+    def start_frame_stream(self, resize=None, fps=None):
+        """Capture frames continuously from the video port for frame listeners.
+
+        :param resize: Resize the frames to (width, height).
+        :type resize: tuple(int, int)
+        :param fps: Maximum framerate, defaults to as fast as possible.
+        :type fps: float
+        """
+        self.stop_frame_stream()
+        self._frame_stream_stop.clear()
+        self._frame_stream_resize = resize
+        self._frame_stream = threading.Thread(
+            target=self._stream_frames,
+            args=(resize, fps),
+            name="FrameStream",
+            daemon=True,
+        )
+        self._frame_stream.start()
+
+    def start_motion_trigger(
+        self,
+        action="record",
+        fname=None,
+        threshold=0.02,
+        resize=(640, 480),
+        rate=5,
+        **kwargs,
+    ):
+        """Capture an image or record a video when the sample changes.
+
+        Cameras with an H.264 encoder score the motion vectors of a
+        low-resolution recording on splitter port 2, which costs almost no CPU.
+        Other cameras score the difference of downscaled frames from the frame
+        stream at `rate` frames per s.
+
+        :param action: "capture" an image per event or "record" a video until
+            the change stopped.
+        :type action: str
+        :param fname: File name without extension, can contain `time.strftime`
+            codes, defaults to "motion_<date>_<time>" in the home folder.
+        :type fname: Path, str
+        :param threshold: Fraction of the image that must change to trigger.
+        :type threshold: float
+        :param resize: Resolution (width, height) at which motion is scored.
+        :type resize: tuple(int, int)
+        :param rate: Frames per s scored without motion vectors.
+        :type rate: float
+        :param kwargs: Release, hold, cooldown, see `MotionTrigger`.
+
+        :return: The trigger, e.g., to count its events.
+        :rtype: rpyscope.motion.MotionTrigger
+
+        :raises ValueError: Invalid action.
+        """
+        from rpyscope.motion import (
+            FrameDifference,
+            MotionTrigger,
+            MotionVectorOutput,
+        )
+
+        if action not in ("capture", "record"):
+            raise ValueError(f"Action must be 'capture' or 'record', not {action}.")
+        self.stop_motion_trigger()
+        if fname is None:
+            fname = Path(self.home_folder).joinpath("motion_%Y-%m-%d_%H-%M-%S")
+        actions = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Motion")
+
+        def started(timestamp):
+            """Start the action, outside the thread that scores motion."""
+            actions.submit(self._motion_started, action, str(fname))
+
+        def stopped(timestamp):
+            """Stop a recording that was started by the trigger."""
+            if action == "record":
+                actions.submit(self._motion_stopped)
+
+        trigger = MotionTrigger(started, stopped, threshold=threshold, **kwargs)
+        self._motion_vectors = self.cam.motion_vectors
+        if self._motion_vectors:
+            self.cam.start_recording(
+                os.devnull,
+                format="h264",
+                resize=resize,
+                splitter_port=2,
+                motion_output=MotionVectorOutput(resize, trigger.update),
+            )
+        else:
+            self.register_processor(
+                "motion", FrameDifference(trigger.update), rate=rate
+            )
+        self.motion_trigger = trigger
+        self._motion_actions = actions
+        return trigger
+
+    def start_recording(self, fname, format=None, sample_id=None):
+        """Start a video recording, it is logged to the catalog when stopped.
+
+        The video is written in the background through the storage layer. Raw
+        formats are written into a memory-mappable container with frame
+        timestamps if `raw_container` is set, see `rpyscope.rawvideo`.
+
+        :param fname: File name, including the path.
+        :type fname: Path, str
+        :param format: Video format, defaults to `video_format`.
+        :type format: str
+        :param sample_id: ID of the sample that is recorded.
+        :type sample_id: str
+
+        :raises StorageFullError: The disk is full, the recording is not started.
+        """
+        from rpyscope.rawvideo import RAW_FORMATS, RawVideoWriter
+
+        if format is None:
+            format = self.video_format
+        settings = self.camera_settings()
+        settings["format"] = format
+        timestamp = time.time()
+
+        def written(path):
+            """Log the video once it is on disk."""
+            self.catalog.add(
+                path,
+                "video",
+                settings=settings,
+                sample_id=sample_id,
+                timestamp=timestamp,
+            )
+
+        target, callback = self._write_target(fname, written)
+        stream = self.storage.open_stream(target, callback=callback)
+        self._recording = [stream]
+        if format in RAW_FORMATS and self.microscope_settings["raw_container"]:
+            raw = RawVideoWriter(
+                stream,
+                tuple(self.cam.resolution),
+                format,
+                self.cam.framerate,
+                clock=self._frame_clock,
+            )
+            self._recording.insert(0, raw)
+        self.cam.start_recording(self._recording[0], format=format)
+        self.is_recording = True
+
+    def stop_frame_bus(self):
+        """Stop publishing frames and remove the shared memory block."""
+        if self.frame_bus is None:
+            return
+        self.remove_frame_listener(self.frame_bus.publish)
+        if not self._frame_listeners:
+            self.stop_frame_stream()
+        self.frame_bus.close()
+        self.frame_bus = None
+
+    def stop_frame_stream(self):
+        """Stop the frame stream, the current frame is completed first."""
+        if self._frame_stream is None:
+            return
+        self._frame_stream_stop.set()
+        self._frame_stream.join()
+        self._frame_stream = None
+
+    def stop_motion_trigger(self):
+        """Stop the motion trigger and a recording it started."""
+        if self.motion_trigger is None:
+            return
+        if self._motion_vectors:
+            self.cam.stop_recording(splitter_port=2)
+        else:
+            self.unregister_processor("motion")
+        if self.motion_trigger.active and self.motion_trigger.on_stop is not None:
+            self.motion_trigger.on_stop(time.time())
+        self._motion_actions.shutdown(wait=True)
+        self._motion_actions = None
+        self.motion_trigger = None
+
+    def stop_recording(self):
+        """Stop the video recording, it is logged once written to disk."""
+        self.cam.stop_recording()
+        self.is_recording = False
+        for output in self._recording:
+            output.close()
+        self._recording = []
+
+    def unregister_processor(self, name):
+        """Remove a frame processor, the frame stream stops if it was the last user.
+
+        :param name: Name of the processor.
+        :type name: str
+        """
+        self.pipeline.unregister(name)
+        if not self.pipeline.stages:
+            self.remove_frame_listener(self.pipeline.submit)
+            if not self._frame_listeners:
+                self.stop_frame_stream()
+
     # PRIVATE FUNCTIONS #
 
+    def _camera_worker(self, name):
+        """Worker thread of a camera, created on first use."""
+        if name not in self._camera_workers:
+            self._camera_workers[name] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"rpyscope-camera-{name}"
+            )
+        return self._camera_workers[name]
+
+    def _capture_released(self, cam, barrier, fname, format, timeout):
+        """Capture once all cameras are ready, runs in the worker of the camera.
+
+        :return: File name, encoded image, settings, trace, and the time of
+            the exposure, or the middle of the capture if the camera does not
+            know it.
+        :rtype: tuple
+        """
+        settings = self.camera_settings(cam)
+        settings["format"] = format
+        buffer = io.BytesIO()
+        barrier.wait(timeout)
+        trace = Trace("image", fname)
+        cam.capture(buffer, format=format)
+        exposed = cam.sensor_timestamp
+        if exposed is None:
+            exposed = (trace.marks["trigger"] + time.monotonic()) / 2
+        trace.mark("exposure", exposed)
+        trace.mark("encoded")
+        return fname, buffer.getvalue(), settings, trace, exposed
+
+    def _check_duplicates(self, fname, frame):
+        """Add a capture to the hash index and get its near-duplicates.
+
+        :param fname: File name of the capture.
+        :type fname: Path, str
+        :param frame: Captured frame, a small one is enough for the hash. None
+            if it could not be decoded, the capture is not checked then.
+        :type frame: numpy.ndarray
+
+        :return: Path and Hamming distance of near-duplicates.
+        :rtype: list(tuple(str, int))
+        """
+        if not self.microscope_settings["duplicate_check"] or frame is None:
+            return []
+        folder = os.path.dirname(os.path.abspath(fname))
+        return self.hash_index(folder).add(fname, image=frame)
+
+    def _frame_clock(self):
+        """Timestamp of the current frame in s, from the camera if available."""
+        if not hasattr(self.cam, "frame"):
+            return time.monotonic()
+        timestamp = self.cam.frame.timestamp  # in microseconds, None if unknown
+        return float("nan") if timestamp is None else timestamp / 1e6
+
+    def _instrument(self, cam):
+        """Wrap a camera for timing if metrics are enabled."""
+        if self.metrics.enabled:
+            return InstrumentedCamera(cam, self.metrics)
+        return cam
+
     def _load_camera(self):
         """Load a new camera, to be called when a default is set.
 
@@ -182,16 +1298,165 @@ class Microscope:
         """
         if self.cam is not None:
             self.cam.close()
-        self.cam = self.default_cam.value
+        self.cam = self._instrument(self.default_cam.camera)
+
+    def _motion_started(self, action, fname):
+        """Capture or start recording when the motion trigger starts."""
+        fname = time.strftime(fname)
+        if action == "capture":
+            self.capture_image(f"{fname}.{self.image_format}")
+        elif not self.is_recording:
+            self.start_recording(f"{fname}.{self.video_format}")
+            self._motion_recording = True
+
+    def _motion_stopped(self):
+        """Stop the recording of the motion trigger, not one started by the user."""
+        if self._motion_recording and self.is_recording:
+            self.stop_recording()
+        self._motion_recording = False
+
+    def _offloaded(self, fname):
+        """Update catalog and thumbnails once a staged file is offloaded."""
+        self.catalog.refresh(fname)
+        thumbnail, on_written = self._pending_written.pop(fname, (None, None))
+        if thumbnail:
+            self.thumbnails.put(fname, thumbnail)
+        if on_written is not None:
+            on_written(fname)
+
+    def _stream_frames(self, resize, fps):
+        """Capture frames and hand them to the listeners until stopped."""
+        interval = 1 / fps if fps else 0
+        next_time = time.monotonic()
+        while not self._frame_stream_stop.is_set():
+            frame = self.cam.capture_array(resize=resize)
+            timestamp = time.time()
+            with self._frame_listeners_lock:
+                for listener in self._frame_listeners:
+                    try:
+                        listener(frame, timestamp)
+                    except Exception as e:
+                        print(f"Frame listener {listener} failed: {e}")
+            if interval:
+                next_time = max(next_time + interval, time.monotonic())
+                self._frame_stream_stop.wait(next_time - time.monotonic())
+
+    def _submit_image(
+        self,
+        fname,
+        data,
+        settings,
+        sample_id,
+        timestamp,
+        thumbnail,
+        trace,
+        on_written=None,
+    ):
+        """Write an encoded image in the background and log it once written.
+
+        `on_written` is called once the image is at its final path, i.e.,
+        after offloading if it is staged.
+        """
+
+        def written(path):
+            """Log the image and store its thumbnail once it is on disk."""
+            trace.mark("written")
+            self._write_trace(trace)
+            self.catalog.add(
+                path,
+                "image",
+                settings=settings,
+                sample_id=sample_id,
+                timestamp=timestamp,
+            )
+            if not os.path.exists(path):  # staged, finish once offloaded
+                if thumbnail or on_written is not None:
+                    self._pending_written[path] = (thumbnail, on_written)
+                return
+            if thumbnail:
+                self.thumbnails.put(path, thumbnail)
+            if on_written is not None:
+                on_written(path)
+
+        target, callback = self._write_target(fname, written)
+        self.storage.submit(target, data, callback=callback)
+        trace.mark("queued")
+
+    def _subsystem(self, name, factory):
+        """Get a subsystem, it is opened with `factory()` on first access.
+
+        :param name: Name of the subsystem, e.g., "catalog".
+        :type name: str
+        :param factory: Opens the subsystem.
+        :type factory: callable
+
+        :return: Subsystem
+        """
+        with self._subsystems_lock:
+            if name not in self._subsystems:
+                self._subsystems[name] = factory()
+            return self._subsystems[name]
+
+    def _write_trace(self, trace):
+        """Append a finished trace to the log if tracing is on."""
+        if self.microscope_settings["tracing"]:
+            self.traces.write(trace)
+
+    def _write_target(self, fname, on_written):
+        """Get the path to write to and the callback for the storage layer.
+
+        Without a staging folder, files are written to `fname` directly. Otherwise,
+        they are written to the staging folder first and then offloaded to `fname`
+        in the background.
+
+        :param fname: Final file name, including the path.
+        :type fname: Path, str
+        :param on_written: Called with the final file name once written.
+        :type on_written: callable
+
+        :return: Path to write to, callback for the storage layer.
+        :rtype: tuple(str, callable)
+        """
+        fname = os.path.abspath(fname)
+        staging = self.microscope_settings["staging_folder"]
+        if not staging:
+            return fname, on_written
+        staged = os.path.join(str(staging), fname.lstrip(os.sep))
+
+        def written(path):
+            """Hand the staged file to the offloader."""
+            on_written(fname)
+            self.offloader.enqueue(path, fname)
+
+        if on_written is not None:
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+        return staged, written
+
+    def _run_startup_script(self):
+        """Start the startup script `init.py`, if there is one."""
+        fname = self.path_config.joinpath("init.py")
+        if self.startup_run is not None or not fname.is_file():
+            return
+        from rpyscope.sequences import Sequence
+
+        try:
+            self.startup_run = self.run_sequence(Sequence.load(fname))
+        except ValueError as e:  # the microscope works without it
+            print(f"Startup script not run: {e}")
 
     def _setup_config_folder(self):
         """Sets up a configuration folder and sets the according self.path_config.
 
         This folder is used for the `init.py` file that will initialize user settings
-        and will be used to store settings later on. It is assumed that we are on
+        and for the settings, see `microscope_settings`. It is assumed that we are on
         a Posix system.
         """
         config_folder = Path.joinpath(Path.home(), ".config/RPyConf")
         if not Path.is_dir(config_folder):
             Path.mkdir(config_folder)
         self.path_config = config_folder
+
+
+def _to_float(value):
+    """Convert a camera value, e.g., a Fraction, to float if it is not None."""
+    return None if value is None else float(value)
@@ -0,0 +1,227 @@
+"""Detect motion or change in live frames and trigger captures.
+
+On the Raspberry Pi camera, the H.264 encoder computes motion vectors for every
+16x16 pixel macroblock anyway. `MotionVectorOutput` reads them while a
+low-resolution recording runs on a separate splitter port, such that scoring
+costs a few vectorized operations on a small array per frame. Cameras without
+an encoder score the difference of downscaled frames with `FrameDifference`
+instead. Scores are the fraction of the image that changed and are fed into a
+`MotionTrigger`.
+"""
+
+import time
+
+import numpy as np
+
+MOTION_VECTOR_DTYPE = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "<u2")])
+
+
+def motion_vector_shape(resolution):
+    """Shape of the motion vector array the encoder writes per frame.
+
+    There is one vector per 16x16 macroblock plus one extra column.
+
+    :param resolution: Resolution (width, height) of the encoded video.
+    :type resolution: tuple(int, int)
+
+    :return: Shape (rows, columns)
+    :rtype: tuple(int, int)
+    """
+    width, height = resolution
+    return (height + 15) // 16, (width + 15) // 16 + 1
+
+
+def motion_vector_score(vectors, magnitude=2):
+    """Score the motion of one frame of motion vectors.
+
+    :param vectors: Motion vectors of one frame, see `MOTION_VECTOR_DTYPE`.
+    :type vectors: numpy.ndarray
+    :param magnitude: Minimum length of a vector to count as motion, in pixels.
+    :type magnitude: float
+
+    :return: Fraction of macroblocks that moved, 0 to 1.
+    :rtype: float
+    """
+    x = vectors["x"].astype(np.int16)
+    y = vectors["y"].astype(np.int16)
+    return float(np.mean(x * x + y * y >= magnitude**2))
+
+
+class MotionVectorOutput:
+    """File-like output for the motion vectors of the camera's H.264 encoder.
+
+    Pass it as `motion_output` to `start_recording`. Every complete frame of
+    motion vectors is scored and handed to `callback(score, timestamp)`.
+    """
+
+    def __init__(self, resolution, callback, magnitude=2):
+        """Initialize the output.
+
+        :param resolution: Resolution (width, height) of the encoded video.
+        :type resolution: tuple(int, int)
+        :param callback: Called with the score and timestamp of every frame.
+        :type callback: callable
+        :param magnitude: Minimum length of a vector to count as motion.
+        :type magnitude: float
+        """
+        self.shape = motion_vector_shape(resolution)
+        self.callback = callback
+        self.magnitude = magnitude
+        self.frame_bytes = int(np.prod(self.shape)) * MOTION_VECTOR_DTYPE.itemsize
+        self._buffer = bytearray()
+
+    def flush(self):
+        """Nothing to flush, required by the camera."""
+        pass
+
+    def write(self, data):
+        """Collect motion vectors and score every complete frame.
+
+        :param data: Motion vector data from the encoder.
+        :type data: bytes
+
+        :return: Number of bytes consumed.
+        :rtype: int
+        """
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.frame_bytes:
+            vectors = np.frombuffer(
+                bytes(self._buffer[: self.frame_bytes]), dtype=MOTION_VECTOR_DTYPE
+            ).reshape(self.shape)
+            del self._buffer[: self.frame_bytes]
+            self.callback(motion_vector_score(vectors, self.magnitude), time.time())
+        return len(data)
+
+
+class FrameDifference:
+    """Frame processor that scores the change to the previous frame.
+
+    Use it for cameras without motion vectors, e.g., registered in the frame
+    pipeline. The downscaled previous frame is kept, such that every frame is
+    only downscaled once.
+    """
+
+    def __init__(self, callback, step=8, threshold=16):
+        """Initialize the processor.
+
+        :param callback: Called with the score and timestamp of every frame.
+        :type callback: callable
+        :param step: Only every `step`-th pixel in x and y is compared.
+        :type step: int
+        :param threshold: Minimum difference of a pixel value to count as change.
+        :type threshold: int
+        """
+        self.callback = callback
+        self.step = step
+        self.threshold = threshold
+        self._previous = None
+
+    def __call__(self, frame, timestamp):
+        """Score a frame, the first frame has a score of 0.
+
+        :param frame: Frame to score.
+        :type frame: numpy.ndarray
+        :param timestamp: Timestamp of the frame.
+        :type timestamp: float
+
+        :return: Score of the frame.
+        :rtype: float
+        """
+        small = _downscale(frame, self.step)
+        if self._previous is None or self._previous.shape != small.shape:
+            score = 0.0
+        else:
+            score = float(np.mean(np.abs(small - self._previous) > self.threshold))
+        self._previous = small
+        self.callback(score, timestamp)
+        return score
+
+
+class MotionTrigger:
+    """Turn motion scores into start and stop events.
+
+    The trigger starts when the score reaches `threshold` and stops once the
+    score was below `release` for `hold` seconds (hysteresis). After it stopped,
+    it cannot start again for `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        on_start,
+        on_stop=None,
+        threshold=0.02,
+        release=None,
+        hold=2.0,
+        cooldown=10.0,
+    ):
+        """Initialize the trigger in the idle state.
+
+        :param on_start: Called with the timestamp when the trigger starts.
+        :type on_start: callable
+        :param on_stop: Called with the timestamp when the trigger stops.
+        :type on_stop: callable
+        :param threshold: Score to start.
+        :type threshold: float
+        :param release: Score to stop, defaults to half the threshold.
+        :type release: float
+        :param hold: Time in s the score must stay below release to stop.
+        :type hold: float
+        :param cooldown: Time in s after stopping before it can start again.
+        :type cooldown: float
+
+        :raises ValueError: The release is higher than the threshold.
+        """
+        release = threshold / 2 if release is None else release
+        if release > threshold:
+            raise ValueError("The release must not be higher than the threshold.")
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.threshold = threshold
+        self.release = release
+        self.hold = hold
+        self.cooldown = cooldown
+
+        self.active = False
+        self.events = 0
+        self._quiet_since = None
+        self._stopped_at = None
+
+    def update(self, score, timestamp=None):
+        """Feed the score of a frame, calls `on_start` / `on_stop` as required.
+
+        :param score: Motion score of the frame.
+        :type score: float
+        :param timestamp: Timestamp of the frame in s, defaults to now.
+        :type timestamp: float
+
+        :return: Is the trigger active?
+        :rtype: bool
+        """
+        now = time.time() if timestamp is None else timestamp
+        if not self.active:
+            cooling = (
+                self._stopped_at is not None and now - self._stopped_at < self.cooldown
+            )
+            if score >= self.threshold and not cooling:
+                self.active = True
+                self.events += 1
+                self._quiet_since = None
+                self.on_start(now)
+        elif score >= self.release:
+            self._quiet_since = None
+        elif self._quiet_since is None:
+            self._quiet_since = now
+        elif now - self._quiet_since >= self.hold:
+            self.active = False
+            self._stopped_at = now
+            if self.on_stop is not None:
+                self.on_stop(now)
+        return self.active
+
+
+def _downscale(frame, step):
+    """Gray, downscaled version of a frame as int16 for differences."""
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        frame = frame[..., 1 if frame.shape[2] > 1 else 0]  # green is closest to gray
+    return frame[::step, ::step].astype(np.int16)
@@ -0,0 +1,296 @@
+"""Asynchronous offload of staged files to their final destination."""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import threading
+import time
+
+from rpyscope.storage import _fsync_folder
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS offload (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    destination TEXT UNIQUE NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+"""
+
+
+class Offloader:
+    """Move files from a local staging folder to their destination in the background.
+
+    Typical destinations are slow network shares. Files are copied with a bounded
+    number of concurrent workers into a temporary file, verified with a SHA-256
+    checksum, renamed, and only then removed from the staging folder. Failed
+    moves are retried with an exponential backoff. The queue is stored in a
+    SQLite database, such that pending moves survive restarts.
+    """
+
+    def __init__(
+        self,
+        queue_file,
+        max_workers=2,
+        retries=5,
+        retry_delay=1.0,
+        copy_function=shutil.copyfile,
+        on_done=None,
+        start=True,
+    ):
+        """Open the queue and start moving pending files.
+
+        :param queue_file: File name of the SQLite queue.
+        :type queue_file: Path, str
+        :param max_workers: Maximum number of files to move concurrently.
+        :type max_workers: int
+        :param retries: Number of attempts before a move is marked failed.
+        :type retries: int
+        :param retry_delay: Delay in s before the first retry, doubles each time.
+        :type retry_delay: float
+        :param copy_function: Function to copy a file, `copy(source, destination)`.
+        :type copy_function: callable
+        :param on_done: Called with the destination once a file is moved.
+        :type on_done: callable
+        :param start: Start moving files, otherwise call `start` later.
+        :type start: bool
+        """
+        self.queue_file = Path(queue_file)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.copy_function = copy_function
+        self.on_done = on_done
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._db = sqlite3.connect(str(self.queue_file), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+
+        self._in_flight = set()  # ids of jobs that are moved right now
+        self._moved_files = 0
+        self._moved_bytes = 0
+        self._stop = False
+        self._executor = None
+        self._scheduler = None
+        if start:
+            self.start()
+
+    # METHODS #
+
+    def close(self):
+        """Stop moving files, files being moved are completed first."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._scheduler is not None:
+            self._scheduler.join()
+            self._executor.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
+
+    def enqueue(self, source, destination):
+        """Queue a staged file to be moved to its destination.
+
+        :param source: Path of the staged file.
+        :type source: Path, str
+        :param destination: Final path of the file.
+        :type destination: Path, str
+        """
+        with self._cond:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO offload (source, destination) VALUES (?, ?)",
+                    (str(source), str(destination)),
+                )
+            self._cond.notify_all()
+
+    def is_pending(self, destination):
+        """Check if a file is waiting to be moved to a destination.
+
+        :param destination: Final path of the file.
+        :type destination: Path, str
+
+        :return: Is the destination pending?
+        :rtype: bool
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM offload WHERE destination = ? AND failed = 0",
+                (str(destination),),
+            ).fetchone()
+        return row is not None
+
+    def retry_failed(self):
+        """Queue all failed moves again."""
+        with self._cond:
+            with self._db:
+                self._db.execute(
+                    "UPDATE offload SET failed = 0, attempts = 0, next_try = 0 "
+                    "WHERE failed = 1"
+                )
+            self._cond.notify_all()
+
+    def start(self):
+        """Start the workers, pending moves from previous runs are resumed."""
+        if self._scheduler is not None:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="Offloader"
+        )
+        self._scheduler = threading.Thread(
+            target=self._schedule, name="OffloadScheduler", daemon=True
+        )
+        self._scheduler.start()
+
+    def stats(self):
+        """Get statistics of the offloader, e.g., to display them.
+
+        :return: Number of pending and failed moves, moved files and bytes.
+        :rtype: dict
+        """
+        with self._lock:
+            pending, failed = self._db.execute(
+                "SELECT COUNT(*) - COALESCE(SUM(failed), 0), COALESCE(SUM(failed), 0) "
+                "FROM offload"
+            ).fetchone()
+            return {
+                "pending": pending,
+                "failed": failed,
+                "moved_files": self._moved_files,
+                "moved_bytes": self._moved_bytes,
+            }
+
+    def wait(self, timeout=None):
+        """Wait until no moves are pending anymore, failed moves are ignored.
+
+        :param timeout: Maximum time to wait in s.
+        :type timeout: float
+
+        :return: True if all moves are done, False if the timeout expired.
+        :rtype: bool
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._db.execute(
+                    "SELECT 1 FROM offload WHERE failed = 0"
+                ).fetchone()
+                is None,
+                timeout=timeout,
+            )
+
+    # PRIVATE FUNCTIONS #
+
+    def _schedule(self):
+        """Hand due jobs to the workers, at most `max_workers` at a time."""
+        with self._cond:
+            while not self._stop:
+                now = time.time()
+                job = None
+                if len(self._in_flight) < self.max_workers:
+                    for row in self._db.execute(
+                        "SELECT id, source, destination, attempts, next_try "
+                        "FROM offload WHERE failed = 0 ORDER BY next_try, id"
+                    ):
+                        if row[0] not in self._in_flight and row[4] <= now:
+                            job = row
+                            break
+                if job is None:
+                    self._cond.wait(timeout=self._next_wakeup(now))
+                    continue
+                self._in_flight.add(job[0])
+                self._executor.submit(self._move, *job[:4])
+
+    def _next_wakeup(self, now):
+        """Time in s until the next delayed job is due, the lock must be held."""
+        row = self._db.execute(
+            "SELECT MIN(next_try) FROM offload WHERE failed = 0 AND next_try > ?",
+            (now,),
+        ).fetchone()
+        return None if row[0] is None else row[0] - now
+
+    def _move(self, job_id, source, destination, attempts):
+        """Copy, verify, and remove the staged file; reschedule on errors.
+
+        The copy is synced to disk and verified before it is renamed, and the
+        rename is synced, before the staged copy is removed.
+        """
+        tmp = f"{destination}.part"
+        try:
+            os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+            self.copy_function(source, tmp)
+            _sync_file(tmp)
+            if _sha256(source) != _sha256(tmp):
+                raise OSError(f"Checksum mismatch after copying {source}.")
+            size = os.path.getsize(tmp)
+            os.replace(tmp, destination)
+            _fsync_folder(os.path.dirname(os.path.abspath(destination)))
+            os.remove(source)
+        except OSError as e:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            attempts += 1
+            with self._cond:
+                with self._db:
+                    self._db.execute(
+                        "UPDATE offload SET attempts = ?, next_try = ?, failed = ?, "
+                        "error = ? WHERE id = ?",
+                        (
+                            attempts,
+                            time.time() + self.retry_delay * 2 ** (attempts - 1),
+                            int(attempts >= self.retries),
+                            str(e),
+                            job_id,
+                        ),
+                    )
+                self._in_flight.discard(job_id)
+                self._cond.notify_all()
+            return
+
+        try:
+            if self.on_done is not None:
+                self.on_done(destination)
+        finally:
+            with self._cond:
+                with self._db:
+                    self._db.execute("DELETE FROM offload WHERE id = ?", (job_id,))
+                self._in_flight.discard(job_id)
+                self._moved_files += 1
+                self._moved_bytes += size
+                self._cond.notify_all()
+
+
+def _sync_file(fname):
+    """Sync a file to disk and drop it from the page cache, if possible.
+
+    Reading it again, e.g., to verify its checksum, then reads from the disk.
+    """
+    with open(fname, "rb+") as fout:
+        os.fsync(fout.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fout.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _sha256(fname):
+    """Calculate the SHA-256 checksum of a file.
+
+    :param fname: File name.
+    :type fname: Path, str
+
+    :return: Hex digest of the checksum.
+    :rtype: str
+    """
+    sha = hashlib.sha256()
+    with open(fname, "rb") as fin:
+        for block in iter(lambda: fin.read(1024**2), b""):
+            sha.update(block)
+    return sha.hexdigest()
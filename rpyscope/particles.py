@@ -0,0 +1,350 @@
+"""Detect, count, and measure particles or grains in images.
+
+Images are thresholded (Otsu's method by default), connected foreground pixels
+are labeled as particles, and every particle is measured: area, centroid,
+equivalent diameter, bounding box, and mean intensity. All steps are vectorized
+with NumPy. Large images, e.g., full resolution HQ captures, are labeled in
+tiles that are merged along their borders, such that the result is the same as
+for the whole image but the memory for intermediate arrays stays small.
+
+Analyze a frame of the microscope::
+
+    from rpyscope import particles
+    table = particles.analyze(scope.capture_frame(), pixel_size=0.35)
+    particles.write_table("particles.csv", table)
+
+Folders are analyzed in parallel with `rpyscope-batch` and the `particles`
+stage, writing one table per image.
+"""
+
+import csv
+import io
+import os
+
+import numpy as np
+
+from rpyscope.image_io import read_image
+
+COLUMNS = (
+    "label",
+    "area",
+    "centroid_x",
+    "centroid_y",
+    "equivalent_diameter",
+    "min_x",
+    "min_y",
+    "max_x",
+    "max_y",
+    "mean_intensity",
+)
+TABLE_SUFFIXES = (".csv", ".parquet")
+
+
+def analyze(
+    image,
+    threshold=None,
+    dark=False,
+    min_area=1,
+    connectivity=8,
+    pixel_size=1.0,
+    tile_size=1024,
+):
+    """Detect and measure the particles in an image.
+
+    :param image: Image, gray (height, width) or color (height, width, c).
+    :type image: numpy.ndarray
+    :param threshold: Intensity threshold, defaults to Otsu's threshold.
+    :type threshold: float
+    :param dark: Particles are darker than the background.
+    :type dark: bool
+    :param min_area: Minimum area of a particle in pixels, smaller ones are
+        dropped, e.g., noise.
+    :type min_area: int
+    :param connectivity: Neighbors of a pixel, 4 (edges) or 8 (with corners).
+    :type connectivity: int
+    :param pixel_size: Size of a pixel in the sample, e.g., in um. Areas,
+        centroids, and diameters are given in this unit.
+    :type pixel_size: float
+    :param tile_size: Size of the tiles that are labeled separately.
+    :type tile_size: int
+
+    :return: Table of particles as columns, see `COLUMNS`.
+    :rtype: dict(str, numpy.ndarray)
+    """
+    gray = _gray(image)
+    if threshold is None:
+        threshold = otsu_threshold(gray)
+    mask = gray < threshold if dark else gray > threshold
+    labels, count = label(mask, connectivity=connectivity, tile_size=tile_size)
+    table = measure(labels, count, gray, pixel_size=pixel_size)
+    keep = table["area"] >= min_area * pixel_size**2
+    if not keep.all():
+        table = {name: column[keep] for name, column in table.items()}
+        table["label"] = np.arange(1, keep.sum() + 1)
+    return table
+
+
+def analyze_file(fname, output=None, **kwargs):
+    """Analyze an image file and optionally write the table.
+
+    :param fname: File name of the image.
+    :type fname: Path, str
+    :param output: File name of the table, see `write_table`.
+    :type output: Path, str
+    :param kwargs: Options for `analyze`.
+
+    :return: Table of particles.
+    :rtype: dict(str, numpy.ndarray)
+    """
+    table = analyze(read_image(fname), **kwargs)
+    if output is not None:
+        write_table(output, table)
+    return table
+
+
+def label(mask, connectivity=8, tile_size=None):
+    """Label the connected components of a mask.
+
+    Labels are numbered from 1, the background is 0.
+
+    :param mask: Foreground of the image.
+    :type mask: numpy.ndarray(bool)
+    :param connectivity: Neighbors of a pixel, 4 (edges) or 8 (with corners).
+    :type connectivity: int
+    :param tile_size: Label tiles of this size separately and merge them.
+    :type tile_size: int
+
+    :return: Labels with the shape of the mask, number of labels.
+    :rtype: tuple(numpy.ndarray, int)
+
+    :raises ValueError: Invalid connectivity.
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"Connectivity must be 4 or 8, not {connectivity}.")
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    if tile_size is None or (height <= tile_size and width <= tile_size):
+        return _label_tile(mask, connectivity)
+
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    count = 0
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            tile, n = _label_tile(
+                mask[y : y + tile_size, x : x + tile_size], connectivity
+            )
+            tile[tile > 0] += count
+            labels[y : y + tile_size, x : x + tile_size] = tile
+            count += n
+
+    # merge particles that touch across tile borders
+    pairs = []
+    for x in range(tile_size, width, tile_size):
+        pairs += _border_pairs(labels[:, x - 1], labels[:, x], connectivity)
+    for y in range(tile_size, height, tile_size):
+        pairs += _border_pairs(labels[y - 1], labels[y], connectivity)
+    if not pairs:
+        return labels, count
+    left = np.concatenate([a for a, _ in pairs])
+    right = np.concatenate([b for _, b in pairs])
+    roots = _resolve(count + 1, left, right)
+    _, new = np.unique(roots, return_inverse=True)  # background stays 0
+    return new.astype(np.int32)[labels], int(new.max())
+
+
+def measure(labels, count, image=None, pixel_size=1.0):
+    """Measure labeled particles.
+
+    :param labels: Labels, see `label`.
+    :type labels: numpy.ndarray
+    :param count: Number of labels.
+    :type count: int
+    :param image: Gray image for the mean intensity.
+    :type image: numpy.ndarray
+    :param pixel_size: Size of a pixel in the sample.
+    :type pixel_size: float
+
+    :return: Table of particles as columns, see `COLUMNS`.
+    :rtype: dict(str, numpy.ndarray)
+    """
+    flat = labels.ravel()
+    fg = np.flatnonzero(flat)
+    ids = flat[fg]
+    rows, cols = np.divmod(fg, labels.shape[1])
+    size = count + 1
+
+    area = np.bincount(ids, minlength=size)[1:].astype(np.float64)
+    nonzero = np.maximum(area, 1)
+    centroid_y = np.bincount(ids, weights=rows, minlength=size)[1:] / nonzero
+    centroid_x = np.bincount(ids, weights=cols, minlength=size)[1:] / nonzero
+    min_y = np.full(size, labels.shape[0], dtype=np.int64)
+    min_x = np.full(size, labels.shape[1], dtype=np.int64)
+    max_y = np.full(size, -1, dtype=np.int64)
+    max_x = np.full(size, -1, dtype=np.int64)
+    np.minimum.at(min_y, ids, rows)
+    np.minimum.at(min_x, ids, cols)
+    np.maximum.at(max_y, ids, rows)
+    np.maximum.at(max_x, ids, cols)
+    if image is None:
+        mean_intensity = np.full(count, np.nan)
+    else:
+        intensity = np.asarray(image).ravel()[fg].astype(np.float64)
+        mean_intensity = (
+            np.bincount(ids, weights=intensity, minlength=size)[1:] / nonzero
+        )
+
+    area *= pixel_size**2
+    return {
+        "label": np.arange(1, size),
+        "area": area,
+        "centroid_x": centroid_x * pixel_size,
+        "centroid_y": centroid_y * pixel_size,
+        "equivalent_diameter": np.sqrt(4 * area / np.pi),
+        "min_x": min_x[1:],
+        "min_y": min_y[1:],
+        "max_x": max_x[1:],
+        "max_y": max_y[1:],
+        "mean_intensity": mean_intensity,
+    }
+
+
+def otsu_threshold(image):
+    """Threshold that best separates foreground and background (Otsu).
+
+    :param image: Gray image.
+    :type image: numpy.ndarray
+
+    :return: Threshold, pixels above it are foreground.
+    :rtype: float
+    """
+    image = np.asarray(image)
+    if image.dtype == np.uint8:
+        hist = np.bincount(image.ravel(), minlength=256).astype(np.float64)
+        centers = np.arange(256, dtype=np.float64)
+    else:
+        hist, edges = np.histogram(image, bins=256)
+        hist = hist.astype(np.float64)
+        centers = (edges[:-1] + edges[1:]) / 2
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mean = np.cumsum(hist * centers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    variance[~np.isfinite(variance)] = 0
+    return float(centers[np.argmax(variance)])
+
+
+def write_table(output, table, suffix=None):
+    """Write a table as CSV or Parquet.
+
+    Parquet requires pyarrow (`pip install pyarrow`).
+
+    :param output: File name or binary file-like object.
+    :type output: Path, str, file-like
+    :param table: Table as columns.
+    :type table: dict(str, numpy.ndarray)
+    :param suffix: Format, ".csv" or ".parquet", defaults to the suffix of the
+        file name.
+    :type suffix: str
+
+    :raises ValueError: Unknown table format.
+    """
+    if suffix is None:
+        suffix = os.path.splitext(str(output))[1]
+    suffix = suffix.lower()
+    if suffix == ".csv":
+        text = io.StringIO(newline="")
+        writer = csv.writer(text)
+        writer.writerow(table.keys())
+        writer.writerows(zip(*(column.tolist() for column in table.values())))
+        data = text.getvalue().encode()
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, "wb") as fout:
+                fout.write(data)
+        else:
+            output.write(data)
+    elif suffix == ".parquet":
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(
+                "Writing Parquet requires pyarrow, install it with "
+                "`pip install pyarrow`."
+            )
+        pyarrow.parquet.write_table(pyarrow.table(table), output)
+    else:
+        raise ValueError(f"Unknown table format {suffix}, use one of {TABLE_SUFFIXES}.")
+
+
+# PRIVATE FUNCTIONS #
+
+
+def _border_pairs(before, after, connectivity):
+    """Pairs of labels that touch across a tile border."""
+    pairs = [(before, after)]
+    if connectivity == 8:
+        pairs += [(before[:-1], after[1:]), (before[1:], after[:-1])]
+    result = []
+    for a, b in pairs:
+        touch = (a > 0) & (b > 0)
+        result.append((a[touch], b[touch]))
+    return result
+
+
+def _gray(image):
+    """Gray version of an image, green channel for color images."""
+    image = np.asarray(image)
+    if image.ndim == 3:
+        image = image[..., 1 if image.shape[2] > 1 else 0]
+    return image
+
+
+def _label_tile(mask, connectivity):
+    """Label one tile, see `label`."""
+    height, width = mask.shape
+    fg = np.flatnonzero(mask)
+    index = np.full(mask.shape, -1, dtype=np.int64)
+    index.flat[fg] = np.arange(len(fg))
+
+    offsets = [(0, 1), (1, 0)]
+    if connectivity == 8:
+        offsets += [(1, 1), (1, -1)]
+    left = []
+    right = []
+    for dy, dx in offsets:
+        a = index[: height - dy, max(-dx, 0) : width - max(dx, 0)]
+        b = index[dy:, max(dx, 0) : width + min(dx, 0)]
+        touch = (a >= 0) & (b >= 0)
+        left.append(a[touch])
+        right.append(b[touch])
+
+    roots = _resolve(len(fg), np.concatenate(left), np.concatenate(right))
+    _, compact = np.unique(roots, return_inverse=True)
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    labels.flat[fg] = compact + 1
+    return labels, int(compact.max() + 1) if len(fg) else 0
+
+
+def _resolve(count, left, right):
+    """Find the connected components of a graph given by its edges.
+
+    Roots are hooked to the smaller root of each edge and all pointers are then
+    compressed, until no edge connects different roots.
+
+    :return: Smallest node of the component for every node.
+    :rtype: numpy.ndarray
+    """
+    parent = np.arange(count)
+    while True:
+        a = parent[left]
+        b = parent[right]
+        differ = a != b
+        if not differ.any():
+            return parent
+        np.minimum.at(parent, np.maximum(a, b)[differ], np.minimum(a, b)[differ])
+        while True:
+            grand = parent[parent]
+            if (grand == parent).all():
+                break
+            parent = grand
@@ -0,0 +1,291 @@
+"""Pipeline of frame processors that run next to the preview and capture paths.
+
+Processors are functions `processor(frame, timestamp)` that analyze a frame,
+e.g., a focus score or a histogram. Every processor runs in its own stage with
+a worker thread, optionally handing the work to a separate process, such that a
+slow processor only delays itself. Frames are handed to a stage at its target
+rate, and a drop policy decides what happens when the stage is busy:
+
+- "latest": Only the newest frame waits, older waiting frames are dropped.
+- "queue": Up to `queue_size` frames wait, new frames are dropped when full.
+- "block": Wait until the stage has room, every frame is processed but the
+  frame source is slowed down.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import time
+
+DROP_POLICIES = ("latest", "queue", "block")
+EXECUTORS = ("thread", "process")
+
+
+class Stage:
+    """One processor of the pipeline with its queue, worker, and statistics."""
+
+    def __init__(
+        self,
+        name,
+        processor,
+        rate=None,
+        executor="thread",
+        drop_policy="latest",
+        queue_size=1,
+        on_result=None,
+    ):
+        """Start the worker of the stage.
+
+        :param name: Name of the stage.
+        :type name: str
+        :param processor: Function called as `processor(frame, timestamp)`, it
+            must be picklable for the process executor.
+        :type processor: callable
+        :param rate: Maximum number of frames per s, defaults to every frame.
+        :type rate: float
+        :param executor: Run the processor in a "thread" or a "process".
+        :type executor: str
+        :param drop_policy: What to do with frames while busy, see module.
+        :type drop_policy: str
+        :param queue_size: Number of frames that can wait.
+        :type queue_size: int
+        :param on_result: Called with the result and timestamp of every frame.
+        :type on_result: callable
+
+        :raises ValueError: Invalid executor, drop policy, or queue size.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Executor must be one of {EXECUTORS}, not {executor}.")
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                f"Drop policy must be one of {DROP_POLICIES}, not {drop_policy}."
+            )
+        if queue_size < 1:
+            raise ValueError("The queue size must be at least 1.")
+
+        self.name = name
+        self.processor = processor
+        self.rate = rate
+        self.executor = executor
+        self.drop_policy = drop_policy
+        self.queue_size = 1 if drop_policy == "latest" else queue_size
+        self.on_result = on_result
+        self.result = None  # result of the last processed frame
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._next_time = 0
+        self._stop = False
+        self._busy = False
+        self._processed = 0
+        self._dropped = 0
+        self._skipped = 0
+        self._errors = 0
+        self._latency = 0.0  # sum over all processed frames
+        self._latency_max = 0.0
+        self._processing = 0.0
+
+        self._pool = (
+            ProcessPoolExecutor(max_workers=1) if executor == "process" else None
+        )
+        self._worker = threading.Thread(
+            target=self._work, name=f"Stage-{name}", daemon=True
+        )
+        self._worker.start()
+
+    # METHODS #
+
+    def close(self):
+        """Stop the stage, waiting frames are discarded."""
+        with self._cond:
+            self._stop = True
+            self._queue.clear()
+            self._cond.notify_all()
+        self._worker.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def stats(self):
+        """Get the statistics of the stage.
+
+        Latency is the time from handing the frame to the stage until the
+        processor returned, processing the time spent in the processor only.
+
+        :return: Processed, dropped, skipped (rate limit), and failed frames,
+            frames waiting, mean and maximum latency and mean processing time in s.
+        :rtype: dict
+        """
+        with self._cond:
+            processed = max(self._processed, 1)
+            return {
+                "processed": self._processed,
+                "dropped": self._dropped,
+                "skipped": self._skipped,
+                "errors": self._errors,
+                "waiting": len(self._queue),
+                "latency": self._latency / processed,
+                "latency_max": self._latency_max,
+                "processing": self._processing / processed,
+            }
+
+    def submit(self, frame, timestamp):
+        """Hand a frame to the stage according to its rate and drop policy.
+
+        :param frame: Frame, must not be modified afterwards.
+        :type frame: numpy.ndarray
+        :param timestamp: Timestamp of the frame.
+        :type timestamp: float
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self.rate:
+                if now < self._next_time:
+                    self._skipped += 1
+                    return
+                # keep the average rate, but never catch up by more than half a frame
+                interval = 1 / self.rate
+                self._next_time = max(self._next_time, now - interval / 2) + interval
+            if len(self._queue) >= self.queue_size:
+                if self.drop_policy == "latest":
+                    self._queue.popleft()
+                    self._dropped += 1
+                elif self.drop_policy == "queue":
+                    self._dropped += 1
+                    return
+                else:
+                    self._cond.wait_for(
+                        lambda: len(self._queue) < self.queue_size or self._stop
+                    )
+                    if self._stop:
+                        return
+            self._queue.append((frame, timestamp, now))
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait until all waiting frames are processed.
+
+        :param timeout: Maximum time to wait in s.
+        :type timeout: float
+
+        :return: True if the stage is idle, False if the timeout expired.
+        :rtype: bool
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and not self._busy, timeout=timeout
+            )
+
+    # PRIVATE FUNCTIONS #
+
+    def _work(self):
+        """Process waiting frames until the stage is closed."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stop)
+                if self._stop:
+                    return
+                frame, timestamp, submitted = self._queue.popleft()
+                self._busy = True
+                self._cond.notify_all()
+
+            start = time.monotonic()
+            try:
+                if self._pool is None:
+                    result = self.processor(frame, timestamp)
+                else:
+                    result = self._pool.submit(
+                        self.processor, frame, timestamp
+                    ).result()
+                if self.on_result is not None:
+                    self.on_result(result, timestamp)
+            except Exception as e:
+                print(f"Frame processor {self.name} failed: {e}")
+                result = None
+                failed = True
+            else:
+                failed = False
+            end = time.monotonic()
+
+            with self._cond:
+                if failed:
+                    self._errors += 1
+                else:
+                    self.result = result
+                    self._processed += 1
+                    self._latency += end - submitted
+                    self._latency_max = max(self._latency_max, end - submitted)
+                    self._processing += end - start
+                self._busy = False
+                self._cond.notify_all()
+
+
+class FramePipeline:
+    """Registry of processing stages, fed with frames by `submit`.
+
+    Use `submit` as frame listener of the microscope, see
+    `Microscope.register_processor`.
+    """
+
+    def __init__(self):
+        """Initialize an empty pipeline."""
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    # METHODS #
+
+    def close(self):
+        """Stop and remove all stages."""
+        for name in list(self.stages):
+            self.unregister(name)
+
+    def register(self, name, processor, **kwargs):
+        """Add a processor as a new stage, replaces a stage of the same name.
+
+        :param name: Name of the stage.
+        :type name: str
+        :param processor: Function called as `processor(frame, timestamp)`.
+        :type processor: callable
+        :param kwargs: Rate, executor, drop policy, etc., see `Stage`.
+
+        :return: The new stage.
+        :rtype: Stage
+        """
+        stage = Stage(name, processor, **kwargs)
+        with self._lock:
+            old = self.stages.get(name)
+            self.stages = {**self.stages, name: stage}
+        if old is not None:
+            old.close()
+        return stage
+
+    def stats(self):
+        """Get the statistics of all stages, see `Stage.stats`.
+
+        :return: Statistics by stage name.
+        :rtype: dict
+        """
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def submit(self, frame, timestamp):
+        """Hand a frame to all stages.
+
+        :param frame: Frame, must not be modified afterwards.
+        :type frame: numpy.ndarray
+        :param timestamp: Timestamp of the frame.
+        :type timestamp: float
+        """
+        for stage in self.stages.values():
+            stage.submit(frame, timestamp)
+
+    def unregister(self, name):
+        """Stop and remove a stage.
+
+        :param name: Name of the stage.
+        :type name: str
+        """
+        with self._lock:
+            stages = dict(self.stages)
+            stage = stages.pop(name, None)
+            self.stages = stages
+        if stage is not None:
+            stage.close()
@@ -0,0 +1,241 @@
+"""Raw, unencoded video recordings in a memory-mappable container.
+
+The container starts with a header of `HEADER_SIZE` bytes: a magic string, the
+length of a JSON description (shape, dtype, fps, format, resolution), and the
+description itself. It is followed by records of fixed stride, each holding the
+timestamp of the frame and the frame itself, aligned to 64 bytes. A reader can
+thus memory-map the file and expose all frames as one NumPy array without any
+copies or decoding.
+"""
+
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"RPYRAW1\0"
+HEADER_SIZE = 4096
+RAW_FORMATS = ("yuv", "rgb", "rgba", "bgr", "bgra")
+
+_ALIGN = 64
+
+
+def raw_frame_shape(resolution, format):
+    """Shape of a raw frame as the camera writes it.
+
+    The camera pads the width to a multiple of 32 and the height to a multiple
+    of 16. YUV frames are stored in I420 layout as (1.5 * height, width).
+
+    :param resolution: Resolution (width, height).
+    :type resolution: tuple(int, int)
+    :param format: Raw format, see `RAW_FORMATS`.
+    :type format: str
+
+    :return: Shape of a frame.
+    :rtype: tuple
+
+    :raises ValueError: Not a raw format.
+    """
+    width = (resolution[0] + 31) // 32 * 32
+    height = (resolution[1] + 15) // 16 * 16
+    if format == "yuv":
+        return height * 3 // 2, width
+    elif format in ("rgb", "bgr"):
+        return height, width, 3
+    elif format in ("rgba", "bgra"):
+        return height, width, 4
+    raise ValueError(f"{format} is not a raw format, use one of {RAW_FORMATS}.")
+
+
+def record_dtype(shape, dtype="uint8"):
+    """Data type of one record: timestamp and frame, aligned to 64 bytes.
+
+    :param shape: Shape of a frame.
+    :type shape: tuple
+    :param dtype: Data type of a frame.
+    :type dtype: str, numpy.dtype
+
+    :return: Structured data type with the fields "timestamp" and "frame".
+    :rtype: numpy.dtype
+    """
+    frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return np.dtype(
+        {
+            "names": ["timestamp", "frame"],
+            "formats": ["<f8", (np.dtype(dtype), tuple(shape))],
+            "offsets": [0, _ALIGN],
+            "itemsize": _ALIGN + (frame_bytes + _ALIGN - 1) // _ALIGN * _ALIGN,
+        }
+    )
+
+
+class RawVideoWriter:
+    """File-like object that writes raw frames into the container.
+
+    Pass it as output to `start_recording` of a camera in a raw format. Data is
+    collected until a frame is complete, which is then written as one record
+    with the timestamp from `clock`.
+    """
+
+    def __init__(self, output, resolution, format, fps, clock=None):
+        """Write the header and prepare for frames.
+
+        :param output: File name or writable file-like object.
+        :type output: Path, str, file-like
+        :param resolution: Resolution (width, height) of the recording.
+        :type resolution: tuple(int, int)
+        :param format: Raw format, see `RAW_FORMATS`.
+        :type format: str
+        :param fps: Framerate of the recording.
+        :type fps: float
+        :param clock: Returns the timestamp of the current frame in seconds,
+            defaults to `time.monotonic`.
+        :type clock: callable
+        """
+        self.shape = raw_frame_shape(resolution, format)
+        self.dtype = record_dtype(self.shape)
+        self.frame_bytes = int(np.prod(self.shape))
+        self.clock = time.monotonic if clock is None else clock
+        self.frames = 0
+        self.closed = False
+
+        if isinstance(output, (str, os.PathLike)):
+            self._output = open(output, "wb")
+            self._owns_output = True
+        else:
+            self._output = output
+            self._owns_output = False
+
+        description = json.dumps(
+            {
+                "shape": list(self.shape),
+                "dtype": "|u1",
+                "fps": float(fps),
+                "format": format,
+                "resolution": list(resolution),
+                "record_size": self.dtype.itemsize,
+            }
+        ).encode()
+        header = MAGIC + struct.pack("<I", len(description)) + description
+        if len(header) > HEADER_SIZE:
+            raise ValueError("Header of the raw video is too large.")
+        self._output.write(header.ljust(HEADER_SIZE, b"\0"))
+
+        self._padding = bytes(self.dtype.itemsize - _ALIGN - self.frame_bytes)
+        self._buffer = bytearray()
+
+    def close(self):
+        """Close the writer, an incomplete last frame is dropped."""
+        if self.closed:
+            return
+        self.closed = True
+        self._buffer = bytearray()
+        if self._owns_output:
+            self._output.close()
+        else:
+            self._output.flush()
+
+    def flush(self):
+        """Flush the underlying output."""
+        self._output.flush()
+
+    def write(self, data):
+        """Write raw frame data, complete frames are written as records.
+
+        :param data: Raw data from the camera.
+        :type data: bytes
+
+        :return: Number of bytes consumed.
+        :rtype: int
+        """
+        if not self._buffer and len(data) == self.frame_bytes:
+            self._write_frame(data)  # the camera usually writes whole frames
+            return len(data)
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.frame_bytes:
+            self._write_frame(bytes(self._buffer[: self.frame_bytes]))
+            del self._buffer[: self.frame_bytes]
+        return len(data)
+
+    def _write_frame(self, frame):
+        """Write one record."""
+        timestamp = struct.pack("<d", self.clock()).ljust(_ALIGN, b"\0")
+        self._output.write(timestamp + frame + self._padding)
+        self.frames += 1
+
+
+class RawVideoReader:
+    """Memory-map a raw video container and expose its frames as NumPy arrays.
+
+    `frames` is a read-only array of shape (n_frames, *frame_shape) and
+    `timestamps` one of shape (n_frames,), both are views into the file. A
+    recording that is still being written can be opened, frames written later
+    are visible after opening it again.
+    """
+
+    def __init__(self, fname):
+        """Open a container.
+
+        :param fname: File name.
+        :type fname: Path, str
+
+        :raises ValueError: Not a raw video container.
+        """
+        with open(fname, "rb") as fin:
+            header = fin.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            raise ValueError(f"{fname} is not a raw video container.")
+        (length,) = struct.unpack("<I", header[len(MAGIC) : len(MAGIC) + 4])
+        start = len(MAGIC) + 4
+        self.description = json.loads(header[start : start + length])
+
+        self.fps = self.description["fps"]
+        self.format = self.description["format"]
+        self.resolution = tuple(self.description["resolution"])
+        self.shape = tuple(self.description["shape"])
+        self.dtype = record_dtype(self.shape, self.description["dtype"])
+
+        n_frames = (os.path.getsize(fname) - HEADER_SIZE) // self.dtype.itemsize
+        if n_frames > 0:
+            self._records = np.memmap(
+                fname, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(n_frames,)
+            )
+        else:
+            self._records = np.zeros(0, dtype=self.dtype)
+
+    def __getitem__(self, index):
+        """Get frames by index, a view into the file."""
+        return self.frames[index]
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def frames(self):
+        """Get all frames, padded as recorded by the camera.
+
+        :return: Frames with shape (n_frames, *frame_shape)
+        :rtype: numpy.ndarray
+        """
+        return self._records["frame"]
+
+    @property
+    def images(self):
+        """Get all frames cropped to the resolution (Y plane for YUV).
+
+        :return: Frames with shape (n_frames, height, width[, channels])
+        :rtype: numpy.ndarray
+        """
+        width, height = self.resolution
+        return self.frames[:, :height, :width]
+
+    @property
+    def timestamps(self):
+        """Get the timestamps of all frames in seconds.
+
+        :return: Timestamps with shape (n_frames,)
+        :rtype: numpy.ndarray
+        """
+        return self._records["timestamp"]
@@ -0,0 +1,230 @@
+"""Drift correction for time series by FFT phase correlation.
+
+The translation of every frame is estimated on a downsampled region of interest
+(ROI) against a key frame, whose spectrum is computed only once. Once the drift
+relative to the key frame grows large, the current frame becomes the new key
+frame, such that the overlap stays large even over long series. Frames are
+corrected as they arrive, e.g., while a time-lapse is captured::
+
+    series = scope.open_series("timelapse.zarr", align=True)
+    scope.capture_to(series)  # aligned frame, offset stored in the metadata
+"""
+
+import numpy as np
+
+
+def phase_correlation(reference, frame, window=None):
+    """Estimate the translation of a frame relative to a reference.
+
+    :param reference: Reference image, gray.
+    :type reference: numpy.ndarray
+    :param frame: Image of the same shape as the reference.
+    :type frame: numpy.ndarray
+    :param window: Window applied to both images, defaults to a Hann window.
+    :type window: numpy.ndarray
+
+    :return: Translation (dy, dx) in pixels with subpixel precision, the frame
+        shows the reference moved by it.
+    :rtype: tuple(float, float)
+    """
+    if window is None:
+        window = hann_window(reference.shape)
+    spectrum = np.fft.rfft2(np.asarray(reference, dtype=np.float32) * window)
+    return _correlate(np.conj(spectrum), frame, window)
+
+
+def hann_window(shape):
+    """2D Hann window, reduces the influence of the image borders.
+
+    :param shape: Shape (height, width).
+    :type shape: tuple(int, int)
+
+    :return: Window
+    :rtype: numpy.ndarray
+    """
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1])).astype(np.float32)
+
+
+def shift_frame(frame, dy, dx, fill=0):
+    """Shift a frame by whole pixels, uncovered areas are filled.
+
+    :param frame: Frame to shift.
+    :type frame: numpy.ndarray
+    :param dy: Shift in y, rounded to whole pixels.
+    :type dy: float
+    :param dx: Shift in x, rounded to whole pixels.
+    :type dx: float
+    :param fill: Value of uncovered pixels.
+    :type fill: int, float
+
+    :return: Shifted frame.
+    :rtype: numpy.ndarray
+    """
+    dy, dx = int(round(dy)), int(round(dx))
+    height, width = frame.shape[:2]
+    result = np.full_like(frame, fill)
+    if abs(dy) >= height or abs(dx) >= width:
+        return result
+    result[max(dy, 0) : height + min(dy, 0), max(dx, 0) : width + min(dx, 0)] = frame[
+        max(-dy, 0) : height + min(-dy, 0), max(-dx, 0) : width + min(-dx, 0)
+    ]
+    return result
+
+
+class DriftCorrector:
+    """Estimate and correct the drift of frames relative to the first frame."""
+
+    def __init__(self, roi=None, downsample=None, rekey=0.125):
+        """Initialize without a reference, the first frame becomes it.
+
+        :param roi: Region (y, x, height, width) to estimate the drift on,
+            defaults to the central quarter of the frame.
+        :type roi: tuple(int, int, int, int)
+        :param downsample: Factor by which the ROI is downsampled, defaults to
+            a factor that leaves about 256 pixels along the shorter side.
+        :type downsample: int
+        :param rekey: Use the current frame as new key frame once the drift
+            relative to the key frame exceeds this fraction of the ROI size.
+        :type rekey: float
+        """
+        self.roi = roi
+        self.downsample = downsample
+        self.rekey = rekey
+        self.offsets = []  # (dy, dx) of every frame
+
+        self._key_spectrum = None  # conjugated spectrum of the key frame
+        self._key_offset = (0.0, 0.0)
+        self._window = None
+
+    def align(self, frame):
+        """Estimate the drift of a frame and shift it back.
+
+        :param frame: Frame, gray or color.
+        :type frame: numpy.ndarray
+
+        :return: Aligned frame, drift (dy, dx).
+        :rtype: tuple(numpy.ndarray, tuple(float, float))
+        """
+        dy, dx = self.update(frame)
+        return shift_frame(frame, -dy, -dx), (dy, dx)
+
+    def update(self, frame):
+        """Estimate the drift of a frame relative to the first frame.
+
+        :param frame: Frame, gray or color.
+        :type frame: numpy.ndarray
+
+        :return: Drift (dy, dx) in pixels of the full frame.
+        :rtype: tuple(float, float)
+        """
+        small = self._prepare(frame)
+        if self._key_spectrum is None:
+            self._window = hann_window(small.shape)
+            self._set_key(small, (0.0, 0.0))
+            self.offsets.append((0.0, 0.0))
+            return 0.0, 0.0
+
+        dy, dx = _correlate(self._key_spectrum, small, self._window)
+        offset = (
+            self._key_offset[0] + dy * self.downsample,
+            self._key_offset[1] + dx * self.downsample,
+        )
+        if max(abs(dy) / small.shape[0], abs(dx) / small.shape[1]) > self.rekey:
+            self._set_key(small, offset)
+        self.offsets.append(offset)
+        return offset
+
+    # PRIVATE FUNCTIONS #
+
+    def _prepare(self, frame):
+        """Gray, downsampled ROI of a frame as float32."""
+        frame = np.asarray(frame)
+        if frame.ndim == 3:
+            frame = frame[..., 1 if frame.shape[2] > 1 else 0]
+        height, width = frame.shape
+        if self.roi is None:
+            self.roi = (height // 4, width // 4, height // 2, width // 2)
+        y, x, roi_height, roi_width = self.roi
+        if self.downsample is None:
+            self.downsample = max(min(roi_height, roi_width) // 256, 1)
+        f = self.downsample
+        roi_height, roi_width = roi_height // f * f, roi_width // f * f
+        region = frame[y : y + roi_height, x : x + roi_width].astype(np.float32)
+        return region.reshape(roi_height // f, f, roi_width // f, f).mean(axis=(1, 3))
+
+    def _set_key(self, small, offset):
+        """Use a prepared frame as key frame."""
+        self._key_spectrum = np.conj(np.fft.rfft2(small * self._window))
+        self._key_offset = offset
+
+
+class AlignedWriter:
+    """Drift-correct frames before writing them to a `ChunkedArrayWriter`.
+
+    The drift of every frame is stored with its metadata in `attrs["frames"]` as
+    "drift_y" and "drift_x", such that the raw positions can be recovered.
+    """
+
+    def __init__(self, writer, corrector=None):
+        """Wrap a writer.
+
+        :param writer: Writer of the series.
+        :type writer: rpyscope.chunked.ChunkedArrayWriter
+        :param corrector: Drift corrector, defaults to `DriftCorrector()`.
+        :type corrector: DriftCorrector
+        """
+        self.writer = writer
+        self.corrector = DriftCorrector() if corrector is None else corrector
+        self.attrs = writer.attrs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, frame, **metadata):
+        """Align a frame and append it, see `ChunkedArrayWriter.append`."""
+        frame = self._align(frame, metadata)
+        return self.writer.append(frame, **metadata)
+
+    def close(self):
+        """Close the writer."""
+        self.writer.close()
+
+    def flush(self):
+        """Write the metadata."""
+        self.writer.flush()
+
+    def write(self, frame, t=0, z=0, y=0, x=0, **metadata):
+        """Align a frame and write it, see `ChunkedArrayWriter.write`."""
+        frame = self._align(frame, metadata)
+        self.writer.write(frame, t=t, z=z, y=y, x=x, **metadata)
+
+    def _align(self, frame, metadata):
+        """Align a frame and add its drift to the metadata."""
+        frame, (dy, dx) = self.corrector.align(frame)
+        metadata.update(drift_y=dy, drift_x=dx)
+        return frame
+
+
+def _correlate(key_spectrum, frame, window):
+    """Phase correlation against a conjugated reference spectrum."""
+    spectrum = np.fft.rfft2(np.asarray(frame, dtype=np.float32) * window)
+    cross = spectrum * key_spectrum
+    cross /= np.abs(cross) + 1e-12
+    corr = np.fft.irfft2(cross, s=frame.shape)
+    peak = np.unravel_index(np.argmax(corr), corr.shape)
+
+    shift = []
+    for axis, (index, size) in enumerate(zip(peak, corr.shape)):
+        before = list(peak)
+        after = list(peak)
+        before[axis] = (index - 1) % size
+        after[axis] = (index + 1) % size
+        lo, mid, hi = corr[tuple(before)], corr[peak], corr[tuple(after)]
+        denominator = lo - 2 * mid + hi
+        sub = 0.5 * (lo - hi) / denominator if denominator < 0 else 0.0
+        value = index + sub
+        shift.append(float(value - size if value > size / 2 else value))
+    return tuple(shift)
@@ -0,0 +1,270 @@
+"""Plan and run scans of many positions with a motorized stage.
+
+Mosaics and multi-well surveys visit many stage positions. The order of the
+positions is optimized to reduce travel: `serpentine` for grids, which
+scans every other row backwards, and `nearest_neighbour` for scattered
+positions, e.g., wells. While the stage moves to the next position, the
+previous tile is compressed and written in the background, such that a tile
+costs about as much as the slower of moving and writing, not their sum::
+
+    from rpyscope import scanning
+    from rpyscope.stages.simulation import SimStage
+
+    scope.stage = SimStage()
+    positions = scanning.grid((0, 0), (5, 4), (1000, 750))
+    result = scope.scan_mosaic("mosaic.zarr", positions, pixel_size=1.0)
+    result["tiles_per_minute"]
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import numpy as np
+
+ORDERS = ("given", "nearest", "serpentine")
+
+
+def grid(origin, shape, step):
+    """Positions of a regular grid, row by row.
+
+    :param origin: Position (x, y) of the first tile in µm.
+    :type origin: tuple(float, float)
+    :param shape: Number of tiles (columns, rows).
+    :type shape: tuple(int, int)
+    :param step: Distance between tiles (x, y) in µm, e.g., the field of view
+        minus the overlap.
+    :type step: tuple(float, float)
+
+    :return: Positions (x, y)
+    :rtype: list(tuple(float, float))
+    """
+    return [
+        (origin[0] + col * step[0], origin[1] + row * step[1])
+        for row in range(shape[1])
+        for col in range(shape[0])
+    ]
+
+
+def nearest_neighbour(positions, start=None, cost=None):
+    """Order positions by always going to the closest one that is left.
+
+    :param positions: Positions (x, y) or (x, y, z) in µm.
+    :type positions: list(tuple)
+    :param start: Position to start from, defaults to the first position.
+    :type start: tuple
+    :param cost: Function `cost(a, b)` of a move, defaults to the largest
+        distance along one axis, as the axes move at the same time.
+    :type cost: callable
+
+    :return: Ordered positions.
+    :rtype: list(tuple)
+    """
+    left = list(positions)
+    if not left:
+        return []
+    current = left.pop(0) if start is None else start
+    ordered = [current] if start is None else []
+    while left:
+        if cost is None:
+            remaining = np.array(left, dtype=float)
+            here = np.array(current, dtype=float)[: remaining.shape[1]]
+            distances = np.abs(remaining - here).max(axis=1)
+        else:
+            distances = [cost(current, position) for position in left]
+        current = left.pop(int(np.argmin(distances)))
+        ordered.append(current)
+    return ordered
+
+
+def path_cost(positions, start=None, cost=None):
+    """Total cost of visiting positions in order.
+
+    :param positions: Positions in the order they are visited.
+    :type positions: list(tuple)
+    :param start: Position before the first one, if any.
+    :type start: tuple
+    :param cost: Function `cost(a, b)` of a move, see `nearest_neighbour`.
+    :type cost: callable
+
+    :return: Sum of the cost of all moves.
+    :rtype: float
+    """
+    cost = cost or _chebyshev
+    path = list(positions) if start is None else [start] + list(positions)
+    return sum(cost(a, b) for a, b in zip(path, path[1:]))
+
+
+def plan(positions, order="serpentine", start=None, cost=None):
+    """Order positions to reduce travel.
+
+    :param positions: Positions (x, y) or (x, y, z) in µm.
+    :type positions: list(tuple)
+    :param order: "serpentine" for grids, "nearest" for scattered positions,
+        or "given" to keep the order.
+    :type order: str
+    :param start: Current position of the stage, used by "nearest".
+    :type start: tuple
+    :param cost: Function `cost(a, b)` of a move, e.g., `stage.travel_time`.
+    :type cost: callable
+
+    :return: Ordered positions.
+    :rtype: list(tuple)
+
+    :raises ValueError: Unknown order.
+    """
+    if order == "serpentine":
+        return serpentine(positions)
+    if order == "nearest":
+        return nearest_neighbour(positions, start=start, cost=cost)
+    if order == "given":
+        return list(positions)
+    raise ValueError(f"Unknown order {order}, must be one of {ORDERS}.")
+
+
+def pipelined(scope, stage, positions, move, on_frame, depth=1, timeout=60.0):
+    """Capture a frame at every position, handle it while the stage moves on.
+
+    As soon as a frame is captured, the stage starts moving to the next
+    position and the frame is handed to `on_frame` in a background thread. At
+    most `depth` frames wait to be handled, such that frames do not pile up if
+    handling is slower than moving. Scans and z-stacks are built on this.
+
+    :param scope: Microscope to capture with.
+    :type scope: rpyscope.microscope.Microscope
+    :param stage: Stage that is moved.
+    :type stage: rpyscope.stages.abstract_stage.AbsStage
+    :param positions: Positions in the order they are visited.
+    :type positions: list
+    :param move: Function `move(position)` that starts a move without waiting.
+    :type move: callable
+    :param on_frame: Function called as `on_frame(frame, position, timestamp)`
+        with the time of the capture, e.g., to write the frame.
+    :type on_frame: callable
+    :param depth: Number of frames that may wait to be handled.
+    :type depth: int
+    :param timeout: Maximum time in s for the stage to settle at a position.
+    :type timeout: float
+
+    :return: Time in s spent waiting for the stage ("move_wait"), capturing
+        ("capture"), waiting for frames to be handled ("handle_wait"), and
+        handling them in the background ("handling"). Handling overlapped
+        with moving and capturing, except for the "handle_wait".
+    :rtype: dict
+    """
+    timings = {"move_wait": 0.0, "capture": 0.0, "handle_wait": 0.0, "handling": 0.0}
+
+    def handle(frame, position, timestamp):
+        """Handle a frame in the worker thread and time it."""
+        start = time.monotonic()
+        try:
+            on_frame(frame, position, timestamp)
+        finally:
+            timings["handling"] += time.monotonic() - start
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rpyscope-scan") as ex:
+        if positions:
+            move(positions[0])
+        for index, position in enumerate(positions):
+            t0 = time.monotonic()
+            stage.wait(timeout)
+            t1 = time.monotonic()
+            frame = scope.capture_frame()
+            timestamp = time.time()
+            t2 = time.monotonic()
+            if index + 1 < len(positions):
+                move(positions[index + 1])
+            while len(pending) >= depth:
+                pending.popleft().result()
+            t3 = time.monotonic()
+            pending.append(ex.submit(handle, frame, position, timestamp))
+            timings["move_wait"] += t1 - t0
+            timings["capture"] += t2 - t1
+            timings["handle_wait"] += t3 - t2
+        t0 = time.monotonic()
+        while pending:
+            pending.popleft().result()
+        timings["handle_wait"] += time.monotonic() - t0
+    return timings
+
+
+def scan(scope, stage, positions, on_tile, order="serpentine", timeout=60.0):
+    """Visit positions with the stage and capture a frame at each one.
+
+    The frame is handed to `on_tile` in a background thread while the stage
+    moves on to the next position, see `pipelined`. At most one tile is
+    handled at a time.
+
+    :param scope: Microscope to capture with.
+    :type scope: rpyscope.microscope.Microscope
+    :param stage: Stage to move.
+    :type stage: rpyscope.stages.abstract_stage.AbsStage
+    :param positions: Positions (x, y) or (x, y, z) in µm.
+    :type positions: list(tuple)
+    :param on_tile: Function called as `on_tile(frame, position, timestamp)`
+        with the time of the capture, e.g., to write the tile.
+    :type on_tile: callable
+    :param order: Order of the positions, see `plan`.
+    :type order: str
+    :param timeout: Maximum time in s for the stage to settle at a position.
+    :type timeout: float
+
+    :return: Number of "tiles", "duration" in s, "tiles_per_minute", the
+        estimated "travel_time" of the planned path, and the time in s spent
+        waiting for the stage ("move_wait"), capturing ("capture"), waiting
+        for the previous tile to be handled ("tile_wait"), and handling tiles
+        in the background ("tile_time").
+    :rtype: dict
+    """
+    initial = stage.position
+    ordered = plan(positions, order=order, start=initial, cost=stage.travel_time)
+    start = time.monotonic()
+    timings = pipelined(
+        scope,
+        stage,
+        ordered,
+        lambda position: stage.move_to(*position, wait=False),
+        on_tile,
+        timeout=timeout,
+    )
+    duration = time.monotonic() - start
+    return {
+        "tiles": len(ordered),
+        "duration": duration,
+        "tiles_per_minute": len(ordered) / duration * 60 if duration else 0.0,
+        "travel_time": path_cost(ordered, start=initial, cost=stage.travel_time),
+        "move_wait": timings["move_wait"],
+        "capture": timings["capture"],
+        "tile_wait": timings["handle_wait"],
+        "tile_time": timings["handling"],
+    }
+
+
+def serpentine(positions, tolerance=1.0):
+    """Order positions row by row, every other row backwards.
+
+    :param positions: Positions (x, y) or (x, y, z) in µm.
+    :type positions: list(tuple)
+    :param tolerance: Positions whose y differs less than this are in the
+        same row, in µm.
+    :type tolerance: float
+
+    :return: Ordered positions.
+    :rtype: list(tuple)
+    """
+    rows = []
+    for position in sorted(positions, key=lambda position: position[1]):
+        if rows and position[1] - rows[-1][0][1] < tolerance:
+            rows[-1].append(position)
+        else:
+            rows.append([position])
+    ordered = []
+    for index, row in enumerate(rows):
+        ordered.extend(sorted(row, key=lambda position: position[0], reverse=index % 2))
+    return ordered
+
+
+def _chebyshev(a, b):
+    """Largest distance along one axis, the axes of a stage move together."""
+    return max(abs(q - p) for p, q in zip(a, b))
@@ -0,0 +1,392 @@
+"""Acquisition sequences: scripts that run captures unattended.
+
+Sequences are small Python scripts in `~/.config/RPyConf/sequences`, e.g.,
+`exposure_series.py`::
+
+    for shutter in (1000, 2000, 4000):
+        set(shutter_speed=shutter)
+        wait(0.5)
+        capture(f"exposure_{shutter}")
+
+A script is checked and compiled once when it is loaded. Only a small subset
+of Python is allowed, see `ALLOWED_NODES`: no imports, no function
+definitions, no `while` loops, and no names or attributes that start with an
+underscore. Scripts run in a worker thread directly against the microscope.
+Every command is a step, which is timed and reported while the sequence runs.
+
+Commands:
+
+- `capture(name=None, format=None, sample_id=None)`: Capture an image into
+  `home_folder`, named `name` or after the number of the step.
+- `wait(seconds)`: Wait, e.g., for the stage or the sample to settle.
+- `set(**values)`: Set microscope properties, e.g., `image_format`, or camera
+  attributes, e.g., `iso`.
+- `log(message)`: Add a message to the report.
+
+The microscope and the camera are available as `scope` and `cam`.
+
+The startup script `~/.config/RPyConf/init.py` is run the same way when the
+camera is opened, e.g., to apply settings.
+"""
+
+import ast
+import builtins
+from pathlib import Path
+import sys
+import threading
+import time
+
+ALLOWED_NODES = (
+    ast.Module,
+    ast.Expr,
+    ast.Assign,
+    ast.AugAssign,
+    ast.For,
+    ast.If,
+    ast.Break,
+    ast.Continue,
+    ast.Pass,
+    ast.Call,
+    ast.keyword,
+    ast.Name,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Slice,
+    ast.Constant,
+    ast.Tuple,
+    ast.List,
+    ast.Dict,
+    ast.ListComp,
+    ast.comprehension,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.JoinedStr,
+    ast.FormattedValue,
+    ast.expr_context,
+    ast.operator,
+    ast.unaryop,
+    ast.boolop,
+    ast.cmpop,
+)
+BUILTINS = (
+    "abs",
+    "enumerate",
+    "float",
+    "int",
+    "len",
+    "list",
+    "max",
+    "min",
+    "print",
+    "range",
+    "round",
+    "str",
+    "zip",
+)
+
+
+def check(source, name="<sequence>"):
+    """Parse a script and check that it only uses the allowed subset of Python.
+
+    :param source: Script.
+    :type source: str
+    :param name: Name of the script for error messages.
+    :type name: str
+
+    :return: Syntax tree of the script.
+    :rtype: ast.Module
+
+    :raises ValueError: The script is invalid or uses something not allowed.
+    """
+    try:
+        tree = ast.parse(source, filename=name)
+    except SyntaxError as e:
+        raise ValueError(f"{name}, line {e.lineno}: {e.msg}") from e
+    for node in ast.walk(tree):
+        line = getattr(node, "lineno", None)
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(
+                f"{name}, line {line}: {type(node).__name__} is not allowed."
+            )
+        identifier = getattr(node, "id", None) or getattr(node, "attr", None)
+        if identifier is not None and identifier.startswith("_"):
+            raise ValueError(f"{name}, line {line}: {identifier} is not allowed.")
+    return tree
+
+
+class Sequence:
+    """Checked and compiled acquisition script."""
+
+    def __init__(self, source, name="<sequence>"):
+        """Check and compile a script.
+
+        :param source: Script.
+        :type source: str
+        :param name: Name of the sequence, e.g., its file name without suffix.
+        :type name: str
+
+        :raises ValueError: The script is invalid, see `check`.
+        """
+        self.name = name
+        self.source = source
+        self.filename = f"<sequence {name}>"  # identifies the script in stacks
+        self.code = compile(check(source, name), self.filename, "exec")
+
+    @classmethod
+    def load(cls, fname):
+        """Load a script from a file.
+
+        :param fname: File name of the script.
+        :type fname: Path, str
+
+        :return: Sequence named after the file.
+        :rtype: Sequence
+
+        :raises ValueError: The script is invalid, see `check`.
+        """
+        fname = Path(fname)
+        return cls(fname.read_text(), name=fname.stem)
+
+    def start(self, scope, on_progress=None):
+        """Run the sequence in a worker thread.
+
+        :param scope: Microscope to run against.
+        :type scope: rpyscope.microscope.Microscope
+        :param on_progress: Function called from the worker thread with every
+            finished step, see `SequenceRun.steps`.
+        :type on_progress: callable
+
+        :return: Running sequence.
+        :rtype: SequenceRun
+        """
+        run = SequenceRun(self, scope, on_progress=on_progress)
+        run.start()
+        return run
+
+
+class SequenceLibrary:
+    """Sequences in a folder, every script is compiled once until it changes."""
+
+    def __init__(self, folder):
+        """Initialize, scripts are loaded when requested.
+
+        :param folder: Folder with the scripts, "*.py".
+        :type folder: Path, str
+        """
+        self.folder = Path(folder)
+        self._compiled = {}  # name -> (modification time, sequence)
+
+    def get(self, name):
+        """Get a sequence.
+
+        :param name: Name of the sequence, i.e., the file name without suffix.
+        :type name: str
+
+        :return: Sequence
+        :rtype: Sequence
+
+        :raises ValueError: Unknown sequence or invalid script.
+        """
+        fname = self.folder.joinpath(f"{name}.py")
+        try:
+            mtime = fname.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise ValueError(f"Unknown sequence {name}.") from None
+        cached = self._compiled.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, Sequence.load(fname))
+            self._compiled[name] = cached
+        return cached[1]
+
+    def names(self):
+        """Names of the available sequences.
+
+        :return: Sorted names.
+        :rtype: list(str)
+        """
+        if not self.folder.is_dir():
+            return []
+        return sorted(fname.stem for fname in self.folder.glob("*.py"))
+
+
+class SequenceRun:
+    """A sequence running in a worker thread, with the timing of every step."""
+
+    def __init__(self, sequence, scope, on_progress=None):
+        """Initialize, the sequence runs with `start`.
+
+        :param sequence: Sequence to run.
+        :type sequence: Sequence
+        :param scope: Microscope to run against.
+        :type scope: rpyscope.microscope.Microscope
+        :param on_progress: Function called with every finished step.
+        :type on_progress: callable
+        """
+        self.sequence = sequence
+        self.scope = scope
+        self.on_progress = on_progress
+        self.steps = []  # dicts with index, command, line, start and duration in s
+        self.messages = []
+        self.error = None
+        self.cancelled = False
+        self.duration = None
+
+        self._start = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    # PROPERTIES #
+
+    @property
+    def done(self):
+        """Has the sequence finished, failed, or been cancelled?
+
+        :rtype: bool
+        """
+        return self._thread is not None and not self._thread.is_alive()
+
+    # METHODS #
+
+    def cancel(self):
+        """Stop the sequence before its next command."""
+        self._cancel.set()
+
+    def report(self):
+        """Steps with their timing.
+
+        :return: Table with one row per step and the outcome.
+        :rtype: str
+        """
+        lines = [f"Sequence {self.sequence.name}"]
+        lines.append(f"{'step':>5}{'line':>6}  {'command':<10}{'start s':>9}{'ms':>9}")
+        for step in self.steps:
+            lines.append(
+                f"{step['index']:>5}{step['line'] or '':>6}  {step['command']:<10}"
+                f"{step['start']:9.3f}{step['duration'] * 1e3:9.1f}"
+            )
+        lines.extend(self.messages)
+        if self.error is not None:
+            lines.append(f"Failed: {self.error}")
+        elif self.cancelled:
+            lines.append("Cancelled")
+        if self.duration is not None:
+            lines.append(f"Total {self.duration:.3f} s for {len(self.steps)} steps")
+        return "\n".join(lines)
+
+    def start(self):
+        """Start the worker thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"rpyscope-sequence-{self.sequence.name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Wait for the sequence to finish.
+
+        :param timeout: Maximum time to wait in s, forever if None.
+        :type timeout: float
+
+        :return: Has the sequence finished?
+        :rtype: bool
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    # PRIVATE FUNCTIONS #
+
+    def _capture(self, name=None, format=None, sample_id=None):
+        """Capture an image into the home folder."""
+        format = format or self.scope.image_format
+        name = name or f"{self.sequence.name}_{len(self.steps):04d}"
+        fname = Path(self.scope.home_folder).joinpath(f"{name}.{format}")
+        self.scope.capture_image(fname, format=format, sample_id=sample_id)
+        return fname
+
+    def _command(self, name, func):
+        """Wrap a command such that it can be cancelled and is timed as a step."""
+
+        def command(*args, **kwargs):
+            if self._cancel.is_set():
+                raise _Cancelled
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            step = {
+                "index": len(self.steps),
+                "command": name,
+                "line": _script_line(self.sequence.filename),
+                "start": start - self._start,
+                "duration": time.monotonic() - start,
+            }
+            self.steps.append(step)
+            if self.on_progress is not None:
+                self.on_progress(step)
+            return result
+
+        return command
+
+    def _log(self, message):
+        """Add a message to the report."""
+        self.messages.append(str(message))
+
+    def _run(self):
+        """Worker thread, runs the compiled script."""
+        namespace = {
+            "__builtins__": {name: getattr(builtins, name) for name in BUILTINS},
+            "scope": self.scope,
+            "cam": self.scope.cam,
+            "capture": self._command("capture", self._capture),
+            "log": self._command("log", self._log),
+            "set": self._command("set", self._set),
+            "wait": self._command("wait", self._wait),
+        }
+        self._start = time.monotonic()
+        try:
+            exec(self.sequence.code, namespace)
+        except _Cancelled:
+            self.cancelled = True
+        except Exception as e:  # reported, the microscope keeps running
+            line = _script_line(self.sequence.filename, e.__traceback__)
+            self.error = f"line {line}: {type(e).__name__}: {e}"
+        self.duration = time.monotonic() - self._start
+
+    def _set(self, **values):
+        """Set microscope properties or camera attributes."""
+        for key, value in values.items():
+            if isinstance(getattr(type(self.scope), key, None), property):
+                setattr(self.scope, key, value)
+            elif not key.startswith("_") and hasattr(self.scope.cam, key):
+                setattr(self.scope.cam, key, value)
+            else:
+                raise ValueError(f"Unknown setting {key}.")
+
+    def _wait(self, seconds):
+        """Wait, returns early if the sequence is cancelled."""
+        if self._cancel.wait(seconds):
+            raise _Cancelled
+
+
+class _Cancelled(Exception):
+    """Raised in the worker thread to stop a cancelled sequence."""
+
+
+def _script_line(filename, tb=None):
+    """Line of the script that is running, or that raised in a traceback."""
+    if tb is not None:
+        line = None
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == filename:
+                line = tb.tb_lineno
+            tb = tb.tb_next
+        return line
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename != filename:
+        frame = frame.f_back
+    return None if frame is None else frame.f_lineno
@@ -0,0 +1,233 @@
+"""Persistent settings that are saved in the background, atomically.
+
+Changes are kept in memory and coalesced: the file is written by a background
+thread once no setting changed for `delay` seconds (at most `max_delay` after
+the first change), such that moving a slider does not rewrite the file for
+every step. The file is written to a temporary file, synced, and renamed over
+the old one, such that a power cut leaves either the old or the new settings.
+
+The file stores the schema version with the settings::
+
+    {"version": 1, "settings": {"image_format": "jpeg", ...}}
+
+Files of older versions are migrated when loaded, e.g., plain dictionaries as
+written by earlier releases (version 0). Loaded values are validated against
+the defaults: unknown settings are dropped and values that cannot be converted
+to the type of their default are replaced by the default.
+"""
+
+from collections.abc import MutableMapping
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+SCHEMA_VERSION = 1
+
+
+def _migrate_v0(data):
+    """Version 0 was a plain dictionary of settings."""
+    return {"version": 1, "settings": data}
+
+
+MIGRATIONS = {0: _migrate_v0}  # version -> function that upgrades it by one
+
+
+class SettingsStore(MutableMapping):
+    """Dictionary of settings with debounced, atomic persistence."""
+
+    def __init__(self, fname, defaults, delay=1.0, max_delay=5.0):
+        """Load the settings, missing or invalid ones get their default.
+
+        :param fname: File name of the settings.
+        :type fname: Path, str
+        :param defaults: Default values, which also define the valid settings.
+        :type defaults: dict
+        :param delay: Write once no setting changed for this time in s.
+        :type delay: float
+        :param max_delay: Write at the latest this time in s after a change.
+        :type max_delay: float
+        """
+        self.fname = Path(fname)
+        self.defaults = dict(defaults)
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self._values = dict(self.defaults)
+        self._values.update(self._load())
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # one commit at a time
+        self._dirty_since = None  # time of the first unsaved change
+        self._changed = None  # time of the last unsaved change
+        self._closing = False
+        self._thread = None
+
+    def __delitem__(self, key):
+        raise TypeError("Settings cannot be deleted, set them to their default.")
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __setitem__(self, key, value):
+        if key not in self.defaults:
+            raise KeyError(f"Unknown setting {key}.")
+        with self._cond:
+            if key in self._values and self._values[key] == value:
+                return
+            self._values[key] = value
+            now = time.monotonic()
+            self._changed = now
+            if self._dirty_since is None:
+                self._dirty_since = now
+            if self._thread is None and not self._closing:
+                self._thread = threading.Thread(
+                    target=self._writer, name="rpyscope-settings", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    # METHODS #
+
+    def close(self):
+        """Write pending changes and stop the writer thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def flush(self):
+        """Write pending changes now.
+
+        :raises OSError: The settings could not be written, they stay pending.
+        """
+        with self._write_lock:
+            with self._cond:
+                if self._dirty_since is None:
+                    return
+                data = dict(self._values)
+                dirty_since, self._dirty_since = self._dirty_since, None
+            try:
+                self._commit(data)
+            except OSError:
+                with self._cond:  # pending since the first unsaved change again
+                    self._dirty_since = dirty_since
+                raise
+
+    # PRIVATE FUNCTIONS #
+
+    def _commit(self, values):
+        """Write settings to a temporary file, sync it, and rename it."""
+        data = {"version": SCHEMA_VERSION, "settings": values}
+        text = json.dumps(data, indent=4, sort_keys=True, default=str)
+        self.fname.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.fname.with_name(f".{self.fname.name}.tmp")
+        with open(tmp, "w") as fout:
+            fout.write(text)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp, self.fname)
+        try:
+            fd = os.open(self.fname.parent, os.O_RDONLY)
+        except OSError:  # e.g., folders cannot be opened on Windows
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        """Read, migrate, and validate the settings file.
+
+        :return: Valid settings of the file, empty if there is none.
+        :rtype: dict
+        """
+        try:
+            with open(self.fname) as fin:
+                data = json.load(fin)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Settings {self.fname} could not be read ({e}), using defaults.")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        version = data.get("version", 0) if "settings" in data else 0
+        while version < SCHEMA_VERSION:
+            data = MIGRATIONS[version](data)
+            version = data["version"]
+        settings = data.get("settings")
+        if not isinstance(settings, dict):
+            return {}
+
+        valid = {}
+        for key, value in settings.items():
+            if key not in self.defaults:
+                continue
+            try:
+                valid[key] = _validate(value, self.defaults[key])
+            except (TypeError, ValueError):
+                print(f"Invalid value {value!r} of setting {key}, using the default.")
+        return valid
+
+    def _writer(self):
+        """Writer thread, commits changes once they settled."""
+        while True:
+            with self._cond:
+                while self._dirty_since is None and not self._closing:
+                    self._cond.wait()
+                if self._closing:
+                    return  # `close` flushes
+                while self._dirty_since is not None and not self._closing:
+                    now = time.monotonic()
+                    remaining = min(
+                        self._changed + self.delay - now,
+                        self._dirty_since + self.max_delay - now,
+                    )
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._dirty_since is None:
+                    continue  # flushed meanwhile
+            try:
+                self.flush()
+            except OSError as e:  # retried after max_delay
+                print(f"Settings could not be written: {e}")
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closing, self.max_delay)
+
+
+def _validate(value, default):
+    """Convert a loaded value to the type of its default.
+
+    :raises TypeError: The value cannot be used for this setting.
+    :raises ValueError: The value cannot be converted.
+    """
+    if default is None or value is None:
+        return value
+    if isinstance(default, Path):
+        if not isinstance(value, str):
+            raise TypeError(f"Path expected, got {type(value)}.")
+        return Path(value)
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            raise TypeError(f"bool expected, got {type(value)}.")
+        return value
+    if isinstance(default, (int, float)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"Number expected, got {type(value)}.")
+        return type(default)(value) if float(value).is_integer() else float(value)
+    if isinstance(default, str):
+        if not isinstance(value, str):
+            raise TypeError(f"Text expected, got {type(value)}.")
+        return value
+    return value
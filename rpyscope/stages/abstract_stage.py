@@ -0,0 +1,130 @@
+"""Abstract class for motorized stages."""
+
+import abc
+
+
+class AbsStage(metaclass=abc.ABCMeta):
+    """Abstract XY(Z) stage class that has functions implemented.
+
+    Positions are in micrometers. All stages should inherit from this class.
+    """
+
+    # PROPERTIES #
+
+    @property
+    @abc.abstractmethod
+    def is_moving(self):
+        """Is the stage moving or settling?
+
+        :return: Moving
+        :rtype: bool
+        """
+
+    @property
+    def limits(self):
+        """Get the travel range of the stage.
+
+        :return: (minimum, maximum) in µm for x, y, and z, None if unlimited
+        :rtype: tuple(tuple(float, float))
+        """
+        return None
+
+    @property
+    @abc.abstractmethod
+    def position(self):
+        """Get the current position of the stage.
+
+        :return: Position (x, y, z) in µm
+        :rtype: tuple(float, float, float)
+        """
+
+    # METHODS #
+
+    @abc.abstractmethod
+    def close(self):
+        """Close the stage connection."""
+        pass
+
+    def move_by(self, dx=0, dy=0, dz=0, wait=True):
+        """Move the stage relative to its current position.
+
+        :param dx: Distance in x in µm.
+        :type dx: float
+        :param dy: Distance in y in µm.
+        :type dy: float
+        :param dz: Distance in z in µm.
+        :type dz: float
+        :param wait: Wait until the stage arrived and settled.
+        :type wait: bool
+        """
+        x, y, z = self.position
+        self.move_to(x + dx, y + dy, z + dz, wait=wait)
+
+    def move_to(self, x=None, y=None, z=None, wait=True):
+        """Move the stage to a position, axes that are None stay where they are.
+
+        :param x: Position in x in µm.
+        :type x: float
+        :param y: Position in y in µm.
+        :type y: float
+        :param z: Position in z in µm.
+        :type z: float
+        :param wait: Wait until the stage arrived and settled, otherwise call
+            `wait` before capturing, e.g., to do something else meanwhile.
+        :type wait: bool
+
+        :raises ValueError: The position is outside of the `limits`.
+        """
+        current = self.position
+        target = tuple(
+            now if new is None else float(new) for now, new in zip(current, (x, y, z))
+        )
+        limits = self.limits
+        if limits is not None:
+            for axis, value, (low, high) in zip("xyz", target, limits):
+                if not low <= value <= high:
+                    raise ValueError(
+                        f"Position {value} in {axis} is outside of [{low}, {high}]."
+                    )
+        self.start_move(target)
+        if wait:
+            self.wait()
+
+    @abc.abstractmethod
+    def start_move(self, target):
+        """Start moving to a position and return right away.
+
+        :param target: Position (x, y, z) in µm, checked against the limits.
+        :type target: tuple(float, float, float)
+        """
+        pass
+
+    @abc.abstractmethod
+    def stop(self):
+        """Stop moving where the stage is."""
+        pass
+
+    def travel_time(self, start, end):
+        """Estimate the time to move between two positions, e.g., for planning.
+
+        :param start: Position (x, y) or (x, y, z) in µm.
+        :type start: tuple
+        :param end: Position (x, y) or (x, y, z) in µm.
+        :type end: tuple
+
+        :return: Time in s, defaults to the largest distance along one axis in
+            µm, as the axes move at the same time.
+        :rtype: float
+        """
+        return max(abs(b - a) for a, b in zip(start, end))
+
+    @abc.abstractmethod
+    def wait(self, timeout=None):
+        """Wait until the stage arrived and settled.
+
+        :param timeout: Maximum time to wait in s, forever if None.
+        :type timeout: float
+
+        :raises TimeoutError: The stage did not settle in time.
+        """
+        pass
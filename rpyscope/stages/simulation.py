@@ -0,0 +1,151 @@
+"""Class for Simulated Stage."""
+
+import threading
+import time
+
+from rpyscope.stages.abstract_stage import AbsStage
+
+
+class SimStage(AbsStage):
+    """Simulated stage that moves at a constant speed and then settles.
+
+    All axes move at the same time, such that a move takes as long as the
+    slowest axis, plus the settle time, e.g., until vibrations decayed.
+    """
+
+    def __init__(
+        self,
+        speed=(5000.0, 5000.0, 500.0),
+        settle_time=0.05,
+        limits=((0.0, 100e3), (0.0, 75e3), (0.0, 10e3)),
+    ):
+        """Initialize at the origin.
+
+        :param speed: Speed of the x, y, and z axis in µm/s.
+        :type speed: tuple(float, float, float)
+        :param settle_time: Time to settle after a move in s.
+        :type settle_time: float
+        :param limits: Travel range (minimum, maximum) in µm per axis.
+        :type limits: tuple(tuple(float, float))
+        """
+        self.speed = tuple(speed)
+        self.settle_time = settle_time
+        self.moves = 0
+        self.travel = 0.0  # total distance moved in µm
+
+        self._limits = limits
+        self._start = (0.0, 0.0, 0.0)
+        self._target = (0.0, 0.0, 0.0)
+        self._departed = 0.0
+        self._duration = 0.0  # of the current move without settling
+        self._lock = threading.Lock()
+
+    # PROPERTIES #
+
+    @property
+    def is_moving(self):
+        """Is the stage moving or settling?
+
+        :return: Moving
+        :rtype: bool
+        """
+        with self._lock:
+            return time.monotonic() < self._departed + self._settled_after()
+
+    @property
+    def limits(self):
+        """Get the travel range of the stage.
+
+        :return: (minimum, maximum) in µm for x, y, and z
+        :rtype: tuple(tuple(float, float))
+        """
+        return self._limits
+
+    @property
+    def position(self):
+        """Get the current position, interpolated while moving.
+
+        :return: Position (x, y, z) in µm
+        :rtype: tuple(float, float, float)
+        """
+        with self._lock:
+            return self._position(time.monotonic())
+
+    # METHODS #
+
+    def close(self):
+        """Close the stage connection."""
+        self.stop()
+
+    def start_move(self, target):
+        """Start moving to a position and return right away.
+
+        :param target: Position (x, y, z) in µm.
+        :type target: tuple(float, float, float)
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = self._position(now)
+            self._start = start
+            self._target = tuple(target)
+            self._departed = now
+            self._duration = self._move_time(start, self._target)
+            self.moves += 1
+            self.travel += sum((b - a) ** 2 for a, b in zip(start, target)) ** 0.5
+
+    def stop(self):
+        """Stop moving where the stage is."""
+        with self._lock:
+            position = self._position(time.monotonic())
+            self._start = self._target = position
+            self._duration = 0.0
+            self._departed = 0.0
+
+    def travel_time(self, start, end):
+        """Time to move between two positions, including settling.
+
+        :param start: Position (x, y) or (x, y, z) in µm.
+        :type start: tuple
+        :param end: Position (x, y) or (x, y, z) in µm.
+        :type end: tuple
+
+        :return: Time in s.
+        :rtype: float
+        """
+        return self._move_time(start, end) + self.settle_time
+
+    def wait(self, timeout=None):
+        """Wait until the stage arrived and settled.
+
+        :param timeout: Maximum time to wait in s, forever if None.
+        :type timeout: float
+
+        :raises TimeoutError: The stage did not settle in time.
+        """
+        with self._lock:
+            remaining = self._departed + self._settled_after() - time.monotonic()
+        if remaining <= 0:
+            return
+        if timeout is not None and remaining > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stage did not settle within {timeout} s.")
+        time.sleep(remaining)
+
+    # PRIVATE FUNCTIONS #
+
+    def _move_time(self, start, end):
+        """Time to move between two positions without settling."""
+        return max(abs(b - a) / v for a, b, v in zip(start, end, self.speed))
+
+    def _position(self, now):
+        """Position at a time, the lock must be held."""
+        if self._duration <= 0:
+            return self._target
+        fraction = min((now - self._departed) / self._duration, 1.0)
+        return tuple(a + (b - a) * fraction for a, b in zip(self._start, self._target))
+
+    def _settled_after(self):
+        """Time after departure when the stage settled, the lock must be held."""
+        if self._departed == 0.0:
+            return 0.0
+        return self._duration + self.settle_time
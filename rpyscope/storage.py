@@ -0,0 +1,432 @@
+"""Write-behind storage layer between the microscope and the filesystem."""
+
+from collections import deque
+import os
+from pathlib import Path
+import queue
+import shutil
+import threading
+import time
+
+from rpyscope.metrics import timed
+
+
+class StorageFullError(OSError):
+    """A capture was refused since the disk is (almost) full."""
+
+
+class WriteBehindStorage:
+    """Buffer outputs in memory (or a tmpfs spool) and write them in the background.
+
+    Files are written sequentially by one writer thread into a temporary file
+    that is renamed once complete, such that partial files never show up.
+    `fsync_batch` files are synced to disk together; set it to 0 to leave
+    syncing to the operating system. Captures are refused once the disk usage
+    exceeds the high watermark, and accepted again when it falls below the
+    low watermark. Submitting blocks while more than `max_backlog_bytes` are
+    waiting to be written.
+    """
+
+    def __init__(
+        self,
+        fsync_batch=8,
+        fsync_interval=2.0,
+        high_watermark=0.95,
+        low_watermark=0.9,
+        max_backlog_bytes=256 * 1024**2,
+        spool_folder=None,
+    ):
+        """Initialize the storage and start the writer thread.
+
+        :param fsync_batch: Number of files to sync to disk at once, 0 for none.
+        :type fsync_batch: int
+        :param fsync_interval: Maximum time in s files wait to be synced.
+        :type fsync_interval: float
+        :param high_watermark: Disk usage fraction at which captures are refused.
+        :type high_watermark: float
+        :param low_watermark: Disk usage fraction to accept captures again.
+        :type low_watermark: float
+        :param max_backlog_bytes: Maximum bytes waiting before submits block.
+        :type max_backlog_bytes: int
+        :param spool_folder: Folder, e.g., on a tmpfs, to buffer files in instead
+            of keeping them in memory.
+        :type spool_folder: Path, str
+
+        :raises ValueError: Invalid watermarks.
+        """
+        if not 0 < low_watermark <= high_watermark <= 1:
+            raise ValueError(
+                "Watermarks must satisfy 0 < low_watermark <= high_watermark <= 1."
+            )
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_backlog_bytes = max_backlog_bytes
+        self.spool_folder = None if spool_folder is None else Path(spool_folder)
+        if self.spool_folder is not None:
+            self.spool_folder.mkdir(parents=True, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = {}  # final path -> number of pending writes
+        self._backlog_bytes = 0
+        self._refusing = set()  # folders in which captures are refused
+        self._written_files = 0
+        self._written_bytes = 0
+        self._history = deque(maxlen=64)  # (time, bytes) of written data
+        self._error = None
+
+        self._thread = threading.Thread(
+            target=self._writer, name="WriteBehindStorage", daemon=True
+        )
+        self._thread.start()
+
+    # METHODS #
+
+    def close(self):
+        """Write all pending files and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def exists(self, path):
+        """Check if a file exists or is waiting to be written.
+
+        :param path: Path of the file.
+        :type path: Path, str
+
+        :return: Does the file exist?
+        :rtype: bool
+        """
+        with self._cond:
+            if str(path) in self._pending:
+                return True
+        return os.path.exists(path)
+
+    def flush(self):
+        """Block until all submitted files are written to disk.
+
+        :raises OSError: A previous write failed.
+        """
+        self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def open_stream(self, path, callback=None):
+        """Open a file-like object, e.g., for video recordings, written behind.
+
+        :param path: Path of the file.
+        :type path: Path, str
+        :param callback: Called with the path once the file is on disk.
+        :type callback: callable
+
+        :return: File-like object that supports `write`, `flush`, and `close`.
+        :rtype: StorageStream
+
+        :raises StorageFullError: The disk is full.
+        """
+        self._check_disk(path, 0)
+        stream = StorageStream(self, str(path), callback)
+        self._add_pending(stream.path, 0)
+        self._queue.put(("open", stream, None))
+        return stream
+
+    def stats(self):
+        """Get statistics of the storage, e.g., to display them.
+
+        :return: Files and bytes waiting, files and bytes written, current
+            throughput in bytes per second, if captures are refused, and the
+            last write error that `flush` did not raise yet, None if none.
+        :rtype: dict
+        """
+        error = self._error
+        with self._cond:
+            history = list(self._history)
+            stats = {
+                "error": None if error is None else str(error),
+                "backlog_files": sum(self._pending.values()),
+                "backlog_bytes": self._backlog_bytes,
+                "written_files": self._written_files,
+                "written_bytes": self._written_bytes,
+                "refusing": bool(self._refusing),
+            }
+        throughput = 0.0
+        if len(history) > 1 and history[-1][0] > history[0][0]:
+            written = sum(size for _, size in history[1:])
+            throughput = written / (history[-1][0] - history[0][0])
+        stats["throughput"] = throughput
+        return stats
+
+    def submit(self, path, data, callback=None):
+        """Submit a file to be written in the background.
+
+        :param path: Path of the file.
+        :type path: Path, str
+        :param data: Content of the file.
+        :type data: bytes
+        :param callback: Called with the path once the file is on disk.
+        :type callback: callable
+
+        :raises StorageFullError: The disk is full.
+        """
+        path = str(path)
+        self._check_disk(path, len(data))
+        if self.spool_folder is not None:
+            spooled = self.spool_folder.joinpath(f"{id(data)}_{time.monotonic_ns()}")
+            spooled.write_bytes(data)
+            self._add_pending(path, 0)
+            self._queue.put(("spool", path, (spooled, callback)))
+        else:
+            self._add_pending(path, len(data))
+            self._queue.put(("file", path, (data, callback)))
+
+    # PRIVATE FUNCTIONS #
+
+    def _add_pending(self, path, size):
+        """Register a pending write, block while the backlog is too large."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._backlog_bytes + size <= self.max_backlog_bytes
+                or self._backlog_bytes == 0
+            )
+            self._backlog_bytes += size
+            if path is not None:
+                self._pending[path] = self._pending.get(path, 0) + 1
+
+    def _check_disk(self, path, size):
+        """Refuse writing if the disk usage is above the watermarks.
+
+        :raises StorageFullError: The disk is full.
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        usage = shutil.disk_usage(folder)
+        with self._cond:
+            used = (usage.used + self._backlog_bytes + size) / usage.total
+            if folder in self._refusing and used < self.low_watermark:
+                self._refusing.discard(folder)
+            elif used >= self.high_watermark:
+                self._refusing.add(folder)
+            if folder in self._refusing:
+                raise StorageFullError(
+                    f"The disk of {folder} is {used * 100:.1f}% full, captures "
+                    f"are refused until it is below {self.low_watermark * 100:.0f}%."
+                )
+
+    @timed("storage_commit")
+    def _commit(self, batch):
+        """Sync (if requested), close, and rename the files of a batch."""
+        durable = self.fsync_batch > 0
+        folders = set()
+        for fout, tmp, path, callback in batch:
+            try:
+                fout.flush()
+                if durable:
+                    os.fsync(fout.fileno())
+                fout.close()
+                os.replace(tmp, path)
+                folders.add(os.path.dirname(path))
+            except OSError as e:
+                self._error = e
+                continue
+            with self._cond:
+                self._written_files += 1
+            if callback is not None:
+                try:
+                    callback(path)
+                except Exception as e:  # must not stop the writer thread
+                    self._error = e
+        if durable:
+            for folder in folders:
+                _fsync_folder(folder)
+        with self._cond:
+            for _, _, path, _ in batch:
+                self._pending[path] -= 1
+                if self._pending[path] == 0:
+                    del self._pending[path]
+            self._cond.notify_all()
+        batch.clear()
+
+    def _written(self, size, backlog=True):
+        """Account for written bytes, `backlog` if they were held in memory."""
+        with self._cond:
+            if backlog:
+                self._backlog_bytes -= size
+            self._written_bytes += size
+            self._history.append((time.monotonic(), size))
+            self._cond.notify_all()
+
+    def _writer(self):
+        """Writer thread, writes all files sequentially."""
+        batch = []
+        last_commit = time.monotonic()
+        while True:
+            try:
+                timeout = self.fsync_interval if batch else None
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False  # timeout, commit the batch
+
+            if item:
+                kind, target, payload = item
+                try:
+                    self._write_item(kind, target, payload, batch)
+                except Exception as e:  # must not stop the writer thread
+                    self._error = e
+
+            if batch and (
+                item is None
+                or self._queue.empty()
+                or len(batch) >= self.fsync_batch
+                or time.monotonic() - last_commit >= self.fsync_interval
+            ):
+                self._commit(batch)
+                last_commit = time.monotonic()
+
+            if item is not False:
+                self._queue.task_done()
+            if item is None:
+                return
+
+    @timed("storage_write")
+    def _write_item(self, kind, target, payload, batch):
+        """Write one item of the queue, completed files are added to the batch.
+
+        A failed write is released from the backlog before its error is raised,
+        such that it neither blocks submits nor shows up as pending.
+        """
+        if kind == "file":
+            data, callback = payload
+            tmp = _tmp_name(target)
+            try:
+                fout = _open_tmp(tmp, lambda fout: fout.write(data))
+            except Exception:
+                self._release(target, len(data))
+                raise
+            batch.append((fout, tmp, target, callback))
+            self._written(len(data))
+        elif kind == "spool":
+            spooled, callback = payload
+            tmp = _tmp_name(target)
+            try:
+                with open(spooled, "rb") as fin:
+                    fout = _open_tmp(tmp, lambda fout: shutil.copyfileobj(fin, fout))
+                size = fout.tell()
+                os.remove(spooled)
+            except Exception:
+                self._release(target, 0)
+                raise
+            batch.append((fout, tmp, target, callback))
+            self._written(size, backlog=False)
+        elif kind == "open":
+            target.fout = open(_tmp_name(target.path), "wb")
+        elif kind == "chunk":
+            if target.fout is None:  # opening the stream failed, already reported
+                self._release(None, len(payload))
+                return
+            try:
+                target.fout.write(payload)
+            except Exception:
+                self._release(None, len(payload))
+                _discard(target.fout, _tmp_name(target.path))
+                target.fout = None  # skip the remaining chunks
+                raise
+            self._written(len(payload))
+        elif kind == "close":
+            if target.fout is None:
+                self._release(target.path, 0)
+                return
+            batch.append((target.fout, _tmp_name(target.path), target.path, payload))
+
+    def _release(self, path, size):
+        """Drop a pending write that failed from the backlog."""
+        with self._cond:
+            self._backlog_bytes -= size
+            if path is not None:
+                self._pending[path] -= 1
+                if self._pending[path] == 0:
+                    del self._pending[path]
+            self._cond.notify_all()
+
+
+class StorageStream:
+    """File-like object whose writes are queued to a `WriteBehindStorage`."""
+
+    def __init__(self, storage, path, callback):
+        """Initialize the stream, use `WriteBehindStorage.open_stream`."""
+        self.storage = storage
+        self.path = path
+        self.callback = callback
+        self.closed = False
+        self.fout = None  # opened by the writer thread
+
+    def close(self):
+        """Close the stream, the file is completed in the background."""
+        if not self.closed:
+            self.closed = True
+            self.storage._queue.put(("close", self, self.callback))
+
+    def flush(self):
+        """Nothing to flush, data is written in the background."""
+
+    def write(self, data):
+        """Queue data to be written.
+
+        :param data: Data to write.
+        :type data: bytes
+
+        :return: Number of bytes queued.
+        :rtype: int
+
+        :raises ValueError: The stream is closed.
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed stream.")
+        data = bytes(data)
+        self.storage._add_pending(None, len(data))
+        self.storage._queue.put(("chunk", self, data))
+        return len(data)
+
+
+def _fsync_folder(folder):
+    """Sync a folder such that renames in it are durable."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _discard(fout, tmp):
+    """Close and remove a temporary file that could not be written."""
+    try:
+        fout.close()
+        os.remove(tmp)
+    except OSError:
+        pass
+
+
+def _open_tmp(tmp, write):
+    """Open a temporary file and write to it, it is removed if writing fails.
+
+    :return: Open file, closed when its batch is committed.
+    :rtype: file
+    """
+    fout = open(tmp, "wb")
+    try:
+        write(fout)
+    except Exception:
+        _discard(fout, tmp)
+        raise
+    return fout
+
+
+def _tmp_name(path):
+    """Temporary name of a file while it is written."""
+    return f"{path}.part"
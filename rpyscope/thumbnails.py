@@ -0,0 +1,141 @@
+"""Size bounded thumbnail cache in memory and on disk, with LRU eviction."""
+
+from collections import OrderedDict
+import hashlib
+import os
+from pathlib import Path
+import threading
+
+THUMBNAIL_SIZE = (160, 120)
+
+
+class ThumbnailCache:
+    """Cache encoded thumbnails of captured files.
+
+    Thumbnails are stored as encoded bytes (e.g., JPEG) and keyed by path,
+    size, and modification time of the original file, such that changed files
+    get a new thumbnail. The least recently used thumbnails are evicted from
+    memory when more than `max_items` are held and from disk when the folder
+    grows beyond `max_bytes`. The cache is thread safe.
+    """
+
+    def __init__(self, folder, max_items=256, max_bytes=32 * 1024**2):
+        """Initialize the cache, create the folder if required.
+
+        :param folder: Folder to store thumbnails in.
+        :type folder: Path, str
+        :param max_items: Maximum number of thumbnails held in memory.
+        :type max_items: int
+        :param max_bytes: Maximum size of all thumbnails on disk in bytes.
+        :type max_bytes: int
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> bytes
+
+        # disk index, least recently used first
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._disk = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+
+    @property
+    def disk_bytes(self):
+        """Get the size of all thumbnails on disk.
+
+        :return: Size in bytes
+        :rtype: int
+        """
+        return self._disk_bytes
+
+    def get(self, path):
+        """Get the thumbnail of a file.
+
+        :param path: Path of the original file.
+        :type path: Path, str
+
+        :return: Encoded thumbnail or None if not cached.
+        :rtype: bytes
+        """
+        key = self.key(path)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        fname = self.folder.joinpath(key)
+        try:
+            data = fname.read_bytes()
+            os.utime(fname)  # keep the LRU order across restarts
+        except OSError:
+            return None
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    def key(self, path):
+        """Get the cache key of a file, None if it does not exist.
+
+        :param path: Path of the original file.
+        :type path: Path, str
+
+        :return: Key of the file.
+        :rtype: str
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        ident = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        return hashlib.sha1(ident.encode()).hexdigest()
+
+    def put(self, path, data):
+        """Store the thumbnail of a file.
+
+        :param path: Path of the original file.
+        :type path: Path, str
+        :param data: Encoded thumbnail.
+        :type data: bytes
+        """
+        key = self.key(path)
+        if key is None or not data:
+            return
+        fname = self.folder.joinpath(key)
+        tmp = fname.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, fname)
+
+        with self._lock:
+            self._remember(key, data)
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            evict = []
+            while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evict.append(old_key)
+        for old_key in evict:
+            try:
+                os.remove(self.folder.joinpath(old_key))
+            except OSError:
+                pass
+
+    # PRIVATE FUNCTIONS #
+
+    def _remember(self, key, data):
+        """Keep a thumbnail in memory, the lock must be held."""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
@@ -0,0 +1,221 @@
+"""Trace the latency of every capture from trigger to file on disk.
+
+Every capture gets a trace with an ID and `time.monotonic` timestamps of its
+stages, see `STAGES`. The exposure time of the sensor is included if the
+camera provides one. Finished traces are appended to a log with one compact
+JSON object per line, where stages are given in ms after the trigger::
+
+    {"id":"3f2a9c1e5b7d4e60","kind":"image","path":"/home/pi/a.jpeg",
+     "time":1760000000.0,"stages":{"trigger":0,"exposure":42.1,"encoded":180.3,
+     "queued":181.0,"written":260.4}}
+
+Frames captured into a series store their trace ID in their metadata.
+Summarize a log with the report tool, e.g.::
+
+    rpyscope-trace ~/.config/RPyConf/traces.jsonl
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+
+STAGES = ("trigger", "exposure", "frames", "encoded", "captured", "queued", "written")
+
+
+class Trace:
+    """Timestamps of the stages of one capture."""
+
+    def __init__(self, kind, path=None):
+        """Start a trace, the current time is the trigger.
+
+        :param kind: Kind of capture, e.g., "image".
+        :type kind: str
+        :param path: File name of the capture.
+        :type path: Path, str
+        """
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.path = None if path is None else str(path)
+        self.time = time.time()
+        self.marks = {"trigger": time.monotonic()}
+
+    def copy(self, path):
+        """Trace for another file of the same capture, with the marks so far.
+
+        :param path: File name of the other file.
+        :type path: Path, str
+
+        :return: New trace with its own ID.
+        :rtype: Trace
+        """
+        trace = Trace(self.kind, path)
+        trace.time = self.time
+        trace.marks = dict(self.marks)
+        return trace
+
+    def mark(self, stage, at=None):
+        """Record the time of a stage.
+
+        :param stage: Name of the stage, see `STAGES`.
+        :type stage: str
+        :param at: Time on the `time.monotonic` clock, defaults to now. Stages
+            with unknown times (None) are skipped.
+        :type at: float
+        """
+        if stage == "exposure" and at is None:
+            return  # the camera does not know
+        self.marks[stage] = time.monotonic() if at is None else at
+
+    def to_dict(self):
+        """Trace as written to the log.
+
+        :return: ID, kind, path, wall time of the trigger, and stages in ms
+            after the trigger, in order.
+        :rtype: dict
+        """
+        start = self.marks["trigger"]
+        stages = sorted(self.marks.items(), key=lambda item: item[1])
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "path": self.path,
+            "time": round(self.time, 6),
+            "stages": {name: round((t - start) * 1e3, 3) for name, t in stages},
+        }
+
+
+class TraceLog:
+    """Append finished traces to a JSON lines file."""
+
+    def __init__(self, fname):
+        """Open the log, it is created when the first trace is written.
+
+        :param fname: File name of the log.
+        :type fname: Path, str
+        """
+        self.fname = fname
+        self._lock = threading.Lock()
+
+    def write(self, trace):
+        """Append a trace.
+
+        :param trace: Finished trace.
+        :type trace: Trace
+        """
+        line = json.dumps(trace.to_dict(), separators=(",", ":")) + "\n"
+        with self._lock, open(self.fname, "a") as fout:
+            fout.write(line)
+
+
+def read(fname, kind=None):
+    """Read the traces of a log.
+
+    :param fname: File name of the log.
+    :type fname: Path, str
+    :param kind: Only read traces of this kind.
+    :type kind: str
+
+    :return: Traces as written, see `Trace.to_dict`.
+    :rtype: generator(dict)
+    """
+    with open(fname) as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            trace = json.loads(line)
+            if kind is None or trace["kind"] == kind:
+                yield trace
+
+
+def summarize(traces):
+    """Latency distribution of every stage.
+
+    Every stage is measured from the stage before it in the same trace, such
+    that the slow step stands out, "total" from the trigger to the last stage.
+
+    :param traces: Traces, see `read`.
+    :type traces: iterable(dict)
+
+    :return: Count, p50, p90, p99, and max in ms per stage, in `STAGES` order.
+    :rtype: dict(str, dict(str, float))
+    """
+    steps = {}
+    for trace in traces:
+        stages = list(trace["stages"].items())
+        for (_, before), (name, after) in zip(stages, stages[1:]):
+            steps.setdefault(name, []).append(after - before)
+        if len(stages) > 1:
+            steps.setdefault("total", []).append(stages[-1][1])
+    order = [name for name in STAGES if name in steps]
+    order += sorted(name for name in steps if name not in STAGES and name != "total")
+    if "total" in steps:
+        order.append("total")
+
+    import numpy as np  # only needed for reports, not while capturing
+
+    summary = {}
+    for name in order:
+        values = np.array(steps[name])
+        p50, p90, p99 = np.percentile(values, (50, 90, 99))
+        summary[name] = {
+            "count": len(values),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(values.max()),
+        }
+    return summary
+
+
+def format_summary(summary):
+    """Summary as a table.
+
+    :param summary: Summary, see `summarize`.
+    :type summary: dict
+
+    :return: Table with one row per stage.
+    :rtype: str
+    """
+    lines = [f"{'stage (ms)':<12}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"]
+    for name, row in summary.items():
+        lines.append(
+            f"{name:<12}{row['count']:>7}{row['p50']:9.1f}{row['p90']:9.1f}"
+            f"{row['p99']:9.1f}{row['max']:9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(args=None):
+    """Summarize a trace log from the command line.
+
+    :param args: Command line arguments, defaults to `sys.argv`.
+    :type args: list(str)
+
+    :return: Exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="rpyscope-trace",
+        description="Summarize the latency per stage of the captures in a trace "
+        "log. Every stage is measured from the one before it.",
+    )
+    parser.add_argument("log", help="trace log, e.g., ~/.config/RPyConf/traces.jsonl")
+    parser.add_argument("--kind", help="only traces of this kind, e.g., image")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args(args)
+
+    summary = summarize(read(args.log, kind=args.kind))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    elif summary:
+        print(format_summary(summary))
+    else:
+        print("No traces found.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
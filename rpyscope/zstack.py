@@ -0,0 +1,112 @@
+"""Pipelined z-stack acquisition.
+
+A z-stack moves the focus to every z position, waits for it to settle,
+captures a frame, and writes it. These steps are pipelined: as soon as a
+slice is captured, the focus moves on to the next position while the slice is
+compressed and written in the background. A slice then costs about as much as
+the slower of moving plus capturing and writing, not their sum.
+
+Any stage can drive the focus, only its z axis is moved, e.g., the simulated
+one::
+
+    from rpyscope import zstack
+    from rpyscope.stages.simulation import SimStage
+
+    scope.focus = SimStage(settle_time=0.02)
+    result = scope.capture_zstack("stack.zarr", zstack.z_range(0, 50, 2.5))
+
+All slices go into one chunked array with the dimensions (t, z, y, x, c), the
+z positions in µm are stored in its attributes, see `acquire`.
+"""
+
+import time
+
+import numpy as np
+
+from rpyscope.scanning import pipelined
+
+
+def acquire(scope, focus, z_positions, writer, t=None, depth=2, timeout=60.0):
+    """Acquire a z-stack into a chunked array.
+
+    :param scope: Microscope to capture with.
+    :type scope: rpyscope.microscope.Microscope
+    :param focus: Stage that moves the focus, only z is moved.
+    :type focus: rpyscope.stages.abstract_stage.AbsStage
+    :param z_positions: Focus positions in µm, in the order they are visited.
+    :type z_positions: list(float)
+    :param writer: Array to write to, see `Microscope.open_series`.
+    :type writer: rpyscope.chunked.ChunkedArrayWriter
+    :param t: Time index of the stack, defaults to appending a new one, e.g.,
+        for a time-lapse of stacks.
+    :type t: int
+    :param depth: Number of slices that may wait to be written before the
+        acquisition waits for the writer.
+    :type depth: int
+    :param timeout: Maximum time in s for the focus to settle.
+    :type timeout: float
+
+    :return: Time index "t", number of "slices", "duration" and
+        "seconds_per_slice" in s, and the time in s spent waiting for the
+        focus ("move_wait"), capturing ("capture"), waiting for the writer
+        ("write_wait"), and writing in the background ("write_time").
+    :rtype: dict
+
+    :raises ValueError: No z positions.
+    """
+    z_positions = [float(z) for z in z_positions]
+    if not z_positions:
+        raise ValueError("A z-stack needs at least one z position.")
+    t = writer.shape[0] if t is None else t
+    writer.attrs.setdefault("z_positions", {})[str(t)] = z_positions
+
+    def write(frame, position, timestamp):
+        """Write a slice, the position is its index and z."""
+        index, z = position
+        writer.write(frame, t=t, z=index, z_position=z, timestamp=timestamp)
+
+    start = time.monotonic()
+    timings = pipelined(
+        scope,
+        focus,
+        list(enumerate(z_positions)),
+        lambda position: focus.move_to(z=position[1], wait=False),
+        write,
+        depth=depth,
+        timeout=timeout,
+    )
+    writer.flush()
+    duration = time.monotonic() - start
+    return {
+        "t": t,
+        "slices": len(z_positions),
+        "duration": duration,
+        "seconds_per_slice": duration / len(z_positions),
+        "move_wait": timings["move_wait"],
+        "capture": timings["capture"],
+        "write_wait": timings["handle_wait"],
+        "write_time": timings["handling"],
+    }
+
+
+def z_range(start, stop, step):
+    """Focus positions from start to stop, both included.
+
+    :param start: First position in µm.
+    :type start: float
+    :param stop: Last position in µm, included if it is a whole number of
+        steps from the start.
+    :type stop: float
+    :param step: Distance between slices in µm, positive.
+    :type step: float
+
+    :return: Positions in µm.
+    :rtype: list(float)
+
+    :raises ValueError: The step is not positive.
+    """
+    if step <= 0:
+        raise ValueError(f"The step must be positive but is {step}.")
+    count = int(np.floor(abs(stop - start) / step + 1e-9)) + 1
+    direction = 1 if stop >= start else -1
+    return [float(start + direction * step * index) for index in range(count)]
@@ -3,9 +3,19 @@ from setuptools import setup
 setup(
     name="RPyScope",
     version="0.0.1",
-    packages=["rpyscope", "rpyscope.cameras"],
+    packages=["rpyscope", "rpyscope.cameras", "rpyscope.stages"],
     url="",
     license="GPLv3",
     description="Microscope package for Raspberry Pi and PiCam HQ",
-    install_requires=["pyqtconfig"],
+    install_requires=["numpy", "pyqtconfig"],
+    extras_require={"images": ["pillow"]},
+    entry_points={
+        "console_scripts": [
+            "rpyscope-batch=rpyscope.batch:main",
+            "rpyscope-benchmark=rpyscope.benchmark:main",
+            "rpyscope-camera-server=rpyscope.cameras.remote:main",
+            "rpyscope-dedupe=rpyscope.dedupe:main",
+            "rpyscope-trace=rpyscope.tracing:main",
+        ]
+    },
 )
@@ -0,0 +1,23 @@
+"""Fixtures for the RPyScope tests."""
+
+import pytest
+
+from rpyscope import microscope
+from rpyscope.cameras.simulation import SimCam
+from rpyscope.microscope import Cam, Microscope
+
+
+@pytest.fixture
+def scope(tmp_path, monkeypatch):
+    """Microscope with a fresh demo camera and its home folder in a temporary path.
+
+    The demo camera is shared by all microscopes of the test, see `Cam.camera`.
+    """
+    monkeypatch.setenv("HOME", str(tmp_path))
+    tmp_path.joinpath(".config").mkdir()
+    camera = SimCam()
+    monkeypatch.setitem(microscope._cameras, Cam.Demo, camera)
+    mic = Microscope(default_cam=Cam.Demo)
+    yield mic
+    mic.close()
+    camera.close()
@@ -0,0 +1,67 @@
+"""Tests for the batch post-processing."""
+
+import os
+
+import numpy as np
+import pytest
+
+from rpyscope.batch import BatchProcessor, calibrate, main, scalebar
+from rpyscope.image_io import read_image
+
+
+@pytest.fixture
+def captures(tmp_path):
+    """Folder with three small images, one in a sub-folder."""
+    folder = tmp_path.joinpath("captures")
+    folder.joinpath("sample").mkdir(parents=True)
+    for index, name in enumerate(["a.npy", "b.npy", "sample/c.npy"]):
+        np.save(folder.joinpath(name), np.full((20, 30), 10 * (index + 1), np.uint8))
+    np.save(tmp_path.joinpath("dark.npy"), np.full((20, 30), 5, np.uint8))
+    return folder
+
+
+def test_calibrate_and_scalebar(tmp_path):
+    """Dark and flat correction, scale bar of a round length."""
+    np.save(tmp_path.joinpath("dark.npy"), np.full((2, 2), 10, np.uint8))
+    np.save(tmp_path.joinpath("flat.npy"), np.array([[20, 20], [30, 30]], np.uint8))
+    image = np.array([[60, 60], [110, 110]], np.uint8)
+    result = calibrate(
+        image, str(tmp_path.joinpath("dark.npy")), str(tmp_path.joinpath("flat.npy"))
+    )
+    np.testing.assert_array_equal(result, [[75, 75], [75, 75]])
+
+    result = scalebar(np.zeros((200, 1000), np.uint8), pixel_size=0.5)
+    assert (result == 255).sum(axis=1).max() == 200  # 100 um bar, 200 px
+
+
+def test_incremental_rerun(captures, tmp_path):
+    """Reruns skip unchanged files and only process changed content."""
+    output = tmp_path.joinpath("processed")
+    stages = [("calibrate", {"dark": str(tmp_path.joinpath("dark.npy"))})]
+    processor = BatchProcessor(captures, output, stages, workers=2)
+    results = list(processor.run())
+    assert [r["status"] for r in results] == ["processed"] * 3
+    assert read_image(output.joinpath("sample/c.npy")).max() == 25
+    assert set(processor.stats()["stages"]) == {"read", "calibrate", "write"}
+
+    assert [r["status"] for r in processor.run()] == ["skipped"] * 3
+
+    fname = captures.joinpath("a.npy")
+    os.utime(fname, ns=(0, 0))  # same content, different time
+    np.save(captures.joinpath("b.npy"), np.full((20, 30), 100, np.uint8))
+    statuses = {r["path"]: r["status"] for r in processor.run()}
+    processor.close()
+    assert statuses[str(fname)] == "unchanged"
+    assert statuses[str(captures.joinpath("b.npy"))] == "processed"
+    assert read_image(output.joinpath("b.npy")).max() == 95
+
+
+def test_cli(captures, tmp_path, capsys):
+    """The command line runs stages and reports failures."""
+    output = tmp_path.joinpath("processed")
+    args = [str(captures), str(output), "--stage", "grayscale", "--workers", "1"]
+    assert main(args) == 0
+    assert "3 processed" in capsys.readouterr().out
+    captures.joinpath("broken.npy").write_bytes(b"no image")
+    assert main(args) == 1
+    assert "3 skipped, 1 failed" in capsys.readouterr().out
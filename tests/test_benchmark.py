@@ -0,0 +1,56 @@
+"""Tests for the benchmark suite."""
+
+import json
+
+import pytest
+
+from rpyscope import benchmark
+from rpyscope.microscope import Cam
+
+FAST = [
+    "capture_latency",
+    "burst_throughput",
+    "capture_rgb",
+    "capture_png",
+    "recording_raw_throughput",
+]
+
+
+def test_run_and_compare():
+    """Benchmarks report their median, regressions beyond the tolerance fail."""
+    Cam.Demo.camera.resolution = (320, 240)
+    results = benchmark.run(FAST, repeat=2, resolution=(64, 48))
+    assert Cam.Demo.camera.resolution == (320, 240)  # the shared camera is restored
+    assert list(results) == FAST
+    assert results["capture_latency"]["value"] > 0
+    assert results["burst_throughput"]["higher_is_better"]
+    assert not results["capture_rgb"]["higher_is_better"]
+    assert "value" in results["capture_png"] or "skipped" in results["capture_png"]
+    assert results["recording_raw_throughput"]["value"] > 0  # frames were recorded
+
+    slower = {
+        "capture_latency": dict(results["capture_latency"], value=1e6),
+        "burst_throughput": dict(results["burst_throughput"], value=1e-6),
+    }
+    assert benchmark.compare(results, slower) == []
+    regressions = benchmark.compare(slower, results, tolerance=0.2)
+    assert [name for name, *_ in regressions] == [
+        "capture_latency",
+        "burst_throughput",
+    ]
+    with pytest.raises(ValueError):
+        benchmark.run(["warp_drive"])
+
+
+def test_cli_baseline(tmp_path, capsys):
+    """The baseline is saved per machine and used for comparison."""
+    baseline = tmp_path.joinpath("benchmarks.json")
+    args = ["capture_latency", "--repeat", "2", "--resolution", "64x48"]
+    assert benchmark.main(args + ["--baseline", str(baseline), "--save"]) == 0
+    saved = json.loads(baseline.read_text())[benchmark.machine_key()]
+    assert list(saved) == ["capture_latency"]
+
+    saved["capture_latency"]["value"] = 1e-9  # impossibly fast baseline
+    baseline.write_text(json.dumps({benchmark.machine_key(): saved}))
+    assert benchmark.main(args + ["--baseline", str(baseline)]) == 1
+    assert "REGRESSION capture_latency" in capsys.readouterr().out
@@ -0,0 +1,69 @@
+"""Test the remote camera against a local camera server."""
+
+import io
+
+import pytest
+
+from rpyscope.cameras.remote import RemoteCam, main, serve
+from rpyscope.cameras.simulation import SimCam
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """Remote camera connected to a simulated camera served locally."""
+    cam = SimCam()
+    server = serve(cam, folder=tmp_path)
+    remote = RemoteCam("127.0.0.1", server.server_address[1])
+    yield remote, cam
+    remote.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_settings(remote):
+    """Settings are read and written on the served camera."""
+    remote, cam = remote
+    remote.resolution = (320, 240)
+    assert cam.resolution == (320, 240)
+    assert remote.resolution == (320, 240)
+    remote.drift = (1, 0)  # not part of AbsCamera, forwarded anyway
+    assert cam.drift == (1, 0)
+    assert remote.negotiate_mode("1920x1080", 30).resolution == (1920, 1080)
+    assert getattr(remote, "shutter_speed", None) is None
+    with pytest.raises(AttributeError):
+        remote._file_name
+    with pytest.raises(AttributeError):
+        remote.close_camera = True  # only camera settings can be set
+
+
+def test_remote_capture(remote):
+    """Frames and images are transferred with the time of their exposure."""
+    remote, cam = remote
+    cam.resolution = (64, 48)
+    frame = remote.capture_array()
+    assert frame.shape == (48, 64, 3)
+    assert (frame == cam.capture_array()).all()
+    assert remote.sensor_timestamp == pytest.approx(cam.sensor_timestamp, abs=0.5)
+
+    buffer = io.BytesIO()
+    remote.capture(buffer, "rgb", resize=(8, 6))
+    assert len(buffer.getvalue()) == 8 * 6 * 3
+    with pytest.raises(RuntimeError):
+        remote._request("call", "close")  # not allowed remotely
+
+
+def test_remote_recording_folder(remote, tmp_path, capsys):
+    """Recordings stay in the recording folder of the server."""
+    remote, cam = remote
+    remote.start_recording("video.h264", "h264")
+    assert str(tmp_path.joinpath("video.h264")) in capsys.readouterr().out
+    sibling = f"../{tmp_path.name}_other/video.h264"  # shares the prefix
+    for fname in ("../video.h264", "/tmp/video.h264", sibling):
+        with pytest.raises(RuntimeError, match="PermissionError"):
+            remote.start_recording(fname, "h264")
+
+
+def test_server_localhost_by_default():
+    """Listening on other interfaces has to be allowed explicitly."""
+    with pytest.raises(SystemExit):
+        main(["--host", "0.0.0.0", "--demo"])
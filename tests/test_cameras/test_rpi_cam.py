@@ -0,0 +1,38 @@
+"""Test the RPi camera without a camera."""
+
+import time
+
+from rpyscope.cameras import rpi_cam
+
+
+class StubPiCamera:
+    """Stands in for PiCamera, frame information is unavailable like on a Pi."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.timestamp = 5_000_000
+
+    @property
+    def frame(self):
+        raise rpi_cam.PiCameraRuntimeError(
+            "Cannot query frame information when camera is not recording"
+        )
+
+
+class RecordingStub(StubPiCamera):
+    """Recording camera whose last frame was exposed 1 s ago."""
+
+    frame = type("Frame", (), {"timestamp": 4_000_000})
+
+
+def test_sensor_timestamp_unknown_without_recording():
+    """Stills do not raise, their exposure time is unknown."""
+    sensor_timestamp = rpi_cam.RPiCam.sensor_timestamp.fget
+    assert sensor_timestamp(StubPiCamera(recording=False)) is None
+    assert sensor_timestamp(StubPiCamera(recording=True)) is None
+
+
+def test_sensor_timestamp_while_recording():
+    """Map the GPU time of the recorded frame to the monotonic clock."""
+    exposed = rpi_cam.RPiCam.sensor_timestamp.fget(RecordingStub(recording=True))
+    assert abs(time.monotonic() - 1.0 - exposed) < 0.1
@@ -0,0 +1,82 @@
+"""Test sensor mode tables and negotiation."""
+
+import pytest
+
+from rpyscope.cameras import sensor_modes
+from rpyscope.cameras.simulation import SimCam
+
+HQ_MODES = sensor_modes.SENSOR_MODES["imx477"]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1920x1080", (1920, 1080)), ("640 X 480", (640, 480)), ((800, 600), (800, 600))],
+)
+def test_parse_resolution(value, expected):
+    """Parse resolutions from strings and tuples."""
+    assert sensor_modes.parse_resolution(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1920", "axb", "0x100", None])
+def test_parse_resolution_invalid(value):
+    """Raise a ValueError for invalid resolutions."""
+    with pytest.raises(ValueError):
+        sensor_modes.parse_resolution(value)
+
+
+def test_negotiate_full_fov_preferred():
+    """Choose the binned full field of view mode for HD at 30 fps."""
+    negotiated = sensor_modes.negotiate(HQ_MODES, "1920x1080", 30)
+    assert negotiated.mode.mode == 2
+    assert negotiated.resolution == (1920, 1080)
+    assert negotiated.framerate == 30
+
+
+def test_negotiate_snap_resolution():
+    """Snap the resolution down if the framerate does not allow full resolution."""
+    negotiated = sensor_modes.negotiate(HQ_MODES, "4056x3040", 30)
+    assert negotiated.resolution == (2028, 1520)
+
+
+def test_negotiate_snap_framerate():
+    """Snap framerates in a gap between modes and above the maximum."""
+    assert sensor_modes.negotiate(HQ_MODES, "640x480", 50.05).framerate == 50
+    assert sensor_modes.negotiate(HQ_MODES, "640x480", 500).framerate == 120
+
+
+def test_negotiate_invalid_framerate():
+    """Raise a ValueError for invalid framerates."""
+    with pytest.raises(ValueError):
+        sensor_modes.negotiate(HQ_MODES, "640x480", "fast")
+
+
+def test_valid_choices_simulation():
+    """Offer native and common resolutions and framerates for the simulation."""
+    cam = SimCam()
+    assert "4056x3040" in cam.valid_resolutions()
+    assert "1920x1080" in cam.valid_resolutions()
+    assert "120" in cam.valid_framerates()
+    assert "120" not in cam.valid_framerates(resolution="4056x3040")
+
+
+def test_negotiate_snap_to_native():
+    """Snap nearly native resolutions to the mode, they are not rescaled."""
+    negotiated = sensor_modes.negotiate(HQ_MODES, "2000x1500", 30)
+    assert negotiated.mode.mode == 2
+    assert negotiated.resolution == (2028, 1520)
+
+
+def test_apply_mode_simulation():
+    """Put the camera into the negotiated sensor mode."""
+    cam = SimCam()
+    negotiated = cam.negotiate_mode("4056x3040", 10)
+    cam.apply_mode(negotiated)
+    assert cam.sensor_mode == negotiated.mode.mode == 3
+    assert tuple(cam.resolution) == (4056, 3040)
+    assert cam.framerate == 10
+
+
+def test_sensor_mode_invalid_simulation():
+    """Raise a ValueError for sensor modes the camera does not have."""
+    with pytest.raises(ValueError):
+        SimCam().sensor_mode = 42
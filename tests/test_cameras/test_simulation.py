@@ -1,3 +1,59 @@
 """Test simulated camera."""
 
+import io
+import time
+
+import pytest
+
 from rpyscope.cameras.simulation import SimCam
+
+
+def test_capture_array():
+    """Capture synthetic frames at the set resolution."""
+    cam = SimCam()
+    cam.resolution = (320, 240)
+    frame = cam.capture_array()
+    assert frame.shape == (240, 320, 3)
+    assert frame.max() == 200
+    assert cam.capture_array(resize=(32, 24)).shape == (24, 32, 3)
+
+
+def test_capture_array_drift():
+    """Frames move by the drift per frame."""
+    cam = SimCam()
+    cam.resolution = (320, 240)
+    cam.drift = (2, 1)
+    first = cam.capture_array()
+    second = cam.capture_array()
+    assert (second[10:-10, 10:-10] == first[9:-11, 8:-12]).all()
+
+
+def test_recording(tmp_path):
+    """Record padded raw frames at the framerate until stopped."""
+    cam = SimCam()
+    cam.resolution = (100, 50)
+    cam.framerate = 50
+    fname = tmp_path.joinpath("video.rgb")
+    cam.start_recording(str(fname), format="rgb")
+    with pytest.raises(RuntimeError):
+        cam.start_recording(str(fname), format="rgb")
+    time.sleep(0.2)
+    cam.stop_recording()
+
+    frame_size = 64 * 128 * 3
+    frames = fname.stat().st_size // frame_size
+    assert fname.stat().st_size % frame_size == 0
+    assert frames == cam.frame_count
+    assert 3 <= frames <= 12
+
+
+def test_reset():
+    """Stop recording and restore the initial settings."""
+    cam = SimCam()
+    cam.resolution = (100, 50)
+    cam.drift = (1, 0)
+    cam.start_recording(io.BytesIO(), format="rgb")
+    cam.reset()
+    assert cam._recorder is None
+    assert cam.resolution == SimCam().resolution
+    assert (cam.drift, cam.frame_count) == ((0, 0), 0)
@@ -0,0 +1,100 @@
+"""Test the capture catalog."""
+
+import os
+
+import pytest
+
+from rpyscope.catalog import Catalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """Catalog in a temporary folder."""
+    cat = Catalog(tmp_path.joinpath("catalog.sqlite"))
+    yield cat
+    cat.close()
+
+
+def test_add_query(catalog):
+    """Add entries and query them by sample, date, and settings."""
+    catalog.add("a.jpeg", "image", {"format": "jpeg"}, sample_id="S1", timestamp=10)
+    catalog.add("b.png", "image", {"format": "png"}, sample_id="S2", timestamp=20)
+    catalog.add("c.h264", "video", {"format": "h264"}, sample_id="S1", timestamp=30)
+
+    assert [e["path"] for e in catalog.query(sample_id="S1")] == ["c.h264", "a.jpeg"]
+    assert [e["path"] for e in catalog.query(since=15, until=30)] == ["b.png"]
+    assert [e["path"] for e in catalog.query(format="png")] == ["b.png"]
+    assert len(catalog.query(limit=2)) == 2
+
+
+def test_add_invalid(catalog):
+    """Raise ValueError for invalid kind and settings."""
+    with pytest.raises(ValueError):
+        catalog.add("a.jpeg", "photo")
+    with pytest.raises(ValueError):
+        catalog.add("a.jpeg", "image", {"iso": 100})
+
+
+def test_rescan(catalog, tmp_path):
+    """Pick up new and changed files only, ignore unknown formats."""
+    folder = tmp_path.joinpath("captures")
+    folder.joinpath("sub").mkdir(parents=True)
+    folder.joinpath("a.jpeg").write_bytes(b"a")
+    folder.joinpath("sub", "b.h264").write_bytes(b"b")
+    folder.joinpath("notes.txt").write_text("not a capture")
+
+    assert catalog.rescan(folder) == 2
+    assert catalog.rescan(folder) == 0
+
+    folder.joinpath("sub", "c.png").write_bytes(b"c")
+    assert catalog.rescan(folder) == 1
+    assert catalog.query(kind="video")[0]["path"] == os.path.join(
+        folder, "sub", "b.h264"
+    )
+
+
+def test_rescan_rewritten_and_deleted(catalog, tmp_path):
+    """Update files rewritten in place and remove deleted files."""
+    folder = tmp_path.joinpath("captures")
+    folder.mkdir()
+    folder.joinpath("a.jpeg").write_bytes(b"a")
+    folder.joinpath("b.png").write_bytes(b"b")
+    catalog.rescan(folder)
+
+    folder.joinpath("a.jpeg").write_bytes(b"rewritten")
+    folder.joinpath("b.png").unlink()
+    assert catalog.rescan(folder) == 2
+    (entry,) = catalog.query()
+    assert entry["path"] == str(folder.joinpath("a.jpeg"))
+    assert entry["size"] == len(b"rewritten")
+
+
+def test_rescan_relative_and_siblings(catalog, tmp_path, monkeypatch):
+    """Relative folders do not duplicate entries, siblings are not removed."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("run_1", "run_10", "run%1"):
+        tmp_path.joinpath(name).mkdir()
+        tmp_path.joinpath(name, "a.jpeg").write_bytes(b"a")
+    catalog.rescan(tmp_path.joinpath("run_10"))
+    catalog.rescan(tmp_path.joinpath("run%1"))
+
+    assert catalog.rescan("run_1") == 1
+    assert catalog.rescan(tmp_path.joinpath("run_1")) == 0
+    tmp_path.joinpath("run_1", "a.jpeg").unlink()
+    assert catalog.rescan("run_1") == 1
+    assert len(catalog.query()) == 2
+
+
+def test_captures_logged_with_settings(scope, tmp_path):
+    """Captures and recordings are logged with their settings and sample ID."""
+    scope.capture_image(tmp_path.joinpath("img.jpeg"), sample_id="S1")
+    scope.start_recording(tmp_path.joinpath("vid.h264"))
+    scope.stop_recording()
+    scope.storage.flush()
+
+    entries = scope.catalog.query()
+    assert {e["kind"] for e in entries} == {"image", "video"}
+    image = scope.catalog.query(kind="image")[0]
+    assert image["sample_id"] == "S1"
+    assert image["resolution"] == "1920x1080"
+    assert image["format"] == "jpeg"
@@ -0,0 +1,72 @@
+"""Test chunked array output."""
+
+import numpy as np
+import pytest
+
+from rpyscope.chunked import ChunkedArrayReader, ChunkedArrayWriter
+
+
+@pytest.fixture
+def frames():
+    """Random RGB frames."""
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (3, 100, 150, 3), dtype=np.uint8)
+
+
+def test_append_read(tmp_path, frames):
+    """Append frames and read them back lazily."""
+    path = tmp_path.joinpath("series.zarr")
+    with ChunkedArrayWriter(path, frames.shape[1:], chunks=(64, 64)) as writer:
+        for it, frame in enumerate(frames):
+            assert writer.append(frame, timestamp=it) == it
+
+    reader = ChunkedArrayReader(path)
+    assert reader.shape == (3, 1, 100, 150, 3)
+    assert len(reader) == 3
+    np.testing.assert_array_equal(reader[:, 0], frames)
+    np.testing.assert_array_equal(reader[1, 0, 50:70, 60:130], frames[1, 50:70, 60:130])
+    np.testing.assert_array_equal(reader[-1, 0, ::7, 3, 1], frames[-1, ::7, 3, 1])
+    assert [f["timestamp"] for f in reader.attrs["frames"]] == [0, 1, 2]
+
+
+def test_mosaic_and_stack(tmp_path, frames):
+    """Write tiles at offsets and z positions, the canvas grows."""
+    path = tmp_path.joinpath("mosaic.zarr")
+    writer = ChunkedArrayWriter(path, frames.shape[1:], chunks=(64, 64))
+    writer.write(frames[0], z=0)
+    writer.write(frames[1], z=0, y=80, x=120)
+    writer.write(frames[2], z=2)
+    writer.close()
+
+    reader = ChunkedArrayReader(path)
+    assert reader.shape == (1, 3, 180, 270, 3)
+    np.testing.assert_array_equal(reader[0, 0, 80:, 120:], frames[1])
+    np.testing.assert_array_equal(reader[0, 0, :80, :120], frames[0, :80, :120])
+    np.testing.assert_array_equal(reader[0, 1], 0)  # never written
+
+
+def test_reopen_append(tmp_path, frames):
+    """Appending to an existing array continues at the end."""
+    path = tmp_path.joinpath("series.zarr")
+    ChunkedArrayWriter(path, frames.shape[1:]).close()
+    writer = ChunkedArrayWriter(path, frames.shape[1:])
+    writer.append(frames[0])
+    writer.close()
+    assert ChunkedArrayReader(path).shape[0] == 1
+
+    with pytest.raises(ValueError):
+        ChunkedArrayWriter(path, (10, 10))
+
+
+def test_capture_to_series(scope, tmp_path):
+    """Frames are appended with the camera settings and their timestamps."""
+    scope.cam.resolution = (320, 240)
+    writer = scope.open_series(tmp_path.joinpath("series.zarr"))
+    for _ in range(2):
+        scope.capture_to(writer)
+    writer.close()
+
+    reader = ChunkedArrayReader(tmp_path.joinpath("series.zarr"))
+    assert reader.shape == (2, 1, 240, 320, 3)
+    assert reader.attrs["camera_settings"]["resolution"] == "320x240"
+    assert "timestamp" in reader.attrs["frames"][0]
@@ -0,0 +1,133 @@
+"""Tests for near-duplicate detection."""
+
+import numpy as np
+import pytest
+
+from rpyscope import dedupe
+from rpyscope.dedupe import HashIndex, hamming, image_hash
+from rpyscope.thumbnails import THUMBNAIL_SIZE
+
+
+def _image(seed, shape=(120, 160)):
+    """Smooth random image, such that downscaling keeps its structure."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 255, (shape[0] // 20, shape[1] // 20), dtype=np.uint8)
+    return np.kron(coarse, np.ones((20, 20), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("kind", dedupe.HASH_KINDS)
+def test_hash_similarity(kind):
+    """Slightly changed images have close hashes, different ones do not."""
+    image = _image(0)
+    noisy = np.clip(image + np.random.default_rng(1).normal(0, 3, image.shape), 0, 255)
+    assert hamming(image_hash(image, kind), image_hash(noisy, kind)) <= 6
+    assert hamming(image_hash(image, kind), image_hash(_image(2), kind)) > 6
+    with pytest.raises(ValueError):
+        image_hash(image, "ahash")
+
+
+def test_index_find_and_report(tmp_path):
+    """Near-duplicates are found by band lookups and grouped."""
+    index = HashIndex(tmp_path.joinpath("hashes.sqlite"), max_distance=4)
+    a, b = str(tmp_path.joinpath("a.png")), str(tmp_path.joinpath("b.png"))
+    assert index.add(a, hash=0xFF00FF00FF00FF00) == []
+    assert index.add(b, hash=0xFF00FF00FF00FF03) == [(a, 2)]
+    assert index.find(0xFF00FF00FF00FF03, max_distance=1) == [(b, 0)]
+    index.add("c.png", hash=0x00FF00FF00FF00FF)
+    index.add("d.png", hash=(1 << 64) - 1)  # stored as signed integer
+    assert len(index) == 4
+    assert len(index.find((1 << 64) - 1, max_distance=0)) == 1
+    groups = index.report()
+    assert len(groups) == 1
+    assert groups == [[a, b]]
+    with pytest.raises(ValueError):
+        index.find(0, max_distance=5)
+    index.remove(b)
+    assert index.report() == []
+    index.close()
+    with pytest.raises(ValueError):
+        HashIndex(tmp_path.joinpath("hashes.sqlite"), max_distance=6)
+
+
+def test_report_identical_hashes(tmp_path):
+    """Identical hashes are grouped with their near-duplicates."""
+    index = HashIndex(tmp_path.joinpath("hashes.sqlite"), max_distance=2)
+    for i in range(500):
+        index.add(tmp_path.joinpath(f"dark_{i}.png"), hash=0)  # e.g., empty view
+    index.add(tmp_path.joinpath("near.png"), hash=0b11)
+    index.add(tmp_path.joinpath("far.png"), hash=0xFF)
+    (group,) = index.report()
+    assert len(group) == 501 and str(tmp_path.joinpath("near.png")) in group
+    index.close()
+
+
+def test_scan_incremental_cli(tmp_path, capsys):
+    """Only new files are hashed on reruns, groups are written as CSV."""
+    folder = tmp_path.joinpath("captures")
+    folder.joinpath("sub").mkdir(parents=True)
+    np.save(folder.joinpath("one.npy"), _image(0))
+    np.save(folder.joinpath("sub", "copy.npy"), _image(0))
+    np.save(folder.joinpath("other.npy"), _image(3))
+
+    output = tmp_path.joinpath("groups.csv")
+    assert dedupe.main([str(folder), "--workers", "1", "--output", str(output)]) == 0
+    assert "3 images (3 newly hashed), 1 groups, 1 near-duplicates" in (
+        capsys.readouterr().out
+    )
+    lines = output.read_text().splitlines()
+    assert len(lines) == 3 and lines[1].endswith("one.npy")
+
+    np.save(folder.joinpath("another.npy"), _image(4))
+    dedupe.main([str(folder), "--workers", "1"])
+    assert "4 images (1 newly hashed)" in capsys.readouterr().out
+
+
+def test_capture_flags_duplicates(scope, tmp_path):
+    """Capturing the same view twice reports the first capture."""
+    scope.cam.resolution = (160, 120)
+    scope.capture_image(tmp_path.joinpath("first.npy"), format="npy")
+    assert scope.duplicates == []
+    scope.capture_image(tmp_path.joinpath("second.npy"), format="npy")
+    assert [path for path, _ in scope.duplicates] == [
+        str(tmp_path.joinpath("first.npy"))
+    ]
+    scope.microscope_settings["duplicate_check"] = False
+    scope.capture_image(tmp_path.joinpath("third.npy"), format="npy")
+    assert scope.duplicates == []
+
+
+def test_capture_duplicates_per_folder(scope, tmp_path):
+    """Captures are only compared to earlier ones in the same folder."""
+    scope.cam.resolution = (160, 120)
+    for name in ("a", "b"):
+        tmp_path.joinpath(name).mkdir()
+        scope.capture_image(tmp_path.joinpath(name, "image.npy"), format="npy")
+        assert scope.duplicates == []
+    assert scope.hash_index(tmp_path.joinpath("a")) is not scope.hash_index(
+        tmp_path.joinpath("b")
+    )
+
+
+def test_capture_hashes_captured_image(scope, tmp_path, monkeypatch):
+    """The captured image is hashed, no second frame is captured."""
+    hashed = []
+    index = scope.hash_index(tmp_path)
+    add = index.add
+
+    def recording(path, image=None, hash=None):
+        hashed.append(image)
+        return add(path, image=image, hash=hash)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("captured a second frame")
+
+    monkeypatch.setattr(index, "add", recording)
+    monkeypatch.setattr(scope.cam, "capture_array", fail)
+    scope.cam.resolution = (640, 480)
+    scope.capture_image(tmp_path.joinpath("image.rgb"), format="rgb")
+    scope.storage.flush()
+
+    (image,) = hashed
+    assert image.shape == (THUMBNAIL_SIZE[1], THUMBNAIL_SIZE[0], 3)
+    captured = np.fromfile(tmp_path.joinpath("image.rgb"), dtype=np.uint8)
+    np.testing.assert_array_equal(image, captured.reshape(480, 640, 3)[::4, ::4])
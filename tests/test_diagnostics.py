@@ -0,0 +1,65 @@
+"""Tests for stall detection and sampling profiling."""
+
+import threading
+import time
+
+from rpyscope.diagnostics import SamplingProfiler, StallWatchdog
+
+
+def _blocked_handler(seconds):
+    """Stands in for a button handler that blocks the event loop."""
+    time.sleep(seconds)
+
+
+def _busy(stop):
+    """Keep a thread busy until stopped."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_watchdog_reports_stall(tmp_path):
+    """A missing heartbeat is reported with the stack of the blocked thread."""
+    report = tmp_path.joinpath("stalls.log")
+    thread_id = []
+
+    def loop():
+        thread_id.append(threading.get_ident())
+        for _ in range(5):
+            watchdog.heartbeat()
+            time.sleep(0.01)
+        _blocked_handler(0.3)
+        watchdog.heartbeat()
+
+    watchdog = StallWatchdog(threshold=0.1, report=report, poll=0.01)
+    thread = threading.Thread(target=loop)
+    thread.start()
+    while not thread_id:
+        time.sleep(0.001)
+    watchdog.thread_id = thread_id[0]
+    watchdog.start()
+    thread.join()
+    watchdog.stop()
+
+    assert len(watchdog.stalls) == 1
+    assert 0.2 < watchdog.stalls[0]["duration"] < 1
+    assert "_blocked_handler" in watchdog.stalls[0]["stack"]
+    text = report.read_text()
+    assert "=== Stall at" in text and "_blocked_handler" in text
+    assert "--- Stall ended after" in text
+
+
+def test_profiler_samples_thread(tmp_path):
+    """The busy function of a thread dominates its profile."""
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy, args=(stop,))
+    thread.start()
+    with SamplingProfiler(interval=0.001, thread_id=thread.ident) as profiler:
+        time.sleep(0.2)
+    stop.set()
+    thread.join()
+
+    assert sum(profiler.samples.values()) > 10
+    assert "_busy" in profiler.report().splitlines()[2]
+    profiler.write(tmp_path.joinpath("profile.txt"))
+    line = tmp_path.joinpath("profile.txt").read_text().splitlines()[0]
+    assert ";_busy (test_diagnostics.py:" in line
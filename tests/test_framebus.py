@@ -0,0 +1,107 @@
+"""Tests for the shared-memory frame bus."""
+
+import multiprocessing
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from rpyscope import framebus
+from rpyscope.framebus import FrameBus, FrameBusReader
+
+
+@pytest.fixture
+def bus():
+    """Frame bus with small frames and a short ring."""
+    bus = FrameBus((4, 6, 3), n_slots=3)
+    yield bus
+    bus.close()
+
+
+def _read_in_process(name, queue):
+    """Read the latest frame in another process and report its sum."""
+    reader = FrameBusReader(name)
+    seq, _, frame = reader.latest()
+    queue.put((seq, int(frame.sum()), frame.shape))
+    reader.close()
+
+
+def test_publish_and_read(bus):
+    """Read frames in order with their timestamps, copies are independent."""
+    reader = FrameBusReader(bus.name)
+    assert reader.shape == (4, 6, 3)
+    assert reader.latest() is None
+    for value in range(2):
+        bus.publish(np.full((4, 6, 3), value, dtype=np.uint8), timestamp=value)
+    seq, timestamp, frame = reader.wait_next(timeout=1)
+    assert (seq, timestamp, frame.max()) == (1, 0, 0)
+    seq, timestamp, frame = reader.wait_next(timeout=1)
+    assert (seq, timestamp, frame.max()) == (2, 1, 1)
+    assert reader.wait_next(timeout=0.01) is None
+    reader.close()
+
+
+def test_overrun_and_lag(bus):
+    """Overwritten frames are skipped, the lag of consumers is reported."""
+    reader = FrameBusReader(bus.name)
+    for value in range(5):
+        bus.publish(np.full((4, 6, 3), value, dtype=np.uint8))
+    assert bus.consumers()[0]["lag"] == 5
+    assert reader.read(1) is None
+    seq, _, frame = reader.wait_next(timeout=1)
+    assert seq == 3 and frame.max() == 2
+    seq, _, view = reader.latest(copy=False)
+    assert seq == 5 and reader.is_valid(seq)
+    assert bus.consumers()[0]["lag"] == 0
+    bus.publish(np.zeros((4, 6, 3), dtype=np.uint8))
+    bus.publish(np.zeros((4, 6, 3), dtype=np.uint8))
+    bus.publish(np.zeros((4, 6, 3), dtype=np.uint8))
+    assert not reader.is_valid(seq)
+    reader.close()
+    assert bus.consumers() == []
+
+
+def test_other_process(bus):
+    """A consumer in another process reads the published frame."""
+    bus.publish(np.ones((4, 6, 3), dtype=np.uint8))
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_read_in_process, args=(bus.name, queue))
+    process.start()
+    assert queue.get(timeout=10) == (1, 72, (4, 6, 3))
+    process.join()
+
+
+def test_reclaim(bus):
+    """Only blocks of publishers that are not running anymore are removed."""
+    assert not framebus.reclaim(bus.name)
+    FrameBusReader(bus.name).close()  # still there
+
+    stale = FrameBus((4, 6, 3))
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    stale._header["owner"] = process.pid  # e.g., a crashed session
+    assert framebus.reclaim(stale.name)
+    with pytest.raises(FileNotFoundError):
+        FrameBusReader(stale.name)
+    stale._release()
+    assert framebus.reclaim(stale.name)  # nothing left
+
+
+def test_start_frame_bus(scope):
+    """Camera frames are published until the bus and its frame stream stop."""
+    bus = scope.start_frame_bus(name=None, resize=(32, 24))
+    reader = FrameBusReader(bus.name)
+    seq, _, frame = reader.wait_next(timeout=5)
+    assert seq >= 1 and frame.shape == (24, 32, 3) and frame.any()
+    reader.close()
+    scope.stop_frame_bus()
+    assert scope.frame_bus is None
+    assert scope._frame_stream is None
+
+
+def test_start_frame_bus_keeps_live_bus(scope, bus):
+    """The frame bus of a running session is not replaced."""
+    with pytest.raises(FileExistsError):
+        scope.start_frame_bus(name=bus.name)
+    FrameBusReader(bus.name).close()
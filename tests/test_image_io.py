@@ -0,0 +1,42 @@
+"""Test encoding and decoding of camera frames."""
+
+import numpy as np
+import pytest
+
+from rpyscope.image_io import RAW_FORMATS, decode_frame, encode_frame
+
+
+def _frame(shape=(60, 80, 3)):
+    """Frame of 10 x 10 pixel blocks, such that YUV 4:2:0 keeps the colors."""
+    rng = np.random.default_rng(42)
+    blocks = rng.integers(0, 255, (shape[0] // 10, shape[1] // 10, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((10, 10, 1), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("format", RAW_FORMATS + ("npy",))
+def test_decode_encoded_frame(format):
+    """Decode what `encode_frame` wrote, YUV up to rounding."""
+    frame = _frame()
+    decoded = decode_frame(encode_frame(frame, format), format, (80, 60))
+    assert decoded.shape == frame.shape
+    tolerance = 3 if format == "yuv" else 0
+    assert np.abs(decoded.astype(int) - frame).max() <= tolerance
+
+
+def test_decode_padded_frame():
+    """Crop the columns and rows the camera pads raw frames with."""
+    frame = _frame()
+    padded = np.zeros((64, 96, 3), dtype=np.uint8)
+    padded[:60, :80] = frame
+    np.testing.assert_array_equal(
+        decode_frame(padded.tobytes(), "rgb", (80, 60)), frame
+    )
+    with pytest.raises(ValueError):
+        decode_frame(padded.tobytes()[:-1], "rgb", (80, 60))
+
+
+def test_decode_shrink():
+    """Shrink to about the requested size, but not smaller."""
+    data = encode_frame(_frame(), "rgb")
+    assert decode_frame(data, "rgb", (80, 60), size=(40, 30)).shape == (30, 40, 3)
+    assert decode_frame(data, "rgb", (80, 60), size=(30, 20)).shape == (30, 40, 3)
@@ -0,0 +1,61 @@
+"""Tests for best-frame selection."""
+
+import numpy as np
+import pytest
+
+from rpyscope.image_io import read_image
+from rpyscope.lucky import BestFrames, sharpness, stack
+
+
+def _blur(frame, times):
+    """Blur a frame by repeated averaging with its neighbors."""
+    frame = frame.astype(np.float32)
+    for _ in range(times):
+        frame = (frame + np.roll(frame, 1, 0) + np.roll(frame, 1, 1)) / 3
+    return frame.astype(np.uint8)
+
+
+def test_sharpness_and_selection(scope):
+    """Blurred frames score lower, only the best are kept."""
+    scope.cam.resolution = (160, 120)
+    frame = scope.capture_frame()
+    burst = [_blur(frame, times) for times in (3, 0, 5, 1)]
+    assert sharpness(burst[1]) > sharpness(burst[3]) > sharpness(burst[0])
+
+    best = BestFrames(keep=2)
+    for item in burst:
+        best.add(item)
+    assert [index for _, index, _ in best.best()] == [1, 3]
+    assert len(best.scores) == 4
+    assert stack([frame, frame]).dtype == frame.dtype
+
+
+def test_capture_best(scope, tmp_path, monkeypatch):
+    """Only the sharpest frames of a burst are written."""
+    scope.cam.resolution = (160, 120)
+    frame = scope.capture_frame()
+    burst = [_blur(frame, times) for times in (2, 0, 4)]
+    monkeypatch.setattr(
+        scope.cam, "capture_burst", lambda count, resize=None: iter(burst)
+    )
+    scope.microscope_settings["capture_mode"] = "lucky"
+    scope.microscope_settings["lucky_keep"] = 2
+    scope.capture_image(tmp_path.joinpath("image.npy"), format="npy")
+    scope.storage.flush()
+    np.testing.assert_array_equal(read_image(tmp_path.joinpath("image_1.npy")), frame)
+    assert tmp_path.joinpath("image_2.npy").exists()
+    assert not tmp_path.joinpath("image_3.npy").exists()
+    assert len(scope.catalog.query()) == 2
+
+
+def test_capture_best_formats(scope, tmp_path):
+    """Raw formats are written like the camera does, unknown ones are refused."""
+    scope.cam.resolution = (160, 120)
+    scope.microscope_settings["capture_mode"] = "lucky"
+    scope.microscope_settings["lucky_burst"] = 2
+    scope.capture_image(tmp_path.joinpath("image.bgra"), format="bgra")
+    scope.storage.flush()
+    assert tmp_path.joinpath("image.bgra").stat().st_size == 160 * 120 * 4
+
+    with pytest.raises(ValueError):
+        scope.capture_image(tmp_path.joinpath("image.xyz"), format="xyz")
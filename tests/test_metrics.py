@@ -0,0 +1,88 @@
+"""Tests for latency metrics."""
+
+import json
+import math
+
+import pytest
+
+from rpyscope.metrics import Histogram, InstrumentedCamera, MetricsRegistry
+from rpyscope.microscope import Cam, Microscope
+
+
+@pytest.fixture
+def metrics(scope):
+    """Metrics of the microscope, enabled and reset after the test."""
+    scope.metrics.reset()
+    scope.enable_metrics()
+    yield scope.metrics
+    scope.enable_metrics(False)
+    scope.metrics.reset()
+
+
+def test_histogram_quantiles():
+    """Quantiles are estimated within the bucket resolution."""
+    hist = Histogram("test")
+    assert math.isnan(hist.quantile(0.5))
+    for i in range(1, 1001):
+        hist.observe(i * 1e-4)  # 0.1 ms to 100 ms
+    assert hist.count == 1000
+    assert hist.quantile(0.5) == pytest.approx(0.05, rel=0.2)
+    assert hist.quantile(0.99) == pytest.approx(0.099, rel=0.2)
+    assert hist.quantile(1.0) <= hist.max == pytest.approx(0.1)
+    assert hist.cumulative()[-1] == (math.inf, 1000)
+
+
+def test_disabled_registry_records_nothing():
+    """Timed functions are only passed on while disabled."""
+    registry = MetricsRegistry()
+
+    @registry.timed("work")
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    assert registry.snapshot() == {}
+    registry.enabled = True
+    assert work(3) == 6
+    assert registry.snapshot()["work"]["count"] == 1
+
+
+def test_camera_and_setters_are_timed(scope, metrics, tmp_path):
+    """Camera calls, property changes, and errors are recorded and exported."""
+    assert isinstance(scope.cam, InstrumentedCamera)
+    scope.cam.resolution = (160, 120)
+    scope.capture_frame()
+    scope.image_format = "png"
+    with pytest.raises(TypeError):
+        scope.auto_exposure = "on"
+
+    snapshot = metrics.snapshot()
+    assert snapshot["camera_set_resolution"]["count"] == 1
+    assert snapshot["camera_capture_array"]["count"] == 1
+    assert snapshot["microscope_set_image_format"]["count"] == 1
+    assert snapshot["microscope_set_auto_exposure_errors"] == 1
+
+    metrics.write(tmp_path.joinpath("metrics.prom"))
+    text = tmp_path.joinpath("metrics.prom").read_text()
+    assert "# TYPE rpyscope_camera_capture_array_seconds histogram" in text
+    assert 'rpyscope_camera_capture_array_seconds_bucket{le="+Inf"}' in text
+    assert "rpyscope_microscope_set_auto_exposure_errors_total 1" in text
+    metrics.write(tmp_path.joinpath("metrics.json"))
+    data = json.loads(tmp_path.joinpath("metrics.json").read_text())
+    assert data["camera_set_resolution"]["p99"] > 0
+
+    scope.enable_metrics(False)
+    assert not isinstance(scope.cam, InstrumentedCamera)
+
+
+def test_enable_metrics_before_camera_opens(scope):
+    """The camera is instrumented once it opens, not opened early."""
+    mic = Microscope(default_cam=Cam.Demo, open_camera=False)
+    try:
+        mic.enable_metrics()
+        assert mic.cam is None
+        mic.open_camera()
+        assert isinstance(mic.cam, InstrumentedCamera)
+    finally:
+        mic.enable_metrics(False)
+        mic.close()
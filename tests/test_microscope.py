@@ -1,7 +1,14 @@
 """Test the microscope class."""
 
 from pathlib import Path
+import subprocess
+import sys
+import threading
+import time
 
+import pytest
+
+from rpyscope.cameras.simulation import SimCam
 from rpyscope.microscope import Cam, Microscope
 
 
@@ -15,3 +22,66 @@ def test_microscope_home_folder():
     """Make sure that the home folder is set to '/home/pi'."""
     mic = Microscope()
     assert mic.microscope_settings["home_folder"] == Path.home()
+
+
+def test_microscope_deferred_camera(scope):
+    """The camera can be opened later and is shared by all microscopes."""
+    mic = Microscope(default_cam=Cam.Demo, open_camera=False)
+    assert mic.cam is None
+    assert mic.open_camera() is Cam.Demo.camera is scope.cam
+    mic.close()
+
+
+def test_import_is_lazy():
+    """Importing the microscope neither loads NumPy nor a camera."""
+    code = (
+        "import sys, rpyscope.microscope; "
+        "print('numpy' in sys.modules, 'rpyscope.cameras.rpi_cam' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_subsystems_opened_when_used(tmp_path, monkeypatch):
+    """Databases and writer threads are not opened before they are used."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    tmp_path.joinpath(".config").mkdir()
+    threads = threading.active_count()
+    mic = Microscope(default_cam=Cam.Demo, open_camera=False)
+    assert threading.active_count() == threads
+    assert not tmp_path.joinpath(".config", "RPyConf", "catalog.sqlite").exists()
+    assert mic.catalog is mic.catalog
+    mic.close()
+
+
+def test_capture_synchronized(scope, tmp_path):
+    """All cameras capture concurrently, the skew between them is reported."""
+
+    class SlowCam(SimCam):
+        def capture(self, fname, format, **kwargs):
+            super().capture(fname, format, **kwargs)
+            time.sleep(0.2)  # e.g., encoding
+            self.finished = time.monotonic()
+
+    scope.cam.resolution = (64, 48)
+    slow = [SlowCam(), SlowCam()]
+    for index, cam in enumerate(slow):
+        cam.resolution = (32, 24)
+        scope.add_camera(f"slow{index}", cam)
+    with pytest.raises(ValueError):
+        scope.add_camera("again", slow[0])
+
+    result = scope.capture_synchronized(tmp_path.joinpath("a.rgb"), format="rgb")
+    scope.storage.flush()
+    timestamps = result["timestamps"]
+    assert max(timestamps.values()) < min(cam.finished for cam in slow)  # overlap
+    assert result["skew"] == max(timestamps.values()) - min(timestamps.values())
+    assert set(result["files"]) == {"main", "slow0", "slow1"}
+    assert tmp_path.joinpath("a_main.rgb").stat().st_size == 64 * 48 * 3
+    assert tmp_path.joinpath("a_slow1.rgb").stat().st_size == 32 * 24 * 3
+
+    assert scope.remove_camera("slow1") is slow[1]
+    result = scope.capture_synchronized(tmp_path.joinpath("b.rgb"), names=["slow0"])
+    assert list(result["files"]) == ["slow0"] and result["skew"] == 0
@@ -0,0 +1,76 @@
+"""Tests for motion detection and the motion trigger."""
+
+import time
+
+import numpy as np
+
+from rpyscope.motion import (
+    MOTION_VECTOR_DTYPE,
+    FrameDifference,
+    MotionTrigger,
+    MotionVectorOutput,
+    motion_vector_shape,
+)
+
+
+def test_trigger_hysteresis_and_cooldown():
+    """Start above threshold, stop after hold below release, then cool down."""
+    events = []
+    trigger = MotionTrigger(
+        lambda t: events.append(("start", t)),
+        lambda t: events.append(("stop", t)),
+        threshold=0.1,
+        hold=1,
+        cooldown=5,
+    )
+    for t, score in enumerate([0, 0.2, 0.07, 0.04, 0.04, 0.04, 0.5, 0.5]):
+        trigger.update(score, timestamp=t)
+    assert events == [("start", 1), ("stop", 4)]
+    trigger.update(0.5, timestamp=9)
+    assert events[-1] == ("start", 9) and trigger.events == 2
+
+
+def test_motion_vector_output():
+    """Motion vectors written in pieces are scored per frame."""
+    scores = []
+    shape = motion_vector_shape((64, 32))
+    assert shape == (2, 5)
+    vectors = np.zeros(shape, dtype=MOTION_VECTOR_DTYPE)
+    vectors["x"][0, :2] = -3
+    output = MotionVectorOutput((64, 32), lambda score, t: scores.append(score))
+    data = vectors.tobytes() * 2
+    output.write(data[:7])
+    output.write(data[7:])
+    assert scores == [0.2, 0.2]
+
+
+def test_frame_difference(scope):
+    """Moving particles are detected, a still sample is not."""
+    cam = scope.cam
+    cam.resolution = (320, 240)
+    scores = []
+    difference = FrameDifference(lambda score, t: scores.append(score), step=4)
+    difference(cam.capture_array(), 0)
+    difference(cam.capture_array(), 1)
+    cam.drift = (6, 0)
+    cam.capture_array()
+    difference(cam.capture_array(), 2)
+    assert scores[:2] == [0, 0] and scores[2] > 0.01
+
+
+def test_motion_trigger_captures(scope):
+    """One image is captured once the sample moves, none while it rests."""
+    scope.cam.resolution = (320, 240)
+    scope.home_folder = scope.path_config.parent
+    trigger = scope.start_motion_trigger(action="capture", rate=50, cooldown=60)
+    time.sleep(0.1)
+    assert trigger.events == 0
+    scope.cam.drift = (6, 0)
+    for _ in range(500):
+        if trigger.events:
+            break
+        time.sleep(0.01)
+    scope.stop_motion_trigger()
+    scope.storage.flush()
+    assert trigger.events == 1
+    assert len(list(scope.home_folder.glob("motion_*.jpeg"))) == 1
@@ -0,0 +1,136 @@
+"""Test offloading staged files to their destination."""
+
+import os
+import shutil
+import time
+
+from rpyscope.offload import Offloader
+
+
+def throttled_copy(source, destination):
+    """Copy slowly, like to a network share."""
+    time.sleep(0.05)
+    shutil.copyfile(source, destination)
+
+
+def stage_files(folder, number):
+    """Create staged files and return their paths."""
+    folder.mkdir(exist_ok=True)
+    paths = []
+    for it in range(number):
+        path = folder.joinpath(f"{it}.jpeg")
+        path.write_bytes(bytes([it]) * 100)
+        paths.append(path)
+    return paths
+
+
+def test_offload(tmp_path):
+    """Move all files with bounded concurrency and remove the staged copies."""
+    share = tmp_path.joinpath("share", "sub")
+    done = []
+    offloader = Offloader(
+        tmp_path.joinpath("queue.sqlite"),
+        max_workers=3,
+        copy_function=throttled_copy,
+        on_done=done.append,
+    )
+    for path in stage_files(tmp_path.joinpath("staging"), 6):
+        offloader.enqueue(path, share.joinpath(path.name))
+    assert offloader.is_pending(share.joinpath("0.jpeg"))
+    assert offloader.wait(timeout=5)
+
+    assert sorted(p.name for p in share.iterdir()) == [f"{it}.jpeg" for it in range(6)]
+    assert share.joinpath("5.jpeg").read_bytes() == bytes([5]) * 100
+    assert not list(tmp_path.joinpath("staging").iterdir())
+    assert len(done) == 6
+    assert offloader.stats()["moved_bytes"] == 600
+    offloader.close()
+
+
+def test_offload_survives_restart(tmp_path):
+    """Pending moves are resumed when the offloader is opened again."""
+    offloader = Offloader(tmp_path.joinpath("queue.sqlite"), start=False)
+    path = stage_files(tmp_path.joinpath("staging"), 1)[0]
+    offloader.enqueue(path, tmp_path.joinpath("share", "0.jpeg"))
+    offloader.close()
+
+    offloader = Offloader(tmp_path.joinpath("queue.sqlite"))
+    assert offloader.wait(timeout=5)
+    assert tmp_path.joinpath("share", "0.jpeg").exists()
+    offloader.close()
+
+
+def test_offload_retry(tmp_path):
+    """Failed copies and checksum mismatches are retried, then marked failed."""
+    calls = []
+
+    def corrupting_copy(source, destination):
+        """Corrupt the copy the first time."""
+        shutil.copyfile(source, destination)
+        if not calls:
+            with open(destination, "ab") as fout:
+                fout.write(b"garbage")
+        calls.append(source)
+
+    offloader = Offloader(
+        tmp_path.joinpath("queue.sqlite"),
+        retry_delay=0.01,
+        copy_function=corrupting_copy,
+    )
+    path = stage_files(tmp_path.joinpath("staging"), 1)[0]
+    offloader.enqueue(path, tmp_path.joinpath("share", "0.jpeg"))
+    assert offloader.wait(timeout=5)
+    assert len(calls) == 2
+    assert tmp_path.joinpath("share", "0.jpeg").read_bytes() == bytes([0]) * 100
+
+    def failing_copy(source, destination):
+        raise OSError("share not mounted")
+
+    offloader.copy_function = failing_copy
+    path = stage_files(tmp_path.joinpath("staging"), 2)[1]
+    offloader.enqueue(path, tmp_path.joinpath("share", "1.jpeg"))
+    assert offloader.wait(timeout=5)
+    assert offloader.stats()["failed"] == 1
+    assert path.exists()
+    offloader.close()
+
+
+def test_staged_capture_offloaded(scope, tmp_path):
+    """Captures in staging mode end up at their destination and in the catalog.
+
+    The caller is notified once the image is at its destination.
+    """
+    scope.microscope_settings["staging_folder"] = tmp_path.joinpath("staging")
+    fname = tmp_path.joinpath("share", "img.jpeg")
+    fname.parent.mkdir()
+    written = []
+    scope.capture_image(
+        fname,
+        sample_id="S1",
+        on_written=lambda path: written.append(os.path.exists(path)),
+    )
+    scope.storage.flush()
+    assert scope.offloader.wait(timeout=5)
+
+    assert written == [True]
+    assert fname.exists()
+    assert scope.file_exists(fname)
+    entry = scope.catalog.query(sample_id="S1")[0]
+    assert entry["path"] == str(fname)
+    assert entry["size"] == fname.stat().st_size
+
+
+def test_offload_syncs_before_removing(tmp_path, monkeypatch):
+    """The staged copy is only removed once the copy and its rename are synced."""
+    events = []
+    fsync, remove = os.fsync, os.remove
+    monkeypatch.setattr(os, "fsync", lambda fd: events.append("fsync") or fsync(fd))
+    monkeypatch.setattr(
+        os, "remove", lambda path: events.append(("remove", str(path))) or remove(path)
+    )
+    offloader = Offloader(tmp_path.joinpath("queue.sqlite"))
+    path = stage_files(tmp_path.joinpath("staging"), 1)[0]
+    offloader.enqueue(path, tmp_path.joinpath("share", "0.jpeg"))
+    assert offloader.wait(timeout=5)
+    offloader.close()
+    assert events[:3] == ["fsync", "fsync", ("remove", str(path))]  # file, folder
@@ -0,0 +1,59 @@
+"""Tests for particle detection and measurement."""
+
+import numpy as np
+import pytest
+
+from rpyscope import particles
+from rpyscope.batch import main
+
+
+@pytest.fixture
+def image():
+    """Dark background with a 3x3 square, an L-shape, and a single pixel."""
+    img = np.full((40, 50), 10, dtype=np.uint8)
+    img[5:8, 5:8] = 200
+    img[20:30, 30] = 150
+    img[29, 30:40] = 150
+    img[35, 2] = 250
+    return img
+
+
+def test_label_connectivity():
+    """Diagonal neighbors are only connected with connectivity 8."""
+    mask = np.eye(4, dtype=bool)
+    assert particles.label(mask, connectivity=8)[1] == 1
+    assert particles.label(mask, connectivity=4)[1] == 4
+
+
+def test_label_tiles():
+    """Tiled labeling gives the same particles as the whole image."""
+    mask = np.random.default_rng(1).random((90, 70)) > 0.55
+    for connectivity in (4, 8):
+        whole, count = particles.label(mask, connectivity)
+        tiled, tiled_count = particles.label(mask, connectivity, tile_size=16)
+        assert tiled_count == count
+        assert len(set(zip(whole.ravel(), tiled.ravel()))) == count + 1
+
+
+def test_analyze(image):
+    """Particles are measured in order of their first pixel."""
+    table = particles.analyze(image, pixel_size=2, tile_size=16)
+    np.testing.assert_allclose(table["area"], [36, 76, 4])
+    assert (table["centroid_x"][0], table["centroid_y"][0]) == (12, 12)
+    assert table["equivalent_diameter"][2] == pytest.approx(np.sqrt(16 / np.pi))
+    assert (table["min_x"][1], table["max_y"][1]) == (30, 29)
+    np.testing.assert_allclose(table["mean_intensity"], [200, 150, 250])
+
+    assert len(particles.analyze(image, min_area=2)["label"]) == 2
+
+
+def test_batch_tables(tmp_path, image):
+    """Folders are analyzed in batch, one CSV table per image."""
+    captures = tmp_path.joinpath("captures")
+    captures.mkdir()
+    np.save(captures.joinpath("a.npy"), image)
+    output = tmp_path.joinpath("tables")
+    assert main([str(captures), str(output), "--stage", "particles", "--quiet"]) == 0
+    lines = output.joinpath("a.csv").read_text().splitlines()
+    assert lines[0].split(",") == list(particles.COLUMNS)
+    assert len(lines) == 4
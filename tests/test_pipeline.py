@@ -0,0 +1,84 @@
+"""Tests for the frame processing pipeline."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from rpyscope.pipeline import FramePipeline, Stage
+
+
+def _mean(frame, timestamp):
+    """Processor that can run in another process."""
+    return float(frame.mean())
+
+
+@pytest.mark.parametrize("drop_policy", ["latest", "queue", "block"])
+def test_drop_policies(drop_policy):
+    """Busy stages drop frames according to their policy."""
+    release = threading.Event()
+    seen = []
+
+    def processor(frame, timestamp):
+        release.wait()
+        seen.append(timestamp)
+
+    stage = Stage("slow", processor, drop_policy=drop_policy, queue_size=2)
+    stage.submit(None, 0)
+    time.sleep(0.05)  # first frame is being processed
+    if drop_policy == "block":
+        threading.Timer(0.1, release.set).start()
+    for timestamp in range(1, 5):
+        stage.submit(None, timestamp)
+    release.set()
+    assert stage.wait(timeout=5)
+    stats = stage.stats()
+    stage.close()
+
+    expected = {"latest": [0, 4], "queue": [0, 1, 2], "block": [0, 1, 2, 3, 4]}
+    assert seen == expected[drop_policy]
+    assert stats["dropped"] == 5 - len(seen)
+    assert stats["processed"] == len(seen)
+
+
+def test_rate_and_errors():
+    """Frames above the target rate are skipped, errors are counted."""
+    stage = Stage("fail", lambda frame, timestamp: 1 / 0, rate=1)
+    for _ in range(3):
+        stage.submit(None, 0)
+    assert stage.wait(timeout=5)
+    stats = stage.stats()
+    stage.close()
+    assert (stats["skipped"], stats["errors"], stats["processed"]) == (2, 1, 0)
+
+
+def test_process_executor():
+    """Processors can run in another process, results are kept."""
+    results = []
+    pipeline = FramePipeline()
+    stage = pipeline.register(
+        "mean",
+        _mean,
+        executor="process",
+        drop_policy="block",
+        on_result=lambda result, timestamp: results.append(result),
+    )
+    pipeline.submit(np.full((4, 4), 3, dtype=np.uint8), 0)
+    assert stage.wait(timeout=30)
+    assert stage.result == 3 and results == [3]
+    assert pipeline.stats()["mean"]["latency"] > 0
+    pipeline.close()
+    assert pipeline.stages == {}
+
+
+def test_register_processor(scope):
+    """Processors get live frames, the frame stream stops with the last one."""
+    stage = scope.register_processor("mean", _mean)
+    for _ in range(500):
+        if stage.result is not None:
+            break
+        time.sleep(0.01)
+    assert stage.result > 0
+    scope.unregister_processor("mean")
+    assert scope._frame_stream is None
@@ -0,0 +1,75 @@
+"""Test the raw video container."""
+
+import io
+import time
+
+import numpy as np
+import pytest
+
+from rpyscope.rawvideo import RawVideoReader, RawVideoWriter, raw_frame_shape
+
+
+def test_raw_frame_shape():
+    """Frames are padded like the camera does."""
+    assert raw_frame_shape((100, 50), "rgb") == (64, 128, 3)
+    assert raw_frame_shape((640, 480), "bgra") == (480, 640, 4)
+    assert raw_frame_shape((640, 480), "yuv") == (720, 640)
+    with pytest.raises(ValueError):
+        raw_frame_shape((640, 480), "h264")
+
+
+def test_write_read(tmp_path):
+    """Write frames in pieces and read them back memory-mapped."""
+    fname = tmp_path.joinpath("video.rgb")
+    times = iter(np.arange(5) / 10)
+    writer = RawVideoWriter(fname, (100, 50), "rgb", 10, clock=lambda: next(times))
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, (4, *writer.shape), dtype=np.uint8)
+    writer.write(frames[0].tobytes())
+    data = frames[1:].tobytes()
+    writer.write(data[:1000])  # the camera might write partial frames
+    writer.write(data[1000:] + b"incomplete")
+    writer.close()
+
+    reader = RawVideoReader(fname)
+    assert len(reader) == 4
+    assert reader.fps == 10
+    assert reader.format == "rgb"
+    np.testing.assert_array_equal(reader.frames, frames)
+    np.testing.assert_array_equal(reader.images[2], frames[2, :50, :100])
+    np.testing.assert_allclose(reader.timestamps, [0, 0.1, 0.2, 0.3])
+    assert isinstance(reader.frames.base, np.memmap)
+
+
+def test_invalid_file(tmp_path):
+    """Raise ValueError for files without header."""
+    fname = tmp_path.joinpath("video.rgb")
+    fname.write_bytes(b"\0" * 5000)
+    with pytest.raises(ValueError):
+        RawVideoReader(fname)
+
+
+def test_file_like_output():
+    """Write to file-like objects, which are not closed."""
+    output = io.BytesIO()
+    writer = RawVideoWriter(output, (32, 16), "yuv", 30)
+    writer.write(bytes(32 * 24))
+    writer.close()
+    assert not output.closed
+    assert writer.frames == 1
+
+
+def test_raw_recording_container(scope, tmp_path):
+    """Raw recordings are written into the container with frame timestamps."""
+    fname = tmp_path.joinpath("video.rgb")
+    scope.cam.resolution = (100, 50)
+    scope.start_recording(fname, format="rgb")
+    time.sleep(0.3)
+    scope.stop_recording()
+    scope.storage.flush()
+    reader = RawVideoReader(fname)
+    assert reader.resolution == (100, 50)
+    assert len(reader) >= 3
+    assert reader.images.shape[1:] == (50, 100, 3)
+    np.testing.assert_array_equal(reader.images[0], scope.cam._render())
+    assert np.all(np.diff(reader.timestamps) > 0)
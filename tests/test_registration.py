@@ -0,0 +1,53 @@
+"""Tests for drift correction."""
+
+import numpy as np
+import pytest
+
+from rpyscope.chunked import ChunkedArrayReader
+from rpyscope.registration import DriftCorrector, phase_correlation, shift_frame
+
+
+def test_phase_correlation(scope):
+    """Integer and subpixel shifts are found."""
+    scope.cam.resolution = (256, 128)
+    reference = scope.capture_frame()[..., 0].astype(float)
+    moved = np.roll(reference, (5, -7), axis=(0, 1))
+    assert phase_correlation(reference, moved) == pytest.approx((5, -7), abs=0.1)
+    blurred = (reference + np.roll(reference, 1, axis=1)) / 2  # shift by 0.5
+    assert phase_correlation(reference, blurred)[1] == pytest.approx(0.5, abs=0.2)
+
+
+def test_shift_frame():
+    """Frames are shifted without wrapping around."""
+    frame = np.arange(12).reshape(3, 4)
+    np.testing.assert_array_equal(
+        shift_frame(frame, 1, -1), [[0, 0, 0, 0], [1, 2, 3, 0], [5, 6, 7, 0]]
+    )
+
+
+def test_drift_corrector(scope):
+    """Drift accumulates over key frames and is corrected."""
+    scope.cam.resolution = (320, 240)
+    scope.cam.drift = (3, -2)
+    corrector = DriftCorrector(downsample=2, rekey=0.05)
+    frames = [scope.capture_frame() for _ in range(12)]
+    for frame in frames:
+        aligned, _ = corrector.align(frame)
+    assert corrector.offsets[-1] == pytest.approx((-22, 33), abs=0.5)
+    np.testing.assert_array_equal(aligned[30:-30, 40:-40], frames[0][30:-30, 40:-40])
+
+
+def test_aligned_series(scope, tmp_path):
+    """Aligned series store the drift of every frame."""
+    scope.cam.resolution = (128, 96)
+    scope.cam.drift = (1, 0)
+    with scope.open_series(tmp_path.joinpath("s.zarr"), align=True) as series:
+        for _ in range(3):
+            scope.capture_to(series)
+    reader = ChunkedArrayReader(tmp_path.joinpath("s.zarr"))
+    assert [f["drift_x"] for f in reader.attrs["frames"]] == pytest.approx(
+        [0, 1, 2], abs=0.2
+    )
+    np.testing.assert_array_equal(
+        reader[2, 0, 20:-20, 20:-20], reader[0, 0, 20:-20, 20:-20]
+    )
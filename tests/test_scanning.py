@@ -0,0 +1,69 @@
+"""Tests for scan planning and pipelined scans."""
+
+import time
+
+import pytest
+
+from rpyscope import scanning
+from rpyscope.chunked import ChunkedArrayReader
+from rpyscope.stages.simulation import SimStage
+
+
+def test_plan_orders():
+    """Serpentine and nearest neighbour orders reduce travel."""
+    positions = scanning.grid((0, 0), (3, 2), (10, 5))
+    assert scanning.serpentine(positions) == [
+        (0, 0),
+        (10, 0),
+        (20, 0),
+        (20, 5),
+        (10, 5),
+        (0, 5),
+    ]
+    assert scanning.path_cost(scanning.plan(positions)) < scanning.path_cost(positions)
+
+    wells = [(0, 0), (90, 0), (10, 5), (80, 5), (5, 10)]
+    ordered = scanning.plan(wells, order="nearest", start=(0, 0, 0))
+    assert ordered == [(0, 0), (10, 5), (5, 10), (80, 5), (90, 0)]
+    assert scanning.plan(wells, order="given") == wells
+    with pytest.raises(ValueError):
+        scanning.plan(wells, order="random")
+
+
+def test_scan_overlaps_moves_and_writes(scope):
+    """Handling a tile overlaps with moving to the next position."""
+    stage = SimStage(speed=(1000, 1000, 100), settle_time=0.0)
+    positions = scanning.grid((0, 0), (3, 2), (50, 50))  # 50 ms per move
+    tiles = []
+
+    def slow_write(frame, position, timestamp):
+        time.sleep(0.03)
+        tiles.append(position)
+
+    result = scanning.scan(scope, stage, positions, slow_write)
+    assert tiles == scanning.serpentine(positions)
+    assert result["tiles"] == 6 and result["tiles_per_minute"] > 0
+    assert result["tile_wait"] < result["tile_time"] / 2  # mostly while moving
+
+
+def test_scan_mosaic(scope, tmp_path):
+    """Tiles are placed by their stage position."""
+    scope.cam.resolution = (32, 24)
+    with pytest.raises(ValueError):
+        scope.scan_mosaic(tmp_path.joinpath("none.zarr"), [(0, 0)], 1.0)
+
+    scope.stage = SimStage(settle_time=0.0)
+    positions = scanning.grid((100, 200), (2, 2), (32, 24))
+    result = scope.scan_mosaic(tmp_path.joinpath("mosaic.zarr"), positions, 1.0)
+    assert result["tiles"] == 4
+
+    mosaic = ChunkedArrayReader(tmp_path.joinpath("mosaic.zarr"))
+    assert mosaic.shape == (1, 1, 48, 64, 3)
+    frames = mosaic.attrs["frames"]
+    assert {(frame["y"], frame["x"]) for frame in frames} == {
+        (0, 0),
+        (0, 32),
+        (24, 0),
+        (24, 32),
+    }
+    assert frames[-1]["stage_position"] == [100, 224]
@@ -0,0 +1,82 @@
+"""Tests for acquisition sequences."""
+
+import pytest
+
+from rpyscope.microscope import Cam, Microscope
+from rpyscope.sequences import Sequence, SequenceLibrary
+
+SCRIPT = """
+for fmt in ("png", "bmp"):
+    set(image_format=fmt, brightness=60)
+    capture(f"image_{fmt}")
+wait(0.01)
+log("done")
+"""
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "import os",
+        "scope.__class__",
+        "def f():\n    pass",
+        "while True:\n    pass",
+        "open('file')\nfor",
+    ],
+)
+def test_sequence_check(source):
+    """Scripts outside of the allowed subset are rejected when loaded."""
+    with pytest.raises(ValueError):
+        Sequence(source)
+
+
+def test_sequence_run(scope, tmp_path):
+    """Steps are run in a worker thread, timed, and reported."""
+    scope.home_folder = tmp_path
+    steps = []
+    run = scope.run_sequence(Sequence(SCRIPT, "test"), on_progress=steps.append)
+    assert run.wait(10)
+    scope.storage.flush()
+
+    assert run.error is None and not run.cancelled
+    assert tmp_path.joinpath("image_png.png").is_file()
+    assert tmp_path.joinpath("image_bmp.bmp").is_file()
+    assert scope.image_format == "bmp"
+    assert [step["command"] for step in steps] == ["set", "capture"] * 2 + [
+        "wait",
+        "log",
+    ]
+    assert [step["line"] for step in steps] == [3, 4, 3, 4, 5, 6]
+    assert steps[-2]["duration"] >= 0.01
+    assert run.messages == ["done"]
+    assert "Total" in run.report()
+
+
+def test_sequence_error_and_cancel(scope):
+    """Errors are reported with their line, waits can be cancelled."""
+    run = scope.run_sequence(Sequence("wait(0)\nset(unknown=1)"))
+    run.wait(10)
+    assert run.error.startswith("line 2: ValueError")
+
+    run = scope.run_sequence(Sequence("wait(60)\ncapture()"))
+    run.cancel()
+    assert run.wait(10) and run.cancelled and not run.steps
+
+
+def test_sequence_library_and_startup(tmp_path, monkeypatch):
+    """Sequences are loaded by name and `init.py` runs when the camera opens."""
+    library = SequenceLibrary(tmp_path)
+    tmp_path.joinpath("one.py").write_text("wait(0)")
+    assert library.names() == ["one"]
+    assert library.get("one") is library.get("one")  # compiled once
+    with pytest.raises(ValueError):
+        library.get("two")
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    config = tmp_path.joinpath(".config", "RPyConf")
+    config.mkdir(parents=True)
+    config.joinpath("init.py").write_text("set(image_format='png')")
+    mic = Microscope(default_cam=Cam.Demo)
+    assert mic.startup_run.wait(10)
+    assert mic.image_format == "png"
+    mic.close()
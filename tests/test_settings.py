@@ -0,0 +1,85 @@
+"""Tests for the persistent settings store."""
+
+import json
+from pathlib import Path
+import time
+
+import pytest
+
+from rpyscope.microscope import Cam, Microscope
+from rpyscope.settings import SCHEMA_VERSION, SettingsStore
+
+DEFAULTS = {"format": "jpeg", "count": 10, "ratio": 0.5, "on": True, "path": None}
+
+
+def test_settings_defaults(tmp_path):
+    """Without a file, the defaults are used and nothing is written."""
+    store = SettingsStore(tmp_path.joinpath("settings.json"), DEFAULTS)
+    assert dict(store) == DEFAULTS
+    store.close()
+    assert not tmp_path.joinpath("settings.json").exists()
+
+    with pytest.raises(KeyError):
+        store["unknown"] = 1
+
+
+def test_settings_debounced(tmp_path):
+    """Changes are coalesced and written once they settle."""
+    fname = tmp_path.joinpath("settings.json")
+    store = SettingsStore(fname, DEFAULTS, delay=0.2)
+    for count in range(20):
+        store["count"] = count
+    assert not fname.exists()
+
+    time.sleep(0.6)
+    data = json.loads(fname.read_text())
+    assert data == {"version": SCHEMA_VERSION, "settings": dict(DEFAULTS, count=19)}
+    assert [path.name for path in tmp_path.iterdir()] == ["settings.json"]
+
+    store["format"] = "png"
+    store.close()  # flushes
+    assert SettingsStore(fname, DEFAULTS)["format"] == "png"
+
+
+def test_settings_failed_write_stays_pending(tmp_path, monkeypatch):
+    """Changes that could not be written are written with the next flush."""
+    fname = tmp_path.joinpath("settings.json")
+    store = SettingsStore(fname, DEFAULTS, delay=60, max_delay=60)
+    store["count"] = 3
+    commit = store._commit
+
+    def fail(values):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(store, "_commit", fail)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.setattr(store, "_commit", commit)
+    store.close()
+    assert SettingsStore(fname, DEFAULTS)["count"] == 3
+
+
+def test_settings_migrate_and_validate(tmp_path):
+    """Plain dictionaries are migrated and invalid values are replaced."""
+    fname = tmp_path.joinpath("settings.json")
+    fname.write_text(
+        json.dumps({"format": 3, "count": "many", "ratio": 1, "old": 1, "path": "/a"})
+    )
+    store = SettingsStore(fname, DEFAULTS)
+    assert dict(store) == dict(DEFAULTS, ratio=1, path="/a")
+
+    fname.write_text("{not json")
+    assert dict(SettingsStore(fname, DEFAULTS)) == DEFAULTS
+
+
+def test_settings_restored_on_start(scope):
+    """Microscope settings are restored on the next start."""
+    scope.image_format = "png"
+    scope.microscope_settings["staging_folder"] = Path.home().joinpath("staging")
+    scope.microscope_settings.flush()
+
+    mic = Microscope(default_cam=Cam.Demo)
+    assert mic.image_format == "png"
+    assert mic.home_folder == Path.home()
+    assert mic.microscope_settings["staging_folder"] == str(Path.home() / "staging")
+    mic.close()
@@ -0,0 +1,41 @@
+"""Test simulated stage."""
+
+import time
+
+import pytest
+
+from rpyscope.stages.simulation import SimStage
+
+
+def test_move_and_settle():
+    """Moves take the time of the slowest axis plus settling."""
+    stage = SimStage(speed=(1000, 1000, 100), settle_time=0.05)
+    assert stage.travel_time((0, 0, 0), (100, 50, 1)) == pytest.approx(0.15)
+
+    start = time.monotonic()
+    stage.move_to(100, 50, wait=False)
+    assert stage.is_moving
+    stage.wait()
+    assert time.monotonic() - start == pytest.approx(0.15, abs=0.05)
+    assert not stage.is_moving
+    assert stage.position == (100, 50, 0)
+
+    stage.move_by(dx=-100)
+    assert stage.position == (0, 50, 0)
+    assert stage.moves == 2 and stage.travel == pytest.approx(125**0.5 * 10 + 100)
+
+
+def test_limits_and_stop():
+    """Positions outside of the limits are refused, moves can be stopped."""
+    stage = SimStage(speed=(100, 100, 100))
+    with pytest.raises(ValueError):
+        stage.move_to(x=-1)
+
+    stage.move_to(x=1000, wait=False)
+    time.sleep(0.05)
+    stage.stop()
+    x, _, _ = stage.position
+    assert 0 < x < 1000 and not stage.is_moving
+    with pytest.raises(TimeoutError):
+        stage.move_to(x=2000, wait=False)
+        stage.wait(timeout=0.01)
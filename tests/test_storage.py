@@ -0,0 +1,100 @@
+"""Test the write-behind storage layer."""
+
+import pytest
+
+from rpyscope.storage import StorageFullError, WriteBehindStorage
+
+
+@pytest.fixture
+def storage():
+    """Storage that syncs every second file."""
+    store = WriteBehindStorage(fsync_batch=2, high_watermark=1.0, low_watermark=1.0)
+    yield store
+    store.close()
+
+
+def test_submit(storage, tmp_path):
+    """Files are written in the background and callbacks are called."""
+    written = []
+    for it in range(5):
+        storage.submit(
+            tmp_path.joinpath(f"{it}.jpeg"), bytes([it]) * 10, written.append
+        )
+    assert storage.exists(tmp_path.joinpath("4.jpeg"))
+    storage.flush()
+
+    assert len(written) == 5
+    assert tmp_path.joinpath("3.jpeg").read_bytes() == bytes([3]) * 10
+    assert not list(tmp_path.glob("*.part"))
+    stats = storage.stats()
+    assert stats["backlog_files"] == 0
+    assert stats["written_files"] == 5
+    assert stats["written_bytes"] == 50
+
+
+def test_stream(storage, tmp_path):
+    """Streams only show up on disk once they are closed."""
+    fname = tmp_path.joinpath("video.h264")
+    stream = storage.open_stream(fname)
+    stream.write(b"abc")
+    stream.write(b"def")
+    storage.flush()
+    assert not fname.exists()
+    assert storage.exists(fname)
+
+    stream.close()
+    storage.flush()
+    assert fname.read_bytes() == b"abcdef"
+    with pytest.raises(ValueError):
+        stream.write(b"ghi")
+
+
+def test_failed_writes(storage, tmp_path):
+    """Failed writes are reported and released, later writes still work."""
+    fname = tmp_path.joinpath("img.png")
+    tmp_path.joinpath("img.png.part").mkdir()  # the file cannot be opened
+    storage.submit(fname, b"image")
+    with pytest.raises(OSError):
+        storage.flush()
+    assert not storage.exists(fname)
+    assert storage.stats()["backlog_bytes"] == 0
+
+    video = tmp_path.joinpath("video.h264")
+    tmp_path.joinpath("video.h264.part").mkdir()
+    stream = storage.open_stream(video)
+    stream.write(b"abc")
+    stream.close()
+    with pytest.raises(OSError):
+        storage.flush()
+    assert not storage.exists(video)
+
+    storage.submit(tmp_path.joinpath("next.png"), b"next")
+    storage.flush()
+    assert tmp_path.joinpath("next.png").read_bytes() == b"next"
+    assert storage.stats()["backlog_files"] == 0
+
+
+def test_spool(tmp_path):
+    """Files can be buffered in a spool folder instead of memory."""
+    storage = WriteBehindStorage(
+        fsync_batch=0, high_watermark=1.0, spool_folder=tmp_path.joinpath("spool")
+    )
+    storage.submit(tmp_path.joinpath("img.png"), b"image")
+    storage.close()
+    assert tmp_path.joinpath("img.png").read_bytes() == b"image"
+    assert not list(tmp_path.joinpath("spool").iterdir())
+
+
+def test_watermark(tmp_path):
+    """Refuse captures above the high watermark."""
+    storage = WriteBehindStorage(high_watermark=1e-9, low_watermark=1e-9)
+    with pytest.raises(StorageFullError):
+        storage.submit(tmp_path.joinpath("img.jpeg"), b"image")
+    assert storage.stats()["refusing"]
+    storage.close()
+
+
+def test_invalid_watermarks():
+    """Raise ValueError if the low watermark is above the high watermark."""
+    with pytest.raises(ValueError):
+        WriteBehindStorage(high_watermark=0.8, low_watermark=0.9)
@@ -0,0 +1,49 @@
+"""Test the thumbnail cache."""
+
+from rpyscope.thumbnails import ThumbnailCache
+
+
+def make_files(folder, number):
+    """Create some original files and return their paths."""
+    paths = []
+    for it in range(number):
+        path = folder.joinpath(f"img{it}.jpeg")
+        path.write_bytes(bytes([it]) * 10)
+        paths.append(path)
+    return paths
+
+
+def test_put_get(tmp_path):
+    """Get thumbnails from memory and, after a restart, from disk."""
+    path = make_files(tmp_path, 1)[0]
+    cache = ThumbnailCache(tmp_path.joinpath("cache"))
+    cache.put(path, b"thumb")
+    assert cache.get(path) == b"thumb"
+
+    cache = ThumbnailCache(tmp_path.joinpath("cache"))
+    assert cache.disk_bytes == 5
+    assert cache.get(path) == b"thumb"
+
+
+def test_changed_file(tmp_path):
+    """A modified original file has no thumbnail anymore."""
+    path = make_files(tmp_path, 1)[0]
+    cache = ThumbnailCache(tmp_path.joinpath("cache"))
+    cache.put(path, b"thumb")
+    path.write_bytes(b"a new and larger image")
+    assert cache.get(path) is None
+
+
+def test_lru_eviction(tmp_path):
+    """Evict the least recently used thumbnails from memory and disk."""
+    paths = make_files(tmp_path, 4)
+    cache = ThumbnailCache(tmp_path.joinpath("cache"), max_items=2, max_bytes=30)
+    for path in paths[:3]:
+        cache.put(path, b"0123456789")
+    cache.get(paths[0])  # use the oldest one again
+    cache.put(paths[3], b"0123456789")
+
+    assert cache.disk_bytes == 30
+    assert len(cache._memory) == 2
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[0]) == b"0123456789"
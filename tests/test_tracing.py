@@ -0,0 +1,60 @@
+"""Tests for capture latency tracing."""
+
+import pytest
+
+from rpyscope import tracing
+
+
+def test_capture_is_traced(scope, tmp_path):
+    """Every stage of an image capture is logged in order."""
+    fname = tmp_path.joinpath("image.jpeg")
+    scope.capture_image(fname)
+    scope.storage.flush()
+
+    (trace,) = tracing.read(scope.traces.fname)
+    assert trace["kind"] == "image" and trace["path"] == str(fname)
+    assert list(trace["stages"]) == [
+        "trigger",
+        "exposure",
+        "encoded",
+        "queued",
+        "written",
+    ]
+    assert trace["stages"]["trigger"] == 0
+    assert trace["stages"]["written"] >= trace["stages"]["queued"]
+
+    scope.microscope_settings["tracing"] = False
+    scope.capture_image(tmp_path.joinpath("untraced.jpeg"))
+    scope.storage.flush()
+    assert len(list(tracing.read(scope.traces.fname))) == 1
+
+
+def test_series_frames_are_traced(scope, tmp_path):
+    """Frames of a series carry their trace ID in the metadata."""
+    scope.cam.resolution = (64, 48)
+    with scope.open_series(tmp_path.joinpath("series.zarr")) as series:
+        assert scope.capture_to(series) == 0
+        frame_id = series.attrs["frames"][0]["trace_id"]
+    (trace,) = tracing.read(scope.traces.fname, kind="frame")
+    assert trace["id"] == frame_id
+    assert list(trace["stages"])[-2:] == ["captured", "written"]
+
+
+def test_summary_and_cli(tmp_path, capsys):
+    """Stages are measured from the stage before, plus the total."""
+    log = tracing.TraceLog(tmp_path.joinpath("traces.jsonl"))
+    for delay in (1, 2, 3):
+        trace = tracing.Trace("image")
+        trace.marks["encoded"] = trace.marks["trigger"] + delay * 0.01
+        trace.marks["written"] = trace.marks["encoded"] + 0.1
+        log.write(trace)
+
+    summary = tracing.summarize(tracing.read(log.fname))
+    assert list(summary) == ["encoded", "written", "total"]
+    assert summary["encoded"]["p50"] == pytest.approx(20)
+    assert summary["written"]["max"] == pytest.approx(100)
+    assert summary["total"]["count"] == 3
+
+    assert tracing.main([str(log.fname)]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("stage (ms)") and lines[-1].startswith("total")
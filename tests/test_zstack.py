@@ -0,0 +1,57 @@
+"""Tests for pipelined z-stacks."""
+
+import time
+
+import pytest
+
+from rpyscope import zstack
+from rpyscope.chunked import ChunkedArrayReader, ChunkedArrayWriter
+from rpyscope.stages.simulation import SimStage
+
+
+def test_z_range():
+    """Positions include both ends, in either direction."""
+    assert zstack.z_range(0, 1, 0.25) == [0, 0.25, 0.5, 0.75, 1]
+    assert zstack.z_range(10, 8, 1) == [10, 9, 8]
+    assert zstack.z_range(0, 1, 0.3) == pytest.approx([0, 0.3, 0.6, 0.9])
+    with pytest.raises(ValueError):
+        zstack.z_range(0, 1, 0)
+
+
+def test_acquire_is_pipelined(scope, tmp_path):
+    """Writing overlaps with moving the focus to the next slice."""
+    scope.cam.resolution = (32, 24)
+    focus = SimStage(speed=(1, 1, 1000), settle_time=0.04)
+    writer = ChunkedArrayWriter(tmp_path.joinpath("stack.zarr"), (24, 32, 3))
+    write = writer.write
+
+    def slow_write(*args, **kwargs):
+        time.sleep(0.02)
+        write(*args, **kwargs)
+
+    writer.write = slow_write
+    result = zstack.acquire(scope, focus, zstack.z_range(0, 8, 2), writer)
+    writer.close()
+    assert result["t"] == 0 and result["slices"] == 5
+    assert result["write_wait"] < result["write_time"] / 2  # mostly while moving
+    assert focus.position[2] == 8
+
+
+def test_capture_zstack(scope, tmp_path):
+    """Stacks go into one array with their z positions, the focus returns."""
+    scope.cam.resolution = (32, 24)
+    fname = tmp_path.joinpath("stack.zarr")
+    with pytest.raises(ValueError):
+        scope.capture_zstack(fname, [0, 1])
+
+    scope.stage = SimStage(settle_time=0.0)
+    scope.stage.move_to(z=5)
+    assert scope.capture_zstack(fname, [4, 5, 6])["t"] == 0
+    assert scope.capture_zstack(fname, [4, 5, 6])["t"] == 1
+    scope.stage.wait()
+    assert scope.stage.position[2] == 5
+
+    stack = ChunkedArrayReader(fname)
+    assert stack.shape == (2, 3, 24, 32, 3)
+    assert stack.attrs["z_positions"] == {"0": [4, 5, 6], "1": [4, 5, 6]}
+    assert [frame["z_position"] for frame in stack.attrs["frames"][:3]] == [4, 5, 6]